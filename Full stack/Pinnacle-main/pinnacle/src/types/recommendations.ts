@@ -18,14 +18,14 @@ export interface RecommendationRecord {
   customer_id: string
   customer_name: string
   gender: string
-  age: number
+  age: number | null
   city: string
   state: string
   occupation: string
   income_bracket: string
   recommended_product: string
   confidence_score: number
-  reason?: string
+  reason: string
 }
 
 export interface RecommendationResponse {
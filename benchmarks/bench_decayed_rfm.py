@@ -0,0 +1,125 @@
+"""
+Benchmark: decayed RFM counters folded per day vs. a full-history rescan.
+
+Replays the last ``--days`` days of a transactions dataset. Each day the
+rescan matches and aggregates the whole history up to that day (what
+section 7 of ``create_customer_product_interactions`` does every run); the
+incremental path folds only that day's matched transactions into a
+``DecayedRFM`` and decays the scores to the day. Reports the time per day,
+that both give the same scores, per-transaction ``update`` throughput and
+the saved state size. With Spark, ``update_rfm_state`` is run as a history
+build plus the replayed days against ``transaction_rfm_spark`` over all
+matches.
+
+Usage:
+    python benchmarks/bench_decayed_rfm.py --data-dir /tmp/pinnacle_10k --days 30
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pinnacle.decayed_rfm import DecayedRFM, rfm_scores_from_state, transaction_rfm_spark, update_rfm_state
+from pinnacle.keyword_match import KeywordMatcher, match_transactions_spark
+
+
+def rescan(matcher, trans, at):
+    """Match and aggregate the full history up to ``at`` from scratch."""
+    state = DecayedRFM()
+    state.update_frame(matcher.match(trans))
+    return state.scores(at=at)
+
+
+def same_scores(a, b):
+    keys = ['Customer_ID', 'Product_Name']
+    merged = a.merge(b, on=keys, how='outer', indicator=True)
+    return bool((merged['_merge'] == 'both').all() and
+                np.allclose(merged['trans_score_x'], merged['trans_score_y'], rtol=1e-9) and
+                np.allclose(merged['total_amount_x'], merged['total_amount_y'], rtol=1e-9))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data-dir', required=True, help='Dataset with transactions and products parquet')
+    parser.add_argument('--days', type=int, default=30, help='Trailing days replayed one at a time')
+    parser.add_argument('--skip-spark', action='store_true')
+    args = parser.parse_args()
+
+    trans = pd.read_parquet(os.path.join(args.data_dir, 'transactions'))
+    products = pd.read_parquet(os.path.join(args.data_dir, 'products'))
+    trans['Date'] = pd.to_datetime(trans['Date']).dt.normalize()
+    matcher = KeywordMatcher.from_products(products)
+    days = np.sort(trans['Date'].unique())[-args.days:]
+    history = trans[trans['Date'] < days[0]]
+    print(f"Transactions: {len(trans):,}  history before {pd.Timestamp(days[0]).date()}: {len(history):,}  "
+          f"replayed days: {len(days)}\n")
+
+    start = time.perf_counter()
+    state = DecayedRFM()
+    state.update_frame(matcher.match(history))
+    build = time.perf_counter() - start
+
+    rescan_s = incremental_s = 0.0
+    for day in days:
+        day_trans = trans[trans['Date'] == day]
+        start = time.perf_counter()
+        full = rescan(matcher, trans[trans['Date'] <= day], day)
+        rescan_s += time.perf_counter() - start
+        start = time.perf_counter()
+        state.update_frame(matcher.match(day_trans))
+        folded = state.scores(at=day)
+        incremental_s += time.perf_counter() - start
+    print(f"   history build            {build:>8.3f}s")
+    print(f"   full rescan per day      {rescan_s / len(days) * 1000:>8.1f}ms")
+    print(f"   incremental fold per day {incremental_s / len(days) * 1000:>8.1f}ms "
+          f"({rescan_s / incremental_s:.1f}x), same scores: {same_scores(full, folded)}")
+
+    matches = matcher.match(trans).head(100000)
+    single = DecayedRFM()
+    start = time.perf_counter()
+    for row in matches.itertuples(index=False):
+        single.update(row.Customer_ID, row.Product_Name, row.Trans_Amount, row.Date, row.match_weight)
+    seconds = time.perf_counter() - start
+    path = os.path.join(tempfile.mkdtemp(), 'rfm.npz')
+    state.save(path)
+    print(f"   per-transaction update   {len(matches) / seconds:>8,.0f} tx/s; state {len(state):,} pairs, "
+          f"{os.path.getsize(path) / len(state):.1f} bytes/pair saved")
+
+    if not args.skip_spark:
+        from pyspark.sql import SparkSession
+
+        spark = SparkSession.builder.getOrCreate()
+        spark.sparkContext.setLogLevel('ERROR')
+        df_trans = spark.createDataFrame(trans).cache()
+        df_trans.count()
+        prefix = f"bench_rfm_state_{os.getpid()}"
+        try:
+            start = time.perf_counter()
+            update_rfm_state(spark, df_trans.filter(df_trans['Date'] < pd.Timestamp(days[0])), matcher, prefix)
+            build = time.perf_counter() - start
+            start = time.perf_counter()
+            for day in days:
+                update_rfm_state(spark, df_trans.filter(df_trans['Date'] <= pd.Timestamp(day)), matcher, prefix)
+            folds = (time.perf_counter() - start) / len(days)
+            stored = rfm_scores_from_state(spark, prefix).toPandas()
+            start = time.perf_counter()
+            full = transaction_rfm_spark(match_transactions_spark(df_trans, matcher), days[-1]).toPandas()
+            full_s = time.perf_counter() - start
+            print(f"\n   spark history build      {build:>8.3f}s")
+            print(f"   spark full rescan        {full_s:>8.3f}s")
+            print(f"   spark fold per day       {folds:>8.3f}s, same scores: {same_scores(full, stored)}")
+        finally:
+            for table in spark.catalog.listTables():
+                if table.name.startswith(prefix):
+                    spark.sql(f"DROP TABLE IF EXISTS {table.name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: ALS fold-in vs. the factors Spark trained, on local Spark.
+
+Trains the notebook's ALS configuration on synthetic customer-product scores,
+then folds every trained customer back in from their training scores. Spark's
+last half-iteration solves the same problem, so the folded-in factors and
+top-N should match the model's; the per-customer fold-in latency is reported
+alongside the time a retrain takes.
+
+Usage:
+    python benchmarks/bench_fold_in.py --customers 5000 --products 40 --per-customer 8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pinnacle.fold_in import FoldInRecommender
+from pinnacle.scoring import factors_to_array, top_n_scores
+
+
+ALS_RANK = 20
+ALS_REG_PARAM = 0.1
+ALS_MAX_ITER = 20
+
+
+def synthetic_scores(n_customers, n_products, per_customer, seed=42):
+    rng = np.random.default_rng(seed)
+    taste = rng.random((n_customers, 4))
+    profile = rng.random((n_products, 4))
+    rows = []
+    for user in range(n_customers):
+        items = rng.choice(n_products, per_customer, replace=False)
+        affinity = taste[user] @ profile[items].T
+        scores = np.clip(np.round(1 + 4 * affinity / 4 + rng.normal(0, 0.3, per_customer), 1), 1, 5)
+        rows.extend(zip([user] * per_customer, items.tolist(), scores.tolist()))
+    return pd.DataFrame(rows, columns=['user_int', 'item_int', 'interaction_score'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--customers', type=int, default=5000)
+    parser.add_argument('--products', type=int, default=40)
+    parser.add_argument('--per-customer', type=int, default=8)
+    parser.add_argument('--top-n', type=int, default=5)
+    args = parser.parse_args()
+
+    from pyspark.ml.recommendation import ALS
+    from pyspark.sql import SparkSession
+
+    spark = (SparkSession.builder.master('local[*]')
+             .config('spark.sql.shuffle.partitions', '8')
+             .config('spark.ui.showConsoleProgress', 'false')
+             .getOrCreate())
+    spark.sparkContext.setLogLevel('ERROR')
+    # ALS checkpoints every 10 iterations; without a directory the lineage overflows the stack
+    spark.sparkContext.setCheckpointDir(tempfile.mkdtemp(prefix='pinnacle_als_'))
+
+    scores = synthetic_scores(args.customers, args.products, args.per_customer)
+    als = ALS(userCol='user_int', itemCol='item_int', ratingCol='interaction_score',
+              implicitPrefs=False, nonnegative=True, coldStartStrategy='drop',
+              rank=ALS_RANK, regParam=ALS_REG_PARAM, maxIter=ALS_MAX_ITER, seed=42)
+
+    start = time.perf_counter()
+    model = als.fit(spark.createDataFrame(scores))
+    user_ids, user_factors = factors_to_array(model.userFactors.collect())
+    retrain_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    recommender = FoldInRecommender.from_model(model, ALS_REG_PARAM)
+    setup_time = time.perf_counter() - start
+
+    by_user = {user: dict(zip(group['item_int'], group['interaction_score']))
+               for user, group in scores.groupby('user_int')}
+
+    latencies = []
+    folded = np.empty_like(user_factors)
+    for row, user in enumerate(user_ids):
+        start = time.perf_counter()
+        folded[row] = recommender.fold_in(by_user[int(user)])
+        recommender.recommend(by_user[int(user)], top_n=args.top_n)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    trained_top, _ = top_n_scores(user_factors, recommender.item_factors, top_n=args.top_n)
+    folded_top, _ = top_n_scores(folded, recommender.item_factors, top_n=args.top_n)
+    same_top = (trained_top == folded_top).all(axis=1).mean()
+    rel = np.linalg.norm(folded - user_factors, axis=1) / np.maximum(np.linalg.norm(user_factors, axis=1), 1e-9)
+
+    print(f"Customers: {len(user_ids):,}  Products: {args.products}  rank={ALS_RANK} regParam={ALS_REG_PARAM}")
+    print(f"Retrain (fit + collect user factors): {retrain_time:.1f}s")
+    print(f"Fold-in setup (collect item factors + Gram): {setup_time * 1000:.1f}ms")
+    print(f"Fold-in + top-{args.top_n} per customer: p50 {np.median(latencies):.3f}ms, "
+          f"p99 {np.percentile(latencies, 99):.3f}ms")
+    print(f"Factor relative error vs trained: median {np.median(rel):.2e}, max {rel.max():.2e}")
+    print(f"Customers with identical top-{args.top_n}: {same_top:.2%}")
+    spark.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark: implicit-library ALS backend vs. Spark ALS on one node.
+
+Builds the stand-in interaction matrix of ``bench_pipeline.py`` for a
+synthetic dataset, indexes it once, and fits on the same training split:
+
+- spark explicit: the notebook's current ``ALS(implicitPrefs=False)``
+- spark implicit: ``ALS(implicitPrefs=True)`` with ``CONFIG['als']``
+- implicit:       ``pinnacle.implicit_als`` with ``CONFIG['als']``
+
+and reports fit wall time, plus the top-N overlap between the two
+implicit-feedback fits (same objective, different solver and init).
+
+Usage:
+    python benchmarks/bench_implicit_als.py --scale 10k --data-dir /tmp/pinnacle_10k
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_pipeline import stand_in_interactions
+from pinnacle.implicit_als import train_implicit_als
+from pinnacle.scoring import factors_to_array, top_n_scores
+from pinnacle.synthetic import scale_to_customers, write_synthetic_dataset
+
+
+ALS_CONFIG = {'factors': 50, 'regularization': 0.01, 'iterations': 15, 'alpha': 40.0}
+EXPLICIT_RANK = 20
+EXPLICIT_REG_PARAM = 0.1
+EXPLICIT_MAX_ITER = 20
+TOP_N = 5
+
+
+def timed(fn):
+    start = time.perf_counter()
+    value = fn()
+    return value, time.perf_counter() - start
+
+
+def top_items(user_ids, user_factors, item_ids, item_factors):
+    rows, _ = top_n_scores(user_factors, item_factors, top_n=TOP_N)
+    return dict(zip(user_ids.tolist(), map(frozenset, item_ids[rows].tolist())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', default='10k', help='10k, 1m, 10m or a customer count')
+    parser.add_argument('--data-dir', default=None, help='Dataset directory (generated if missing)')
+    parser.add_argument('--threads', type=int, default=0, help='implicit worker threads (0 = all cores)')
+    args = parser.parse_args()
+
+    n_customers = scale_to_customers(args.scale)
+    data_dir = args.data_dir or os.path.join(tempfile.gettempdir(), f"pinnacle_synthetic_{args.scale}")
+    if not os.path.exists(os.path.join(data_dir, 'products')):
+        write_synthetic_dataset(data_dir, n_customers, verbose=False)
+
+    from pyspark.ml.recommendation import ALS
+    from pyspark.sql import SparkSession, Window, functions as F
+
+    spark = (SparkSession.builder.master('local[*]')
+             .config('spark.driver.memory', os.environ.get('SPARK_DRIVER_MEMORY', '4g'))
+             .config('spark.sql.shuffle.partitions', '16')
+             .config('spark.ui.showConsoleProgress', 'false')
+             .getOrCreate())
+    spark.sparkContext.setLogLevel('ERROR')
+    spark.sparkContext.setCheckpointDir(tempfile.mkdtemp(prefix='pinnacle_als_'))
+
+    customers = spark.read.parquet(os.path.join(data_dir, 'customers'))
+    products = spark.read.parquet(os.path.join(data_dir, 'products'))
+    interactions = stand_in_interactions(customers, products)
+    idx_df = (interactions
+              .withColumn('user_int', F.dense_rank().over(Window.orderBy('Customer_ID')) - 1)
+              .withColumn('item_int', F.dense_rank().over(Window.orderBy('Product_Name')) - 1)
+              .select('user_int', 'item_int', 'interaction_score'))
+    train_df = idx_df.randomSplit([0.8, 0.2], seed=42)[0].cache()
+    train = train_df.toPandas()
+    print(f"Training interactions: {len(train):,}  "
+          f"Users: {train['user_int'].nunique():,}  Items: {train['item_int'].nunique():,}\n")
+
+    def spark_fit(**params):
+        als = ALS(userCol='user_int', itemCol='item_int', ratingCol='interaction_score',
+                  coldStartStrategy='drop', seed=42, **params)
+        model = als.fit(train_df)
+        return (*factors_to_array(model.userFactors.collect()), *factors_to_array(model.itemFactors.collect()))
+
+    results = []
+    _, seconds = timed(lambda: spark_fit(implicitPrefs=False, nonnegative=True, rank=EXPLICIT_RANK,
+                                         regParam=EXPLICIT_REG_PARAM, maxIter=EXPLICIT_MAX_ITER))
+    results.append(('spark explicit', seconds))
+    spark_implicit, seconds = timed(lambda: spark_fit(
+        implicitPrefs=True, rank=ALS_CONFIG['factors'], regParam=ALS_CONFIG['regularization'],
+        maxIter=ALS_CONFIG['iterations'], alpha=ALS_CONFIG['alpha']))
+    results.append(('spark implicit', seconds))
+    implicit_factors, seconds = timed(lambda: train_implicit_als(
+        train['user_int'].to_numpy(), train['item_int'].to_numpy(), train['interaction_score'].to_numpy(),
+        num_threads=args.threads, **ALS_CONFIG))
+    results.append(('implicit', seconds))
+
+    spark.stop()
+
+    baseline = results[0][1]
+    for name, seconds in results:
+        print(f"   {name:<16} {seconds:>8.2f}s   {baseline / max(seconds, 1e-9):>6.1f}x vs spark explicit")
+
+    spark_top, implicit_top = top_items(*spark_implicit), top_items(*implicit_factors)
+    overlap = np.mean([len(implicit_top[u] & spark_top[u]) / len(spark_top[u])
+                       for u in spark_top if u in implicit_top])
+    print(f"\n   top-{TOP_N} overlap, implicit vs spark implicit: {overlap:.1%}")
+
+
+if __name__ == '__main__':
+    main()
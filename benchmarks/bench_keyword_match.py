@@ -0,0 +1,157 @@
+"""
+Benchmark: multi-keyword product matcher vs. the regex-extract + keyword join.
+
+The old section 7 of ``create_customer_product_interactions`` took the
+first keyword of Account_Type (else of Description) with ``regexp_extract``
+and equi-joined it on a (keyword, Product_Name) map built from the first
+keyword of each product name. The matcher emits every product matched by
+either text, with a weight, from a dictionary built from product names and
+Key_Features. Both run on pandas and on Spark; the report gives rows/s and
+how many signals each finds, and a parity check: the share of the old
+path's (transaction, product) signals the matcher also finds, per
+Account_Type, and the signals it adds.
+
+Datasets without Description use Narration as the description text for both.
+
+Usage:
+    python benchmarks/bench_keyword_match.py --data-dir /tmp/pinnacle_10k --repeat 5
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pinnacle.keyword_match import MATCH_COLUMNS, KeywordMatcher, match_transactions_spark
+
+
+ACCOUNT_KEYWORDS = r'(current|savings|sme|student|premium|platinum|children|aspire)'
+DESCRIPTION_KEYWORDS = (r'(current|savings|sme|student|premium|platinum|children|aspire'
+                        r'|loan|investment|card|transfer|deposit)')
+
+
+def _extract(values, pattern):
+    return values.str.lower().str.extract(pattern, expand=False).fillna('')
+
+
+def legacy_pandas(trans, products):
+    """First keyword of Account_Type, else Description, joined on the product keyword map."""
+    keyword_map = pd.DataFrame({'keyword': _extract(products['Product_Name'], ACCOUNT_KEYWORDS),
+                                'Product_Name': products['Product_Name']})
+    keyword_map = keyword_map[keyword_map['keyword'] != ''].drop_duplicates()
+    combined = _extract(trans['Account_Type'], ACCOUNT_KEYWORDS)
+    combined = combined.where(combined != '', _extract(trans['Description'], DESCRIPTION_KEYWORDS))
+    keep = [c for c in (*MATCH_COLUMNS, 'row') if c in trans.columns]
+    return trans[keep].assign(keyword=combined).merge(keyword_map, on='keyword', how='inner')
+
+
+def legacy_spark(df_trans, df_products):
+    from pyspark.sql import functions as F
+
+    keyword_map = (df_products
+                   .withColumn('product_keywords', F.regexp_extract(F.lower('Product_Name'), ACCOUNT_KEYWORDS, 1))
+                   .filter(F.col('product_keywords') != '')
+                   .select('product_keywords', 'Product_Name').distinct())
+    df = (df_trans
+          .withColumn('account_keywords', F.regexp_extract(F.lower('Account_Type'), ACCOUNT_KEYWORDS, 1))
+          .withColumn('desc_keywords', F.regexp_extract(F.lower('Description'), DESCRIPTION_KEYWORDS, 1))
+          .withColumn('combined_keywords',
+                      F.when(F.col('account_keywords') != '', F.col('account_keywords'))
+                      .when(F.col('desc_keywords') != '', F.col('desc_keywords')).otherwise('')))
+    return df.join(keyword_map.withColumnRenamed('product_keywords', 'combined_keywords'), 'combined_keywords')
+
+
+def parity(trans, products, matcher):
+    """
+    Per Account_Type: the old path's (transaction, product) signals, how
+    many of them the matcher also finds and the signals it adds, plus the
+    share of the transactions the old path matched that the matcher matches
+    to at least one product (the old join fans a keyword out to every
+    product carrying it, so signal parity is below 100% by design).
+    """
+    trans = trans.assign(row=np.arange(len(trans)))
+    keys = ['row', 'Product_Name']
+    both = legacy_pandas(trans, products)[keys].merge(
+        matcher.match(trans, keep=(*MATCH_COLUMNS, 'row'))[keys], on=keys, how='outer', indicator=True)
+    both['Account_Type'] = trans['Account_Type'].to_numpy()[both['row'].to_numpy()]
+    counts = both.groupby(['Account_Type', '_merge'], observed=False).size().unstack(fill_value=0)
+    rows = both.assign(old=both['_merge'] != 'right_only', new=both['_merge'] != 'left_only') \
+        .groupby(['Account_Type', 'row'])[['old', 'new']].any()
+    rows = rows[rows['old']].groupby('Account_Type').agg(old_rows=('old', 'sum'), covered=('new', 'sum'))
+    table = pd.DataFrame({'old signals': counts['both'] + counts['left_only'], 'found': counts['both'],
+                          'added': counts['right_only']}).join(rows, how='left').fillna(0).astype(np.int64)
+    table.loc['total'] = table.sum()
+    table['found %'] = (100 * table['found'] / table['old signals'].where(table['old signals'] > 0)).round(1)
+    table['covered %'] = (100 * table['covered'] / table['old_rows'].where(table['old_rows'] > 0)).round(1)
+    return table.drop(columns=['old_rows', 'covered'])
+
+
+def best_of(fn, repeat):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data-dir', required=True, help='Dataset with transactions and products parquet')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per method (best is reported)')
+    parser.add_argument('--skip-spark', action='store_true')
+    args = parser.parse_args()
+
+    trans = pd.read_parquet(os.path.join(args.data_dir, 'transactions'))
+    products = pd.read_parquet(os.path.join(args.data_dir, 'products'))
+    if 'Description' not in trans.columns:
+        trans['Description'] = trans['Narration']
+    trans = trans[['Customer_ID', 'Trans_Amount', 'Date', 'Account_Type', 'Description']]
+    n = len(trans)
+    print(f"Transactions: {n:,}  Products: {len(products)}\n")
+
+    def report(name, seconds, matches):
+        print(f"   {name:<22} {seconds:>7.3f}s {n / seconds:>12,.0f} rows/s   "
+              f"{len(matches):>9,} signals {len(matches[['Customer_ID', 'Product_Name']].drop_duplicates()):>8,} "
+              f"pairs {matches['Product_Name'].nunique():>4} products")
+
+    legacy, seconds = best_of(lambda: legacy_pandas(trans, products), args.repeat)
+    report('pandas regex + join', seconds, legacy)
+    matcher, build = best_of(lambda: KeywordMatcher.from_products(products), args.repeat)
+    matched, seconds = best_of(lambda: matcher.match(trans), args.repeat)
+    report('pandas matcher', seconds, matched)
+    print(f"   {'':<22} (dictionary: {len(matcher.units)} units + {len(matcher.fallback_units)} category "
+          f"fallbacks, {len(matcher.vocabulary)} tokens, built in {build * 1000:.1f}ms)")
+
+    print("\n   Parity with the old path, per Account_Type:")
+    print('   ' + parity(trans, products, matcher).to_string().replace('\n', '\n   '))
+
+    if not args.skip_spark:
+        from pyspark.sql import SparkSession
+
+        spark = SparkSession.builder.getOrCreate()
+        spark.sparkContext.setLogLevel('ERROR')
+        df_trans = spark.createDataFrame(trans).cache()
+        df_products = spark.createDataFrame(products.astype(str)).cache()
+        df_trans.count()
+        df_products.count()
+
+        def run(df):
+            # Aggregate to the per-pair counts section 7 feeds into RFM, so both plans run fully
+            return df.groupBy('Customer_ID', 'Product_Name').count().toPandas()
+
+        legacy_pairs, seconds = best_of(lambda: run(legacy_spark(df_trans, df_products)), args.repeat)
+        print(f"\n   {'spark regex + join':<22} {seconds:>7.3f}s {n / seconds:>12,.0f} rows/s   "
+              f"{int(legacy_pairs['count'].sum()):>9,} signals {len(legacy_pairs):>8,} pairs")
+        spark_pairs, seconds = best_of(lambda: run(match_transactions_spark(df_trans, matcher)), args.repeat)
+        print(f"   {'spark matcher':<22} {seconds:>7.3f}s {n / seconds:>12,.0f} rows/s   "
+              f"{int(spark_pairs['count'].sum()):>9,} signals {len(spark_pairs):>8,} pairs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Benchmark: online life-event detection throughput, state size and accuracy.
+
+Injects known events into a copy of a transactions dataset, each into its
+own random set of customers:
+
+- salary: monthly salary credits over the whole range, raised by
+  ``--raise`` from a random month on;
+- relocation: a habitual spender, about six debits a month at five
+  destinations before a random day and at five new ones after it (the
+  sample data has too few debits per customer to show a habit);
+- business: from a random day, a couple of wholesale / stock-purchase
+  debits a month.
+
+One ``LifeEventDetector`` pass over the full history reports transactions/s
+and bytes of state per customer, then recall (injected customers flagged
+after their change day), median detection delay and false alarms per 1,000
+untouched customers. The same data is replayed in daily micro-batches to
+check that streaming raises the same events, ``--scale`` copies of the data
+(renamed customers) measure throughput at firehose sizes, and with Spark
+``life_event_features_spark`` is compared with the pandas features.
+
+Usage:
+    python benchmarks/bench_life_events.py --data-dir /tmp/pinnacle_10k --customers 200 --scale 10
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pinnacle.life_events import EVENT_TYPES, LifeEventDetector, life_event_features_spark
+
+
+def inject(trans, n_customers, raise_factor, rng):
+    """Transactions with injected salary raises, relocations and business starts, plus the truth."""
+    dates = pd.date_range(trans['Date'].min(), trans['Date'].max(), freq='D')
+    customers = rng.permutation(trans['Customer_ID'].unique())
+    chosen = {event: customers[i * n_customers:(i + 1) * n_customers] for i, event in enumerate(EVENT_TYPES)}
+    truth, added = [], []
+    trans = trans.copy()
+
+    for customer in chosen['salary_jump']:
+        months = pd.date_range(dates[0], dates[-1], freq='MS') + pd.Timedelta(days=24)
+        change = months[rng.integers(len(months) // 3, 2 * len(months) // 3)]
+        salary = rng.uniform(80000, 600000)
+        amounts = salary * np.where(months >= change, raise_factor, 1.0) * rng.normal(1.0, 0.03, len(months))
+        added.append(pd.DataFrame({'Customer_ID': customer, 'Date': months, 'Trans_Amount': amounts,
+                                   'Deb_or_credit': 'C', 'Destination': 'Employer Payroll',
+                                   'Category': 'Transfer', 'Narration': 'monthly salary'}))
+        truth.append((customer, 'salary_jump', change))
+
+    places = trans['Destination'].unique()
+    new_places = np.array([f'Relocated Store {i}' for i in range(50)], dtype=object)
+    for customer in chosen['location_shift']:
+        change = dates[rng.integers(len(dates) // 3, 2 * len(dates) // 3)]
+        spend_days = pd.DatetimeIndex(np.sort(rng.choice(dates, 6 * (len(dates) // 30))))
+        destinations = np.where(spend_days < change, rng.choice(rng.choice(places, 5, replace=False), len(spend_days)),
+                                rng.choice(rng.choice(new_places, 5, replace=False), len(spend_days)))
+        added.append(pd.DataFrame({'Customer_ID': customer, 'Date': spend_days,
+                                   'Trans_Amount': rng.uniform(2000, 30000, len(spend_days)),
+                                   'Deb_or_credit': 'D', 'Destination': destinations,
+                                   'Category': 'Groceries', 'Narration': 'weekly shopping'}))
+        truth.append((customer, 'location_shift', change))
+
+    for customer in chosen['business_start']:
+        change = dates[rng.integers(len(dates) // 3, 2 * len(dates) // 3)]
+        spend_days = pd.DatetimeIndex(rng.choice(dates[dates >= change], 2 * ((dates[-1] - change).days // 30 + 1)))
+        added.append(pd.DataFrame({'Customer_ID': customer, 'Date': spend_days.sort_values(),
+                                   'Trans_Amount': rng.uniform(50000, 400000, len(spend_days)),
+                                   'Deb_or_credit': 'D', 'Destination': 'Alaba Wholesale Market',
+                                   'Category': 'Shopping', 'Narration': 'wholesale stock purchase'}))
+        truth.append((customer, 'business_start', change))
+
+    injected = pd.concat([trans, *added], ignore_index=True).sort_values('Date', kind='stable')
+    return injected.reset_index(drop=True), pd.DataFrame(truth, columns=['Customer_ID', 'event', 'change'])
+
+
+def score(events, truth, n_customers):
+    """Recall, median delay (days) and false alarms per 1,000 untouched customers, per event type."""
+    injected = set(truth['Customer_ID'])
+    rows = []
+    for event in EVENT_TYPES:
+        expected = truth[truth['event'] == event]
+        found = events[events['event'] == event]
+        hits = expected.merge(found, on=['Customer_ID', 'event'])
+        hits = hits[hits['Date'] >= hits['change']].groupby('Customer_ID')['Date'].min()
+        delays = (hits - expected.set_index('Customer_ID')['change'].reindex(hits.index)).dt.days
+        controls = found[~found['Customer_ID'].isin(injected)]
+        rows.append({'event': event, 'recall': len(hits) / max(len(expected), 1),
+                     'median_delay_days': float(delays.median()) if len(delays) else np.nan,
+                     'false_alarms_per_1k': 1000 * controls['Customer_ID'].nunique()
+                     / max(n_customers - len(injected), 1)})
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data-dir', required=True, help='Dataset with transactions parquet')
+    parser.add_argument('--customers', type=int, default=200, help='Customers injected per event type')
+    parser.add_argument('--raise', dest='raise_factor', type=float, default=1.4, help='Salary raise factor')
+    parser.add_argument('--scale', type=int, default=10, help='Copies of the data for the throughput run')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-spark', action='store_true')
+    args = parser.parse_args()
+
+    trans = pd.read_parquet(os.path.join(args.data_dir, 'transactions'))
+    trans['Date'] = pd.to_datetime(trans['Date']).dt.normalize()
+    trans, truth = inject(trans, args.customers, args.raise_factor, np.random.default_rng(args.seed))
+    n_customers = trans['Customer_ID'].nunique()
+    print(f"Transactions: {len(trans):,}  customers: {n_customers:,}  "
+          f"injected: {args.customers} per event type\n")
+
+    detector = LifeEventDetector()
+    start = time.perf_counter()
+    detector.update(trans)
+    seconds = time.perf_counter() - start
+    events = detector.drain_events()
+    path = os.path.join(tempfile.mkdtemp(), 'life_events.npz')
+    detector.save(path)
+    print(f"   full-history pass   {seconds:>7.3f}s {len(trans) / seconds:>12,.0f} tx/s   "
+          f"state {detector.bytes_per_customer:.0f} bytes/customer in memory, "
+          f"{os.path.getsize(path) / len(detector):.0f} saved")
+    print(score(events, truth, n_customers).to_string(index=False, float_format=lambda v: f'{v:.3f}'))
+
+    streamed = LifeEventDetector()
+    start = time.perf_counter()
+    for _, day in trans.groupby('Date', sort=True):
+        streamed.update(day)
+    seconds = time.perf_counter() - start
+    same = streamed.features().equals(detector.features())
+    print(f"\n   daily micro-batches {seconds:>7.3f}s {len(trans) / seconds:>12,.0f} tx/s   "
+          f"({trans['Date'].nunique()} batches), same features: {same}")
+
+    if args.scale > 1:
+        big = pd.concat([trans.assign(Customer_ID=trans['Customer_ID'] + f'_{copy}') for copy in range(args.scale)],
+                        ignore_index=True).sort_values('Date', kind='stable')
+        detector = LifeEventDetector()
+        start = time.perf_counter()
+        for chunk in range(0, len(big), 1_000_000):
+            detector.update(big.iloc[chunk:chunk + 1_000_000])
+        seconds = time.perf_counter() - start
+        print(f"   x{args.scale} data, 1M-row batches {seconds:>7.3f}s {len(big) / seconds:>12,.0f} tx/s   "
+              f"{len(detector):,} customers")
+
+    if not args.skip_spark:
+        from pyspark.sql import SparkSession
+
+        spark = SparkSession.builder.getOrCreate()
+        spark.sparkContext.setLogLevel('ERROR')
+        df_trans = spark.createDataFrame(trans).cache()
+        df_trans.count()
+        start = time.perf_counter()
+        spark_features = life_event_features_spark(df_trans).toPandas()
+        seconds = time.perf_counter() - start
+        local = LifeEventDetector()
+        local.update(trans)
+        merged = local.features().merge(spark_features, on='Customer_ID', suffixes=('', '_spark'))
+        agree = np.mean([(merged[f'{e}_count'] == merged[f'{e}_count_spark']).mean() for e in EVENT_TYPES])
+        print(f"\n   spark one pass      {seconds:>7.3f}s {len(trans) / seconds:>12,.0f} tx/s   "
+              f"{len(spark_features):,} customers, event counts agree with pandas on {agree:.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark: concurrent LLM batch dispatch vs. sequential calls with a fixed sleep.
+
+Runs both strategies against the local fake OpenAI server, checks that every
+batch is answered in order, and reports wall time and retries.
+
+Usage:
+    python benchmarks/bench_llm_dispatch.py --batches 40 --latency 0.3 --in-flight 8 --error-rate 0.1
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from openai import OpenAI
+
+from fake_openai_server import start_server
+from pinnacle.llm_dispatch import RateLimiter, dispatch_batches
+
+
+def build_prompts(n_batches, batch_size):
+    prompts = []
+    for b in range(n_batches):
+        customers = [f"Customer ZB{b * batch_size + i:06d}:\n- Age: 30" for i in range(batch_size)]
+        prompts.append("# CUSTOMERS\n" + "\n".join(customers))
+    return prompts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batches', type=int, default=40)
+    parser.add_argument('--batch-size', type=int, default=30)
+    parser.add_argument('--latency', type=float, default=0.3)
+    parser.add_argument('--error-rate', type=float, default=0.1)
+    parser.add_argument('--in-flight', type=int, default=8)
+    parser.add_argument('--rpm', type=float, default=600)
+    parser.add_argument('--tpm', type=float, default=2000000)
+    parser.add_argument('--sleep', type=float, default=0.5, help='Fixed delay of the sequential baseline')
+    args = parser.parse_args()
+
+    server, base_url = start_server(latency=args.latency, error_rate=args.error_rate)
+    client = OpenAI(api_key='test', base_url=base_url, max_retries=0)
+    prompts = build_prompts(args.batches, args.batch_size)
+
+    def score_batch(prompt):
+        response = client.chat.completions.create(
+            model='fake',
+            messages=[{'role': 'user', 'content': prompt}],
+            response_format={'type': 'json_object'}
+        )
+        return json.loads(response.choices[0].message.content)['matches']
+
+    # Sequential baseline: one call at a time, failed batches are dropped
+    start = time.perf_counter()
+    sequential_ok = 0
+    for i, prompt in enumerate(prompts):
+        try:
+            score_batch(prompt)
+            sequential_ok += 1
+        except Exception:
+            pass
+        if i + 1 < len(prompts):
+            time.sleep(args.sleep)
+    sequential_time = time.perf_counter() - start
+
+    requests_before = server.RequestHandlerClass.stats['requests']
+    start = time.perf_counter()
+    results = dispatch_batches(
+        score_batch,
+        prompts,
+        max_in_flight=args.in_flight,
+        limiter=RateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm),
+        base_delay=0.1,
+        max_delay=2.0
+    )
+    dispatch_time = time.perf_counter() - start
+    dispatch_requests = server.RequestHandlerClass.stats['requests'] - requests_before
+    server.shutdown()
+
+    dispatch_ok = sum(not isinstance(r, Exception) for r in results)
+    in_order = all(
+        r[0]['customer_id'] == f"ZB{b * args.batch_size:06d}"
+        for b, r in enumerate(results) if not isinstance(r, Exception)
+    )
+
+    print(f"Batches: {args.batches}  Latency: {args.latency}s  Error rate: {args.error_rate:.0%}")
+    print(f"Sequential + sleep: {sequential_time:.2f}s, {sequential_ok}/{args.batches} batches scored")
+    print(f"Dispatcher:         {dispatch_time:.2f}s, {dispatch_ok}/{args.batches} batches scored "
+          f"({dispatch_requests - args.batches} retries)")
+    print(f"Speedup:            {sequential_time / dispatch_time:.1f}x")
+    print(f"Results in order:   {in_order}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+Benchmark: single-node pandas/NumPy engine vs. the Spark path, on synthetic data.
+
+Runs each deterministic stage on both engines over the same synthetic
+dataset and checks the outputs agree:
+
+- customer sample: identical Customer_ID set
+- transaction features: every column equal (top_category may differ only
+  between categories tied on debit count, which Spark's max_by leaves open)
+- transaction RFM interactions: identical pairs and scores
+- ALS: same train/test split on both engines; test RMSE and per-customer
+  top-N overlap (different random initialization, same objective)
+
+and reports wall time per stage for each engine.
+
+Usage:
+    python benchmarks/bench_local_engine.py --scale 10k --data-dir /tmp/pinnacle_10k
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pinnacle import local
+from pinnacle.decayed_rfm import transaction_rfm_spark
+from pinnacle.features import aggregate_transaction_features
+from pinnacle.keyword_match import KeywordMatcher, match_transactions_spark
+from pinnacle.sampling import restrict_to_customers, sample_customers
+from pinnacle.scoring import factors_to_array, top_n_scores
+from pinnacle.synthetic import scale_to_customers, write_synthetic_dataset
+
+
+ALS_RANK = 20
+ALS_REG_PARAM = 0.1
+ALS_MAX_ITER = 20
+TOP_N = 5
+
+
+def timed(fn):
+    start = time.perf_counter()
+    value = fn()
+    return value, time.perf_counter() - start
+
+
+def spark_transaction_interactions(df_trans, df_products):
+    """Section 7 of ``create_customer_product_interactions`` (keyword match + decayed RFM), as in the notebook."""
+    from pyspark.sql import functions as F
+
+    matches = match_transactions_spark(df_trans, KeywordMatcher.from_products(df_products))
+    max_date = df_trans.agg(F.max('Date')).collect()[0][0]
+    return transaction_rfm_spark(matches, max_date)
+
+
+def compare_features(local_features, spark_features, transactions):
+    spark_features = spark_features.sort_values('Customer_ID').reset_index(drop=True)
+    local_features = local_features.sort_values('Customer_ID').reset_index(drop=True)
+    if not local_features['Customer_ID'].equals(spark_features['Customer_ID']):
+        return ['Customer_ID']
+
+    mismatched = []
+    for column in local_features.columns:
+        if column in ('Customer_ID', 'current_account'):
+            continue
+        if column == 'top_category':
+            # Accept any category tied for the customer's highest debit count
+            debit_counts = (transactions[transactions['Deb_or_credit'] == 'D']
+                            .groupby(['Customer_ID', 'Category']).size())
+            best = debit_counts.groupby(level=0).transform('max')
+            tied = set(debit_counts[debit_counts == best].index)
+            ok = [a == b or (pd.isna(a) and pd.isna(b)) or ((c, a) in tied and (c, b) in tied)
+                  for c, a, b in zip(local_features['Customer_ID'], local_features[column], spark_features[column])]
+            if not all(ok):
+                mismatched.append(column)
+        elif not np.allclose(local_features[column].astype(float), spark_features[column].astype(float),
+                             rtol=1e-9, equal_nan=True):
+            mismatched.append(column)
+    return mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', default='10k', help='10k, 1m, 10m or a customer count')
+    parser.add_argument('--data-dir', default=None, help='Dataset directory (generated if missing)')
+    parser.add_argument('--sample', type=int, default=None, help='Customers to sample (default: all)')
+    args = parser.parse_args()
+
+    n_customers = scale_to_customers(args.scale)
+    data_dir = args.data_dir or os.path.join(tempfile.gettempdir(), f"pinnacle_synthetic_{args.scale}")
+    if not os.path.exists(os.path.join(data_dir, 'products')):
+        write_synthetic_dataset(data_dir, n_customers, verbose=False)
+
+    from pyspark.ml.recommendation import ALS
+    from pyspark.sql import SparkSession
+
+    spark = (SparkSession.builder.master('local[*]')
+             .config('spark.driver.memory', os.environ.get('SPARK_DRIVER_MEMORY', '4g'))
+             .config('spark.sql.shuffle.partitions', '16')
+             .config('spark.ui.showConsoleProgress', 'false')
+             .getOrCreate())
+    spark.sparkContext.setLogLevel('ERROR')
+    spark.sparkContext.setCheckpointDir(tempfile.mkdtemp(prefix='pinnacle_als_'))
+
+    tables = {t: pd.read_parquet(os.path.join(data_dir, t)) for t in ('customers', 'transactions', 'products')}
+    spark_tables = {t: spark.read.parquet(os.path.join(data_dir, t)).cache() for t in tables}
+    for df in spark_tables.values():
+        df.count()
+    print(f"Customers: {len(tables['customers']):,}  Transactions: {len(tables['transactions']):,}\n")
+
+    rows = []
+
+    def report(stage, local_seconds, spark_seconds, result):
+        rows.append((stage, local_seconds, spark_seconds, result))
+        print(f"   {stage:<14} local {local_seconds:>8.2f}s   spark {spark_seconds:>8.2f}s   "
+              f"{spark_seconds / max(local_seconds, 1e-9):>6.1f}x   {result}")
+
+    # Sample
+    sample_size = args.sample or len(tables['customers'])
+    local_sample, local_s = timed(lambda: local.sample_customers(tables['customers'], sample_size))
+    spark_sample, spark_s = timed(lambda: sample_customers(spark_tables['customers'], sample_size)
+                                  .select('Customer_ID').toPandas())
+    same = set(local_sample['Customer_ID']) == set(spark_sample['Customer_ID'])
+    report('sample', local_s, spark_s, 'identical' if same else 'MISMATCH')
+
+    # Transaction features
+    trans = local.restrict_to_customers(tables['transactions'], local_sample)
+    spark_trans = restrict_to_customers(spark_tables['transactions'],
+                                        sample_customers(spark_tables['customers'], sample_size))
+    local_features, local_s = timed(lambda: local.transaction_features(trans))
+    spark_features, spark_s = timed(lambda: aggregate_transaction_features(spark_trans).toPandas())
+    mismatched = compare_features(local_features, spark_features, trans)
+    report('features', local_s, spark_s, f"MISMATCH {mismatched}" if mismatched else 'identical')
+
+    # Transaction interactions
+    local_inter, local_s = timed(lambda: local.transaction_interactions(trans, tables['products']))
+    spark_inter, spark_s = timed(lambda: spark_transaction_interactions(spark_trans, spark_tables['products'])
+                                 .toPandas())
+    keys = ['Customer_ID', 'Product_Name']
+    merged = local_inter.merge(spark_inter, on=keys, how='outer', suffixes=('_local', '_spark'), indicator=True)
+    same = ((merged['_merge'] == 'both').all() and
+            np.allclose(merged['trans_score_local'], merged['trans_score_spark'], rtol=1e-9))
+    report('interactions', local_s, spark_s,
+           f"identical ({len(local_inter):,} pairs)" if same else f"MISMATCH ({len(merged):,} rows)")
+
+    # ALS on one shared split
+    interactions = local_inter.rename(columns={'trans_score': 'interaction_score'})
+    idx_df, customer_lookup, product_lookup = local.index_interactions(interactions)
+    test_mask = np.random.default_rng(42).random(len(idx_df)) < 0.2
+    train_df, test_df = idx_df[~test_mask], idx_df[test_mask]
+
+    local_factors, local_s = timed(lambda: local.train_als(train_df, rank=ALS_RANK, reg_param=ALS_REG_PARAM,
+                                                           max_iter=ALS_MAX_ITER))
+    columns = ['user_int', 'item_int', 'interaction_score']
+    spark_train = spark.createDataFrame(train_df[columns]).cache()
+    spark_train.count()
+    als = ALS(userCol='user_int', itemCol='item_int', ratingCol='interaction_score', implicitPrefs=False,
+              nonnegative=True, coldStartStrategy='drop', rank=ALS_RANK, regParam=ALS_REG_PARAM,
+              maxIter=ALS_MAX_ITER, seed=42)
+    model, spark_s = timed(lambda: als.fit(spark_train))
+    spark_factors = (*factors_to_array(model.userFactors.collect()), *factors_to_array(model.itemFactors.collect()))
+
+    local_rmse = local.rmse(test_df, *local_factors)
+    spark_rmse = local.rmse(test_df, *spark_factors)
+
+    def top_items(user_ids, user_factors, item_ids, item_factors):
+        order = np.argsort(user_ids)
+        rows, _ = top_n_scores(user_factors[order], item_factors, top_n=TOP_N)
+        return dict(zip(user_ids[order].tolist(), map(frozenset, item_ids[rows].tolist())))
+
+    local_top, spark_top = top_items(*local_factors), top_items(*spark_factors)
+    overlap = np.mean([len(local_top[u] & spark_top[u]) / len(spark_top[u]) for u in spark_top if u in local_top])
+    report('als', local_s, spark_s,
+           f"test RMSE local {local_rmse:.4f} / spark {spark_rmse:.4f}, top-{TOP_N} overlap {overlap:.1%}")
+
+    spark.stop()
+
+    total_local = sum(r[1] for r in rows)
+    total_spark = sum(r[2] for r in rows)
+    print(f"\n   {'total':<14} local {total_local:>8.2f}s   spark {total_spark:>8.2f}s   "
+          f"{total_spark / max(total_local, 1e-9):>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: memory-mapped model artifacts vs. Python dict-of-lists factors.
+
+Builds random float32 ALS factors for ``--users`` customers, then compares
+the two ways a scoring process can get at them:
+
+- dict of lists: ``{Customer_ID: [float, ...]}`` as ``userFactors.collect()``
+  rows turn into, persisted with pickle
+- artifact: ``pinnacle.artifacts.save_model`` + ``open_model`` (mmap)
+
+reporting load time, resident memory growth after load and after scoring
+every customer once, and single-customer lookup+score latency.
+
+Usage:
+    python benchmarks/bench_model_artifacts.py --users 1000000 --rank 20
+"""
+
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pinnacle.artifacts import open_model, save_model
+
+
+N_ITEMS = 42
+
+
+def rss_bytes():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--rank', type=int, default=20)
+    parser.add_argument('--lookups', type=int, default=1000, help='Single-customer queries to time')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    customer_ids = np.array([f"ZB{i:07d}" for i in range(args.users)])
+    user_factors = rng.random((args.users, args.rank), dtype=np.float32)
+    product_names = np.array([f"Product {i}" for i in range(N_ITEMS)])
+    item_factors = rng.random((N_ITEMS, args.rank), dtype=np.float32)
+    queries = customer_ids[rng.integers(0, args.users, args.lookups)]
+
+    workdir = tempfile.mkdtemp(prefix='pinnacle_artifacts_')
+    model_dir = save_model(os.path.join(workdir, 'model'), customer_ids, user_factors, product_names, item_factors)
+    with open(os.path.join(workdir, 'factors.pkl'), 'wb') as f:
+        pickle.dump({c: row.tolist() for c, row in zip(customer_ids.tolist(), user_factors)}, f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    del user_factors
+    print(f"Users: {args.users:,}  Rank: {args.rank}  Items: {N_ITEMS}\n")
+
+    # Artifact first: its pages are file-backed, so they do not linger in the heap afterwards
+    before = rss_bytes()
+    start = time.perf_counter()
+    model = open_model(model_dir)
+    open_seconds = time.perf_counter() - start
+    open_rss = rss_bytes() - before
+    start = time.perf_counter()
+    for customer_id in queries:
+        model.recommend([customer_id], top_n=5)
+    mmap_lookup_ms = (time.perf_counter() - start) / len(queries) * 1000
+    model.recommend(customer_ids, top_n=5)
+    mmap_scored_rss = rss_bytes() - before
+    del model
+
+    before = rss_bytes()
+    start = time.perf_counter()
+    with open(os.path.join(workdir, 'factors.pkl'), 'rb') as f:
+        factors = pickle.load(f)
+    pickle_seconds = time.perf_counter() - start
+    pickle_rss = rss_bytes() - before
+    items_t = item_factors.T
+    start = time.perf_counter()
+    for customer_id in queries:
+        scores = np.asarray(factors[customer_id], dtype=np.float32) @ items_t
+        np.argsort(-scores)[:5]
+    dict_lookup_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+    mb = 1024 * 1024
+    print(f"   {'':<16} {'load':>10} {'RSS after load':>16} {'RSS after scoring':>18} {'lookup':>10}")
+    print(f"   {'dict of lists':<16} {pickle_seconds:>9.3f}s {pickle_rss / mb:>14.1f}MB {pickle_rss / mb:>16.1f}MB "
+          f"{dict_lookup_ms:>8.3f}ms")
+    print(f"   {'mmap artifact':<16} {open_seconds:>9.3f}s {open_rss / mb:>14.1f}MB {mmap_scored_rss / mb:>16.1f}MB "
+          f"{mmap_lookup_ms:>8.3f}ms")
+
+
+if __name__ == '__main__':
+    main()
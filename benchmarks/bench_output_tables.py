@@ -0,0 +1,168 @@
+"""
+Benchmark: content-hash upserts vs. full overwrites of a recommendation table.
+
+Writes a top-N table for ``--customers`` customers, then replays runs in
+which a ``--churn`` share of customers get a different list (some lists also
+get shorter, a few customers disappear and new ones appear). Each run is
+written both ways: ``mode("overwrite")`` of the whole table, as the notebook
+did, and ``upsert_recommendations``. Reports seconds and rows written per
+run, checks the upserted table equals the run's output, and that a rerun
+with identical output writes nothing and keeps the version.
+
+A last run keeps every list but moves every score slightly, as a retrain
+does: the default (rank, Product_Name) hash writes nothing, hashing every
+column (the old behaviour, kept in a third table) rewrites every customer,
+and ``tolerances`` refreshes only the rows whose confidence moved further
+than ``--tolerance`` points.
+
+Needs Delta Lake: run on Databricks or with ``pip install delta-spark``.
+
+Usage:
+    python benchmarks/bench_output_tables.py --customers 200000 --top-n 5 --churn 0.01 0.05 0.2
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pinnacle.output_tables import BUCKET_COLUMN, upsert_recommendations
+
+SCHEMA = 'Customer_ID string, Product_Name string, als_score float, confidence_score_pct float, rank int'
+
+
+def recommendations(customers, top_n, n_products, rng):
+    """Random top-N lists: ``top_n`` distinct products per customer with decreasing scores."""
+    products = np.argsort(rng.random((len(customers), n_products)), axis=1)[:, :top_n]
+    scores = np.sort(rng.uniform(0, 5, (len(customers), top_n)), axis=1)[:, ::-1]
+    return pd.DataFrame({
+        'Customer_ID': np.repeat(customers, top_n),
+        'Product_Name': [f'Product {p}' for p in products.ravel()],
+        'als_score': scores.ravel().astype(np.float32),
+        'confidence_score_pct': (scores.ravel() * 20).astype(np.float32),
+        'rank': np.tile(np.arange(1, top_n + 1, dtype=np.int32), len(customers)),
+    })
+
+
+def churn(frame, share, top_n, n_products, rng):
+    """A next run: ``share`` of customers re-ranked (a third of them with shorter lists), 0.1% swapped out."""
+    customers = frame['Customer_ID'].unique()
+    changed = rng.choice(customers, int(len(customers) * share), replace=False)
+    gone = rng.choice(customers, max(1, len(customers) // 1000), replace=False)
+    fresh = recommendations(changed, top_n, n_products, rng)
+    fresh = fresh[~(fresh['Customer_ID'].isin(changed[:len(changed) // 3]) & (fresh['rank'] > top_n - 2))]
+    first = int(frame['Customer_ID'].str.startswith('NEW').sum())
+    added = recommendations(np.array([f'NEW{first + i:07d}' for i in range(len(gone))]), top_n, n_products, rng)
+    kept = frame[~frame['Customer_ID'].isin(np.concatenate([changed, gone]))]
+    return pd.concat([kept, fresh, added], ignore_index=True)
+
+
+def drift(frame, spread, rng):
+    """A retrain that keeps every list: each confidence moves by N(0, ``spread``) points, als_score with it."""
+    confidence = frame['confidence_score_pct'] + rng.normal(0, spread, len(frame)).astype(np.float32)
+    return frame.assign(confidence_score_pct=confidence.astype(np.float32),
+                        als_score=(confidence / 20).astype(np.float32))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--customers', type=int, default=200000)
+    parser.add_argument('--top-n', type=int, default=5)
+    parser.add_argument('--products', type=int, default=40)
+    parser.add_argument('--churn', type=float, nargs='+', default=[0.01, 0.05, 0.2],
+                        help='Share of customers whose list changes per run')
+    parser.add_argument('--drift', type=float, default=0.4,
+                        help='Std of the confidence change (points) in the score-drift run')
+    parser.add_argument('--tolerance', type=float, default=1.0,
+                        help='Confidence change (points) refreshed in place in the score-drift run')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from pyspark.sql import SparkSession
+
+    builder = SparkSession.builder.appName('bench-output-tables')
+    try:
+        from delta import configure_spark_with_delta_pip
+
+        builder = configure_spark_with_delta_pip(
+            builder.config('spark.sql.extensions', 'io.delta.sql.DeltaSparkSessionExtension')
+            .config('spark.sql.catalog.spark_catalog', 'org.apache.spark.sql.delta.catalog.DeltaCatalog'))
+    except ImportError:
+        pass  # Databricks: Delta is built in
+    spark = builder.getOrCreate()
+    spark.sparkContext.setLogLevel('ERROR')
+
+    rng = np.random.default_rng(args.seed)
+    suffix = os.getpid()
+    overwrite_table, upsert_table = f'bench_overwrite_{suffix}', f'bench_upsert_{suffix}'
+    all_columns_table = f'bench_upsert_all_{suffix}'
+    frame = recommendations(np.array([f'C{i:07d}' for i in range(args.customers)]), args.top_n, args.products, rng)
+    print(f"Customers: {args.customers:,}  rows: {len(frame):,}\n")
+    try:
+        df = spark.createDataFrame(frame, SCHEMA).localCheckpoint()
+        df.write.format('delta').mode('overwrite').saveAsTable(overwrite_table)
+        start = time.perf_counter()
+        result = upsert_recommendations(spark, df, upsert_table)
+        print(f"   initial write       {time.perf_counter() - start:>7.2f}s  v{result.version}  "
+              f"{result.rows_written:,} rows")
+        upsert_recommendations(spark, df, all_columns_table, hash_columns=None)
+
+        for share in args.churn:
+            frame = churn(frame, share, args.top_n, args.products, rng)
+            df = spark.createDataFrame(frame, SCHEMA).localCheckpoint()
+            start = time.perf_counter()
+            df.write.format('delta').mode('overwrite').saveAsTable(overwrite_table)
+            overwrite_s = time.perf_counter() - start
+            start = time.perf_counter()
+            result = upsert_recommendations(spark, df, upsert_table)
+            upsert_s = time.perf_counter() - start
+            upsert_recommendations(spark, df, all_columns_table, hash_columns=None)
+            stored = spark.table(upsert_table).drop(BUCKET_COLUMN).toPandas()
+            keys = ['Customer_ID', 'rank']
+            merged = frame.merge(stored, on=keys, how='outer', suffixes=('', '_stored'), indicator=True)
+            same = bool((merged['_merge'] == 'both').all() and
+                        (merged['Product_Name'] == merged['Product_Name_stored']).all())
+            print(f"   churn {share:>5.1%}  overwrite {overwrite_s:>6.2f}s {len(frame):>10,} rows   "
+                  f"upsert {upsert_s:>6.2f}s {result.rows_written:>10,} rows  v{result.version}  "
+                  f"({result.changed:,} changed, {result.removed:,} removed)  same table: {same}")
+
+        start = time.perf_counter()
+        rerun = upsert_recommendations(spark, df, upsert_table)
+        print(f"   identical rerun     {time.perf_counter() - start:>7.2f}s  v{rerun.version} "
+              f"(unchanged: {rerun.version == result.version}), {rerun.rows_written:,} rows written")
+
+        print(f"\n   score drift, lists unchanged (confidence ± N(0, {args.drift}) points):")
+        frame = drift(frame, args.drift, rng)
+        df = spark.createDataFrame(frame, SCHEMA).localCheckpoint()
+        start = time.perf_counter()
+        df.write.format('delta').mode('overwrite').saveAsTable(overwrite_table)
+        print(f"   overwrite                 {time.perf_counter() - start:>6.2f}s {len(frame):>10,} rows")
+        start = time.perf_counter()
+        every = upsert_recommendations(spark, df, all_columns_table, hash_columns=None)
+        print(f"   upsert, all columns hash  {time.perf_counter() - start:>6.2f}s {every.rows_written:>10,} rows  "
+              f"({every.changed:,} changed)")
+        start = time.perf_counter()
+        lists = upsert_recommendations(spark, df, upsert_table)
+        print(f"   upsert, list hash         {time.perf_counter() - start:>6.2f}s {lists.rows_written:>10,} rows  "
+              f"v{lists.version} (unchanged: {lists.version == rerun.version})")
+        start = time.perf_counter()
+        tolerant = upsert_recommendations(spark, df, upsert_table,
+                                          tolerances={'confidence_score_pct': args.tolerance})
+        stored = spark.table(upsert_table).drop(BUCKET_COLUMN).toPandas()
+        merged = frame.merge(stored, on=['Customer_ID', 'rank'], suffixes=('', '_stored'))
+        error = (merged['confidence_score_pct'] - merged['confidence_score_pct_stored']).abs().max()
+        print(f"   upsert, list hash + tol.  {time.perf_counter() - start:>6.2f}s {tolerant.rows_written:>10,} rows  "
+              f"({tolerant.refreshed:,} customers refreshed), max stored error {error:.2f} points")
+    finally:
+        for table in (overwrite_table, upsert_table, f'{upsert_table}_hashes',
+                      all_columns_table, f'{all_columns_table}_hashes'):
+            spark.sql(f"DROP TABLE IF EXISTS {table}")
+
+
+if __name__ == '__main__':
+    main()
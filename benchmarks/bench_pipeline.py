@@ -0,0 +1,286 @@
+"""
+End-to-end pipeline benchmark on synthetic data under local Spark.
+
+Generates (or reuses) a synthetic dataset at the requested scale, then runs
+the pipeline stages and records wall time and throughput per stage:
+
+    generate -> load -> features -> interactions -> als -> scoring -> serving
+
+The interactions stage runs the notebook's transaction builder (keyword
+matching of every transaction with ``KeywordMatcher`` and decayed RFM
+scores) and blends it 70/30 with LLM fit scores. Only the LLM scores come
+from a deterministic hash-based stand-in, so the run needs no network; LLM
+dispatch throughput is covered by ``bench_llm_dispatch.py``.
+
+Scoring and serving run on the driver (NumPy top-N over the collected
+factors, the in-memory serving store), as in the notebook. They are kept
+columnar (arrays, no per-row Python objects) but still hold every
+customer's factors and recommendations in driver memory, so they only run
+up to ``--driver-max-customers`` (default 2M); larger scales report the
+Spark stages and skip them.
+
+Results are written as JSON; passing a previous result file as
+``--baseline`` fails the run (exit code 1) when any stage's throughput
+dropped by more than ``--tolerance``.
+
+Usage:
+    python benchmarks/bench_pipeline.py --scale 10k --data-dir /tmp/pinnacle_10k --output results.json
+    python benchmarks/bench_pipeline.py --scale 10k --data-dir /tmp/pinnacle_10k --baseline results.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pinnacle.decayed_rfm import transaction_rfm_spark
+from pinnacle.features import aggregate_transaction_features
+from pinnacle.keyword_match import KeywordMatcher, match_transactions_spark
+from pinnacle.scoring import top_n_scores
+from pinnacle.serving import RecommendationStore
+from pinnacle.synthetic import scale_to_customers, write_synthetic_dataset
+
+
+ALS_RANK = 20
+ALS_REG_PARAM = 0.1
+ALS_MAX_ITER = 10
+TOP_N = 5
+PRODUCTS_PER_CUSTOMER = 5
+TRANSACTION_WEIGHT = 0.7
+DRIVER_MAX_CUSTOMERS = 2_000_000
+
+
+class StageTimer:
+    """Collects wall time and rows/sec per named stage."""
+
+    def __init__(self):
+        self.results = []
+
+    def run(self, name, fn, rows_fn=None):
+        start = time.perf_counter()
+        value = fn()
+        elapsed = time.perf_counter() - start
+        rows = rows_fn(value) if rows_fn else None
+        self.results.append({
+            'stage': name,
+            'seconds': round(elapsed, 3),
+            'rows': rows,
+            'rows_per_sec': round(rows / elapsed, 1) if rows and elapsed > 0 else None,
+        })
+        if rows:
+            print(f"   {name:<14} {elapsed:>8.2f}s {rows:>12,} rows {rows / elapsed:>12,.0f} rows/s")
+        else:
+            print(f"   {name:<14} {elapsed:>8.2f}s")
+        return value
+
+
+def stand_in_llm_scores(customers, products):
+    """
+    Deterministic customer-product scores in the LLM scorer's layout.
+
+    Keeps the ``PRODUCTS_PER_CUSTOMER`` best-hashed products per customer with
+    a 1-5 interaction_score, in place of the LLM calls.
+    """
+    from pyspark.sql import Window, functions as F
+
+    scored = (customers.select('Customer_ID')
+              .crossJoin(F.broadcast(products.select('Product_Name')))
+              .withColumn('hash', F.abs(F.xxhash64('Customer_ID', 'Product_Name')) % 10000))
+    window = Window.partitionBy('Customer_ID').orderBy(F.desc('hash'))
+    return (scored.withColumn('rn', F.row_number().over(window))
+            .filter(F.col('rn') <= PRODUCTS_PER_CUSTOMER)
+            .select('Customer_ID', 'Product_Name',
+                    F.round(1 + 4 * F.col('hash') / 10000, 1).alias('interaction_score')))
+
+
+def build_interactions(transactions, customers, products):
+    """
+    The notebook's interaction matrix: keyword-matched decayed RFM scores of
+    every transaction, blended ``TRANSACTION_WEIGHT`` / rest with LLM scores
+    (sections 7-8 of ``create_openai_interactions``).
+    """
+    from pyspark.sql import functions as F
+
+    matcher = KeywordMatcher.from_products(products)
+    matches = match_transactions_spark(transactions, matcher)
+    max_date = transactions.agg(F.max('Date')).collect()[0][0]
+    transaction_scores = transaction_rfm_spark(matches, max_date)
+    combined = stand_in_llm_scores(customers, products).join(
+        transaction_scores.select('Customer_ID', 'Product_Name', 'trans_score'),
+        ['Customer_ID', 'Product_Name'], 'full_outer')
+    return combined.select(
+        'Customer_ID', 'Product_Name',
+        (F.coalesce(F.col('trans_score'), F.lit(0.0)) * TRANSACTION_WEIGHT
+         + F.coalesce(F.col('interaction_score'), F.lit(0.0)) * (1.0 - TRANSACTION_WEIGHT)).alias('interaction_score'))
+
+
+def factor_matrix(factors):
+    """(ids, float32 factors) from an ALS factor DataFrame, via Arrow instead of collected Rows."""
+    frame = factors.toPandas()
+    matrix = np.stack(frame['features'].to_numpy()).astype(np.float32) if len(frame) else np.zeros((0, 0), np.float32)
+    return frame['id'].to_numpy(dtype=np.int64), matrix
+
+
+def driver_stages(model, tables, lookups, timer):
+    """Blocked top-N over the collected factors, then the serving store; columnar throughout."""
+    import pandas as pd
+    from pyspark.sql import functions as F
+
+    def scoring():
+        user_ids, user_factors = factor_matrix(model.userFactors)
+        item_ids, item_factors = factor_matrix(model.itemFactors)
+        item_rows, scores = top_n_scores(user_factors, item_factors, top_n=TOP_N)
+        return user_ids, item_ids[item_rows], scores
+
+    user_ids, items, scores = timer.run('scoring', scoring, lambda r: len(r[0]))
+
+    def serving():
+        # user_int / item_int are 0..n-1 row numbers, so attributes are gathered by position
+        customers = (tables['customers'].join(lookups['customers'], 'Customer_ID')
+                     .select('user_int', 'Customer_ID', 'Full_Name', 'Gender', 'Age', 'City', 'State',
+                             'Occupation', 'Income_Bracket', 'Account_Type', 'Status')
+                     .toPandas().set_index('user_int').sort_index())
+        products = lookups['products'].toPandas().set_index('item_int').sort_index()['Product_Name'].to_numpy()
+        k = items.shape[1]
+        attributes = customers.iloc[customers.index.get_indexer(np.repeat(user_ids, k))]
+        frame = pd.DataFrame({
+            'customer_id': attributes['Customer_ID'].to_numpy(),
+            'customer_name': attributes['Full_Name'].to_numpy(),
+            'gender': attributes['Gender'].to_numpy(),
+            'age': attributes['Age'].to_numpy(),
+            'city': attributes['City'].to_numpy(),
+            'state': attributes['State'].to_numpy(),
+            'occupation': attributes['Occupation'].to_numpy(),
+            'income_bracket': attributes['Income_Bracket'].to_numpy(),
+            'recommended_product': products[items.ravel()],
+            'confidence_score': np.clip(scores.ravel() / 5.0, 0, 1),
+            'account_type': attributes['Account_Type'].to_numpy(),
+            'status': attributes['Status'].to_numpy(),
+        })
+        return RecommendationStore(frame)
+
+    return timer.run('serving', serving, len)
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path) as f:
+        baseline = {r['stage']: r for r in json.load(f)['stages']}
+    regressions = []
+    for result in results:
+        before = baseline.get(result['stage'], {}).get('rows_per_sec')
+        after = result['rows_per_sec']
+        if before and after and after < before * (1 - tolerance):
+            regressions.append(f"{result['stage']}: {before:,.0f} -> {after:,.0f} rows/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', default='10k', help='10k, 1m, 10m or a customer count')
+    parser.add_argument('--data-dir', default=None, help='Dataset directory (generated if missing)')
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--output', default=None, help='Write stage results as JSON')
+    parser.add_argument('--baseline', default=None, help='Previous JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed throughput drop vs baseline')
+    parser.add_argument('--driver-max-customers', type=int, default=DRIVER_MAX_CUSTOMERS,
+                        help='Largest scale the driver-side scoring and serving stages run at')
+    args = parser.parse_args()
+
+    n_customers = scale_to_customers(args.scale)
+    data_dir = args.data_dir or os.path.join(tempfile.gettempdir(), f"pinnacle_synthetic_{args.scale}")
+    timer = StageTimer()
+    print(f"Scale: {n_customers:,} customers  Data: {data_dir}\n")
+
+    if not os.path.exists(os.path.join(data_dir, 'products')):
+        timer.run('generate', lambda: write_synthetic_dataset(
+            data_dir, n_customers, chunk_size=args.chunk_size, verbose=False),
+            lambda c: c['customers'] + c['transactions'] + c['conversations'])
+
+    from pyspark.ml.recommendation import ALS
+    from pyspark.sql import SparkSession, Window, functions as F
+
+    spark = (SparkSession.builder.master('local[*]')
+             .config('spark.driver.memory', os.environ.get('SPARK_DRIVER_MEMORY', '4g'))
+             .config('spark.sql.shuffle.partitions', '16')
+             .config('spark.ui.showConsoleProgress', 'false')
+             .getOrCreate())
+    spark.sparkContext.setLogLevel('ERROR')
+    spark.sparkContext.setCheckpointDir(tempfile.mkdtemp(prefix='pinnacle_als_'))
+
+    def load():
+        tables = {t: spark.read.parquet(os.path.join(data_dir, t)).cache()
+                  for t in ('customers', 'transactions', 'conversations', 'products')}
+        return tables, sum(df.count() for df in tables.values())
+
+    tables, _ = timer.run('load', load, lambda v: v[1])
+    n_transactions = tables['transactions'].count()
+
+    timer.run('features', lambda: aggregate_transaction_features(tables['transactions'])
+              .write.format('noop').mode('overwrite').save(), lambda _: n_transactions)
+
+    def interactions():
+        lookups = {
+            'customers': tables['customers'].select('Customer_ID').withColumn(
+                'user_int', F.row_number().over(Window.orderBy('Customer_ID')) - 1).cache(),
+            'products': tables['products'].select('Product_Name').withColumn(
+                'item_int', F.row_number().over(Window.orderBy('Product_Name')) - 1).cache(),
+        }
+        df = (build_interactions(tables['transactions'], tables['customers'], tables['products'])
+              .join(lookups['customers'], 'Customer_ID')
+              .join(F.broadcast(lookups['products']), 'Product_Name')
+              .cache())
+        return df, lookups, df.count()
+
+    # Throughput over the transactions matched and scored
+    idx_df, lookups, n_interactions = timer.run('interactions', interactions, lambda _: n_transactions)
+
+    als = ALS(userCol='user_int', itemCol='item_int', ratingCol='interaction_score',
+              implicitPrefs=False, nonnegative=True, coldStartStrategy='drop',
+              rank=ALS_RANK, regParam=ALS_REG_PARAM, maxIter=ALS_MAX_ITER, seed=42)
+    model = timer.run('als', lambda: als.fit(idx_df), lambda _: n_interactions)
+
+    if n_customers > args.driver_max_customers:
+        print(f"   scoring, serving skipped: {n_customers:,} customers > --driver-max-customers "
+              f"{args.driver_max_customers:,} (driver-side stages)")
+        latencies = None
+    else:
+        store = driver_stages(model, tables, lookups, timer)
+        latencies = []
+        for _ in range(200):
+            start = time.perf_counter()
+            store.query(page=3, limit=20, min_age=25, max_age=40, state='Lagos', min_confidence=0.3)
+            latencies.append((time.perf_counter() - start) * 1000)
+        print(f"   serving query  p50 {np.median(latencies):.3f}ms  p99 {np.percentile(latencies, 99):.3f}ms")
+
+    spark.stop()
+
+    report = {
+        'scale': args.scale,
+        'customers': n_customers,
+        'stages': timer.results,
+        'serving_query_ms': None if latencies is None else {
+            'p50': round(float(np.median(latencies)), 4), 'p99': round(float(np.percentile(latencies, 99)), 4)},
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        regressions = compare(timer.results, args.baseline, args.tolerance)
+        if regressions:
+            print(f"\nThroughput regressions (> {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"\nNo stage regressed by more than {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark: compact token-budgeted scoring prompts vs. the verbose encoding.
+
+Encodes the same customers and product catalogue both ways and reports, per
+customer, the prompt tokens and expected completion tokens, plus requests
+per run. The verbose encoding is the notebook's previous prompt: full
+catalogue with every column, one rule line per product restriction, a
+free-text block per customer over every column, fixed ``batch_size=30``,
+and product names in the answer. Completion size dominates LLM latency
+(tokens are generated sequentially), so expected completion tokens per
+customer is the latency proxy. Token counts use ``estimate_tokens``
+(~4 characters per token), as the dispatcher's TPM budgeting does.
+
+Usage:
+    python benchmarks/bench_prompt_encoding.py --data-dir /tmp/pinnacle_10k --customers 1000
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pinnacle.llm_dispatch import estimate_tokens
+from pinnacle.prompts import (DEFAULT_TOKEN_BUDGET, build_prompt, completion_tokens, customer_fields, customer_row,
+                              plan_batches, product_table, prompt_header, rules_text)
+
+
+VERBOSE_BATCH_SIZE = 30
+TOP_N = 5
+CUSTOM_RULES = [
+    "Premium products require demonstrated high transaction volumes",
+    "Savings products are suitable for customers with stable income",
+]
+
+
+def verbose_prompts(customers, products, batch_size):
+    """The previous encoding (section 4-6 of ``create_customer_product_interactions``)."""
+    def title(key):
+        return key.replace('_', ' ').title()
+
+    catalog = [{('name' if k == 'Product_Name' else k.lower()): v for k, v in row.items() if v is not None}
+               for row in products]
+    product_list = []
+    for i, prod in enumerate(catalog):
+        parts = [f"{i + 1}. {prod['name']}"]
+        for key, label in (('product_category', 'Category'), ('target_audience', 'Target'),
+                           ('age_range', 'Age Range'), ('minimum_balance', 'Min Balance'),
+                           ('interest_rate', 'Interest Rate')):
+            if key in prod:
+                parts.append(f"{label}: {prod[key]}")
+        parts += [f"{title(k)}: {v}" for k, v in prod.items()
+                  if k not in ('name', 'product_category', 'target_audience', 'age_range', 'minimum_balance',
+                               'interest_rate')]
+        product_list.append(' - '.join(parts))
+    rules = ["- Match products to customer demographics (age, income, occupation)",
+             "- Do NOT recommend products similar to customer's current account",
+             "- Consider customer's financial capacity when recommending products",
+             "- Respect all age ranges and target audience specifications STRICTLY"]
+    for prod in catalog:
+        if prod.get('age_range'):
+            rules.append(f"- {prod['name']}: Only for customers within age range {prod['age_range']}")
+        if prod.get('target_audience'):
+            rules.append(f"- {prod['name']}: Designed for {prod['target_audience']}")
+        if prod.get('minimum_balance') not in (None, '', '0', 0):
+            rules.append(f"- {prod['name']}: Requires minimum balance of {prod['minimum_balance']}")
+    rules += [f"- {rule}" for rule in CUSTOM_RULES]
+
+    summaries = ['\n'.join([f"Customer {c['Customer_ID']}:"] +
+                           [f"- {title(k)}: {v}" for k, v in c.items() if k != 'Customer_ID' and v is not None])
+                 for c in customers]
+    product_text, rules_text_ = '\n'.join(product_list), '\n'.join(rules)
+    prompts = []
+    for start in range(0, len(summaries), batch_size):
+        prompts.append(f"""You are a banking product recommendation expert. Score how well each product fits each customer on a scale of 0-10.
+
+# CUSTOMERS
+{chr(10).join(summaries[start:start + batch_size])}
+
+# PRODUCTS
+{product_text}
+
+# TASK
+For each customer, score ONLY the top {TOP_N} most relevant products (0-10 scale).
+
+# MATCHING RULES
+{rules_text_}
+
+Return ONLY valid JSON with this exact structure:
+{{
+  "matches": [
+    {{"customer_id": "C001", "product": "Exact Product Name", "score": 8}},
+    {{"customer_id": "C001", "product": "Another Product", "score": 7}}
+  ]
+}}
+
+Do NOT include any other text, only the JSON object.""")
+    return prompts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data-dir', required=True, help='Dataset with customers and products parquet')
+    parser.add_argument('--customers', type=int, default=1000)
+    parser.add_argument('--token-budget', type=int, default=DEFAULT_TOKEN_BUDGET)
+    args = parser.parse_args()
+
+    customers = (pd.read_parquet(os.path.join(args.data_dir, 'customers')).head(args.customers)
+                 .astype(object).where(lambda df: df.notna(), None).to_dict('records'))
+    products = (pd.read_parquet(os.path.join(args.data_dir, 'products'))
+                .astype(object).where(lambda df: df.notna(), None).to_dict('records'))
+    n = len(customers)
+
+    # Verbose: answer is one {"customer_id", "product", "score"} object per match
+    prompts = verbose_prompts(customers, products, VERBOSE_BATCH_SIZE)
+    avg_name = sum(len(p['Product_Name']) for p in products) / len(products)
+    match = json.dumps({'customer_id': customers[0]['Customer_ID'], 'product': 'x' * round(avg_name), 'score': 8})
+    verbose = {
+        'requests': len(prompts),
+        'prompt': sum(estimate_tokens(p) for p in prompts) / n,
+        'completion': estimate_tokens(match + ', ') * TOP_N + 10 * len(prompts) / n,
+    }
+
+    product_text, product_names = product_table(products)
+    header = prompt_header(product_text, rules_text(CUSTOM_RULES), TOP_N)
+    fields = customer_fields(list(customers[0]))
+    rows = {c['Customer_ID']: customer_row(c, fields) for c in customers}
+    batches = plan_batches(rows, header, TOP_N, token_budget=args.token_budget)
+    compact_prompts = [build_prompt(header, fields, [rows[c] for c in batch]) for batch in batches]
+    compact = {
+        'requests': len(batches),
+        'prompt': sum(estimate_tokens(p) for p in compact_prompts) / n,
+        'completion': sum(completion_tokens(len(b), TOP_N) for b in batches) / n,
+    }
+
+    print(f"Customers: {n:,}  Products: {len(products)}  Token budget: {args.token_budget:,}\n")
+    print(f"   {'':<9} {'requests':>9} {'cust/req':>9} {'prompt tok/cust':>16} {'completion tok/cust':>20} "
+          f"{'total tok/cust':>15}")
+    for name, r in (('verbose', verbose), ('compact', compact)):
+        print(f"   {name:<9} {r['requests']:>9,} {n / r['requests']:>9.1f} {r['prompt']:>16.1f} "
+              f"{r['completion']:>20.1f} {r['prompt'] + r['completion']:>15.1f}")
+    total_before = verbose['prompt'] + verbose['completion']
+    total_after = compact['prompt'] + compact['completion']
+    print(f"\n   tokens per customer: -{1 - total_after / total_before:.0%}   "
+          f"completion tokens per customer: -{1 - compact['completion'] / verbose['completion']:.0%}   "
+          f"requests: -{1 - compact['requests'] / verbose['requests']:.0%}")
+
+
+if __name__ == '__main__':
+    main()
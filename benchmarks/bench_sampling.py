@@ -0,0 +1,76 @@
+"""
+Benchmark: broadcast semi-join sampling vs. driver-side ``isin`` ID lists.
+
+For growing sample sizes, draws the customer sample, restricts synthetic
+transactions to it both ways and reports the logical plan size and run time.
+
+Usage:
+    python benchmarks/bench_sampling.py --customers 200000 --transactions 2000000 --samples 1000,10000,100000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pinnacle.sampling import restrict_to_customers, sample_customers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--customers', type=int, default=200000)
+    parser.add_argument('--transactions', type=int, default=2000000)
+    parser.add_argument('--samples', default='1000,10000,100000')
+    args = parser.parse_args()
+
+    from pyspark.sql import SparkSession, functions as F
+
+    spark = (SparkSession.builder.master('local[*]')
+             .config('spark.sql.shuffle.partitions', '16')
+             .config('spark.ui.showConsoleProgress', 'false')
+             .getOrCreate())
+    spark.sparkContext.setLogLevel('ERROR')
+
+    rng = np.random.default_rng(42)
+    df_custs = spark.createDataFrame(pd.DataFrame(
+        {'Customer_ID': [f"ZB{i:07d}" for i in range(1, args.customers + 1)]})).cache()
+    df_trans = spark.createDataFrame(pd.DataFrame({
+        'Customer_ID': [f"ZB{c:07d}" for c in rng.integers(1, args.customers + 1, args.transactions)],
+        'Trans_Amount': rng.lognormal(9, 1.2, args.transactions),
+    })).cache()
+    df_custs.count(), df_trans.count()
+
+    print(f"{'sample':>8} | {'isin plan chars':>15} {'isin time':>10} | {'semi plan chars':>15} {'semi time':>10} | rows match")
+    for size in [int(s) for s in args.samples.split(',')]:
+        # Original: count(), fractional sample, collect IDs, isin literal list
+        start = time.perf_counter()
+        total = df_custs.count()
+        sample = df_custs.sample(fraction=min(1.0, size / total), seed=42).limit(size)
+        ids = [row.Customer_ID for row in sample.select('Customer_ID').collect()]
+        isin_df = df_trans.filter(F.col('Customer_ID').isin(ids))
+        isin_plan = len(isin_df._jdf.queryExecution().logical().toString())
+        isin_rows = isin_df.count()
+        isin_time = time.perf_counter() - start
+
+        # New: one-pass hash sample kept as a DataFrame, broadcast left-semi join
+        start = time.perf_counter()
+        semi_df = restrict_to_customers(df_trans, sample_customers(df_custs, size, seed=42))
+        semi_plan = len(semi_df._jdf.queryExecution().logical().toString())
+        semi_df.count()
+        semi_time = time.perf_counter() - start
+
+        # Different samplers pick different customers; compare against the sample's own size
+        expected = restrict_to_customers(df_trans, spark.createDataFrame([(i,) for i in ids], ['Customer_ID'])).count()
+        print(f"{size:>8,} | {isin_plan:>15,} {isin_time:>9.2f}s | {semi_plan:>15,} {semi_time:>9.2f}s | "
+              f"{isin_rows == expected}")
+
+    spark.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark: indexed serving store vs. a linear filter per request.
+
+Builds a synthetic recommendations table, runs a mix of filtered, paginated
+queries against ``RecommendationStore`` and against a pandas filter over the
+whole table (what the MSW mock does per request), checks both return the same
+page and totals, and reports median / p99 latency per query.
+
+Usage:
+    python benchmarks/bench_serving.py --rows 2000000 --repeats 50
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pinnacle.serving import RecommendationStore
+
+
+STATES = ['Lagos', 'Abuja', 'Rivers', 'Oyo', 'Kano', 'Kaduna', 'Enugu', 'Delta', 'Ogun', 'Anambra',
+          'Edo', 'Kwara', 'Plateau', 'Cross River', 'Akwa Ibom', 'Imo', 'Osun', 'Ondo', 'Ekiti', 'Abia']
+PRODUCTS = [f"Product {i}" for i in range(40)]
+ACCOUNT_TYPES = ['Savings', 'Current', 'Domiciliary', 'Corporate', 'Student']
+CITIES = ['Ikeja', 'Lekki', 'Garki', 'Port Harcourt', 'Ibadan', 'Kano', 'Zaria', 'Enugu', 'Warri', 'Abeokuta']
+FIRST = ['Chinedu', 'Aisha', 'Tunde', 'Ngozi', 'Emeka', 'Fatima', 'Bola', 'Ifeoma', 'Musa', 'Kemi']
+LAST = ['Okafor', 'Bello', 'Adeyemi', 'Eze', 'Ibrahim', 'Okonkwo', 'Balogun', 'Nwosu', 'Lawal', 'Obi']
+
+QUERIES = {
+    'unfiltered': {},
+    'confidence only': {'min_confidence': 0.7},
+    'age + confidence': {'min_age': 25, 'max_age': 40, 'min_confidence': 0.7},
+    'state': {'state': 'Kano'},
+    'product + state': {'products': 'Product 3,Product 7', 'state': 'Lagos,Abuja', 'min_confidence': 0.5},
+    'account + age': {'account_type': 'Student', 'min_age': 18, 'max_age': 22},
+    'search id': {'search': 'zb0012345'},
+    'search name + state': {'search': 'ngozi eze', 'state': 'Enugu', 'page': 2},
+    'deep page': {'min_confidence': 0.3, 'page': 5000},
+}
+
+
+def synthetic_table(rows, per_customer=5, seed=42):
+    rng = np.random.default_rng(seed)
+    n_customers = rows // per_customer
+    customer = np.repeat(np.arange(1, n_customers + 1), per_customer)
+    first = rng.integers(0, len(FIRST), n_customers)
+    last = rng.integers(0, len(LAST), n_customers)
+    names = np.array([f"{f} {l}" for f in FIRST for l in LAST])[first * len(LAST) + last]
+    # About 1% of customers have no recorded age
+    ages = np.where(rng.random(n_customers) < 0.01, np.nan, rng.integers(18, 76, n_customers))
+    products = np.array(PRODUCTS)[rng.integers(0, len(PRODUCTS), len(customer))]
+    return pd.DataFrame({
+        'customer_id': [f"ZB{c:07d}" for c in customer],
+        'customer_name': names[customer - 1],
+        'gender': np.array(['Male', 'Female'])[rng.integers(0, 2, n_customers)][customer - 1],
+        'age': ages[customer - 1],
+        'city': np.array(CITIES)[rng.integers(0, len(CITIES), n_customers)][customer - 1],
+        'state': np.array(STATES)[rng.integers(0, len(STATES), n_customers)][customer - 1],
+        'occupation': 'Engineer',
+        'income_bracket': '₦200k-₦500k',
+        'recommended_product': products,
+        'confidence_score': np.round(rng.beta(4, 2, len(customer)), 4),
+        'reason': [f"Profile fits {p}." for p in products],
+        'account_type': np.array(ACCOUNT_TYPES)[rng.integers(0, len(ACCOUNT_TYPES), n_customers)][customer - 1],
+    })
+
+
+def linear_query(df, page=1, limit=10, min_age=None, max_age=None, state=None, products=None,
+                 account_type=None, min_confidence=None, search=None):
+    """Filter the whole table on every request, like the MSW mock handler."""
+    mask = np.ones(len(df), dtype=bool)
+    if min_age is not None:
+        mask &= df['age'].to_numpy() >= min_age
+    if max_age is not None:
+        mask &= df['age'].to_numpy() <= max_age
+    if min_confidence is not None:
+        mask &= df['confidence_score'].to_numpy(dtype=np.float32) >= np.float32(min_confidence)
+    for column, value in (('state', state), ('recommended_product', products), ('account_type', account_type)):
+        if value:
+            mask &= df[column].isin(value.split(',')).to_numpy()
+    if search:
+        s = search.lower()
+        mask &= (df['customer_name'].str.lower().str.contains(s, regex=False)
+                 | df['city'].str.lower().str.contains(s, regex=False)
+                 | df['customer_id'].str.lower().str.contains(s, regex=False)).to_numpy()
+    matched = df[mask]
+    total_pages = max(1, -(-len(matched) // limit))
+    current = min(page, total_pages)
+    return len(matched), matched.iloc[(current - 1) * limit:current * limit]['customer_id'].tolist()
+
+
+def timings(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return np.median(samples), np.percentile(samples, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--repeats', type=int, default=50)
+    args = parser.parse_args()
+
+    df = synthetic_table(args.rows)
+    start = time.perf_counter()
+    store = RecommendationStore(df)
+    print(f"Rows: {len(store):,}  index build: {time.perf_counter() - start:.1f}s\n")
+
+    # The linear baseline scans rows in the same (confidence-descending) order
+    ordered = df.sort_values(['confidence_score', 'customer_id'], ascending=[False, True], kind='stable')
+
+    print(f"{'query':<22} {'matches':>10} | {'store p50':>10} {'p99':>8} | {'linear p50':>11} {'p99':>8} | same page")
+    for name, params in QUERIES.items():
+        response = store.query(**params)
+        total, ids = linear_query(ordered, **params)
+        same = (response['pagination']['total_records'] == total
+                and [r['customer_id'] for r in response['data']] == ids)
+        s50, s99 = timings(lambda: store.query(**params), args.repeats)
+        l50, l99 = timings(lambda: linear_query(ordered, **params), max(3, args.repeats // 10))
+        print(f"{name:<22} {total:>10,} | {s50:>8.3f}ms {s99:>6.3f}ms | {l50:>9.1f}ms {l99:>6.1f}ms | {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Local fake OpenAI-compatible chat completions server.
+
+Serves ``POST /v1/chat/completions`` with a canned ``{"matches": [...]}`` JSON
+answer after a configurable latency, and injects 429/500 responses at a
+configurable rate (or a scripted status for each of the first requests), so
+the LLM dispatcher can be exercised without network access or API spend.
+Arrival times and prompts are kept in ``stats`` for pacing checks.
+
+Usage:
+    python benchmarks/fake_openai_server.py --port 8765 --latency 0.5 --error-rate 0.1
+    # then point the client at it:
+    OpenAI(api_key="test", base_url="http://127.0.0.1:8765/v1")
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+CUSTOMER_PATTERN = re.compile(r'Customer (\S+?):')
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    latency = 0.5
+    error_rate = 0.0
+    errors = []
+    retry_after = '0'
+    stats = {'requests': 0, 'errors': 0, 'arrivals': []}
+    stats_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        prompt = request.get('messages', [{}])[-1].get('content', '')
+        with self.stats_lock:
+            self.stats['requests'] += 1
+            self.stats['arrivals'].append((time.monotonic(), prompt))
+            status = self.errors.pop(0) if self.errors else None
+
+        time.sleep(self.latency)
+
+        if status is None and random.random() < self.error_rate:
+            status = random.choice([429, 500])
+        if status is not None:
+            with self.stats_lock:
+                self.stats['errors'] += 1
+            self._send_json(status, {'error': {'message': 'injected failure', 'type': 'fake', 'code': status}},
+                            headers={'retry-after': self.retry_after} if status == 429 else None)
+            return
+
+        matches = [{'customer_id': cid, 'product': 'Aspire Account', 'score': 7}
+                   for cid in CUSTOMER_PATTERN.findall(prompt)]
+        content = json.dumps({'matches': matches})
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+
+        self._send_json(200, {
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'fake'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens
+            }
+        })
+
+
+def start_server(port=0, latency=0.5, error_rate=0.0, errors=(), retry_after=0):
+    """
+    Start the fake server on a background thread. Returns (server, base_url).
+
+    ``errors`` are the statuses (429 / 500) answered to the first requests,
+    in arrival order; 429 answers carry ``retry-after: <retry_after>``.
+    The handler's ``stats`` are at ``server.RequestHandlerClass.stats``.
+    """
+    handler = type('Handler', (FakeOpenAIHandler,), {
+        'latency': latency,
+        'error_rate': error_rate,
+        'errors': list(errors),
+        'retry_after': str(retry_after),
+        'stats': {'requests': 0, 'errors': 0, 'arrivals': []},
+        'stats_lock': threading.Lock(),
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.port, args.latency, args.error_rate)
+    print(f"Fake OpenAI server listening on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,38 +1,26 @@
-pip install -q openai python-dotenv implicit scikit-learn scipy
+pip install -q openai python-dotenv implicit
 
 dbutils.library.restartPython()
 
+# Heavy, stage-specific dependencies (OpenAI client, pinnacle stage modules)
+# are imported in the cells that use them; the same stages run outside
+# Databricks through the `pinnacle run <stage>` command line.
 import os
 import json
+import time
 import warnings
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional, Tuple
 
 import pandas as pd
 import numpy as np
-from scipy.sparse import csr_matrix, coo_matrix
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, ndcg_score
-from implicit.als import AlternatingLeastSquares
-
-import openai
-import time
 from pyspark.sql import functions as F
 from pyspark.sql.types import *
 from pyspark.sql import Window
-import json
-from decimal import Decimal
-
-# Visualization
-import matplotlib.pyplot as plt
-import seaborn as sns
 from dotenv import load_dotenv
 
 # Configure
 warnings.filterwarnings('ignore')
-sns.set_style('whitegrid')
-plt.rcParams['figure.figsize'] = (12, 6)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -50,7 +38,9 @@ CONFIG = {
         'factors': 50,
         'regularization': 0.01,
         'iterations': 15,
-        'alpha': 40.0
+        'alpha': 40.0,
+        'backend': 'spark',   # 'spark' = explicit Spark ALS, 'implicit' = implicit-feedback ALS with the settings above
+        'num_threads': 0      # implicit backend worker threads (0 = all cores)
     },
     'llm': {
         'model': 'gpt-4o',
@@ -59,17 +49,34 @@ CONFIG = {
     },
     'recommendation': {
         'top_n': 5,
-        'final_n': 3
+        'final_n': 3,
+        'score_tolerance_pct': 1.0   # Confidence points a stored score may drift before its row is rewritten
     },
     'feature_engineering': {
         'recency_days': 90,
         'min_transactions': 3
+    },
+    'metrics': {
+        'jsonl_path': 'run_metrics.jsonl',      # Appended per run (None = skip)
+        'prometheus_path': 'run_metrics.prom'   # Replaced per run (None = skip)
+    },
+    'diagnostics': {
+        'stats': False   # True = diagnostic counts, samples and distributions (extra Spark jobs)
     }
 }
 
 print("\n📊 Configuration:")
 print(json.dumps(CONFIG, indent=2))
 
+COLLECT_STATS = CONFIG['diagnostics']['stats']
+
+# Stage spans, row throughput, Spark jobs, driver memory and LLM latency/tokens for this run
+from pinnacle.diagnostics import frame_stats
+from pinnacle.metrics import RunMetrics
+run_metrics = RunMetrics()
+run_metrics.track_spark_jobs(spark)
+print(f"\n📈 Run metrics: {run_metrics.run_id} (stats {'on' if COLLECT_STATS else 'off'})")
+
 # %%
 # ==============================================================================
 # DATA LOADING (SPARK)
@@ -84,56 +91,66 @@ CUSTOMERS_TABLE = 'workspace.default.customer_data_1'
 print("📂 Loading datasets from Unity Catalog...\n")
 
 # Load data using Spark (NO pandas conversion for distributed processing)
+# Tables are read lazily; in stats-on runs each table's overview figures come
+# from one combined aggregation instead of a count() per figure
+load_span = run_metrics.span('load', stats=COLLECT_STATS)
 try:
     # Load transactions
     print(f"Loading: {TRANSACTIONS_TABLE}")
     df_transactions = spark.table(TRANSACTIONS_TABLE)
-    transactions_count = df_transactions.count()
-    print(f" Loaded {transactions_count:,} transactions")
+    if COLLECT_STATS:
+        transaction_stats = frame_stats(
+            df_transactions,
+            distinct=['Customer_ID'],
+            min_date=F.min('Date'),
+            max_date=F.max('Date'),
+            total_value=F.sum('Trans_Amount')
+        )
+        print(f" Loaded {transaction_stats['rows']:,} transactions")
     
     # Load products
     print(f"\nLoading: {PRODUCTS_TABLE}")
     df_products = spark.table(PRODUCTS_TABLE)
-    products_count = df_products.count()
-    print(f" Loaded {products_count:,} products")
+    if COLLECT_STATS:
+        product_stats = frame_stats(df_products, distinct=['Product_ID'])
+        print(f" Loaded {product_stats['rows']:,} products")
     
     # Load conversations
     print(f"\nLoading: {CONVERSATIONS_TABLE}")
     df_conversations = spark.table(CONVERSATIONS_TABLE)
-    conversations_count = df_conversations.count()
-    print(f" Loaded {conversations_count:,} conversations")
+    if COLLECT_STATS:
+        conversations_count = df_conversations.count()
+        print(f" Loaded {conversations_count:,} conversations")
     
     # Try loading customer demographics (optional)
     print(f"\nLoading: {CUSTOMERS_TABLE}")
     try:
         df_customers = spark.table(CUSTOMERS_TABLE)
-        customers_count = df_customers.count()
-        print(f" Loaded {customers_count:,} customer demographics")
+        if COLLECT_STATS:
+            customers_count = df_customers.count()
+            print(f" Loaded {customers_count:,} customer demographics")
     except Exception as e:
         df_customers = None
         print(f" Customer demographics table not found: {e}")
         print(" Proceeding without demographics data")
     
-    # Display basic info using Spark operations
-    print("\n" + "="*80)
-    print(" DATASET OVERVIEW")
-    print("="*80)
-    print(f"Unique Customers: {df_transactions.select('Customer_ID').distinct().count():,}")
-    print(f"Unique Products: {df_products.select('Product_ID').distinct().count():,}")
-    
-    # Get date range
-    date_stats = df_transactions.agg(
-        F.min('Date').alias('min_date'),
-        F.max('Date').alias('max_date')
-    ).collect()[0]
-    print(f"Date Range: {date_stats['min_date']} to {date_stats['max_date']}")
-    
-    # Get total transaction value
-    total_value = df_transactions.agg(F.sum('Trans_Amount').alias('total')).collect()[0]['total']
-    print(f"Total Transaction Value: ₦{total_value:,.2f}")
-    print("="*80)
+    if COLLECT_STATS:
+        load_span.end(rows=transaction_stats['rows'] + product_stats['rows'] + conversations_count)
+        
+        # Display basic info using Spark operations
+        print("\n" + "="*80)
+        print(" DATASET OVERVIEW")
+        print("="*80)
+        print(f"Unique Customers: {transaction_stats['distinct_Customer_ID']:,}")
+        print(f"Unique Products: {product_stats['distinct_Product_ID']:,}")
+        print(f"Date Range: {transaction_stats['min_date']} to {transaction_stats['max_date']}")
+        print(f"Total Transaction Value: ₦{transaction_stats['total_value']:,.2f}")
+        print("="*80)
+    else:
+        load_span.end()
     
 except Exception as e:
+    load_span.end(error=str(e))
     print(f"\n Error loading data: {e}")
     print("\n Troubleshooting:")
     print("   1. Verify table names exist in Unity Catalog")
@@ -141,25 +158,26 @@ except Exception as e:
     print("   3. Run: spark.sql('SHOW TABLES IN workspace.default').show()")
     print("   4. Or run: spark.catalog.listTables('workspace.default')")
 
-# Quick data exploration
-print("\n TRANSACTIONS SAMPLE:")
-display(df_transactions.head())
-
-print("\n PRODUCTS SAMPLE:")
-display(df_products.head())
-
-print("\n CUSTOMERS SAMPLE:")
-display(df_customers.head())
-
-print("\n CONVERSATIONS SAMPLE:")
-display(df_conversations.head())
-
-print("\n TRANSACTION STATISTICS:")
-print(df_transactions.describe())
-
-# Check for missing values
-print("\n Missing Values:")
-print(df_transactions.select([F.sum(F.col(c).isNull().cast('int')).alias(c) for c in df_transactions.columns]).show())
+# Quick data exploration (stats-on runs only; each display is a Spark job)
+if COLLECT_STATS:
+    print("\n TRANSACTIONS SAMPLE:")
+    display(df_transactions.head())
+    
+    print("\n PRODUCTS SAMPLE:")
+    display(df_products.head())
+    
+    print("\n CUSTOMERS SAMPLE:")
+    display(df_customers.head())
+    
+    print("\n CONVERSATIONS SAMPLE:")
+    display(df_conversations.head())
+    
+    print("\n TRANSACTION STATISTICS:")
+    print(df_transactions.describe())
+    
+    # Check for missing values
+    print("\n Missing Values:")
+    print(df_transactions.select([F.sum(F.col(c).isNull().cast('int')).alias(c) for c in df_transactions.columns]).show())
 
 # ============================================================================
 # CELL 6 - HYBRID INTERACTION MATRIX (OPENAI + TRANSACTIONS WITH DESCRIPTIONS)
@@ -167,23 +185,47 @@ print(df_transactions.select([F.sum(F.col(c).isNull().cast('int')).alias(c) for
 
 from openai import OpenAI
 import time
+from pinnacle.decayed_rfm import rfm_scores_from_state, transaction_rfm_spark, update_rfm_state
+from pinnacle.diagnostics import frame_stats
+from pinnacle.eligibility import eligibility_mask, product_rules
+from pinnacle.features import aggregate_transaction_features
+from pinnacle.incremental_features import load_watermark, transaction_features_from_state, update_feature_state
+from pinnacle.keyword_match import TEXT_COLUMNS, KeywordMatcher, match_transactions_spark
+from pinnacle.life_events import INPUT_COLUMNS as LIFE_EVENT_COLUMNS, LifeEventDetector, life_event_features_spark
+from pinnacle.llm_cache import ScoreCache, fingerprint
+from pinnacle.llm_dispatch import RateLimiter, dispatch_batches, estimate_tokens
+from pinnacle.metrics import RunMetrics
+from pinnacle.prompts import (build_prompt, completion_tokens, customer_fields, customer_row, parse_matches,
+                              plan_batches, product_table, prompt_header, rules_text)
+from pinnacle.sampling import restrict_to_customers, sample_customers
 from pyspark.sql import functions as F
 from pyspark.sql.types import *
 from pyspark.sql import Window
 import json
-from decimal import Decimal
 
 def create_customer_product_interactions(df_custs, df_products, df_trans,
                                           openai_api_key=None, 
                                           model_name="gpt-4o-mini",
                                           customer_sample_size=None,
-                                          batch_size=30,
+                                          batch_size=None,
+                                          prompt_token_budget=8000,
                                           temperature=0.3,
                                           top_n_products=10,
-                                          rate_limit_delay=0.5,
+                                          max_concurrent_requests=4,
+                                          requests_per_minute=500,
+                                          tokens_per_minute=200000,
+                                          cache_path=None,
+                                          cache_max_entries=1000000,
                                           additional_rules=None,
                                           use_transaction_data=True,
-                                          transaction_weight=0.7):
+                                          transaction_weight=0.7,
+                                          frequency_half_life=180.0,
+                                          monetary_half_life=180.0,
+                                          recency_half_life=120.0,
+                                          rfm_state_prefix=None,
+                                          llm_scores_table=None,
+                                          stats=False,
+                                          metrics=None):
     """
     HYBRID: Combines OpenAI intelligent matching with real transaction data
     Enhanced with transaction description analysis
@@ -197,32 +239,47 @@ def create_customer_product_interactions(df_custs, df_products, df_trans,
         openai_api_key: OpenAI API key (required)
         model_name: OpenAI model to use
         customer_sample_size: Number of customers to process (None = all)
-        batch_size: Number of customers per API call
+        batch_size: Maximum customers per API call (None = as many as fit the token budget)
+        prompt_token_budget: Prompt plus expected completion tokens per API call;
+            customers are packed into each call up to this budget
         temperature: LLM temperature setting
         top_n_products: Number of products to recommend per customer
-        rate_limit_delay: Delay between API calls in seconds
+        max_concurrent_requests: Number of batches kept in flight at once
+        requests_per_minute: Request rate limit for the OpenAI account (None = unlimited)
+        tokens_per_minute: Token rate limit for the OpenAI account (None = unlimited)
+        cache_path: SQLite file caching LLM scores per customer (None = no cache)
+        cache_max_entries: Cached customers kept before least-recently-used eviction
         additional_rules: Optional list of custom business rules
         use_transaction_data: Whether to include transaction data
         transaction_weight: Weight for transaction scores (0-1)
+        frequency_half_life: Days for a transaction's RFM frequency count to halve
+        monetary_half_life: Days for a transaction's RFM monetary amount to halve
+        recency_half_life: Days for the RFM recency score to halve
+        rfm_state_prefix: Table prefix of the decayed RFM state (None = score the
+            sample's full history each run; set = fold only transactions newer
+            than the state's watermark, for all customers, before scoring)
+        llm_scores_table: Table the raw LLM scores are saved to, for the
+            streaming re-ranker's score blend (None = not saved)
+        stats: Run diagnostic counts and samples (extra Spark jobs); off, only
+            the final matrix is counted while it is materialized
+        metrics: RunMetrics collecting stage spans and LLM usage (None = not exported)
     """
-    start_time = time.time()
+    metrics = metrics or RunMetrics()
+    stage = metrics.span('interactions', model=model_name, stats=stats)
     print(" Creating interaction matrix (Hybrid: OpenAI + Transaction Descriptions)...\n")
     
     # Validate inputs
     if openai_api_key is None:
         raise ValueError("openai_api_key parameter is required")
     
-    # Initialize OpenAI client
-    client = OpenAI(api_key=openai_api_key)
-    
-    # Get all product names
-    all_product_names = [row.Product_Name for row in df_products.select('Product_Name').collect()]
-    print(f"   Products in catalog: {len(all_product_names)}")
+    # Initialize OpenAI client (retries are handled by the batch dispatcher)
+    client = OpenAI(api_key=openai_api_key, max_retries=0)
     
     # =========================================================================
     # 1. IDENTIFY CURRENT PRODUCTS FROM ACCOUNT_TYPE (SPARK)
     # =========================================================================
     print("\n   → Identifying current products from Account_Type...")
+    step = metrics.span('current_products')
     
     df_custs_with_keywords = df_custs.withColumn(
         'account_keywords',
@@ -252,13 +309,12 @@ def create_customer_product_interactions(df_custs, df_products, df_trans,
         F.collect_set('current_product').alias('current_products')
     )
     
-    current_products_count = customer_current_products_df.count()
-    print(f"      Found current products for {current_products_count:,} customers")
-    
     customer_current_products = {
         row.Customer_ID: set(row.current_products) 
         for row in customer_current_products_df.collect()
     }
+    print(f"      Found current products for {len(customer_current_products):,} customers")
+    step.end(rows=len(customer_current_products))
     
     # =========================================================================
     # 2. PREPARE CUSTOMER PROFILES (SPARK)
@@ -266,193 +322,189 @@ def create_customer_product_interactions(df_custs, df_products, df_trans,
     print("\n   → Preparing customer profiles...")
     
     customer_profiles = df_custs.select([c for c in df_custs.columns])
-    profiles_count = customer_profiles.count()
-    print(f"      Total customers: {profiles_count:,}")
     
     # =========================================================================
     # 3. SAMPLE CUSTOMERS IF SPECIFIED
     # =========================================================================
-    if customer_sample_size is not None and profiles_count > customer_sample_size:
-        print(f"      Sampling {customer_sample_size:,} customers from {profiles_count:,} total")
-        customer_profiles_sample = customer_profiles.sample(
-            fraction=customer_sample_size/profiles_count, 
-            seed=42
-        ).limit(customer_sample_size)
+    # One-pass seeded hash sample (no count() needed); stays a DataFrame.
+    # Persisted: profiles are collected for prompts and semi-joined to transactions
+    if customer_sample_size is not None:
+        print(f"      Sampling up to {customer_sample_size:,} customers")
     else:
-        print(f"      Processing all {profiles_count:,} customers")
-        customer_profiles_sample = customer_profiles
+        print("      Processing all customers")
+    customer_profiles_sample = sample_customers(customer_profiles, customer_sample_size, seed=42).persist()
     
     # =========================================================================
     # 4. PREPARE PRODUCT CATALOG WITH RULES (SPARK)
     # =========================================================================
-    print("\n   → Preparing product catalog and deriving rules from data...")
-    
-    product_cols = [c for c in df_products.columns]
-    product_data = df_products.select(product_cols).collect()
-    
-    def safe_convert(value):
-        if value is None:
-            return None
-        if isinstance(value, Decimal):
-            return float(value)
-        if isinstance(value, (int, float, str, bool)):
-            return value
-        return str(value)
-    
-    product_catalog = []
-    for row in product_data:
-        product_info = {'name': row.Product_Name}
-        for col in product_cols:
-            if col != 'Product_Name' and hasattr(row, col):
-                value = getattr(row, col)
-                converted_value = safe_convert(value)
-                if converted_value is not None:
-                    product_info[col.lower()] = converted_value
-        product_catalog.append(product_info)
-    
-    product_list_parts = []
-    for i, prod in enumerate(product_catalog):
-        parts = [f"{i+1}. {prod['name']}"]
-        if 'product_category' in prod:
-            parts.append(f"Category: {prod['product_category']}")
-        if 'target_audience' in prod:
-            parts.append(f"Target: {prod['target_audience']}")
-        if 'age_range' in prod:
-            parts.append(f"Age Range: {prod['age_range']}")
-        if 'minimum_balance' in prod:
-            try:
-                min_bal = float(prod['minimum_balance'])
-                parts.append(f"Min Balance: ₦{min_bal:,.0f}")
-            except (ValueError, TypeError):
-                parts.append(f"Min Balance: {prod['minimum_balance']}")
-        if 'interest_rate' in prod:
-            parts.append(f"Interest Rate: {prod['interest_rate']}")
-        for key, value in prod.items():
-            if key not in ['name', 'product_category', 'target_audience', 'age_range', 'minimum_balance', 'interest_rate']:
-                parts.append(f"{key.replace('_', ' ').title()}: {value}")
-        product_list_parts.append(" - ".join(parts))
-    
-    product_list = "\n".join(product_list_parts)
+    print("\n   → Preparing compact product table and rules...")
+    
+    # Numbered table of the fields the rules use (category, age range, target
+    # audience, minimum balance); the model answers with product numbers
+    product_data = df_products.collect()
+    product_text, all_product_names = product_table(product_data)
+    print(f"   Products in catalog: {len(all_product_names)}")
     
     # =========================================================================
-    # 5. BUILD DYNAMIC RULES FROM PRODUCT CATALOG
+    # 5. RULES
     # =========================================================================
-    print("   → Deriving business rules from product catalog...")
-    
-    derived_rules = []
-    for prod in product_catalog:
-        prod_name = prod['name']
-        if 'age_range' in prod and prod['age_range']:
-            age_range = str(prod['age_range'])
-            derived_rules.append(f"- {prod_name}: Only for customers within age range {age_range}")
-        if 'target_audience' in prod and prod['target_audience']:
-            target = prod['target_audience']
-            derived_rules.append(f"- {prod_name}: Designed for {target}")
-        if 'minimum_balance' in prod and prod['minimum_balance']:
-            try:
-                min_bal = float(prod['minimum_balance'])
-                if min_bal > 0:
-                    derived_rules.append(f"- {prod_name}: Requires minimum balance of ₦{min_bal:,.0f}")
-            except (ValueError, TypeError):
-                pass
-    
-    if additional_rules:
-        derived_rules.extend([f"- {rule}" for rule in additional_rules])
-    
-    general_rules = [
-        "- Match products to customer demographics (age, income, occupation)",
-        "- Do NOT recommend products similar to customer's current account",
-        "- Consider customer's financial capacity when recommending products",
-        "- Respect all age ranges and target audience specifications STRICTLY"
-    ]
-    
-    all_rules = general_rules + derived_rules
-    rules_text = "\n".join(all_rules) if all_rules else "- Match products appropriately to customer profiles"
-    
-    print(f"Generated {len(derived_rules)} product-specific rules from catalog")
+    # Per-product age/audience/balance rules are the product table's columns;
+    # only the general and custom rules are spelled out
+    rules = rules_text(additional_rules)
+    header = prompt_header(product_text, rules, top_n_products)
+    print(f"Prompt header: ~{estimate_tokens(header):,} tokens "
+          f"({len(additional_rules or [])} custom rules)")
     
     # =========================================================================
     # 6. USE OPENAI TO SCORE CUSTOMER-PRODUCT FIT
     # =========================================================================
     print("\n   → Using OpenAI to score product fit (intelligent matching)...")
     print("      This may take time depending on sample size...")
+    step = metrics.span('llm_scoring')
     
-    customer_profiles_list = customer_profiles_sample.collect()
-    total_batches = (len(customer_profiles_list) + batch_size - 1) // batch_size
+    # Only the pruned prompt columns are collected; one table row per customer
+    fields = customer_fields(df_custs.columns)
+    customer_profiles_list = customer_profiles_sample.select(
+        'Customer_ID', *[column for column, _ in fields]
+    ).collect()
     all_interactions = []
     
-    for batch_idx in range(0, len(customer_profiles_list), batch_size):
-        batch = customer_profiles_list[batch_idx:batch_idx + batch_size]
-        print(f"      Processing batch {batch_idx//batch_size + 1}/{total_batches}...", end='')
-        
-        customer_summaries = []
-        for cust in batch:
-            summary_parts = [f"Customer {cust.Customer_ID}:"]
-            for col in df_custs.columns:
-                if col != 'Customer_ID' and hasattr(cust, col):
-                    value = getattr(cust, col)
-                    converted_value = safe_convert(value)
-                    if converted_value is not None:
-                        summary_parts.append(f"- {col.replace('_', ' ').title()}: {converted_value}")
-            customer_summaries.append('\n'.join(summary_parts))
-        
-        prompt = f"""You are a banking product recommendation expert. Score how well each product fits each customer on a scale of 0-10.
-
-# CUSTOMERS
-{chr(10).join(customer_summaries)}
-
-# PRODUCTS
-{product_list}
-
-# TASK
-For each customer, score ONLY the top {top_n_products} most relevant products (0-10 scale).
-
-# MATCHING RULES
-{rules_text}
-
-Return ONLY valid JSON with this exact structure:
-{{
-  "matches": [
-    {{"customer_id": "C001", "product": "Exact Product Name", "score": 8}},
-    {{"customer_id": "C001", "product": "Another Product", "score": 7}}
-  ]
-}}
-
-Do NOT include any other text, only the JSON object."""
-        
-        try:
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {"role": "system", "content": "You are a banking product expert. Return only valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=temperature,
-                response_format={"type": "json_object"}
-            )
-            
-            response_text = response.choices[0].message.content.strip()
-            if response_text.startswith('```'):
-                response_text = response_text.split('```')[1]
-                if response_text.startswith('json'):
-                    response_text = response_text[4:]
-                response_text = response_text.strip()
-            
-            result = json.loads(response_text)
-            for match in result.get('matches', []):
+    customer_rows = {cust.Customer_ID: customer_row(cust, fields) for cust in customer_profiles_list}
+    
+    # Catalog eligibility (age range, balances, target audience) as a customers x
+    # products mask: each batch's product table lists only products eligible for
+    # one of its customers, and ineligible answers are dropped
+    eligible = eligibility_mask(customer_profiles_list, product_rules(product_data))
+    eligible_products = {cust.Customer_ID: row for cust, row in zip(customer_profiles_list, eligible)}
+    product_position = {name: i for i, name in enumerate(all_product_names)}
+    print(f"      Eligible customer-product pairs: {eligible.mean()*100:.1f}% "
+          f"({int((~eligible.any(axis=1)).sum()):,} customers with none)")
+    
+    # Content-addressed cache: a customer is only re-scored when its row,
+    # the catalog/rules, the model or the temperature changed
+    score_cache = ScoreCache(cache_path, max_entries=cache_max_entries) if cache_path else None
+    catalog_fingerprint = fingerprint(header, fields)
+    cache_keys = {
+        customer_id: fingerprint(row, catalog_fingerprint, model_name, temperature)
+        for customer_id, row in customer_rows.items()
+    }
+    cached_matches = score_cache.get_many(cache_keys.values()) if score_cache else {}
+    
+    def add_interactions(customer_id, matches):
+        for match in matches:
+            position = product_position.get(match.get('product'))
+            if position is None or not eligible_products[customer_id][position]:
+                continue
+            try:
                 all_interactions.append({
-                    'Customer_ID': match['customer_id'],
+                    'Customer_ID': customer_id,
                     'Product_Name': match['product'],
                     'interaction_score': float(match['score'])
                 })
-            
-            print(f" ({len(result.get('matches', []))} matches)")
-        except Exception as e:
-            print(f" Error: {e}")
+            except (KeyError, TypeError, ValueError):
+                continue
+    
+    customers_to_score = []
+    for customer_id, key in cache_keys.items():
+        if key in cached_matches:
+            add_interactions(customer_id, cached_matches[key])
+        elif eligible_products[customer_id].any():
+            customers_to_score.append(customer_id)
+    # Customers with the same eligible products are batched together so each
+    # batch's product table stays small
+    customers_to_score.sort(key=lambda customer_id: eligible_products[customer_id].tobytes())
+    
+    if score_cache:
+        cache_stats = score_cache.stats()
+        print(f"      Score cache: {cache_stats['hits']:,} hits, {cache_stats['misses']:,} misses "
+              f"({cache_stats['hit_rate']*100:.1f}% hit rate)")
+    
+    # As many customers per call as fit the token budget (prompt + expected answer);
+    # planned against the full catalog, an upper bound on each batch's header
+    batches = plan_batches({customer_id: customer_rows[customer_id] for customer_id in customers_to_score},
+                           header, top_n_products, token_budget=prompt_token_budget, max_batch_size=batch_size)
+    total_batches = len(batches)
+    
+    def score_batch(item):
+        batch, prompt = item
+        response = metrics.timed_completion(
+            client, 'scoring',
+            model=model_name,
+            messages=[
+                {"role": "system", "content": "You are a banking product expert. Return only valid JSON."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            response_format={"type": "json_object"}
+        )
+        return parse_matches(response.choices[0].message.content, batch, all_product_names)
+    
+    def batch_prompt(batch):
+        allowed = np.flatnonzero(np.logical_or.reduce([eligible_products[customer_id] for customer_id in batch]))
+        batch_header = prompt_header(product_table(product_data, include=allowed)[0], rules, top_n_products)
+        return build_prompt(batch_header, fields, [customer_rows[customer_id] for customer_id in batch])
+    
+    items = [(batch, batch_prompt(batch)) for batch in batches]
+    limiter = RateLimiter(requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute)
+    
+    completed_batches = 0
+    
+    def report_batch(batch_idx, result):
+        nonlocal completed_batches
+        completed_batches += 1
+        if isinstance(result, Exception):
+            print(f"      Batch {batch_idx + 1}/{total_batches} error: {result} ({completed_batches}/{total_batches} done)")
+        else:
+            print(f"      Batch {batch_idx + 1}/{total_batches}: {len(result)} matches ({completed_batches}/{total_batches} done)")
+    
+    print(f"      Dispatching {total_batches} batches for {len(customers_to_score):,} customers "
+          f"({max_concurrent_requests} in flight)...")
+    batch_results = dispatch_batches(
+        score_batch,
+        items,
+        max_in_flight=max_concurrent_requests,
+        limiter=limiter,
+        # Reserve prompt tokens plus the expected compact answer
+        token_cost=lambda item: estimate_tokens(item[1]) + completion_tokens(len(item[0]), top_n_products),
+        on_complete=report_batch
+    )
+    
+    # Results come back in batch order regardless of completion order.
+    # Only customers present in a successful batch's parsed answer are cached;
+    # customers the model left out (truncated or partial answers) count as
+    # misses and are re-scored on the next run instead of being cached as "no fit"
+    new_cache_entries = {}
+    omitted_customers = 0
+    for batch, matches in zip(batches, batch_results):
+        if isinstance(matches, Exception):
             continue
-        
-        if batch_idx + batch_size < len(customer_profiles_list):
-            time.sleep(rate_limit_delay)
+        in_batch = set(batch)
+        matches_by_customer = {}
+        for match in matches:
+            if isinstance(match, dict) and match.get('customer_id') in in_batch:
+                matches_by_customer.setdefault(match['customer_id'], []).append(
+                    {'product': match.get('product'), 'score': match.get('score')}
+                )
+        omitted_customers += len(in_batch) - len(matches_by_customer)
+        for customer_id, customer_matches in matches_by_customer.items():
+            add_interactions(customer_id, customer_matches)
+            new_cache_entries[cache_keys[customer_id]] = customer_matches
+    if omitted_customers:
+        print(f"      {omitted_customers:,} customers missing from the answers (not cached, retried next run)")
+    
+    if score_cache:
+        score_cache.put_many(new_cache_entries)
+        evicted = score_cache.evict()
+        score_cache.close()
+        print(f"      Cached {len(new_cache_entries):,} newly scored customers ({evicted:,} evicted)")
+    step.set(batches=total_batches, cached_customers=len(customer_rows) - len(customers_to_score),
+             omitted_customers=omitted_customers)
+    step.end(rows=len(customer_rows))
+    
+    if llm_scores_table and all_interactions:
+        spark.createDataFrame(all_interactions).write.mode("overwrite").option("overwriteSchema", "true") \
+            .saveAsTable(llm_scores_table)
+        print(f"      LLM scores saved → {llm_scores_table}")
     
     # =========================================================================
     # 7. CREATE TRANSACTION-BASED INTERACTIONS (WITH DESCRIPTION ANALYSIS)
@@ -462,122 +514,66 @@ Do NOT include any other text, only the JSON object."""
     if use_transaction_data and df_trans is not None:
         print("\n   → Computing transaction-based interaction scores...")
         print("      Analyzing transaction descriptions for product signals...")
+        step = metrics.span('transaction_scores')
         
-        # Get sampled customer IDs
-        sampled_customer_ids = [row.Customer_ID for row in customer_profiles_sample.select('Customer_ID').collect()]
-        df_trans_filtered = df_trans.filter(F.col('Customer_ID').isin(sampled_customer_ids))
+        # Restrict to sampled customers with a broadcast semi-join (no driver-side ID list).
+        # Persisted: read by the max-date aggregate and the keyword match below
+        df_trans_filtered = restrict_to_customers(df_trans, customer_profiles_sample).persist()
         
-        trans_filtered_count = df_trans_filtered.count()
-        print(f"      Filtered to {trans_filtered_count:,} transactions for sampled customers")
+        trans_filtered_count = None
+        if stats:
+            trans_filtered_count = df_trans_filtered.count()
+            print(f"      Filtered to {trans_filtered_count:,} transactions for sampled customers")
         
-        # Extract keywords from Account_Type
-        df_trans_with_keywords = df_trans_filtered.withColumn(
-            'account_keywords',
-            F.regexp_extract(F.lower(F.col('Account_Type')), 
-                            r'(current|savings|sme|student|premium|platinum|children|aspire)', 1)
-        )
+        # Every product matched by Account_Type / Description keywords, with its
+        # match weight, in one mapInPandas pass (dictionary built from product
+        # names and Key_Features; no keyword join)
+        keyword_matcher = KeywordMatcher.from_products(df_products)
+        text_columns = [c for c in TEXT_COLUMNS if c in df_trans_filtered.columns]
+        print(f"      Matching {', '.join(text_columns)} against {len(keyword_matcher.units):,} "
+              f"keyword units from {len(keyword_matcher.product_names)} products")
         
-        # Extract keywords from Description (if it exists)
-        if 'Description' in df_trans_filtered.columns:
-            print(" Description field found - using for enhanced matching")
-            df_trans_with_keywords = df_trans_with_keywords.withColumn(
-                'desc_keywords',
-                F.regexp_extract(F.lower(F.col('Description')), 
-                                r'(current|savings|sme|student|premium|platinum|children|aspire|loan|investment|card|transfer|deposit)', 1)
-            )
-            
-            # Combine keywords from both sources
-            df_trans_with_keywords = df_trans_with_keywords.withColumn(
-                'combined_keywords',
-                F.when(F.col('account_keywords') != '', F.col('account_keywords'))
-                 .when(F.col('desc_keywords') != '', F.col('desc_keywords'))
-                 .otherwise('')
-            )
+        # Decayed RFM (pinnacle.decayed_rfm): frequency and monetary are
+        # exponentially decayed sums of the match-weighted transactions and
+        # recency decays continuously, with configurable half-lives
+        print(f"      Computing decayed RFM scores (half-lives: frequency {frequency_half_life:g}d, "
+              f"monetary {monetary_half_life:g}d, recency {recency_half_life:g}d)...")
+        if rfm_state_prefix:
+            # Stored per-pair counters: only transactions after the state's watermark
+            # are matched and folded in, then the sample's pairs are decayed to it
+            rfm_run = update_rfm_state(spark, df_trans, keyword_matcher, rfm_state_prefix,
+                                       frequency_half_life=frequency_half_life,
+                                       monetary_half_life=monetary_half_life)
+            print(f"      RFM state '{rfm_state_prefix}': folded {rfm_run['rows_folded']:,} new transactions "
+                  f"(watermark {rfm_run['previous_watermark']} → {rfm_run['watermark']})")
+            transaction_interactions = rfm_scores_from_state(spark, rfm_state_prefix,
+                                                             customer_ids=customer_profiles_sample,
+                                                             recency_half_life=recency_half_life)
         else:
-            print("      ⚠ Description field not found - using Account_Type only")
-            df_trans_with_keywords = df_trans_with_keywords.withColumn(
-                'combined_keywords',
-                F.col('account_keywords')
-            )
-        
-        # Match transactions to products using combined keywords
-        transaction_product_matches = df_trans_with_keywords.join(
-            keyword_map.withColumnRenamed('product_keywords', 'combined_keywords'),
-            'combined_keywords',
-            'inner'
-        )
-        
-        matches_count = transaction_product_matches.count()
-        print(f"      Matched {matches_count:,} transactions to products")
-        
-        # Aggregate transaction metrics (RFM Analysis)
-        transaction_interactions = transaction_product_matches.groupBy('Customer_ID', 'Product_Name').agg(
-            F.count('*').alias('transaction_count'),
-            F.sum('Trans_Amount').alias('total_amount'),
-            F.max('Date').alias('last_transaction_date'),
-            F.avg('Trans_Amount').alias('avg_amount')
-        )
-        
-        # Calculate recency
-        max_date = df_trans_filtered.agg(F.max('Date')).collect()[0][0]
-        
-        transaction_interactions = transaction_interactions.withColumn(
-            'days_since_last',
-            F.datediff(F.lit(max_date), F.col('last_transaction_date'))
-        )
-        
-        # Create RFM-based interaction score (0-10 scale)
-        print("      Computing RFM (Recency, Frequency, Monetary) scores...")
-        
-        # Frequency score: normalize transaction count (log scale for better distribution)
-        transaction_interactions = transaction_interactions.withColumn(
-            'frequency_score',
-            F.least(F.lit(10.0), (F.log1p(F.col('transaction_count')) / F.log1p(F.lit(100.0))) * 10.0)
-        )
-        
-        # Monetary score: normalize total amount (log scale)
-        transaction_interactions = transaction_interactions.withColumn(
-            'monetary_score',
-            F.least(F.lit(10.0), (F.log1p(F.col('total_amount')) / F.log1p(F.lit(1000000.0))) * 10.0)
-        )
-        
-        # Recency score: decay based on days since last transaction
-        transaction_interactions = transaction_interactions.withColumn(
-            'recency_score',
-            F.when(F.col('days_since_last') <= 30, F.lit(10.0))
-             .when(F.col('days_since_last') <= 60, F.lit(8.0))
-             .when(F.col('days_since_last') <= 90, F.lit(6.0))
-             .when(F.col('days_since_last') <= 180, F.lit(4.0))
-             .when(F.col('days_since_last') <= 365, F.lit(2.0))
-             .otherwise(F.lit(0.5))
-        )
-        
-        # Combined RFM score with weights
-        transaction_interactions = transaction_interactions.withColumn(
-            'transaction_score',
-            (F.col('frequency_score') * 0.35) +   # 35% frequency
-            (F.col('monetary_score') * 0.35) +    # 35% monetary
-            (F.col('recency_score') * 0.30)       # 30% recency
-        )
-        
-        transaction_interactions = transaction_interactions.select(
-            'Customer_ID',
-            'Product_Name',
-            F.col('transaction_score').alias('trans_score'),
-            'transaction_count',
-            'total_amount',
-            'days_since_last'
-        )
-        
-        trans_count = transaction_interactions.count()
-        print(f"      Generated {trans_count:,} transaction-based interactions")
+            transaction_product_matches = match_transactions_spark(df_trans_filtered, keyword_matcher)
+            
+            if stats:
+                matches_count = transaction_product_matches.count()
+                print(f"      Matched {matches_count:,} transaction-product signals")
+            
+            # Scores decayed to the latest transaction date
+            max_date = df_trans_filtered.agg(F.max('Date')).collect()[0][0]
+            transaction_interactions = transaction_rfm_spark(transaction_product_matches, max_date,
+                                                             frequency_half_life=frequency_half_life,
+                                                             monetary_half_life=monetary_half_life,
+                                                             recency_half_life=recency_half_life)
         
-        # Show sample RFM scores
-        print("\n      Sample RFM scores:")
-        transaction_interactions.select(
-            'Customer_ID', 'Product_Name', 'trans_score', 
-            'transaction_count', 'total_amount', 'days_since_last'
-        ).show(5, truncate=False)
+        if stats:
+            trans_count = transaction_interactions.count()
+            print(f"      Generated {trans_count:,} transaction-based interactions")
+            
+            # Show sample RFM scores
+            print("\n      Sample RFM scores:")
+            transaction_interactions.select(
+                'Customer_ID', 'Product_Name', 'trans_score', 
+                'transaction_count', 'total_amount', 'days_since_last'
+            ).show(5, truncate=False)
+        step.end(rows=trans_filtered_count)
         
         # =========================================================================
         # 8. MERGE TRANSACTION AND OPENAI SCORES
@@ -620,8 +616,9 @@ Do NOT include any other text, only the JSON object."""
                 'interaction_score'
             )
             
-            combined_count = interaction_matrix.count()
-            print(f"      Combined into {combined_count:,} total interactions")
+            if stats:
+                combined_count = interaction_matrix.count()
+                print(f"      Combined into {combined_count:,} total interactions")
             print(f"      Weighting: {transaction_weight*100:.0f}% transactions + {(1-transaction_weight)*100:.0f}% OpenAI")
     
     else:
@@ -671,32 +668,43 @@ Do NOT include any other text, only the JSON object."""
             'left_anti'
         )
     
-    elapsed = time.time() - start_time
-    
     # =========================================================================
     # FINAL STATS
     # =========================================================================
-    total_interactions = interaction_matrix.count()
-    unique_customers = interaction_matrix.select('Customer_ID').distinct().count()
-    unique_products = interaction_matrix.select('Product_Name').distinct().count()
+    # The matrix is persisted for the caller; the first action materializes it,
+    # after which the persisted inputs are no longer read and can be released
+    interaction_matrix = interaction_matrix.persist()
+    if stats:
+        matrix_stats = frame_stats(interaction_matrix, distinct=['Customer_ID', 'Product_Name'])
+        total_interactions = matrix_stats['rows']
+    else:
+        total_interactions = interaction_matrix.count()
+    customer_profiles_sample.unpersist()
+    if use_transaction_data and df_trans is not None:
+        df_trans_filtered.unpersist()
+    stage.end(rows=total_interactions)
     
     print("\n" + "="*80)
     print("HYBRID INTERACTION MATRIX CREATED")
     print("="*80)
     print(f"Total interactions: {total_interactions:,}")
-    print(f"Unique customers: {unique_customers:,}")
-    print(f"Unique products: {unique_products:,}")
-    print(f"Products in catalog: {len(product_catalog)}")
+    if stats:
+        print(f"Unique customers: {matrix_stats['distinct_Customer_ID']:,}")
+        print(f"Unique products: {matrix_stats['distinct_Product_Name']:,}")
+    print(f"Products in catalog: {len(all_product_names)}")
     print(f"\n {model_name} + Transaction Data:")
-    print(f"   • {len(derived_rules)} rules derived from product catalog")
+    print(f"   • Compact product table with age, audience and balance rules ({total_batches} scoring calls)")
     print(f"   • {len(additional_rules) if additional_rules else 0} custom business rules")
     print(f"   • Customer demographics and attributes")
+    if score_cache:
+        print(f"   • Score cache: {cache_stats['hit_rate']*100:.1f}% hit rate "
+              f"({cache_stats['hits']:,} cached, {len(customers_to_score):,} scored)")
     if use_transaction_data:
         print(f"   • Real transaction history with descriptions (weight: {transaction_weight*100:.0f}%)")
         print(f"   • RFM analysis: Recency (30%) + Frequency (35%) + Monetary (35%)")
     print(f"\n Current products EXCLUDED from recommendations")
     print(f"Customers with current products: {len(customer_current_products):,}")
-    print(f"\n Completed in {elapsed:.1f} seconds")
+    print(f"\n Completed in {stage.seconds:.1f} seconds ({stage.rows_per_sec:,.0f} interactions/sec)")
     print(f"   Model used: {model_name}")
     print("="*80)
     
@@ -714,46 +722,88 @@ custom_rules = [
     "Savings products are suitable for customers with stable income"
 ]
 
+# Life events (salary jumps, relocations, business starts) from one pass over
+# the transactions; the prompt's customer table shows recent ones as "events"
+DETECT_LIFE_EVENTS = True
+life_events = None
+df_customers_scored = df_customers
+if DETECT_LIFE_EVENTS:
+    life_events = life_event_features_spark(df_transactions).persist()
+    df_customers_scored = df_customers.join(life_events.select('Customer_ID', 'life_events'), 'Customer_ID', 'left')
+    custom_rules.append("Recent life events (events column) signal new needs: salary_jump -> savings/investment, "
+                        "location_shift -> transport/insurance, business_start -> SME/business accounts")
+
 interaction_df, product_map, customer_current_products = create_customer_product_interactions(
-    df_customers,
+    df_customers_scored,
     df_products,
     df_transactions, 
     openai_api_key=openai_api_key,
     model_name=CONFIG['llm']['model'],
     customer_sample_size=1000,
-    batch_size=30,
+    prompt_token_budget=8000,        # Customers per call adapt to this budget
     temperature=CONFIG['llm']['temperature'],
     top_n_products=CONFIG['recommendation']['top_n'],
-    rate_limit_delay=0.5,
+    max_concurrent_requests=4,
+    requests_per_minute=500,
+    tokens_per_minute=200000,
+    cache_path="llm_score_cache.sqlite",
     additional_rules=custom_rules,
     use_transaction_data=True,
-    transaction_weight=0.7           # 70% transactions, 30% OpenAI
+    transaction_weight=0.7,          # 70% transactions, 30% OpenAI
+    frequency_half_life=180.0,       # Decayed RFM half-lives (days)
+    monetary_half_life=180.0,
+    recency_half_life=120.0,
+    rfm_state_prefix=None,           # e.g. "customer_rfm_state": fold only new transactions per run
+    llm_scores_table="llm_interaction_scores",  # Read by the streaming re-ranker
+    stats=COLLECT_STATS,
+    metrics=run_metrics
 )
 
-print("\n Sample Interactions:")
-interaction_df.show(10)
-
-print("\n Score Distribution:")
-interaction_df.describe(['interaction_score']).show()
-
-print("\n Top Products by Interaction Count:")
-top_products = interaction_df.groupBy('Product_Name').count().orderBy(F.desc('count')).limit(10)
-top_products.show()
+if COLLECT_STATS:
+    print("\n Sample Interactions:")
+    interaction_df.show(10)
+    
+    print("\n Score Distribution:")
+    interaction_df.describe(['interaction_score']).show()
+    
+    print("\n Top Products by Interaction Count:")
+    top_products = interaction_df.groupBy('Product_Name').count().orderBy(F.desc('count')).limit(10)
+    top_products.show()
 
+interaction_matrix_df = interaction_df
 interaction_df=interaction_df.toPandas()
 interaction_df.to_csv("interaction_df.csv", index=False)
+interaction_matrix_df.unpersist()
 
-def engineer_customer_features(df_trans, df_convs, df_custs=None, recency_days=90, customer_sample_size=1000):
+def engineer_customer_features(df_trans, df_convs, df_custs=None, recency_days=90, customer_sample_size=1000,
+                               incremental=False, state_prefix='customer_feature_state', stats=False,
+                               metrics=None, stream_batch_id=None, life_events=None):
     """
     Create comprehensive customer features for ML and LLM context.
     SPARK OPTIMIZED: Uses distributed processing
+    
+    With incremental=True the transaction aggregates come from mergeable
+    per-customer state (pinnacle.incremental_features) that is kept over the
+    full transaction table; each run folds in only transactions newer than
+    the stored watermark, and the sample is applied when reading the state.
+    With stream_batch_id set (incremental only), df_trans is a streaming
+    micro-batch: all of its rows are folded (a replayed batch is skipped) and
+    only the df_custs customers are read back from the state.
+    life_events (per-customer life-event features) are joined in before the
+    features are persisted.
+    
+    stats=True adds the diagnostic sample/filter counts (extra Spark jobs).
+    metrics (a RunMetrics) receives a 'features' span with one sub-span per step.
+    The returned features are persisted (they feed the prompts, ALS and serving).
     """
-    import time
     from pyspark.sql import Window
     from pyspark.sql.functions import col, count, sum as spark_sum, mean, stddev, expr
     from datetime import timedelta
     
-    start_time = time.time()
+    metrics = metrics or RunMetrics()
+    stage = metrics.span('features', incremental=incremental, stats=stats)
+    df_custs_sample = None
+    df_trans_all = df_trans
     
     print(f"🔨 Engineering customer features for {customer_sample_size if customer_sample_size else 'ALL'} customers (Spark)...")
     
@@ -762,137 +812,47 @@ def engineer_customer_features(df_trans, df_convs, df_custs=None, recency_days=9
     # =========================================================================
     if customer_sample_size and df_custs is not None:
         print(f"   → Sampling {customer_sample_size:,} customers from customer table...")
-        total_customers = df_custs.count()
-        sample_fraction = customer_sample_size / total_customers
-        df_custs_sample = df_custs.sample(fraction=sample_fraction, seed=42).limit(customer_sample_size)
-        sampled_customer_ids = [row.Customer_ID for row in df_custs_sample.select('Customer_ID').collect()]
-        sampled_customer_ids_set = set(sampled_customer_ids)
+        step = metrics.span('sample')
+        # Persisted: semi-joined to transactions and conversations, then joined for demographics
+        df_custs_sample = sample_customers(df_custs, customer_sample_size, seed=42).persist()
         
         # Filter transactions and conversations to only include sampled customers
-        df_trans = df_trans.filter(col('Customer_ID').isin(sampled_customer_ids))
-        df_convs = df_convs.filter(col('Customer_ID').isin(sampled_customer_ids))
+        df_trans = restrict_to_customers(df_trans, df_custs_sample)
+        df_convs = restrict_to_customers(df_convs, df_custs_sample)
         df_custs = df_custs_sample
         
-        print(f"      ✓ Sampled {len(sampled_customer_ids):,} customers")
-        print(f"      ✓ Filtered to {df_trans.count():,} transactions")
-        print(f"      ✓ Filtered to {df_convs.count():,} conversations")
-    
-    # =========================================================================
-    # PREPARE TRANSACTION DATA
-    # =========================================================================
-    print("   → Preparing transaction data...")
-    
-    # Ensure Date is date type
-    df_trans = df_trans.withColumn('Date', F.to_date(F.col('Date')))
-    
-    # Create debit/credit flags
-    df_trans = df_trans.withColumn('is_debit', F.when(F.col('Deb_or_credit') == 'D', 1).otherwise(0))
-    df_trans = df_trans.withColumn('is_credit', F.when(F.col('Deb_or_credit') == 'C', 1).otherwise(0))
-    df_trans = df_trans.withColumn('debit_amount', F.col('Trans_Amount') * F.col('is_debit'))
-    df_trans = df_trans.withColumn('credit_amount', F.col('Trans_Amount') * F.col('is_credit'))
-    
-    # Calculate recency
-    max_date = df_trans.agg(F.max('Date')).collect()[0][0]
-    recent_threshold = max_date - timedelta(days=recency_days)
-    
-    df_trans = df_trans.withColumn('is_recent', F.when(F.col('Date') >= F.lit(recent_threshold), 1).otherwise(0))
-    df_trans = df_trans.withColumn('recent_debit', F.col('debit_amount') * F.col('is_recent'))
-    
-    # =========================================================================
-    # 1. DATE RANGE FEATURES
-    # =========================================================================
-    print("   → Computing date range features...")
-    
-    date_ranges = df_trans.groupBy('Customer_ID').agg(
-        F.min('Date').alias('min_date'),
-        F.max('Date').alias('max_date')
-    )
-    
-    date_ranges = date_ranges.withColumn(
-        'date_span_days',
-        F.when(F.datediff(F.col('max_date'), F.col('min_date')) == 0, 1)
-         .otherwise(F.datediff(F.col('max_date'), F.col('min_date')))
-    )
-    
-    # =========================================================================
-    # 2. AGGREGATED FEATURES
-    # =========================================================================
-    print("   → Computing aggregated features...")
-    
-    agg_features = df_trans.groupBy('Customer_ID').agg(
-        # Financial metrics
-        F.sum('debit_amount').alias('total_debit'),
-        F.sum('credit_amount').alias('total_credit'),
-        F.mean('Trans_Amount').alias('avg_transaction'),
-        F.stddev('Trans_Amount').alias('std_transaction'),
-        F.expr('percentile_approx(Trans_Amount, 0.5)').alias('median_transaction'),
-        F.count('Trans_Amount').alias('transaction_count'),
-        
-        # Debit/Credit counts
-        F.sum('is_debit').alias('debit_count'),
-        F.sum('is_credit').alias('credit_count'),
-        
-        # Diversity metrics
-        F.countDistinct('Category').alias('unique_categories'),
-        F.countDistinct('Destination').alias('unique_destinations'),
+        sampled_count = None
+        if stats:
+            sampled_count = df_custs.count()
+            print(f"      ✓ Sampled {sampled_count:,} customers")
+            print(f"      ✓ Filtered to {df_trans.count():,} transactions")
+            print(f"      ✓ Filtered to {df_convs.count():,} conversations")
+        step.end(rows=sampled_count)
+    
+    if incremental:
+        # =====================================================================
+        # 1-4. TRANSACTION FEATURES FROM INCREMENTAL STATE
+        # =====================================================================
+        print("   → Folding new transactions into feature state...")
+        with metrics.span('state_update') as step:
+            state_stats = update_feature_state(spark, df_trans_all, state_prefix=state_prefix, recency_days=recency_days,
+                                               batch_id=stream_batch_id)
+            step.set_rows(state_stats['rows_folded'])
+        print(f"      ✓ Folded {state_stats['rows_folded']:,} transactions "
+              f"(watermark {state_stats['previous_watermark']} → {state_stats['watermark']})")
         
-        # Recency
-        F.sum('is_recent').alias('recent_transaction_count'),
-        F.sum('recent_debit').alias('recent_debit'),
-        
-        # Account type (most common using first)
-        F.first('Account_Type').alias('current_account')
-    )
-    
-    # =========================================================================
-    # 3. TOP CATEGORY FEATURES
-    # =========================================================================
-    print("   → Computing category preferences...")
-    
-    # Filter debit transactions
-    debit_txns = df_trans.filter(F.col('is_debit') == 1)
-    
-    # Top category per customer (most frequent)
-    window_spec = Window.partitionBy('Customer_ID', 'Category')
-    category_counts = debit_txns.groupBy('Customer_ID', 'Category').agg(
-        F.count('*').alias('category_count')
-    )
-    
-    window_rank = Window.partitionBy('Customer_ID').orderBy(F.desc('category_count'))
-    top_categories = category_counts.withColumn('rank', F.row_number().over(window_rank)) \
-        .filter(F.col('rank') == 1) \
-        .select('Customer_ID', F.col('Category').alias('top_category'))
-    
-    # Top category spending amount
-    category_amounts = debit_txns.groupBy('Customer_ID', 'Category').agg(
-        F.sum('Trans_Amount').alias('category_amount')
-    )
-    
-    window_rank_amount = Window.partitionBy('Customer_ID').orderBy(F.desc('category_amount'))
-    top_category_amounts = category_amounts.withColumn('rank', F.row_number().over(window_rank_amount)) \
-        .filter(F.col('rank') == 1) \
-        .select('Customer_ID', F.col('category_amount').alias('top_category_amount'))
-    
-    # Category concentration (simplified - top category count / total count)
-    category_concentration = category_counts.join(
-        debit_txns.groupBy('Customer_ID').agg(F.count('*').alias('total_count')),
-        'Customer_ID'
-    ).withColumn('category_concentration', F.col('category_count') / F.col('total_count'))
-    
-    window_rank_conc = Window.partitionBy('Customer_ID').orderBy(F.desc('category_concentration'))
-    category_concentration = category_concentration.withColumn('rank', F.row_number().over(window_rank_conc)) \
-        .filter(F.col('rank') == 1) \
-        .select('Customer_ID', 'category_concentration')
-    
-    # =========================================================================
-    # 4. MERGE BASE FEATURES
-    # =========================================================================
-    print("   → Merging all features...")
-    
-    df_features = agg_features.join(date_ranges.select('Customer_ID', 'date_span_days'), 'Customer_ID', 'left')
-    df_features = df_features.join(top_categories, 'Customer_ID', 'left')
-    df_features = df_features.join(top_category_amounts, 'Customer_ID', 'left')
-    df_features = df_features.join(category_concentration, 'Customer_ID', 'left')
+        df_features = transaction_features_from_state(
+            spark,
+            state_prefix=state_prefix,
+            recency_days=recency_days,
+            customer_ids=df_custs if (customer_sample_size or stream_batch_id is not None) and df_custs is not None else None
+        )
+    else:
+        # =====================================================================
+        # 1-4. DATE RANGE, AGGREGATED AND CATEGORY FEATURES (ONE SHUFFLE)
+        # =====================================================================
+        print("   → Computing transaction features in a single grouped pass...")
+        df_features = aggregate_transaction_features(df_trans, recency_days=recency_days)
     
     # Fill nulls
     df_features = df_features.fillna({
@@ -923,8 +883,8 @@ def engineer_customer_features(df_trans, df_convs, df_custs=None, recency_days=9
     # =========================================================================
     print("   → Adding conversation features...")
     
-    conv_count = df_convs.count()
-    if conv_count > 0:
+    # Only emptiness matters here: take(1) stops at the first row instead of counting all
+    if df_convs.take(1):
         conv_features = df_convs.groupBy('Customer_ID').agg(
             F.count('Category').alias('conversation_count'),
             F.first('Category').alias('top_inquiry_category'),
@@ -980,12 +940,20 @@ def engineer_customer_features(df_trans, df_convs, df_custs=None, recency_days=9
         (F.col('conversation_count') * 5 * 0.3)
     )
     
-    elapsed_time = time.time() - start_time
+    if life_events is not None:
+        df_features = df_features.join(life_events, 'Customer_ID', 'left')
+    
+    # Transformations above are lazy; the count runs the feature plan and fills the cache
+    df_features = df_features.persist()
     feature_count = df_features.count()
+    if df_custs_sample is not None:
+        df_custs_sample.unpersist()
     col_count = len(df_features.columns)
+    stage.set(features=col_count)
+    stage.end(rows=feature_count)
     
     print(f"✅ Engineered {feature_count:,} customer profiles with {col_count} features")
-    print(f"   ⚡ Completed in {elapsed_time:.2f} seconds ({feature_count/elapsed_time:.0f} customers/sec)")
+    print(f"   ⚡ Completed in {stage.seconds:.2f} seconds ({stage.rows_per_sec:.0f} customers/sec)")
     
     return df_features
 
@@ -1001,14 +969,23 @@ customer_features = engineer_customer_features(
     df_conversations,     # Conversations table (filtered by sampled customers)
     df_customers,         # CUSTOMERS TABLE - SOURCE TABLE for sampling
     recency_days=CONFIG['feature_engineering']['recency_days'],
-    customer_sample_size=1000  # Sample 1000 customers
+    customer_sample_size=1000,  # Sample 1000 customers
+    incremental=False,          # True = fold only new transactions into stored state
+    stats=COLLECT_STATS,
+    metrics=run_metrics,
+    life_events=life_events     # Joined before the features are persisted
 )
 
-print("\n Customer Features Sample:")
-customer_features.show(10, truncate=False)
+if life_events is not None:
+    # Cached for the interaction prompts and the feature join; both have run
+    life_events.unpersist()
 
-print("\n Feature Statistics:")
-customer_features.describe().show()
+if COLLECT_STATS:
+    print("\n Customer Features Sample:")
+    customer_features.show(10, truncate=False)
+    
+    print("\n Feature Statistics:")
+    customer_features.describe().show()
 
 print("\n Feature Columns:")
 print(f"Total columns: {len(customer_features.columns)}")
@@ -1032,6 +1009,21 @@ from openai import OpenAI
 import pyspark.sql.functions as F
 import numpy as np
 from datetime import datetime
+from pinnacle.artifacts import model_from_lookups, save_model
+from pinnacle.audience import AudienceIndex, user_attributes
+from pinnacle.decayed_rfm import DecayedRFM, decayed_partials
+from pinnacle.eligibility import ELIGIBILITY_COLUMNS, aligned_mask, product_rules
+from pinnacle.evaluation import RANKING_METRICS, ranking_metrics
+from pinnacle.explanations import generate_grouped_explanations
+from pinnacle.fold_in import FoldInRecommender, recommend_by_name
+from pinnacle.implicit_als import train_from_config
+from pinnacle.keyword_match import KeywordMatcher, match_transactions_spark
+from pinnacle.llm_dispatch import RateLimiter
+from pinnacle.output_tables import customer_versions, upsert_recommendations
+from pinnacle.sampling import restrict_to_customers
+from pinnacle.scoring import factors_to_array, top_n_recommendations
+from pinnacle.serving import RecommendationStore, load_serving_frame
+from pinnacle.streaming import StreamingRanker, TableSink, load_stream_state, stream_transactions
 
 # ============================================================================  
 # CONFIGURATION  
@@ -1047,19 +1039,46 @@ TOP_N = 5
 ALS_RANK = 20
 ALS_REG_PARAM = 0.1
 ALS_MAX_ITER = 20
+ALS_ALPHA = None           # Implicit confidence scaling (None for explicit ALS)
+ALS_BACKEND = CONFIG['als']['backend']
+if ALS_BACKEND == 'implicit':
+    # Confidence-weighted implicit feedback (1 + alpha * interaction_score), multi-threaded on the driver
+    ALS_RANK = CONFIG['als']['factors']
+    ALS_REG_PARAM = CONFIG['als']['regularization']
+    ALS_MAX_ITER = CONFIG['als']['iterations']
+    ALS_ALPHA = CONFIG['als']['alpha']
+SCORING_BLOCK_SIZE = 4096  # Users scored per matrix multiply in Step 4
+EVAL_K = 10                # Cutoff for the held-out ranking metrics
+APPLY_ELIGIBILITY = True   # Drop products the catalog's age/balance/audience rules exclude from the top-N
+AUDIENCE_TOP_K = 5000       # Customers kept per product in the audience index
+AUDIENCE_INDEX_PATH = "audience_index.npz"
+MODEL_ARTIFACT_DIR = "als_model"    # Memory-mapped factors + ID indexes for scoring/serving processes
+# Streaming mode: re-rank customers as their transactions land (see the STREAMING section)
+STREAM_TRANSACTIONS = False
+STREAM_SOURCE = TRANSACTIONS_TABLE  # Table (streaming read of its appends) or a file-drop directory
+STREAM_CHECKPOINT = "/tmp/pinnacle_stream/checkpoint"
+STREAM_STATE_DIR = "/tmp/pinnacle_stream/state"
+FEATURE_STATE_PREFIX = "customer_feature_state"  # Incremental feature state the stream folds batches into
+STREAM_TRIGGER_SECONDS = 60
+LLM_SCORES_TABLE = "llm_interaction_scores"
 
 INTERACTIONS_DF = interaction_df
 CUSTOMERS_DF = customer_features
 PRODUCTS_DF = product_map
 
-# For testing - limit to N customers
-SAMPLE_CUSTOMERS = 20
+# Customers to explain (None = all). Grouped mode keeps LLM calls bounded by
+# the number of distinct (product, rank, occupation, income, age band) profiles.
+SAMPLE_CUSTOMERS = None
+EXPLANATION_MODE = "grouped"        # "grouped" or "per_customer"
+EXPLANATION_GROUP_BATCH_SIZE = 10   # Distinct profiles packed per LLM request
 
 # ============================================================================  
 # STEP 1: CLEAN DATA  
 # ============================================================================  
 
 print("\n📋 Step 1: Preparing data...")
+recommendation_span = run_metrics.span('recommendations')
+step = run_metrics.span('prepare')
 
 interaction_df = INTERACTIONS_DF
 
@@ -1077,7 +1096,10 @@ interaction_df = (interaction_df
     .withColumn("interaction_score", col("interaction_score").cast("double"))
 )
 
-print(f"Cleaned: {interaction_df.count():,} interactions")
+cleaned_count = None
+if COLLECT_STATS:
+    cleaned_count = interaction_df.count()
+    print(f"Cleaned: {cleaned_count:,} interactions")
 
 # Deduplicate per Customer-Product
 w_dedup = Window.partitionBy("Customer_ID", "Product_Name").orderBy(desc("interaction_score"))
@@ -1095,58 +1117,81 @@ customer_features = CUSTOMERS_DF
 
 print("\n Step 2: Creating indexes...")
 
+# Persisted: the lookups are joined for training, recommendations, fold-in and audiences
 customer_lookup = (interaction_df
     .select("Customer_ID")
     .distinct()
     .withColumn("user_int", (row_number().over(Window.orderBy("Customer_ID")) - 1).cast("int"))
+    .persist()
 )
 
 product_lookup = (interaction_df
     .select("Product_Name")
     .distinct()
     .withColumn("item_int", (row_number().over(Window.orderBy("Product_Name")) - 1).cast("int"))
+    .persist()
 )
 
-print(f" Customers: {customer_lookup.count():,}")
-print(f" Products: {product_lookup.count():,}")
+if COLLECT_STATS:
+    print(f" Customers: {customer_lookup.count():,}")
+    print(f" Products: {product_lookup.count():,}")
+step.end(rows=cleaned_count)
 
-# Indexed interactions
+# Indexed interactions (persisted for the train/test split, fit and evaluation)
 idx_df = (interaction_df
     .join(customer_lookup, "Customer_ID", "inner")
     .join(product_lookup, "Product_Name", "inner")
     .select("Customer_ID", "Product_Name", "interaction_score", "user_int", "item_int")
+    .persist()
 )
 
 # ============================================================================  
 # STEP 3: TRAIN ALS  
 # ============================================================================  
 
-print("\n Step 3: Training ALS...")
+print(f"\n Step 3: Training ALS ({ALS_BACKEND})...")
 
+step = run_metrics.span('train', backend=ALS_BACKEND, rank=ALS_RANK, reg_param=ALS_REG_PARAM,
+                        max_iter=ALS_MAX_ITER)
 train_df, test_df = idx_df.randomSplit([0.8, 0.2], seed=42)
+# Split pairs for the ranking metrics after Step 4 (collected while idx_df is persisted)
+train_pairs = train_df.select("user_int", "item_int").toPandas()
+test_pairs = test_df.select("user_int", "item_int").toPandas()
+
+if ALS_BACKEND == 'implicit':
+    # Preferences, not ratings: RMSE against interaction_score does not apply
+    user_ids, user_factor_matrix, item_ids, item_factor_matrix = train_from_config(
+        train_df, CONFIG['als'], num_threads=CONFIG['als']['num_threads'], random_state=42)
+    rmse = None
+    idx_df.unpersist()
+    step.end()
+    print(f" Trained on the driver: {len(user_ids):,} users, {len(item_ids):,} items")
+else:
+    als = ALS(
+        userCol="user_int",
+        itemCol="item_int",
+        ratingCol="interaction_score",
+        implicitPrefs=False,
+        nonnegative=True,
+        coldStartStrategy="drop",
+        rank=ALS_RANK,
+        regParam=ALS_REG_PARAM,
+        maxIter=ALS_MAX_ITER,
+        seed=42
+    )
+    als_model = als.fit(train_df)
 
-als = ALS(
-    userCol="user_int",
-    itemCol="item_int",
-    ratingCol="interaction_score",
-    implicitPrefs=False,
-    nonnegative=True,
-    coldStartStrategy="drop",
-    rank=ALS_RANK,
-    regParam=ALS_REG_PARAM,
-    maxIter=ALS_MAX_ITER,
-    seed=42
-)
-als_model = als.fit(train_df)
-
-pred_test = als_model.transform(test_df)
-evaluator = RegressionEvaluator(
-    metricName="rmse",
-    labelCol="interaction_score",
-    predictionCol="prediction"
-)
-rmse = evaluator.evaluate(pred_test)
-print(f" Trained. RMSE: {rmse:.4f}")
+    pred_test = als_model.transform(test_df)
+    evaluator = RegressionEvaluator(
+        metricName="rmse",
+        labelCol="interaction_score",
+        predictionCol="prediction"
+    )
+    rmse = evaluator.evaluate(pred_test)
+    idx_df.unpersist()
+    step.set(rmse=rmse)
+    step.end()
+    print(f" Trained. RMSE: {rmse:.4f}")
 
 # ============================================================================  
 # STEP 4: GENERATE RECOMMENDATIONS (UNITY CATALOG COMPATIBLE)
@@ -1155,40 +1200,49 @@ print(f" Trained. RMSE: {rmse:.4f}")
 print("\n Step 4: Generating recommendations...")
 
 # Extract factor matrices (Unity Catalog safe)
-user_factors = als_model.userFactors.collect()
-item_factors = als_model.itemFactors.collect()
-
-# Build lookup dictionaries
-user_factor_dict = {row['id']: row['features'] for row in user_factors}
-item_factor_dict = {row['id']: row['features'] for row in item_factors}
-
-print(f" Users: {len(user_factor_dict):,}, Items: {len(item_factor_dict):,}")
-
-# Compute recommendations manually in Python (bypasses Unity Catalog restrictions)
-recs_list = []
-for user_int, user_vec in user_factor_dict.items():
-    user_array = np.array(user_vec)
-    scores = []
-    
-    for item_int, item_vec in item_factor_dict.items():
-        item_array = np.array(item_vec)
-        score = np.dot(user_array, item_array)
-        scores.append((item_int, float(score)))
-    
-    # Sort by score and get top N
-    scores.sort(key=lambda x: x[1], reverse=True)
-    top_items = scores[:TOP_N]
-    
-    for rank, (item_int, als_score) in enumerate(top_items, start=1):
-        recs_list.append({
-            'user_int': int(user_int),
-            'item_int': int(item_int),
-            'als_score': float(als_score),
-            'rank': rank
-        })
+step = run_metrics.span('score', block_size=SCORING_BLOCK_SIZE)
+if ALS_BACKEND == 'spark':
+    user_ids, user_factor_matrix = factors_to_array(als_model.userFactors.collect())
+    item_ids, item_factor_matrix = factors_to_array(als_model.itemFactors.collect())
+
+print(f" Users: {len(user_ids):,}, Items: {len(item_ids):,}")
+
+# Catalog eligibility in factor order: ineligible products never take a top-N slot
+eligible = None
+if APPLY_ELIGIBILITY:
+    eligibility_customers = (df_customers
+        .join(customer_lookup.select("Customer_ID"), "Customer_ID", "left_semi")
+        .select("Customer_ID", *[c for c in ELIGIBILITY_COLUMNS if c in df_customers.columns]))
+    eligible = aligned_mask(eligibility_customers, customer_lookup, user_ids,
+                            product_rules(df_products), product_lookup, item_ids)
+    step.set(eligible_pair_pct=float(eligible.mean() * 100))
+    print(f" Eligible customer-product pairs: {eligible.mean()*100:.1f}%")
+
+# Blocked matrix multiply + argpartition top-N in Python (bypasses Unity Catalog restrictions)
+recs_list = top_n_recommendations(
+    user_ids, user_factor_matrix,
+    item_ids, item_factor_matrix,
+    top_n=TOP_N,
+    block_size=SCORING_BLOCK_SIZE,
+    eligible=eligible
+)
 
+step.end(rows=len(user_ids))
 print(f"  ✓ Computed {len(recs_list):,} recommendations")
 
+# Held-out ranking quality: training items are excluded from each customer's ranking
+step = run_metrics.span('evaluate', k=EVAL_K)
+ranking = ranking_metrics(
+    user_ids, user_factor_matrix, item_ids, item_factor_matrix,
+    test_pairs["user_int"].to_numpy(), test_pairs["item_int"].to_numpy(),
+    train_pairs["user_int"].to_numpy(), train_pairs["item_int"].to_numpy(),
+    k=EVAL_K
+)
+step.set(**{f"{name}_at_k": ranking[name] for name in RANKING_METRICS})
+step.end(rows=ranking['users'])
+print(f"  ✓ Held-out @{EVAL_K} over {ranking['users']:,} customers: "
+      + ", ".join(f"{name} {ranking[name]:.4f}" for name in RANKING_METRICS))
+
 # Create DataFrame from collected data
 rec_schema = StructType([
     StructField("user_int", IntegerType(), True),
@@ -1206,17 +1260,31 @@ als_recommendations = (als_flat
 
 # Serverless-safe confidence score (fixed min/max)
 min_score = 0.0
-max_score = 5.0  # Expected ALS score range
+max_score = 5.0 if ALS_BACKEND == 'spark' else 1.0  # Expected score range (ratings / implicit preferences)
 als_recommendations = als_recommendations.withColumn(
     "confidence_score_pct",
     ((col("als_score") - lit(min_score)) / lit(max_score - min_score) * 100)
 )
 
+# Model artifact: float32 factor matrices with sorted Customer_ID / Product_Name
+# index files, opened with open_model() (np.load mmap) by scoring and serving
+step = run_metrics.span('save_model')
+save_model(
+    MODEL_ARTIFACT_DIR,
+    *model_from_lookups(user_ids, user_factor_matrix, item_ids, item_factor_matrix,
+                        customer_lookup, product_lookup),
+    backend=ALS_BACKEND, rank=ALS_RANK, reg_param=ALS_REG_PARAM, max_iter=ALS_MAX_ITER,
+    alpha=ALS_ALPHA, score_range=[min_score, max_score]
+)
+step.end(rows=len(user_ids))
+print(f"  ✓ Model artifact saved → {MODEL_ARTIFACT_DIR}")
+
 # ============================================================================  
 # SAVE TABLE 1: ALS RECOMMENDATIONS  
 # ============================================================================  
 
 print("\n Saving ALS table...")
+step = run_metrics.span('save_als')
 
 # Collect and recreate to break lineage completely
 als_data = als_recommendations.select(
@@ -1241,14 +1309,135 @@ als_output_data = [{
 
 als_output = spark.createDataFrame(als_output_data, schema=als_output_schema).orderBy("Customer_ID", "rank")
 
-als_output.write.mode("overwrite").option("overwriteSchema", "true").saveAsTable("als_recommendations_table")
-print("Table 1 saved: als_recommendations_table")
+# Only customers whose top-N products changed are merged, plus rows whose confidence
+# drifted past the tolerance; the version is the cache key downstream
+SCORE_TOLERANCE_PCT = CONFIG['recommendation']['score_tolerance_pct']
+als_write = upsert_recommendations(spark, als_output, "als_recommendations_table",
+                                   tolerances={'confidence_score_pct': SCORE_TOLERANCE_PCT})
+step.end(rows=als_write.rows_written)
+print(f"Table 1 saved: als_recommendations_table v{als_write.version} "
+      f"({als_write.changed:,} customers changed, {als_write.removed:,} removed, {als_write.unchanged:,} unchanged, "
+      f"{als_write.refreshed:,} with refreshed scores)")
+
+# ============================================================================  
+# FOLD-IN: RECOMMENDATIONS FOR NEW OR CHANGED CUSTOMERS (NO RETRAIN)  
+# ============================================================================  
+
+# Solves the ALS least-squares step for one customer against the frozen item
+# factors, so sign-ups missing from customer_lookup get a top-N immediately
+# (the implicit backend's confidence-weighted step when ALS_ALPHA is set)
+fold_in_recommender = FoldInRecommender(item_ids, item_factor_matrix, reg_param=ALS_REG_PARAM,
+                                        nonnegative=(ALS_BACKEND == 'spark'), implicit_alpha=ALS_ALPHA)
+product_index = {row['Product_Name']: row['item_int'] for row in product_lookup.collect()}
+
+def recommend_new_customer(product_scores, top_n=TOP_N):
+    """Top-N for a customer's fresh {Product_Name: interaction_score} vector"""
+    return recommend_by_name(fold_in_recommender, product_scores, product_index, top_n=top_n)
+
+print(f" Fold-in ready: rank {ALS_RANK}, regParam {ALS_REG_PARAM}, {len(product_index):,} products")
+
+# ============================================================================  
+# AUDIENCE INDEX: TOP CUSTOMERS PER PRODUCT (CAMPAIGN TARGETING)  
+# ============================================================================  
+
+# Reverse top-K: best-scoring customers per product, stored with the model so
+# audience building is an index lookup instead of a scan of every customer
+step = run_metrics.span('audience_index', top_k=AUDIENCE_TOP_K)
+audience_customer_ids, audience_ages, audience_states = user_attributes(user_ids, customer_lookup, customer_features)
+audience_index = AudienceIndex.build(
+    user_ids, user_factor_matrix, item_ids, item_factor_matrix,
+    audience_customer_ids, audience_ages, audience_states,
+    top_k=AUDIENCE_TOP_K, score_range=(min_score, max_score)
+)
+audience_index.save(AUDIENCE_INDEX_PATH)
+step.end(rows=len(item_ids))
+
+def product_audience(product_name, limit=100, state=None, min_age=None, max_age=None, min_confidence=None):
+    """Best-scoring customers for a product, with optional state/age/confidence filters"""
+    return audience_index.audience(product_index[product_name], limit=limit, state=state,
+                                   min_age=min_age, max_age=max_age, min_confidence=min_confidence)
+
+print(f" Audience index ready: top {audience_index.top_k:,} customers per product → {AUDIENCE_INDEX_PATH}")
+
+# ============================================================================  
+# STREAMING: RE-RANK CUSTOMERS AS TRANSACTIONS LAND  
+# ============================================================================  
+
+# Each micro-batch folds its transactions into the decayed RFM counters, re-blends
+# the interaction scores of the customers involved, folds them into the current
+# item factors and swaps only their rows in als_recommendations_table; their
+# features are recomputed and swapped in customer_features_table
+if STREAM_TRANSACTIONS:
+    stream_matcher = KeywordMatcher.from_products(df_products)
+    stream_rfm, stream_last_batch = load_stream_state(STREAM_STATE_DIR)
+    if stream_rfm is None:
+        # Counters over the full matched history, as of its latest day
+        stream_epoch = df_transactions.agg(F.datediff(F.max("Date"), F.lit("1970-01-01"))).collect()[0][0]
+        stream_rfm = DecayedRFM.from_frame(
+            decayed_partials(match_transactions_spark(df_transactions, stream_matcher), stream_epoch).toPandas(),
+            epoch=stream_epoch)
+    stream_llm_scores = spark.table(LLM_SCORES_TABLE).toPandas() if spark.catalog.tableExists(LLM_SCORES_TABLE) else None
+    product_of_item = {item: name for name, item in product_index.items()}
+    stream_ranker = StreamingRanker(
+        stream_matcher, stream_rfm, [product_of_item.get(int(item)) for item in item_ids],
+        item_factor_matrix, reg_param=ALS_REG_PARAM, nonnegative=(ALS_BACKEND == 'spark'), implicit_alpha=ALS_ALPHA,
+        llm_scores=stream_llm_scores, customers=df_customers.toPandas(), products=df_products.toPandas(),
+        top_n=TOP_N, eligibility=APPLY_ELIGIBILITY, score_range=(min_score, max_score)
+    )
+    stream_ranker.last_batch_id = stream_last_batch
+    features_sink = TableSink(spark, "customer_features_table")
+    recency_days = CONFIG['feature_engineering']['recency_days']
+
+    # Batches are folded into the incremental feature state; the history is
+    # read once, only when that state (or the life-event state) does not exist yet
+    if load_watermark(spark, FEATURE_STATE_PREFIX) is None:
+        update_feature_state(spark, df_transactions, state_prefix=FEATURE_STATE_PREFIX, recency_days=recency_days)
+    stream_detector_path = os.path.join(STREAM_STATE_DIR, "life_events.npz")
+    stream_detector, stream_detector_batch = None, stream_last_batch
+    if DETECT_LIFE_EVENTS and os.path.exists(stream_detector_path):
+        stream_detector = LifeEventDetector.load(stream_detector_path)
+        with np.load(stream_detector_path) as saved:
+            stream_detector_batch = int(saved['last_batch_id']) if 'last_batch_id' in saved.files else stream_last_batch
+    elif DETECT_LIFE_EVENTS:
+        stream_detector = LifeEventDetector()
+        stream_detector.update(df_transactions.select(*[c for c in LIFE_EVENT_COLUMNS if c in df_transactions.columns])
+                               .toPandas())
+
+    def refresh_customer_features(batch_df, customer_ids, batch_id):
+        """Feature rows of the batch's customers only, from the incremental feature state"""
+        global stream_detector_batch
+        ids = spark.createDataFrame([(c,) for c in customer_ids], "Customer_ID string")
+        features = engineer_customer_features(
+            batch_df, restrict_to_customers(df_conversations, ids), restrict_to_customers(df_customers, ids),
+            recency_days=recency_days, customer_sample_size=None, incremental=True,
+            state_prefix=FEATURE_STATE_PREFIX, stream_batch_id=batch_id)
+        rows = features
+        if stream_detector is not None:
+            if batch_id > stream_detector_batch:  # A batch replayed after a restart is already folded in
+                stream_detector.update(batch_df.select(*[c for c in LIFE_EVENT_COLUMNS if c in batch_df.columns])
+                                       .toPandas())
+                os.makedirs(STREAM_STATE_DIR, exist_ok=True)
+                stream_detector.save(stream_detector_path, last_batch_id=np.int64(batch_id))
+                stream_detector_batch = batch_id
+            events = spark.createDataFrame(stream_detector.features(customer_ids=customer_ids))
+            rows = features.join(events, 'Customer_ID', 'left')
+        features_sink.upsert(rows.toPandas(), customer_ids)
+        features.unpersist()
+
+    stream_query = stream_transactions(
+        spark, STREAM_SOURCE, stream_ranker, TableSink(spark, "als_recommendations_table"),
+        checkpoint_location=STREAM_CHECKPOINT, state_directory=STREAM_STATE_DIR,
+        on_batch=refresh_customer_features,
+        source_format='table' if STREAM_SOURCE == TRANSACTIONS_TABLE else 'parquet',
+        trigger_seconds=STREAM_TRIGGER_SECONDS
+    )
+    print(f" Streaming from {STREAM_SOURCE} every {STREAM_TRIGGER_SECONDS}s (query {stream_query.id})")
 
 # ============================================================================  
 # STEP 5: GENERATE LLM EXPLANATIONS (IMPROVED WITH ERROR HANDLING)
 # ============================================================================  
 
-print(f"\n Step 5: Generating LLM explanations (limiting to {SAMPLE_CUSTOMERS} customers)...")
+print(f"\n Step 5: Generating LLM explanations ({SAMPLE_CUSTOMERS or 'all'} customers, {EXPLANATION_MODE} mode)...")
 
 # Initialize OpenAI client
 client = OpenAI(api_key=OPENAI_API_KEY)
@@ -1302,7 +1491,8 @@ Example style: "This customer's profile as a {occupation} in the {income} bracke
 
 DO NOT use second-person language like "you" or "your"."""
         
-        response = client.chat.completions.create(
+        response = run_metrics.timed_completion(
+            client, 'explanation',
             model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": "You are a professional banking analytics assistant providing product recommendation rationale to account managers. Always use third-person language."},
@@ -1322,59 +1512,119 @@ DO NOT use second-person language like "you" or "your"."""
         # Professional fallback for account managers
         return f"This customer's profile and banking behavior patterns indicate strong alignment with {product_name}. Recommendation confidence: {confidence_pct:.1f}%."
 
-# Get top N customers and their top 3 recommendations
-print(f" Selecting top {SAMPLE_CUSTOMERS} customers...")
-top_customers = (als_recommendations
-    .select("Customer_ID")
-    .distinct()
-    .limit(SAMPLE_CUSTOMERS)
-    .collect()
-)
-top_customer_ids = [row['Customer_ID'] for row in top_customers]
+# Only the profile fields the explanation prompts use are brought to the driver
+profile_columns = [c for c in ["Customer_ID", "Age", "Gender", "Occupation", "Income_Bracket",
+                               "Account_Type", "Location"] if c in customer_features.columns]
 
-# Filter to only these customers, top 3 each
-top_3_recs = (als_recommendations
-    .filter(col("Customer_ID").isin(top_customer_ids))
-    .filter(col("rank") <= 3)
-    .collect()
-)
+# Get top N customers and their top 3 recommendations
+if SAMPLE_CUSTOMERS is None:
+    print(" Selecting all customers...")
+    top_3_recs = list(als_recommendations.filter(col("rank") <= 3).toLocalIterator())
+    top_customer_ids = sorted({row['Customer_ID'] for row in top_3_recs})
+    # Streamed a partition at a time instead of one collect() of every customer's features
+    customer_features_list = customer_features.select(*profile_columns).toLocalIterator()
+else:
+    print(f" Selecting top {SAMPLE_CUSTOMERS} customers...")
+    top_customers = (als_recommendations
+        .select("Customer_ID")
+        .distinct()
+        .limit(SAMPLE_CUSTOMERS)
+        .collect()
+    )
+    top_customer_ids = [row['Customer_ID'] for row in top_customers]
+    
+    # Filter to only these customers, top 3 each
+    top_3_recs = (als_recommendations
+        .filter(col("Customer_ID").isin(top_customer_ids))
+        .filter(col("rank") <= 3)
+        .collect()
+    )
+    customer_features_list = customer_features.filter(
+        col("Customer_ID").isin(top_customer_ids)
+    ).select(*profile_columns).collect()
 
 print(f" Processing {len(top_customer_ids)} customers, {len(top_3_recs)} recommendations...")
 
-# Pre-fetch ALL customer features efficiently
-print(" Fetching customer features...")
-customer_features_list = customer_features.filter(
-    col("Customer_ID").isin(top_customer_ids)
-).collect()
+# Explanations are generated only for customers whose ALS list changed in this
+# run (new customers included); the others keep the reason already stored in
+# final_recommendations_api_table, so their rows hash the same and are not rewritten
+stored_reasons = {}
+if spark.catalog.tableExists("final_recommendations_api_table"):
+    stored_final = spark.table("final_recommendations_api_table")
+    if SAMPLE_CUSTOMERS is not None:
+        stored_final = stored_final.filter(col("Customer_ID").isin(top_customer_ids))
+    stored_reasons = {
+        (row['Customer_ID'], row['Rank'], row['Product_Name']): row['Recommendation_Reason']
+        for row in stored_final.select("Customer_ID", "Rank", "Product_Name", "Recommendation_Reason")
+        .toLocalIterator()
+    }
+if als_write.full_write:
+    als_changed_ids = set(top_customer_ids)
+elif als_write.changed:
+    # Customers whose hash was stamped with this run's version
+    als_changed_ids = {row['Customer_ID'] for row in customer_versions(spark, "als_recommendations_table")
+                       .filter(col("version") == als_write.version).select("Customer_ID").toLocalIterator()}
+else:
+    als_changed_ids = set()
+explain_recs = [row for row in top_3_recs
+                if row['Customer_ID'] in als_changed_ids
+                or (row['Customer_ID'], row['rank'], row['Product_Name']) not in stored_reasons]
+print(f" {len(explain_recs):,} recommendations need a new explanation "
+      f"({len(top_3_recs) - len(explain_recs):,} keep their stored reason)")
 
 customer_dict = {row['Customer_ID']: row.asDict() for row in customer_features_list}
 print(f" Loaded {len(customer_dict)} customer profiles")
 
 # Generate explanations with progress tracking
 llm_results = []
-total_recs = len(top_3_recs)
+total_recs = len(explain_recs)
 start_time = datetime.now()
+step = run_metrics.span('explanations', mode=EXPLANATION_MODE)
 
 print(f"\n Starting LLM generation at {start_time.strftime('%H:%M:%S')}...")
 
-for idx, row in enumerate(top_3_recs, 1):
-    if idx % 5 == 0 or idx == 1:
-        elapsed = (datetime.now() - start_time).total_seconds()
-        avg_time = elapsed / idx if idx > 0 else 0
-        remaining = avg_time * (total_recs - idx)
-        print(f"  → Progress: {idx}/{total_recs} ({idx*100//total_recs}%) | Elapsed: {elapsed:.1f}s | Est. remaining: {remaining:.1f}s")
-    
-    cust_dict = customer_dict.get(row['Customer_ID'], {})
-    
-    # Generate explanation
-    llm_reason = generate_llm_explanation(
-        row['Customer_ID'], 
-        row['Product_Name'], 
-        row['confidence_score_pct'],
-        row['rank'],  # Pass rank to function
-        cust_dict
+if EXPLANATION_MODE == "grouped":
+    # One explanation per distinct profile key, several keys per JSON-mode request
+    llm_reasons, explanation_stats = generate_grouped_explanations(
+        client,
+        explain_recs,
+        customer_dict,
+        model=OPENAI_MODEL,
+        group_batch_size=EXPLANATION_GROUP_BATCH_SIZE,
+        temperature=0.7,
+        max_in_flight=4,
+        limiter=RateLimiter(requests_per_minute=500, tokens_per_minute=200000),
+        metrics=run_metrics
     )
-    
+    print(f"  ✓ {explanation_stats['unique_keys']:,} distinct profiles across "
+          f"{explanation_stats['recommendations']:,} recommendations "
+          f"({explanation_stats['llm_calls']:,} LLM calls, {explanation_stats['failed_calls']:,} failed)")
+else:
+    llm_reasons = []
+    for idx, row in enumerate(explain_recs, 1):
+        if idx % 5 == 0 or idx == 1:
+            elapsed = (datetime.now() - start_time).total_seconds()
+            avg_time = elapsed / idx if idx > 0 else 0
+            remaining = avg_time * (total_recs - idx)
+            print(f"  → Progress: {idx}/{total_recs} ({idx*100//total_recs}%) | Elapsed: {elapsed:.1f}s | Est. remaining: {remaining:.1f}s")
+        
+        cust_dict = customer_dict.get(row['Customer_ID'], {})
+        
+        # Generate explanation
+        llm_reasons.append(generate_llm_explanation(
+            row['Customer_ID'], 
+            row['Product_Name'], 
+            row['confidence_score_pct'],
+            row['rank'],  # Pass rank to function
+            cust_dict
+        ))
+    explanation_stats = {'llm_calls': total_recs}
+
+new_reasons = {(row['Customer_ID'], row['rank'], row['Product_Name']): reason
+               for row, reason in zip(explain_recs, llm_reasons)}
+for row in top_3_recs:
+    recommendation_key = (row['Customer_ID'], row['rank'], row['Product_Name'])
+    llm_reason = new_reasons.get(recommendation_key, stored_reasons.get(recommendation_key))
     llm_results.append({
         'Customer_ID': row['Customer_ID'],
         'Product_Name': row['Product_Name'],
@@ -1384,9 +1634,13 @@ for idx, row in enumerate(top_3_recs, 1):
         'LLM_Reason': llm_reason
     })
 
+step.set(llm_calls=explanation_stats['llm_calls'])
+step.end(rows=len(llm_results))
 end_time = datetime.now()
-total_time = (end_time - start_time).total_seconds()
-print(f"\n Completed {len(llm_results)} explanations in {total_time:.1f}s (avg {total_time/len(llm_results):.2f}s per explanation)")
+total_time = step.seconds
+calls_per_recommendation = explanation_stats['llm_calls'] / max(len(llm_results), 1)
+print(f"\n Completed {len(llm_results)} explanations in {total_time:.1f}s (avg {total_time/max(len(llm_results), 1):.2f}s per explanation)")
+print(f" Calls per recommendation: {calls_per_recommendation:.3f}")
 
 # Create final Spark DataFrame
 llm_schema = StructType([
@@ -1404,6 +1658,7 @@ final_recommendations = spark.createDataFrame(llm_results, schema=llm_schema)
 # ============================================================================  
 
 print("\n Saving final recommendations table...")
+step = run_metrics.span('save_final')
 
 final_output = (final_recommendations
     .select(
@@ -1415,13 +1670,31 @@ final_output = (final_recommendations
     )
     .orderBy("Customer_ID", "Rank")
 )
-final_output.write.mode("overwrite").option("overwriteSchema", "true").saveAsTable("final_recommendations_api_table")
-print("✅ Table 2 saved: final_recommendations_api_table")
+final_write = upsert_recommendations(spark, final_output, "final_recommendations_api_table", order="Rank",
+                                     tolerances={'Confidence_Score_Percentage': SCORE_TOLERANCE_PCT})
+step.end(rows=final_write.rows_written)
+print(f"✅ Table 2 saved: final_recommendations_api_table v{final_write.version} "
+      f"({final_write.changed:,} customers changed, {final_write.removed:,} removed, {final_write.unchanged:,} unchanged, "
+      f"{final_write.refreshed:,} with refreshed scores)")
 
 # Display sample results
-print("\n SAMPLE RESULTS:")
-print("-" * 100)
-final_output.show(10, truncate=False)
+if COLLECT_STATS:
+    print("\n SAMPLE RESULTS:")
+    print("-" * 100)
+    final_output.show(10, truncate=False)
+
+# ============================================================================  
+# SERVING STORE (/api/recommendations_table)  
+# ============================================================================  
+
+print("\n Building indexed serving store...")
+with run_metrics.span('serving_store') as step:
+    serving_store = RecommendationStore(load_serving_frame(final_output, customer_features, df_customers),
+                                        version=final_write.version)
+    step.set_rows(len(serving_store))
+sample_page = serving_store.query(page=1, limit=5, min_confidence=0.7)
+print(f"✅ Serving store ready: {len(serving_store):,} rows "
+      f"({sample_page['pagination']['total_records']:,} with confidence ≥ 0.7)")
 
 # ============================================================================  
 # SUMMARY  
@@ -1431,19 +1704,41 @@ print("\n" + "="*100)
 print("✅ RECOMMENDATION SYSTEM COMPLETE!")
 print("="*100)
 print(f" ALS Model Performance:")
-print(f" RMSE: {rmse:.4f}")
+print(f" Backend: {ALS_BACKEND}")
+print(f" RMSE: {rmse:.4f}" if rmse is not None else " RMSE: n/a (implicit feedback)")
+print(" " + ", ".join(f"{name.upper()}@{EVAL_K}: {ranking[name]:.4f}" for name in RANKING_METRICS))
 print(f" Rank: {ALS_RANK}")
 print(f" Regularization: {ALS_REG_PARAM}")
 print(f"\n Coverage:")
-print(f" Total Customers: {len(user_factor_dict):,}")
-print(f" Total Products: {len(item_factor_dict):,}")
+print(f" Total Customers: {len(user_ids):,}")
+print(f" Total Products: {len(item_ids):,}")
 print(f"\n Output Tables:")
-print(f" ALS recommendations: {len(als_output_data):,} rows → als_recommendations_table")
-print(f" Final recommendations with LLM: {len(llm_results):,} rows → final_recommendations_api_table")
+print(f" ALS recommendations: {len(als_output_data):,} rows → als_recommendations_table "
+      f"(v{als_write.version}, {als_write.rows_written:,} rows written)")
+print(f" Final recommendations with LLM: {len(llm_results):,} rows → final_recommendations_api_table "
+      f"(v{final_write.version}, {final_write.rows_written:,} rows written)")
 print(f"\n LLM Generation:")
 print(f"  Total time: {total_time:.1f}s")
-print(f" Avg per recommendation: {total_time/len(llm_results):.2f}s")
+print(f" Avg per recommendation: {total_time/max(len(llm_results), 1):.2f}s")
+print(f" LLM calls: {explanation_stats['llm_calls']:,} ({calls_per_recommendation:.3f} per recommendation)")
 print("="*100)
 
+# ============================================================================  
+# RUN METRICS EXPORT  
+# ============================================================================  
+
+# Cached intermediates are not read past this point (fold-in and audiences use local arrays)
+for cached_df in (customer_lookup, product_lookup, customer_features):
+    cached_df.unpersist()
+
+recommendation_span.end(rows=len(llm_results))
+print("\n" + run_metrics.summary())
+if CONFIG['metrics']['jsonl_path']:
+    run_metrics.export_jsonl(CONFIG['metrics']['jsonl_path'])
+    print(f"\n📈 Run metrics appended → {CONFIG['metrics']['jsonl_path']}")
+if CONFIG['metrics']['prometheus_path']:
+    run_metrics.export_prometheus(CONFIG['metrics']['prometheus_path'])
+    print(f"📈 Prometheus metrics written → {CONFIG['metrics']['prometheus_path']}")
+
 
 interaction_df.show()
\ No newline at end of file
@@ -0,0 +1,6 @@
+"""
+Pinnacle-AI recommendation pipeline building blocks.
+
+Reusable pieces of the notebook pipeline (notebooks/recommendation_system.py)
+that can be imported from a Databricks Git folder or a local checkout.
+"""
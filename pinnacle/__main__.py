@@ -0,0 +1,7 @@
+"""``python -m pinnacle`` -> the ``pinnacle`` command line."""
+
+import sys
+
+from pinnacle.cli import main
+
+sys.exit(main())
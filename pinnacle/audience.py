@@ -0,0 +1,293 @@
+"""
+Product-to-audience reverse top-K index for campaign targeting.
+
+For every ALS item the index keeps its top-K customers by score, overall
+and within each state, computed once alongside the model, so building a
+campaign audience for a product is a lookup over pre-ranked customers
+(filtered by state, age and confidence) instead of scoring or scanning
+every customer. Filters that exhaust the stored lists return fewer
+customers with ``truncated`` set rather than falling back to a scan.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+DEFAULT_TOP_K = 1000
+DEFAULT_USER_BLOCK_SIZE = 65536
+
+# Default ALS score range for confidence_score_pct (explicit ratings); the
+# implicit backend's preferences use the range saved with the model
+SCORE_RANGE = (0.0, 5.0)
+
+
+def reverse_top_k(user_factors: np.ndarray, item_factors: np.ndarray, top_k: int = DEFAULT_TOP_K,
+                  block_size: int = DEFAULT_USER_BLOCK_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-K user rows per item, scanning users in blocks with a running top-K.
+
+    Args:
+        user_factors: (n_users, rank) user factor matrix
+        item_factors: (n_items, rank) item factor matrix
+        top_k: Users kept per item
+        block_size: Users scored per matrix multiply (bounds peak memory at
+            ``n_items x (block_size + top_k)`` scores)
+
+    Returns:
+        (user_rows, scores): two (n_items, min(top_k, n_users)) arrays, best
+        first; ties keep the lower user row first
+    """
+    user_factors = np.ascontiguousarray(user_factors, dtype=np.float32)
+    item_factors = np.ascontiguousarray(item_factors, dtype=np.float32)
+    n_users, n_items = user_factors.shape[0], item_factors.shape[0]
+    k = max(0, min(top_k, n_users))
+
+    best_rows = np.empty((n_items, 0), dtype=np.int64)
+    best_scores = np.empty((n_items, 0), dtype=np.float32)
+    for start in range(0, n_users, block_size):
+        stop = min(start + block_size, n_users)
+        block_scores = item_factors @ user_factors[start:stop].T
+        block_rows = np.broadcast_to(np.arange(start, stop), block_scores.shape)
+
+        rows = np.concatenate([best_rows, block_rows], axis=1)
+        scores = np.concatenate([best_scores, block_scores], axis=1)
+        if rows.shape[1] > k:
+            keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            rows = np.take_along_axis(rows, keep, axis=1)
+            scores = np.take_along_axis(scores, keep, axis=1)
+        best_rows, best_scores = rows, scores
+
+    # Order by score descending, user row ascending on ties
+    order = np.lexsort((best_rows, -best_scores), axis=1) if k else np.empty((n_items, 0), dtype=np.int64)
+    return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+class AudienceIndex:
+    """
+    Reverse top-K index: best-scoring customers per product, and per product
+    and state.
+
+    Queries are answered from the stored lists only. A product-only query
+    reads the product's list; state filters read the lists of those states
+    and age filters without a state read every state's list (together at
+    least as deep as the product list). When the filters leave fewer than
+    ``limit`` customers and a list was cut off at K above ``min_confidence``,
+    the result is returned as is with ``truncated`` set.
+
+    Args:
+        item_ids: ALS item ids, one per index row
+        customer_ids: Customer_ID per user row (None if unknown)
+        user_rows: (n_items, K) user rows per item, best first
+        scores: (n_items, K) ALS scores matching ``user_rows``
+        ages: Age per user row (-1 if unknown)
+        states: State per user row ('' if unknown)
+        state_rows: (n_items, n_states, K_state) user rows per item and state
+            code (codes index the sorted distinct ``states``), best first,
+            padded with -1
+        state_scores: Scores matching ``state_rows``, padded with -inf
+        state_sizes: Users per state code, to tell a cut-off list from a
+            complete one
+        score_range: (min, max) ALS score mapped to confidence_score_pct 0-100
+    """
+
+    def __init__(self, item_ids, customer_ids, user_rows, scores, ages, states,
+                 state_rows, state_scores, state_sizes, score_range: Tuple[float, float] = SCORE_RANGE):
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)
+        self.customer_ids = np.asarray(customer_ids, dtype=object)
+        self.user_rows = np.asarray(user_rows, dtype=np.int64)
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self.ages = np.asarray(ages, dtype=np.int16)
+        self.states = np.asarray(states, dtype=object)
+        self._state_values, state_codes = np.unique(self.states.astype(str), return_inverse=True)
+        self._state_codes = state_codes.astype(np.int32)
+        self._code_of_state = {value: code for code, value in enumerate(self._state_values)}
+        self.state_rows = np.asarray(state_rows, dtype=np.int32)
+        self.state_scores = np.asarray(state_scores, dtype=np.float32)
+        self.state_sizes = np.asarray(state_sizes, dtype=np.int64)
+        self.score_range = (float(score_range[0]), float(score_range[1]))
+        self._row_of = {int(item): row for row, item in enumerate(self.item_ids)}
+
+    @property
+    def top_k(self) -> int:
+        return self.user_rows.shape[1]
+
+    @property
+    def state_top_k(self) -> int:
+        return self.state_rows.shape[2]
+
+    @classmethod
+    def build(cls, user_ids, user_factors, item_ids, item_factors, customer_ids, ages, states,
+              top_k: int = DEFAULT_TOP_K, state_top_k: Optional[int] = None,
+              block_size: int = DEFAULT_USER_BLOCK_SIZE,
+              score_range: Tuple[float, float] = SCORE_RANGE) -> 'AudienceIndex':
+        """
+        Build the index from ALS factor matrices and per-user attributes.
+
+        Args:
+            user_ids: ALS user ids (unused beyond alignment; rows of ``user_factors``)
+            user_factors: (n_users, rank) user factor matrix
+            item_ids: ALS item ids, one per row of ``item_factors``
+            item_factors: (n_items, rank) item factor matrix
+            customer_ids, ages, states: Customer_ID, Age and State per user row
+            top_k: Customers kept per product
+            state_top_k: Customers kept per product and state (default ``top_k``)
+            block_size: Users scored per matrix multiply
+            score_range: (min, max) ALS score of the model (its ``score_range``
+                metadata), for confidence_score_pct
+        """
+        if not (len(user_ids) == len(user_factors) == len(customer_ids) == len(ages) == len(states)):
+            raise ValueError("user_ids, user_factors, customer_ids, ages and states must be aligned")
+        user_factors = np.asarray(user_factors, dtype=np.float32)
+        user_rows, scores = reverse_top_k(user_factors, item_factors, top_k=top_k, block_size=block_size)
+
+        # Users are partitioned by state, so the per-state lists together
+        # score every user once more
+        state_values, state_codes = np.unique(np.asarray(states, dtype=object).astype(str), return_inverse=True)
+        k = top_k if state_top_k is None else state_top_k
+        state_rows = np.full((len(item_ids), len(state_values), k), -1, dtype=np.int32)
+        state_scores = np.full((len(item_ids), len(state_values), k), -np.inf, dtype=np.float32)
+        state_sizes = np.bincount(state_codes, minlength=len(state_values))
+        for code in range(len(state_values)):
+            members = np.flatnonzero(state_codes == code)
+            rows, member_scores = reverse_top_k(user_factors[members], item_factors, top_k=k, block_size=block_size)
+            state_rows[:, code, :rows.shape[1]] = members[rows]
+            state_scores[:, code, :rows.shape[1]] = member_scores
+        return cls(item_ids, customer_ids, user_rows, scores, ages, states, state_rows, state_scores, state_sizes,
+                   score_range=score_range)
+
+    def save(self, path: str):
+        """Write the index to an ``.npz`` file next to the model."""
+        missing = np.asarray([c is None for c in self.customer_ids], dtype=bool)
+        np.savez(path, item_ids=self.item_ids, customer_ids=np.where(missing, '', self.customer_ids).astype(str),
+                 customer_missing=missing, user_rows=self.user_rows, scores=self.scores, ages=self.ages,
+                 states=self.states.astype(str), state_rows=self.state_rows, state_scores=self.state_scores,
+                 state_sizes=self.state_sizes, score_range=np.asarray(self.score_range))
+
+    @classmethod
+    def load(cls, path: str) -> 'AudienceIndex':
+        with np.load(path) as data:
+            customer_ids = data['customer_ids'].astype(object)
+            customer_ids[data['customer_missing']] = None
+            score_range = tuple(data['score_range']) if 'score_range' in data.files else SCORE_RANGE
+            return cls(data['item_ids'], customer_ids, data['user_rows'], data['scores'], data['ages'],
+                       data['states'], data['state_rows'], data['state_scores'], data['state_sizes'],
+                       score_range=score_range)
+
+    def _matches(self, rows: np.ndarray, scores: np.ndarray, states, min_age, max_age, min_score) -> np.ndarray:
+        mask = np.ones(len(rows), dtype=bool)
+        if states:
+            wanted = np.isin(self._state_values, list(states))
+            mask &= wanted[self._state_codes[rows]]
+        if min_age is not None:
+            mask &= self.ages[rows] >= min_age
+        if max_age is not None:
+            mask &= self.ages[rows] <= max_age
+        if min_score is not None:
+            mask &= scores >= min_score
+        return mask
+
+    def _lists(self, row: int, states, by_age: bool) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        Candidate (rows, scores), not ordered, and the score down to which they are complete.
+
+        Every user scoring above the returned bound is among the candidates;
+        the bound is -inf when no list consulted was cut off.
+        """
+        if not states and not by_age:
+            rows, scores = self.user_rows[row], self.scores[row]
+            cut_off = self.top_k < len(self.customer_ids)
+            return rows, scores, float(scores[-1]) if cut_off and len(scores) else -np.inf
+
+        codes = (np.arange(len(self._state_values)) if not states
+                 else np.asarray([self._code_of_state[s] for s in states if s in self._code_of_state], dtype=np.int64))
+        rows = self.state_rows[row, codes]
+        scores = self.state_scores[row, codes]
+        cut_off = self.state_sizes[codes] > self.state_top_k
+        bound = float(scores[cut_off, -1].max()) if cut_off.any() else -np.inf
+        rows, scores = rows.ravel(), scores.ravel()
+        valid = rows >= 0
+        return rows[valid].astype(np.int64), scores[valid], bound
+
+    def audience(self, item_id: int, limit: int = 100, state: Optional[Sequence[str]] = None,
+                 min_age: Optional[int] = None, max_age: Optional[int] = None,
+                 min_confidence: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Best-scoring customers for a product, after filters.
+
+        Args:
+            item_id: ALS item id (``item_int``) of the product
+            limit: Maximum customers to return
+            state: State or list of states to keep
+            min_age, max_age: Inclusive age bounds
+            min_confidence: Minimum confidence_score_pct (0-100)
+
+        Returns:
+            Dict with ``customers`` (Customer_ID, user_row, als_score,
+            confidence_score_pct, rank, Age, State) and ``truncated``: True
+            when fewer than ``limit`` customers came back and customers
+            beyond the stored lists may also qualify
+        """
+        row = self._row_of.get(int(item_id))
+        if row is None:
+            raise KeyError(f"Unknown item_id: {item_id}")
+
+        states = [state] if isinstance(state, str) else state
+        low, high = self.score_range
+        min_score = None if min_confidence is None else low + (high - low) * min_confidence / 100
+
+        rows, scores, bound = self._lists(row, states, min_age is not None or max_age is not None)
+        # Below the bound a cut-off list may be missing customers, so only
+        # candidates at or above it are certain to be in rank order
+        complete = scores >= bound
+        selected = np.flatnonzero(complete & self._matches(rows, scores, states, min_age, max_age, min_score))
+        truncated = bool(len(selected) < limit and np.isfinite(bound) and (min_score is None or bound >= min_score))
+
+        # Best ``limit`` of the matches (ties at the cut kept), score descending,
+        # user row ascending on ties
+        if 0 < limit < len(selected):
+            cut = np.partition(-scores[selected], limit - 1)[limit - 1]
+            selected = selected[-scores[selected] <= cut]
+        selected = selected[np.lexsort((rows[selected], -scores[selected]))][:limit]
+        return {
+            'customers': [
+                {
+                    'Customer_ID': self.customer_ids[rows[i]],
+                    'user_row': int(rows[i]),
+                    'als_score': float(scores[i]),
+                    'confidence_score_pct': float((scores[i] - low) / (high - low) * 100),
+                    'rank': rank,
+                    'Age': int(self.ages[rows[i]]),
+                    'State': self.states[rows[i]],
+                }
+                for rank, i in enumerate(selected, start=1)
+            ],
+            'truncated': truncated,
+        }
+
+
+def user_attributes(user_ids, customer_lookup, customer_features) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Customer_ID, Age and State aligned with ``user_ids`` (Spark -> NumPy).
+
+    Args:
+        user_ids: ALS user ids (``user_int``) in factor-row order
+        customer_lookup: DataFrame with Customer_ID, user_int
+        customer_features: DataFrame with Customer_ID and optional Age/State
+    """
+    from pyspark.sql import functions as F
+
+    columns = [F.col(c) if c in customer_features.columns else F.lit(None).alias(c) for c in ('Age', 'State')]
+    rows = (customer_lookup
+            .join(customer_features.select('Customer_ID', *columns), 'Customer_ID', 'left')
+            .select('user_int', 'Customer_ID', 'Age', 'State')
+            .collect())
+    by_user = {row['user_int']: row for row in rows}
+
+    customer_ids, ages, states = [], [], []
+    for user in user_ids:
+        row = by_user.get(int(user))
+        customer_ids.append(row['Customer_ID'] if row else None)
+        ages.append(int(row['Age']) if row and row['Age'] is not None else -1)
+        states.append(row['State'] if row and row['State'] is not None else '')
+    return customer_ids, np.asarray(ages, dtype=np.int16), np.asarray(states, dtype=object)
@@ -0,0 +1,480 @@
+"""
+Command-line entry point: ``pinnacle run features|events|interactions|train|score|explain``,
+``pinnacle tune`` and ``pinnacle stream``.
+
+Each stage reads its inputs from ``--data-dir`` (the source tables as
+parquet) and the artifact directory ``--workdir``, and writes its output
+back to the artifact directory, so stages can run as separate processes:
+
+    features      -> features.parquet
+    events        -> events.parquet (life events, ``pinnacle.life_events``)
+    interactions  -> interactions.parquet
+    train         -> model/ (memory-mapped factors and ID indexes, ``pinnacle.artifacts``)
+    score         -> recommendations.parquet
+    explain       -> explanations.parquet
+
+``pinnacle tune`` sweeps ALS hyperparameters over ``interactions.parquet``
+(``pinnacle.tuning``) and writes a leaderboard.
+
+``pinnacle stream`` watches a directory for new transaction parquet files
+(Spark Structured Streaming, ``pinnacle.streaming``) and, per micro-batch,
+updates ``recommendations.parquet`` and ``features.parquet`` (with the
+life-event features) for the customers involved only, against the trained
+``model/``. Transaction features come from the incremental feature state
+(``pinnacle.incremental_features``), kept as tables of a Spark catalog in
+``<workdir>/warehouse`` so a restart resumes from it.
+
+Stages run on the single-node engine (``pinnacle.local``). Nothing beyond
+the standard library is imported until a stage starts, and each stage only
+imports what it uses: ``score`` needs NumPy and pandas, and only
+``explain`` loads the OpenAI client.
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import List, Optional
+
+DEFAULT_WORKDIR = 'pinnacle_artifacts'
+STAGES = ('features', 'events', 'interactions', 'train', 'score', 'explain')
+
+FEATURES_FILE = 'features.parquet'
+EVENTS_FILE = 'events.parquet'
+INTERACTIONS_FILE = 'interactions.parquet'
+MODEL_DIR = 'model'
+LEADERBOARD_FILE = 'leaderboard.csv'
+STREAM_STATE_DIR = 'stream_state'
+STREAM_CHECKPOINT_DIR = 'stream_checkpoint'
+STREAM_WAREHOUSE_DIR = 'warehouse'
+FEATURE_STATE_PREFIX = 'stream_feature_state'
+LIFE_EVENTS_STATE_FILE = 'life_events.npz'
+RECOMMENDATIONS_FILE = 'recommendations.parquet'
+EXPLANATIONS_FILE = 'explanations.parquet'
+
+
+def _read_table(data_dir: str, name: str):
+    import pandas as pd
+
+    path = os.path.join(data_dir, name)
+    if not os.path.exists(path) and os.path.exists(path + '.parquet'):
+        path += '.parquet'
+    if not os.path.exists(path):
+        raise SystemExit(f"❌ Missing source table '{name}' in {data_dir}")
+    return pd.read_parquet(path)
+
+
+def _read_artifact(args, filename: str, produced_by: str):
+    import pandas as pd
+
+    path = os.path.join(args.workdir, filename)
+    if not os.path.exists(path):
+        raise SystemExit(f"❌ {path} not found; run `pinnacle run {produced_by}` first")
+    return pd.read_parquet(path)
+
+
+def _write_artifact(args, frame, filename: str) -> str:
+    os.makedirs(args.workdir, exist_ok=True)
+    path = os.path.join(args.workdir, filename)
+    frame.to_parquet(path, index=False)
+    return path
+
+
+def _require_data_dir(args) -> str:
+    if not args.data_dir:
+        raise SystemExit(f"❌ `pinnacle run {args.stage}` needs --data-dir")
+    return args.data_dir
+
+
+# ============================================================================
+# STAGES
+# ============================================================================
+
+def run_features(args, metrics) -> str:
+    from pinnacle import local
+
+    data_dir = _require_data_dir(args)
+    with metrics.span('features') as span:
+        features = local.customer_features(_read_table(data_dir, 'transactions'),
+                                           _read_table(data_dir, 'conversations'),
+                                           _read_table(data_dir, 'customers'),
+                                           recency_days=args.recency_days,
+                                           customer_sample_size=args.sample)
+        span.set_rows(len(features))
+    return _write_artifact(args, features, FEATURES_FILE)
+
+
+def run_events(args, metrics) -> str:
+    from pinnacle import local
+    from pinnacle.life_events import LifeEventDetector
+
+    data_dir = _require_data_dir(args)
+    trans = _read_table(data_dir, 'transactions')
+    if args.sample:
+        trans = local.restrict_to_customers(trans, local.sample_customers(_read_table(data_dir, 'customers'),
+                                                                          args.sample, seed=42))
+    with metrics.span('events') as span:
+        detector = LifeEventDetector()
+        detector.update(trans)
+        events = detector.features()
+        span.set_rows(len(events))
+    print(f"   {int((events['life_events'] != '').sum()):,} of {len(events):,} customers with recent life events")
+    return _write_artifact(args, events, EVENTS_FILE)
+
+
+def run_interactions(args, metrics) -> str:
+    import pandas as pd
+
+    from pinnacle import local
+
+    data_dir = _require_data_dir(args)
+    llm_scores = pd.read_parquet(args.llm_scores) if args.llm_scores else None
+    with metrics.span('interactions') as span:
+        interactions, _ = local.build_interactions(_read_table(data_dir, 'customers'),
+                                                   _read_table(data_dir, 'products'),
+                                                   _read_table(data_dir, 'transactions'),
+                                                   llm_scores,
+                                                   customer_sample_size=args.sample,
+                                                   transaction_weight=args.transaction_weight)
+        span.set_rows(len(interactions))
+    return _write_artifact(args, interactions, INTERACTIONS_FILE)
+
+
+def run_train(args, metrics) -> str:
+    import numpy as np
+
+    from pinnacle import local
+    from pinnacle.artifacts import model_from_lookups, save_model
+
+    interactions = _read_artifact(args, INTERACTIONS_FILE, 'interactions')
+    with metrics.span('train', rank=args.rank, reg_param=args.reg_param, max_iter=args.max_iter) as span:
+        idx_df, customer_lookup, product_lookup = local.index_interactions(interactions)
+        test_mask = np.random.default_rng(args.seed).random(len(idx_df)) < args.test_fraction
+        train_df, test_df = idx_df[~test_mask], idx_df[test_mask]
+        user_ids, user_factors, item_ids, item_factors = local.train_als(
+            train_df, rank=args.rank, reg_param=args.reg_param, max_iter=args.max_iter, seed=args.seed)
+        span.set_rows(len(train_df))
+        if len(test_df):
+            test_rmse = local.rmse(test_df, user_ids, user_factors, item_ids, item_factors)
+            span.set(rmse=test_rmse)
+            print(f"   Test RMSE: {test_rmse:.4f} ({len(test_df):,} held-out interactions)")
+
+    return save_model(os.path.join(args.workdir, MODEL_DIR),
+                      *model_from_lookups(user_ids, user_factors, item_ids, item_factors,
+                                          customer_lookup, product_lookup),
+                      backend='local', rank=args.rank, reg_param=args.reg_param, max_iter=args.max_iter,
+                      score_range=list(local.SCORE_RANGE))
+
+
+def run_score(args, metrics) -> str:
+    import pandas as pd
+
+    from pinnacle import local
+    from pinnacle.artifacts import METADATA_FILE, open_model
+
+    path = os.path.join(args.workdir, MODEL_DIR)
+    if not os.path.exists(os.path.join(path, METADATA_FILE)):
+        raise SystemExit(f"❌ {path} not found; run `pinnacle run train` first")
+    model = open_model(path)
+    user_ids, user_factors, item_ids, item_factors = model.factors()
+    customer_lookup = pd.DataFrame({'Customer_ID': model.customer_ids, 'user_int': user_ids})
+    product_lookup = pd.DataFrame({'Product_Name': model.product_names, 'item_int': item_ids})
+    apply_eligibility = bool(args.data_dir) and not args.no_eligibility
+    with metrics.span('score', eligibility=apply_eligibility) as span:
+        eligible = None
+        if apply_eligibility:
+            from pinnacle.eligibility import aligned_mask, product_rules
+
+            eligible = aligned_mask(_read_table(args.data_dir, 'customers'), customer_lookup, user_ids,
+                                    product_rules(_read_table(args.data_dir, 'products')), product_lookup, item_ids)
+        recommendations = local.recommendations_frame(user_ids, user_factors, item_ids, item_factors,
+                                                      customer_lookup, product_lookup, top_n=args.top_n,
+                                                      eligible=eligible)
+        span.set_rows(len(user_ids))
+    return _write_artifact(args, recommendations, RECOMMENDATIONS_FILE)
+
+
+def run_explain(args, metrics) -> str:
+    from openai import OpenAI
+
+    from pinnacle.explanations import generate_grouped_explanations
+    from pinnacle.llm_dispatch import RateLimiter
+
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        raise SystemExit("❌ OPENAI_API_KEY not found in environment variables")
+
+    recommendations = _read_artifact(args, RECOMMENDATIONS_FILE, 'score')
+    recommendations = recommendations[recommendations['rank'] <= args.top_n].reset_index(drop=True)
+    features = _read_artifact(args, FEATURES_FILE, 'features')
+    customer_dict = {row['Customer_ID']: row for row in features.to_dict('records')}
+
+    client = OpenAI(api_key=api_key, max_retries=0)
+    limiter = RateLimiter(requests_per_minute=args.rpm) if args.rpm else None
+    with metrics.span('explain') as span:
+        explanations, stats = generate_grouped_explanations(
+            client, recommendations.to_dict('records'), customer_dict, model=args.model,
+            group_batch_size=args.batch_size, max_in_flight=args.max_in_flight, limiter=limiter,
+            metrics=metrics)
+        span.set_rows(len(recommendations))
+        span.set(**stats)
+    print(f"   {stats['llm_calls']} LLM calls for {stats['recommendations']:,} recommendations "
+          f"({stats['unique_keys']:,} distinct profiles, {stats['failed_calls']} failed)")
+    return _write_artifact(args, recommendations.assign(llm_explanation=explanations), EXPLANATIONS_FILE)
+
+
+def _parse_value(text: str):
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return {'true': True, 'false': False}.get(text.lower(), text)
+
+
+def run_tune(args) -> str:
+    from pinnacle import local
+    from pinnacle.tuning import DEFAULT_GRIDS, backend_configs, grid, random_configs, sweep
+
+    space = {} if args.grid else dict(DEFAULT_GRIDS[args.backend])
+    for item in args.grid or []:
+        name, _, values = item.partition('=')
+        if not values:
+            raise SystemExit(f"❌ Expected name=v1,v2,... in --grid, got '{item}'")
+        space[name] = [_parse_value(v) for v in values.split(',')]
+    configs = random_configs(space, args.random, seed=args.seed) if args.random else grid(space)
+    try:
+        configs = backend_configs(configs, args.backend)
+    except ValueError as error:
+        raise SystemExit(f"❌ {error}")
+
+    interactions = _read_artifact(args, INTERACTIONS_FILE, 'interactions')
+    idx_df, _, _ = local.index_interactions(interactions)
+    path = args.leaderboard or os.path.join(args.workdir, LEADERBOARD_FILE)
+    board = sweep(idx_df, configs, backend=args.backend, k=args.k, metric=args.metric,
+                  test_fraction=args.test_fraction, seed=args.seed, max_workers=args.workers,
+                  warm_start=not args.no_warm_start, leaderboard_path=path)
+    print(board.head(args.show).to_string(index=False))
+    return path
+
+
+def run_stream(args) -> str:
+    import numpy as np
+    import pandas as pd
+    from pyspark.sql import SparkSession
+
+    from pinnacle import local
+    from pinnacle.artifacts import METADATA_FILE, open_model
+    from pinnacle.decayed_rfm import DecayedRFM
+    from pinnacle.incremental_features import load_watermark, transaction_features_from_state, update_feature_state
+    from pinnacle.keyword_match import KeywordMatcher
+    from pinnacle.life_events import LifeEventDetector
+    from pinnacle.streaming import ParquetSink, StreamingRanker, load_stream_state, stream_transactions
+
+    path = os.path.join(args.workdir, MODEL_DIR)
+    if not os.path.exists(os.path.join(path, METADATA_FILE)):
+        raise SystemExit(f"❌ {path} not found; run `pinnacle run train` first")
+    customers = _read_table(args.data_dir, 'customers')
+    products = _read_table(args.data_dir, 'products')
+    conversations = _read_table(args.data_dir, 'conversations')
+    history = None
+
+    def read_history():
+        # The full history is only read to build state that is missing
+        nonlocal history
+        if history is None:
+            history = _read_table(args.data_dir, 'transactions')
+            history['Date'] = pd.to_datetime(history['Date'])
+        return history
+
+    # Persistent catalog in the workdir, so the feature state tables survive restarts
+    workdir = os.path.abspath(args.workdir)
+    spark = (SparkSession.builder.appName('pinnacle-stream')
+             .config('spark.sql.warehouse.dir', os.path.join(workdir, STREAM_WAREHOUSE_DIR))
+             .config('spark.driver.extraJavaOptions', f"-Dderby.system.home={os.path.join(workdir, 'metastore')}")
+             .enableHiveSupport().getOrCreate())
+    if load_watermark(spark, FEATURE_STATE_PREFIX) is None:
+        stats = update_feature_state(spark, spark.createDataFrame(read_history()), FEATURE_STATE_PREFIX,
+                                     recency_days=args.recency_days)
+        print(f"   Feature state built from {stats['rows_folded']:,} historical transactions")
+
+    matcher = KeywordMatcher.from_products(products)
+    state_directory = os.path.join(args.workdir, STREAM_STATE_DIR)
+    rfm, last_batch_id = load_stream_state(state_directory)
+    if rfm is None:
+        rfm = DecayedRFM()
+        rfm.update_frame(matcher.match(read_history()))
+        print(f"   RFM counters built from {len(read_history()):,} historical transactions ({len(rfm):,} pairs)")
+    else:
+        print(f"   Restored RFM counters ({len(rfm):,} pairs) after batch {last_batch_id}")
+    ranker = StreamingRanker.from_model(
+        open_model(path), matcher, rfm,
+        llm_scores=pd.read_parquet(args.llm_scores) if args.llm_scores else None,
+        customers=customers, products=products, transaction_weight=args.transaction_weight,
+        top_n=args.top_n, eligibility=not args.no_eligibility)
+    ranker.last_batch_id = last_batch_id
+    detector_path = os.path.join(state_directory, LIFE_EVENTS_STATE_FILE)
+    detector_batch_id = -1
+    if os.path.exists(detector_path):
+        detector = LifeEventDetector.load(detector_path)
+        with np.load(detector_path) as data:
+            detector_batch_id = int(data['last_batch_id']) if 'last_batch_id' in data.files else last_batch_id
+    else:
+        detector = LifeEventDetector()
+        detector.update(read_history())
+    history = None   # Not needed once the state exists
+
+    features_sink = ParquetSink(os.path.join(args.workdir, FEATURES_FILE))
+
+    def refresh_features(batch_df, customer_ids, batch_id):
+        # Fold the batch into the feature state, then read back the batch's customers only
+        nonlocal detector_batch_id
+        update_feature_state(spark, batch_df, FEATURE_STATE_PREFIX, recency_days=args.recency_days,
+                             batch_id=batch_id)
+        if batch_id > detector_batch_id:   # A batch replayed after a crash is already in the detector
+            detector.update(batch_df.toPandas().assign(Date=lambda df: pd.to_datetime(df['Date'])))
+            os.makedirs(state_directory, exist_ok=True)
+            detector.save(detector_path, last_batch_id=np.int64(batch_id))
+            detector_batch_id = batch_id
+        ids = pd.DataFrame({'Customer_ID': customer_ids})
+        trans_features = transaction_features_from_state(
+            spark, FEATURE_STATE_PREFIX, recency_days=args.recency_days,
+            customer_ids=spark.createDataFrame(ids, 'Customer_ID string')).toPandas()
+        features = local.profile_features(trans_features.sort_values('Customer_ID', ignore_index=True),
+                                          local.restrict_to_customers(conversations, ids),
+                                          local.restrict_to_customers(customers, ids))
+        events = detector.features(customer_ids=customer_ids)
+        features_sink.upsert(features.merge(events, on='Customer_ID', how='left'), customer_ids)
+
+    query = stream_transactions(
+        spark, args.source, ranker, ParquetSink(os.path.join(args.workdir, RECOMMENDATIONS_FILE),
+                                                sort_columns=('Customer_ID', 'rank')),
+        checkpoint_location=args.checkpoint or os.path.join(args.workdir, STREAM_CHECKPOINT_DIR),
+        state_directory=state_directory, on_batch=refresh_features,
+        trigger_seconds=None if args.once else args.trigger_seconds,
+        max_files_per_trigger=args.max_files_per_trigger)
+    print(f"   Watching {args.source} ({'available files, then stop' if args.once else f'every {args.trigger_seconds}s'})")
+    query.awaitTermination()
+    return os.path.join(args.workdir, RECOMMENDATIONS_FILE)
+
+
+RUNNERS = {
+    'features': run_features,
+    'events': run_events,
+    'interactions': run_interactions,
+    'train': run_train,
+    'score': run_score,
+    'explain': run_explain,
+}
+
+
+# ============================================================================
+# ENTRY POINT
+# ============================================================================
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='pinnacle', description='Pinnacle-AI recommendation pipeline')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Run one pipeline stage')
+    run.add_argument('stage', choices=STAGES)
+    run.add_argument('--data-dir', default=None,
+                     help='Directory with customers, transactions, conversations and products parquet')
+    run.add_argument('--workdir', default=DEFAULT_WORKDIR, help='Artifact directory shared between stages')
+    run.add_argument('--metrics', default=None,
+                     help='Export run metrics to this path (.prom = Prometheus text, otherwise JSON lines)')
+
+    group = run.add_argument_group('features / events / interactions')
+    group.add_argument('--sample', type=int, default=1000, help='Customers to sample (0 = all)')
+    group.add_argument('--recency-days', type=int, default=90)
+    group.add_argument('--llm-scores', default=None,
+                       help='Parquet of LLM scores (Customer_ID, Product_Name, interaction_score)')
+    group.add_argument('--transaction-weight', type=float, default=0.7)
+
+    group = run.add_argument_group('train')
+    group.add_argument('--rank', type=int, default=20)
+    group.add_argument('--reg-param', type=float, default=0.1)
+    group.add_argument('--max-iter', type=int, default=20)
+    group.add_argument('--test-fraction', type=float, default=0.2)
+    group.add_argument('--seed', type=int, default=42)
+
+    group = run.add_argument_group('score / explain')
+    group.add_argument('--top-n', type=int, default=None,
+                       help='Recommendations per customer (default 5 for score, 3 for explain)')
+    group.add_argument('--no-eligibility', action='store_true',
+                       help='Keep products the catalogue rules exclude (score applies them when --data-dir is set)')
+    group.add_argument('--model', default='gpt-4o')
+    group.add_argument('--batch-size', type=int, default=10, help='Explanation profiles per LLM request')
+    group.add_argument('--max-in-flight', type=int, default=4)
+    group.add_argument('--rpm', type=int, default=None, help='Requests-per-minute limit')
+
+    tune = commands.add_parser('tune', help='Sweep ALS hyperparameters and write a leaderboard')
+    tune.add_argument('--workdir', default=DEFAULT_WORKDIR, help='Artifact directory with interactions.parquet')
+    tune.add_argument('--backend', choices=('local', 'implicit'), default='local')
+    tune.add_argument('--grid', nargs='+', default=None, metavar='NAME=V1,V2',
+                      help='Parameter values to sweep (default: rank and regularization grid of the backend)')
+    tune.add_argument('--random', type=int, default=0,
+                      help='Sample this many configurations from the grid instead of all of them')
+    tune.add_argument('--k', type=int, default=10, help='Ranking metric cutoff')
+    tune.add_argument('--metric', choices=('precision', 'recall', 'ndcg', 'map'), default='ndcg')
+    tune.add_argument('--test-fraction', type=float, default=0.2)
+    tune.add_argument('--seed', type=int, default=42)
+    tune.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    tune.add_argument('--no-warm-start', action='store_true')
+    tune.add_argument('--leaderboard', default=None, help=f"Output path (default <workdir>/{LEADERBOARD_FILE})")
+    tune.add_argument('--show', type=int, default=10, help='Leaderboard rows to print')
+
+    stream = commands.add_parser('stream', help='Re-rank customers as transaction files land (Spark streaming)')
+    stream.add_argument('--source', required=True, help='Directory new transaction parquet files are dropped into')
+    stream.add_argument('--data-dir', required=True,
+                        help='Directory with customers, transactions (history), conversations and products parquet')
+    stream.add_argument('--workdir', default=DEFAULT_WORKDIR, help='Artifact directory with model/')
+    stream.add_argument('--checkpoint', default=None,
+                        help=f"Streaming checkpoint (default <workdir>/{STREAM_CHECKPOINT_DIR})")
+    stream.add_argument('--trigger-seconds', type=int, default=60, help='Micro-batch interval')
+    stream.add_argument('--once', action='store_true', help='Process the files present, then stop')
+    stream.add_argument('--max-files-per-trigger', type=int, default=None)
+    stream.add_argument('--llm-scores', default=None,
+                        help='Parquet of LLM scores (Customer_ID, Product_Name, interaction_score)')
+    stream.add_argument('--transaction-weight', type=float, default=0.7)
+    stream.add_argument('--recency-days', type=int, default=90)
+    stream.add_argument('--top-n', type=int, default=5)
+    stream.add_argument('--no-eligibility', action='store_true',
+                        help='Keep products the catalogue rules exclude')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == 'tune':
+        start = time.perf_counter()
+        print(f"▶ pinnacle tune ({args.backend})")
+        path = run_tune(args)
+        print(f"✅ tune done in {time.perf_counter() - start:.2f}s -> {path}")
+        return 0
+    if args.command == 'stream':
+        start = time.perf_counter()
+        print(f"▶ pinnacle stream ({args.source})")
+        path = run_stream(args)
+        print(f"✅ stream stopped after {time.perf_counter() - start:.2f}s -> {path}")
+        return 0
+
+    if args.sample == 0:
+        args.sample = None
+    if args.top_n is None:
+        args.top_n = 3 if args.stage == 'explain' else 5
+
+    from pinnacle.metrics import RunMetrics
+
+    metrics = RunMetrics()
+    start = time.perf_counter()
+    print(f"▶ pinnacle run {args.stage}")
+    path = RUNNERS[args.stage](args, metrics)
+    print(f"✅ {args.stage} done in {time.perf_counter() - start:.2f}s -> {path}")
+    if args.metrics:
+        metrics.export(args.metrics)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
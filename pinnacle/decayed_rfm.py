@@ -0,0 +1,520 @@
+"""
+Exponentially decayed RFM counters per (customer, product).
+
+Section 7 of ``create_customer_product_interactions`` re-aggregated every
+matched transaction into frequency, monetary and a step-function recency
+score on each run. Here each (customer, product) pair keeps three numbers:
+
+- ``frequency_mass``: match weights, each scaled by
+  ``2 ** ((day - epoch) / frequency_half_life)``
+- ``monetary_mass``: weight x amount, scaled with ``monetary_half_life``
+- ``last_day``: day of the latest transaction (days since 1970-01-01)
+
+This is forward decay: masses are relative to a fixed ``epoch`` day, so a
+transaction is one multiply-add on its own pair (O(1), in any order) and
+states of separate batches merge by addition. The decayed count at any day
+``t`` at or after the last folded transaction is
+``frequency_mass * 2 ** (-(t - epoch) / frequency_half_life)``. Before the
+growth factor gets large the state is rebased to a later epoch (one
+vectorized multiply). A half-life of ``float('inf')`` gives the undecayed
+sums.
+
+``trans_score`` at day ``t`` keeps the old 0-10 scales: frequency
+``log1p(count) / log1p(100)``, monetary ``log1p(amount) / log1p(1e6)``, and
+recency ``10 * 2 ** (-days_since_last / recency_half_life)`` floored at 0.5
+(a continuous version of the 30/60/90/180/365-day steps), weighted
+0.35 / 0.35 / 0.30.
+
+State lives in a ``DecayedRFM`` (NumPy, ``.npz``; per-transaction
+``update``) or in Spark tables (``update_rfm_state``) with the same
+columns: each fold writes a new ``<prefix>_rfm_v<version>`` table, and the
+single-row ``<prefix>_watermark`` table, written last, names the version
+that holds the transactions up to its watermark. Rewriting that row is the
+commit: a run that dies before it leaves the previous version and
+watermark in place, so the retry folds the same transactions into the same
+old state once.
+"""
+
+import os
+import tempfile
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from pinnacle.sampling import restrict_to_customers
+
+
+FREQUENCY_HALF_LIFE_DAYS = 180.0
+MONETARY_HALF_LIFE_DAYS = 180.0
+RECENCY_HALF_LIFE_DAYS = 120.0
+RFM_WEIGHTS = (0.35, 0.35, 0.30)
+MIN_RECENCY_SCORE = 0.5
+# Rebase once a mass has grown by 2**REBASE_EXPONENT (keeps weight x amount sums far from overflow)
+REBASE_EXPONENT = 256.0
+_NO_DAY = np.iinfo(np.int64).min
+STATE_COLUMNS = ('Customer_ID', 'Product_Name', 'frequency_mass', 'monetary_mass', 'last_day')
+SCORE_COLUMNS = ('Customer_ID', 'Product_Name', 'trans_score', 'transaction_count', 'total_amount',
+                 'days_since_last')
+
+
+def day_numbers(dates: Sequence) -> np.ndarray:
+    """Days since 1970-01-01 (int64) of dates / datetimes / date strings."""
+    values = pd.to_datetime(pd.Series(dates).reset_index(drop=True))
+    return values.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int64)
+
+
+def _day(value) -> int:
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return (pd.Timestamp(value).normalize() - pd.Timestamp('1970-01-01')).days
+
+
+def rfm_scores(transaction_count, total_amount, days_since_last,
+               recency_half_life: float = RECENCY_HALF_LIFE_DAYS) -> np.ndarray:
+    """0-10 ``trans_score`` from (decayed) count, amount and days since the last transaction."""
+    frequency = np.minimum(10.0, np.log1p(transaction_count) / np.log1p(100.0) * 10.0)
+    with np.errstate(invalid='ignore'):
+        monetary = np.minimum(10.0, np.log1p(total_amount) / np.log1p(1000000.0) * 10.0)
+    recency = np.maximum(MIN_RECENCY_SCORE,
+                         10.0 * np.exp2(-np.asarray(days_since_last, dtype=np.float64) / recency_half_life))
+    return frequency * RFM_WEIGHTS[0] + monetary * RFM_WEIGHTS[1] + recency * RFM_WEIGHTS[2]
+
+
+class DecayedRFM:
+    """
+    In-memory decayed counters, one slot per (customer, product) pair.
+
+    Args:
+        frequency_half_life: Days for a transaction's count to halve
+        monetary_half_life: Days for a transaction's amount to halve
+        recency_half_life: Days for the recency score to halve (query time only)
+        epoch: Reference day of the masses (default: first day folded)
+    """
+
+    def __init__(self, frequency_half_life: float = FREQUENCY_HALF_LIFE_DAYS,
+                 monetary_half_life: float = MONETARY_HALF_LIFE_DAYS,
+                 recency_half_life: float = RECENCY_HALF_LIFE_DAYS, epoch: Optional[int] = None):
+        self.frequency_half_life = float(frequency_half_life)
+        self.monetary_half_life = float(monetary_half_life)
+        self.recency_half_life = float(recency_half_life)
+        self.epoch = epoch
+        self.watermark: Optional[int] = None
+        self._customers: Dict[Any, int] = {}
+        self._products: Dict[Any, int] = {}
+        self._slots: Dict[tuple, int] = {}
+        self.size = 0
+        self.customer_codes = np.zeros(0, dtype=np.int32)
+        self.product_codes = np.zeros(0, dtype=np.int32)
+        self.frequency_mass = np.zeros(0)
+        self.monetary_mass = np.zeros(0)
+        self.last_day = np.zeros(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def customer_ids(self) -> np.ndarray:
+        return np.asarray(list(self._customers), dtype=object)
+
+    @property
+    def product_names(self) -> np.ndarray:
+        return np.asarray(list(self._products), dtype=object)
+
+    def _grow(self, needed: int):
+        capacity = len(self.frequency_mass)
+        if needed <= capacity:
+            return
+        capacity = max(needed, 2 * capacity, 1024)
+        for name in ('customer_codes', 'product_codes', 'frequency_mass', 'monetary_mass', 'last_day'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+        self.last_day[self.size:] = _NO_DAY
+
+    def _slot(self, customer_id, product_name) -> int:
+        customer = self._customers.setdefault(customer_id, len(self._customers))
+        product = self._products.setdefault(product_name, len(self._products))
+        slot = self._slots.get((customer, product))
+        if slot is None:
+            self._grow(self.size + 1)
+            slot = self._slots[(customer, product)] = self.size
+            self.customer_codes[slot], self.product_codes[slot] = customer, product
+            self.size += 1
+        return slot
+
+    def _prepare(self, latest_day: int):
+        """Set the epoch on first use; rebase before ``latest_day`` would grow masses past the limit."""
+        if self.epoch is None:
+            self.epoch = latest_day
+        elif (latest_day - self.epoch) / min(self.frequency_half_life, self.monetary_half_life) > REBASE_EXPONENT:
+            self.rebase(latest_day)
+
+    def rebase(self, epoch: int):
+        """Express the masses relative to a new epoch day."""
+        if self.epoch is not None:
+            shift = epoch - self.epoch
+            self.frequency_mass[:self.size] *= np.exp2(-shift / self.frequency_half_life)
+            self.monetary_mass[:self.size] *= np.exp2(-shift / self.monetary_half_life)
+        self.epoch = epoch
+
+    def update(self, customer_id, product_name, amount: float, day, weight: float = 1.0):
+        """Fold one matched transaction in O(1)."""
+        day = _day(day)
+        self._prepare(day)
+        slot = self._slot(customer_id, product_name)
+        offset = day - self.epoch
+        self.frequency_mass[slot] += weight * 2.0 ** (offset / self.frequency_half_life)
+        self.monetary_mass[slot] += weight * amount * 2.0 ** (offset / self.monetary_half_life)
+        if day > self.last_day[slot]:
+            self.last_day[slot] = day
+        if self.watermark is None or day > self.watermark:
+            self.watermark = day
+
+    def update_many(self, customer_ids: Sequence, product_names: Sequence, amounts: Sequence, days: Sequence,
+                    weights: Optional[Sequence] = None):
+        """
+        Fold a batch of matched transactions (vectorized ``update``).
+
+        Args:
+            customer_ids: Customer per transaction
+            product_names: Matched product per transaction
+            amounts: Trans_Amount per transaction
+            days: Dates or day numbers per transaction
+            weights: Match weights (default 1)
+        """
+        days = np.asarray(days) if np.asarray(days).dtype.kind in 'iu' else day_numbers(days)
+        if len(days) == 0:
+            return
+        self._prepare(int(days.max()))
+        pair_codes, pairs = pd.factorize(pd.MultiIndex.from_arrays([np.asarray(customer_ids, dtype=object),
+                                                                    np.asarray(product_names, dtype=object)]))
+        pair_slots = np.fromiter((self._slot(c, p) for c, p in pairs), dtype=np.int64, count=len(pairs))
+        slots = pair_slots[pair_codes]
+        weights = np.ones(len(days)) if weights is None else np.asarray(weights, dtype=np.float64)
+        offsets = (days - self.epoch).astype(np.float64)
+        np.add.at(self.frequency_mass, slots, weights * np.exp2(offsets / self.frequency_half_life))
+        np.add.at(self.monetary_mass, slots,
+                  weights * np.asarray(amounts, dtype=np.float64) * np.exp2(offsets / self.monetary_half_life))
+        np.maximum.at(self.last_day, slots, days)
+        latest = int(days.max())
+        self.watermark = latest if self.watermark is None else max(self.watermark, latest)
+
+    def update_frame(self, matches: pd.DataFrame):
+        """Fold ``KeywordMatcher.match`` output (Customer_ID, Product_Name, Trans_Amount, Date, match_weight)."""
+        self.update_many(matches['Customer_ID'], matches['Product_Name'], matches['Trans_Amount'],
+                         matches['Date'], matches['match_weight'] if 'match_weight' in matches else None)
+
+    def scores(self, at=None, customer_ids: Optional[Sequence] = None) -> pd.DataFrame:
+        """
+        RFM scores decayed to day ``at``.
+
+        Args:
+            at: Query date or day number (default: the latest folded day)
+            customer_ids: Optional customers to restrict to
+
+        Returns:
+            DataFrame with Customer_ID, Product_Name, trans_score,
+            transaction_count, total_amount (decayed to ``at``) and
+            days_since_last
+        """
+        if self.size == 0:
+            return pd.DataFrame({column: [] for column in SCORE_COLUMNS})
+        at = self.watermark if at is None else _day(at)
+        rows = np.arange(self.size)
+        if customer_ids is not None:
+            wanted = np.zeros(len(self._customers), dtype=bool)
+            codes = [self._customers[c] for c in customer_ids if c in self._customers]
+            wanted[codes] = True
+            rows = rows[wanted[self.customer_codes[:self.size]]]
+        offset = at - self.epoch
+        count = self.frequency_mass[rows] * np.exp2(-offset / self.frequency_half_life)
+        amount = self.monetary_mass[rows] * np.exp2(-offset / self.monetary_half_life)
+        days_since_last = at - self.last_day[rows]
+        return pd.DataFrame({
+            'Customer_ID': self.customer_ids[self.customer_codes[rows]],
+            'Product_Name': self.product_names[self.product_codes[rows]],
+            'trans_score': rfm_scores(count, amount, days_since_last, self.recency_half_life),
+            'transaction_count': count,
+            'total_amount': amount,
+            'days_since_last': days_since_last,
+        })
+
+    def to_frame(self) -> pd.DataFrame:
+        """The state as rows with ``STATE_COLUMNS`` (the Spark ``<prefix>_rfm`` layout)."""
+        return pd.DataFrame({
+            'Customer_ID': self.customer_ids[self.customer_codes[:self.size]],
+            'Product_Name': self.product_names[self.product_codes[:self.size]],
+            'frequency_mass': self.frequency_mass[:self.size],
+            'monetary_mass': self.monetary_mass[:self.size],
+            'last_day': self.last_day[:self.size],
+        })
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, epoch: int, watermark: Optional[int] = None,
+                   **half_lives) -> 'DecayedRFM':
+        """State from ``STATE_COLUMNS`` rows (e.g. a collected ``<prefix>_rfm`` table)."""
+        state = cls(epoch=int(epoch), **half_lives)
+        customer_codes, customers = pd.factorize(frame['Customer_ID'])
+        product_codes, products = pd.factorize(frame['Product_Name'])
+        state._customers = {c: i for i, c in enumerate(customers)}
+        state._products = {p: i for i, p in enumerate(products)}
+        state._slots = {pair: i for i, pair in enumerate(zip(customer_codes.tolist(), product_codes.tolist()))}
+        state.size = len(frame)
+        state.customer_codes = customer_codes.astype(np.int32)
+        state.product_codes = product_codes.astype(np.int32)
+        state.frequency_mass = frame['frequency_mass'].to_numpy(dtype=np.float64).copy()
+        state.monetary_mass = frame['monetary_mass'].to_numpy(dtype=np.float64).copy()
+        state.last_day = frame['last_day'].to_numpy(dtype=np.int64).copy()
+        state.watermark = int(state.last_day.max()) if watermark is None and len(frame) else watermark
+        return state
+
+    def save(self, path: str, **extra):
+        """
+        Write the state to an ``.npz`` file (about 28 bytes per pair plus the ID tables).
+
+        The file is written next to ``path`` and renamed into place, so a
+        crash leaves the previous state. ``extra`` arrays are stored in the
+        same file (e.g. a stream's last batch id) and ignored by ``load``.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.npz.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, customer_ids=self.customer_ids.astype(str), product_names=self.product_names.astype(str),
+                         customer_codes=self.customer_codes[:self.size], product_codes=self.product_codes[:self.size],
+                         frequency_mass=self.frequency_mass[:self.size], monetary_mass=self.monetary_mass[:self.size],
+                         last_day=self.last_day[:self.size],
+                         params=np.array([self.frequency_half_life, self.monetary_half_life, self.recency_half_life]),
+                         days=np.array([_NO_DAY if self.epoch is None else self.epoch,
+                                        _NO_DAY if self.watermark is None else self.watermark], dtype=np.int64),
+                         **extra)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> 'DecayedRFM':
+        with np.load(path) as data:
+            frequency_half_life, monetary_half_life, recency_half_life = data['params'].tolist()
+            epoch, watermark = (None if day == _NO_DAY else day for day in data['days'].tolist())
+            state = cls(frequency_half_life, monetary_half_life, recency_half_life, epoch=epoch)
+            state.watermark = watermark
+            state._customers = {c: i for i, c in enumerate(data['customer_ids'].tolist())}
+            state._products = {p: i for i, p in enumerate(data['product_names'].tolist())}
+            state.customer_codes = data['customer_codes'].astype(np.int32)
+            state.product_codes = data['product_codes'].astype(np.int32)
+            state.frequency_mass = data['frequency_mass'].astype(np.float64)
+            state.monetary_mass = data['monetary_mass'].astype(np.float64)
+            state.last_day = data['last_day'].astype(np.int64)
+        state.size = len(state.last_day)
+        state._slots = {pair: i for i, pair in enumerate(zip(state.customer_codes.tolist(),
+                                                             state.product_codes.tolist()))}
+        return state
+
+
+# ---------------------------------------------------------------------------
+# Spark
+# ---------------------------------------------------------------------------
+
+def state_table_names(state_prefix: str, version: int = 0) -> Dict[str, str]:
+    return {
+        'rfm': f"{state_prefix}_rfm_v{version}",
+        'watermark': f"{state_prefix}_watermark",
+    }
+
+
+def _drop_stale_versions(spark, state_prefix: str, version: int):
+    """Drop ``<prefix>_rfm_v<n>`` tables other than ``version`` (replaced, or left by a run that died)."""
+    stale = f"{state_prefix}_rfm_v".lower()
+    for table in spark.catalog.listTables():
+        name = table.name.lower()
+        if name.startswith(stale) and name[len(stale):].isdigit() and int(name[len(stale):]) != version:
+            spark.sql(f"DROP TABLE IF EXISTS {table.name}")
+
+
+def load_rfm_watermark(spark, state_prefix: str) -> Optional[Dict[str, Any]]:
+    """Last committed watermark record (watermark, epoch, half-lives, state version), or None if no state yet."""
+    table = state_table_names(state_prefix)['watermark']
+    if not spark.catalog.tableExists(table):
+        return None
+    rows = spark.table(table).collect()
+    return rows[0].asDict() if rows else None
+
+
+def _day_column(column='Date'):
+    from pyspark.sql import functions as F
+
+    return F.datediff(F.to_date(F.col(column)), F.lit('1970-01-01'))
+
+
+def decayed_partials(matches, epoch: int, frequency_half_life: float = FREQUENCY_HALF_LIFE_DAYS,
+                     monetary_half_life: float = MONETARY_HALF_LIFE_DAYS):
+    """
+    Per-pair forward-decayed masses of matched transactions (one groupBy, mergeable by addition).
+
+    Args:
+        matches: Spark DataFrame with Customer_ID, Product_Name, Trans_Amount,
+            Date and match_weight (``match_transactions_spark`` output)
+        epoch: Reference day number of the masses
+
+    Returns:
+        Spark DataFrame with ``STATE_COLUMNS``
+    """
+    from pyspark.sql import functions as F
+
+    offset = (_day_column() - F.lit(epoch)).cast('double')
+    weight = F.col('match_weight') if 'match_weight' in matches.columns else F.lit(1.0)
+    return matches.groupBy('Customer_ID', 'Product_Name').agg(
+        F.sum(weight * F.pow(F.lit(2.0), offset / frequency_half_life)).alias('frequency_mass'),
+        F.sum(weight * F.col('Trans_Amount') * F.pow(F.lit(2.0), offset / monetary_half_life)).alias('monetary_mass'),
+        F.max(_day_column()).alias('last_day'),
+    )
+
+
+def rfm_scores_spark(state, epoch: int, at: int, frequency_half_life: float = FREQUENCY_HALF_LIFE_DAYS,
+                     monetary_half_life: float = MONETARY_HALF_LIFE_DAYS,
+                     recency_half_life: float = RECENCY_HALF_LIFE_DAYS):
+    """``DecayedRFM.scores`` over a Spark state DataFrame: ``SCORE_COLUMNS`` decayed to day ``at``."""
+    from pyspark.sql import functions as F
+
+    count = F.col('frequency_mass') * float(np.exp2(-(at - epoch) / frequency_half_life))
+    amount = F.col('monetary_mass') * float(np.exp2(-(at - epoch) / monetary_half_life))
+    scored = state.select('Customer_ID', 'Product_Name', count.alias('transaction_count'),
+                          amount.alias('total_amount'), (F.lit(at) - F.col('last_day')).alias('days_since_last'))
+    frequency = F.least(F.lit(10.0), (F.log1p(F.col('transaction_count')) / F.log1p(F.lit(100.0))) * 10.0)
+    monetary = F.least(F.lit(10.0), (F.log1p(F.col('total_amount')) / F.log1p(F.lit(1000000.0))) * 10.0)
+    recency = F.greatest(F.lit(MIN_RECENCY_SCORE),
+                         10.0 * F.pow(F.lit(2.0), -F.col('days_since_last').cast('double') / recency_half_life))
+    return scored.select(
+        'Customer_ID', 'Product_Name',
+        (frequency * RFM_WEIGHTS[0] + monetary * RFM_WEIGHTS[1] + recency * RFM_WEIGHTS[2]).alias('trans_score'),
+        'transaction_count', 'total_amount', 'days_since_last',
+    )
+
+
+def transaction_rfm_spark(matches, at_date, frequency_half_life: float = FREQUENCY_HALF_LIFE_DAYS,
+                          monetary_half_life: float = MONETARY_HALF_LIFE_DAYS,
+                          recency_half_life: float = RECENCY_HALF_LIFE_DAYS):
+    """Decayed RFM scores of a batch of matches at ``at_date`` without stored state."""
+    at = _day(at_date)
+    partials = decayed_partials(matches, at, frequency_half_life, monetary_half_life)
+    return rfm_scores_spark(partials, at, at, frequency_half_life, monetary_half_life, recency_half_life)
+
+
+def update_rfm_state(spark, df_trans, matcher, state_prefix: str = 'customer_rfm_state',
+                     frequency_half_life: float = FREQUENCY_HALF_LIFE_DAYS,
+                     monetary_half_life: float = MONETARY_HALF_LIFE_DAYS) -> Dict[str, Any]:
+    """
+    Fold transactions newer than the stored watermark into the decayed RFM state.
+
+    Only rows with ``Date`` strictly after the watermark are matched and
+    folded, so each day must have fully landed before the run that first
+    sees it (as in ``update_feature_state``). New pairs' masses are added to
+    the stored ones with a full outer join; the half-lives are fixed when
+    the state is first built. The folded state goes to the next version's
+    table and the watermark row naming it is written last, so a retry after
+    a failure in between folds the batch into the old state again rather
+    than into the new counters.
+
+    Args:
+        spark: Active SparkSession
+        df_trans: Full transaction DataFrame (only new rows are read)
+        matcher: ``KeywordMatcher`` for the product catalogue
+        state_prefix: Table name prefix for the state tables
+        frequency_half_life: Days for a transaction's count to halve
+        monetary_half_life: Days for a transaction's amount to halve
+
+    Returns:
+        Dict with previous/new watermark, epoch and folded row count
+    """
+    from pyspark.sql import functions as F
+
+    from pinnacle.keyword_match import match_transactions_spark
+
+    previous = load_rfm_watermark(spark, state_prefix)
+    if previous is not None and (previous['frequency_half_life'], previous['monetary_half_life']) != \
+            (frequency_half_life, monetary_half_life):
+        raise ValueError(f"RFM state was built with half-lives {previous['frequency_half_life']}/"
+                         f"{previous['monetary_half_life']} days; rebuild it to use "
+                         f"{frequency_half_life}/{monetary_half_life}.")
+
+    new_trans = df_trans.withColumn('Date', F.to_date(F.col('Date')))
+    if previous is not None:
+        new_trans = new_trans.filter(F.col('Date') > F.lit(previous['watermark']))
+    batch_stats = new_trans.agg(F.count('*').alias('rows'), F.max('Date').alias('max_date')).collect()[0]
+    if batch_stats['rows'] == 0:
+        print(f"   → No transactions newer than RFM watermark {previous['watermark'] if previous else None}")
+        return {'previous_watermark': previous['watermark'] if previous else None,
+                'watermark': previous['watermark'] if previous else None,
+                'epoch': previous['epoch'] if previous else None, 'rows_folded': 0}
+
+    watermark = batch_stats['max_date'] if previous is None else max(batch_stats['max_date'], previous['watermark'])
+    latest = _day(watermark)
+    epoch = previous['epoch'] if previous is not None else latest
+    version = previous['version'] + 1 if previous is not None else 0
+    state = None if previous is None else spark.table(state_table_names(state_prefix, previous['version'])['rfm'])
+    if previous is not None and (latest - epoch) / min(frequency_half_life, monetary_half_life) > REBASE_EXPONENT:
+        shift = latest - epoch
+        state = state.select(
+            'Customer_ID', 'Product_Name',
+            (F.col('frequency_mass') * float(np.exp2(-shift / frequency_half_life))).alias('frequency_mass'),
+            (F.col('monetary_mass') * float(np.exp2(-shift / monetary_half_life))).alias('monetary_mass'),
+            'last_day')
+        epoch = latest
+
+    new_state = decayed_partials(match_transactions_spark(new_trans, matcher), epoch,
+                                 frequency_half_life, monetary_half_life)
+    if state is not None:
+        def added(name):
+            return (F.coalesce(F.col(f"old.{name}"), F.lit(0.0)) +
+                    F.coalesce(F.col(f"new.{name}"), F.lit(0.0))).alias(name)
+
+        new_state = state.alias('old').join(new_state.alias('new'), ['Customer_ID', 'Product_Name'],
+                                            'full_outer').select(
+            'Customer_ID', 'Product_Name', added('frequency_mass'), added('monetary_mass'),
+            F.greatest(F.col('old.last_day'), F.col('new.last_day')).alias('last_day'))
+
+    tables = state_table_names(state_prefix, version)
+    new_state.write.mode('overwrite').option('overwriteSchema', 'true').saveAsTable(tables['rfm'])
+    # Commit: the watermark row now points at the new version
+    spark.createDataFrame(
+        [(watermark, epoch, float(frequency_half_life), float(monetary_half_life), int(batch_stats['rows']),
+          version)],
+        'watermark date, epoch int, frequency_half_life double, monetary_half_life double, rows_folded long, '
+        'version long'
+    ).write.mode('overwrite').option('overwriteSchema', 'true').saveAsTable(tables['watermark'])
+    _drop_stale_versions(spark, state_prefix, version)
+
+    return {'previous_watermark': previous['watermark'] if previous else None, 'watermark': watermark,
+            'epoch': epoch, 'rows_folded': int(batch_stats['rows'])}
+
+
+def rfm_scores_from_state(spark, state_prefix: str = 'customer_rfm_state', at_date=None, customer_ids=None,
+                          recency_half_life: float = RECENCY_HALF_LIFE_DAYS):
+    """
+    ``trans_score`` per (customer, product) from the stored state, decayed to ``at_date``.
+
+    Args:
+        spark: Active SparkSession
+        state_prefix: Table name prefix used by ``update_rfm_state``
+        at_date: Query date (default: the watermark)
+        customer_ids: Optional DataFrame with a Customer_ID column to restrict to
+        recency_half_life: Days for the recency score to halve
+
+    Returns:
+        DataFrame with Customer_ID, Product_Name, trans_score,
+        transaction_count, total_amount and days_since_last
+    """
+    watermark = load_rfm_watermark(spark, state_prefix)
+    if watermark is None:
+        raise ValueError(f"No RFM state found for prefix '{state_prefix}'. Run update_rfm_state first.")
+    state = spark.table(state_table_names(state_prefix, watermark['version'])['rfm'])
+    if customer_ids is not None:
+        state = restrict_to_customers(state, customer_ids)
+    at = _day(watermark['watermark'] if at_date is None else at_date)
+    return rfm_scores_spark(state, watermark['epoch'], at, watermark['frequency_half_life'],
+                            watermark['monetary_half_life'], recency_half_life)
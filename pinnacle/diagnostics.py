@@ -0,0 +1,31 @@
+"""
+Diagnostic DataFrame statistics for run logs, in one Spark job per frame.
+
+The notebook's progress output used to call ``count()`` and
+``select(col).distinct().count()`` separately, each a full job over the
+same plan. ``frame_stats`` folds the row count, distinct counts and any
+extra aggregates into a single aggregation; the notebook only calls it in
+stats-on runs.
+"""
+
+from typing import Any, Dict, Sequence
+
+
+def frame_stats(df, distinct: Sequence[str] = (), **aggregates) -> Dict[str, Any]:
+    """
+    Row count, distinct counts and extra aggregates of a DataFrame in one job.
+
+    Args:
+        df: Spark DataFrame
+        distinct: Columns to count distinct values of (``distinct_<col>`` keys)
+        **aggregates: Extra named aggregate Columns, e.g. ``max_date=F.max('Date')``
+
+    Returns:
+        Dict with ``rows``, ``distinct_<col>`` per column and each extra aggregate
+    """
+    from pyspark.sql import functions as F
+
+    columns = [F.count(F.lit(1)).alias('rows')]
+    columns += [F.countDistinct(c).alias(f"distinct_{c}") for c in distinct]
+    columns += [column.alias(name) for name, column in aggregates.items()]
+    return df.agg(*columns).collect()[0].asDict()
@@ -0,0 +1,281 @@
+"""
+Structured product eligibility as a vectorized customer x product mask.
+
+The catalogue's machine-checkable constraints are parsed once into one row
+of predicates per product:
+
+- ``Age_Range`` ("0-15 years", "18+ years", "All ages") -> min_age, max_age
+- ``Opening_Balance`` / ``Minimum_Balance`` ("₦1,000,000", "0") -> min_balance
+- ``Target_Audience`` -> min_income ("... pension ≥₦500,000") and the
+  audience predicates of ``AUDIENCE_RULES`` (students, pensioners,
+  salaried staff, businesses, Gold / Platinum Premium holders, ...)
+- ``Status`` -> active
+
+Customers are reduced to their age, an income ceiling (the upper bound of
+``Income_Bracket``, the only balance capacity signal in the customer table)
+and one boolean per audience predicate. The mask is then a handful of
+broadcast comparisons plus one (customers x predicates) @ (predicates x
+products) product counting unmet audience requirements; no per-pair Python.
+
+Unknown values never exclude: a customer without an age passes every age
+range, free-text balances ("Standard", "Variable") impose no minimum, and
+audience text that matches no rule is not a constraint.
+"""
+
+import re
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+ELIGIBILITY_COLUMNS = ('Age', 'Gender', 'Occupation', 'Employment_Status', 'Income_Bracket', 'Account_Type')
+BUSINESS_OCCUPATIONS = ('Business Owner', 'Entrepreneur', 'Trader', 'Self-Employed')
+
+# (predicate, Target_Audience pattern): a product requires every predicate whose
+# pattern matches its audience. Patterns are anchored on the audience's leading
+# group so broader audiences ("Customers and merchants", "Students and parents")
+# stay open to everyone.
+AUDIENCE_RULES = (
+    ('student', r'^(?:nigerian )?(?:undergraduate )?students\b(?! and parents)'),
+    ('retired', r'^pensioners\b'),
+    ('employed', r'^(?:salaried\b|staff of\b|federal and state government mda staff\b)'),
+    ('business', r'^(?:small and medium enterprises|sme owners|businesses|merchants|corporate bodies'
+                 r'|female-owned businesses)\b'),
+    ('female', r'^female\b'),
+    ('gold_premium', r'^gold premium account holders\b'),
+    ('platinum_premium', r'^platinum premium account holders\b'),
+)
+
+
+def _text(frame: pd.DataFrame, column: str) -> pd.Series:
+    return frame[column].fillna('').astype(str).str.strip() if column in frame else None
+
+
+def _employment_is(*values: str) -> Callable[[pd.DataFrame], pd.Series]:
+    def predicate(frame):
+        columns = [_text(frame, c) for c in ('Employment_Status', 'Occupation')]
+        columns = [c for c in columns if c is not None]
+        return None if not columns else np.logical_or.reduce([c.isin(values) for c in columns])
+    return predicate
+
+
+def _business(frame):
+    columns = [_text(frame, 'Employment_Status'), _text(frame, 'Occupation'), _text(frame, 'Account_Type')]
+    if all(c is None for c in columns):
+        return None
+    status, occupation, account = (c if c is not None else pd.Series('', index=frame.index) for c in columns)
+    return (status.eq('Self-Employed') | occupation.isin(BUSINESS_OCCUPATIONS)
+            | account.str.contains(r'\bSME\b', regex=True))
+
+
+def _account_contains(text: str) -> Callable[[pd.DataFrame], pd.Series]:
+    def predicate(frame):
+        account = _text(frame, 'Account_Type')
+        return None if account is None else account.str.contains(text, case=False, regex=False)
+    return predicate
+
+
+def _gender_is(value: str) -> Callable[[pd.DataFrame], pd.Series]:
+    def predicate(frame):
+        gender = _text(frame, 'Gender')
+        return None if gender is None else gender.eq(value)
+    return predicate
+
+
+# Customer side of each audience predicate; None (column missing) means unknown
+CUSTOMER_PREDICATES: Dict[str, Callable[[pd.DataFrame], Any]] = {
+    'student': _employment_is('Student'),
+    'retired': _employment_is('Retired'),
+    'employed': _employment_is('Employed'),
+    'business': _business,
+    'female': _gender_is('Female'),
+    'gold_premium': _account_contains('Gold Premium'),
+    'platinum_premium': _account_contains('Platinum Premium'),
+}
+
+_AGE_RANGE = re.compile(r'(\d+)\s*(?:-|–|to)\s*(\d+)|(\d+)\s*\+|(\d+)\s+and\s+above')
+_AMOUNT = re.compile(r'\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?')
+_MIN_AMOUNT = re.compile(r'(?:≥|>=|at least|minimum(?: of)?)\s*₦?\s*(\d{1,3}(?:,\d{3})+|\d+)', re.IGNORECASE)
+
+
+def parse_age_range(text: Any) -> Tuple[float, float]:
+    """``"16-25 years"`` -> (16, 25), ``"18+ years"`` -> (18, inf), anything else -> (nan, nan)."""
+    match = _AGE_RANGE.search(str(text)) if text is not None else None
+    if not match:
+        return np.nan, np.nan
+    low, high, plus, above = match.groups()
+    if low is not None:
+        return float(low), float(high)
+    return float(plus or above), np.inf
+
+
+def parse_amount(text: Any) -> float:
+    """Naira amount in ``text`` (``"₦1,000,000"`` -> 1e6, ``"Zero"`` -> 0); nan when not numeric."""
+    if text is None or (isinstance(text, float) and np.isnan(text)):
+        return np.nan
+    if isinstance(text, (int, float)):
+        return float(text)
+    text = str(text).strip()
+    if text.lower() in ('zero', 'none', 'nil'):
+        return 0.0
+    match = _AMOUNT.search(text)
+    return float(match.group(0).replace(',', '')) if match else np.nan
+
+
+def parse_income_bracket(text: Any) -> Tuple[float, float]:
+    """``"₦100,000 - ₦250,000"`` -> (1e5, 2.5e5), ``"< ₦100,000"`` -> (0, 1e5), ``"> ₦2,500,000"`` -> (2.5e6, inf)."""
+    if text is None or (isinstance(text, float) and np.isnan(text)):
+        return np.nan, np.nan
+    text = str(text)
+    amounts = [float(a.replace(',', '')) for a in _AMOUNT.findall(text)]
+    if not amounts:
+        return np.nan, np.nan
+    if text.lstrip().startswith('<'):
+        return 0.0, amounts[0]
+    if text.lstrip().startswith('>'):
+        return amounts[0], np.inf
+    return amounts[0], amounts[-1]
+
+
+def _minimum_in_text(text: str) -> float:
+    match = _MIN_AMOUNT.search(text)
+    return parse_amount(match.group(1)) if match else np.nan
+
+
+def _frame(rows) -> pd.DataFrame:
+    if isinstance(rows, pd.DataFrame):
+        return rows
+    if hasattr(rows, 'toPandas'):
+        return rows.toPandas()
+    return pd.DataFrame([row.asDict() if hasattr(row, 'asDict') else dict(row) for row in rows])
+
+
+def product_rules(products) -> pd.DataFrame:
+    """
+    Parse the catalogue's constraints into one predicate row per product.
+
+    Args:
+        products: Catalogue (pandas or Spark DataFrame, or collected Rows / dicts)
+
+    Returns:
+        DataFrame indexed by Product_Name, in catalogue order, with min_age,
+        max_age, min_balance, min_income (nan = no constraint), active and
+        one ``requires_<predicate>`` bool column per ``AUDIENCE_RULES`` entry
+    """
+    products = _frame(products)
+    index = pd.Index(products['Product_Name'], name='Product_Name')
+    ages = [parse_age_range(value) for value in products.get('Age_Range', pd.Series(None, index=products.index))]
+    audience = (products['Target_Audience'].fillna('').astype(str).str.strip().str.lower()
+                if 'Target_Audience' in products else pd.Series('', index=products.index))
+
+    balances = [products[c].map(parse_amount).to_numpy(dtype=np.float64)
+                for c in ('Opening_Balance', 'Minimum_Balance') if c in products]
+    with np.errstate(invalid='ignore'):
+        min_balance = np.fmax.reduce(balances) if balances else np.full(len(products), np.nan)
+    min_income = audience.map(_minimum_in_text)
+
+    rules = pd.DataFrame({
+        'min_age': [low for low, _ in ages],
+        'max_age': [high for _, high in ages],
+        'min_balance': np.where(min_balance > 0, min_balance, np.nan),
+        'min_income': min_income.to_numpy(dtype=np.float64),
+        'active': (products['Status'].fillna('Active').astype(str).str.strip().str.lower().eq('active').to_numpy()
+                   if 'Status' in products else np.ones(len(products), dtype=bool)),
+    }, index=index)
+    for name, pattern in AUDIENCE_RULES:
+        rules[f"requires_{name}"] = audience.str.contains(pattern, regex=True).to_numpy()
+    return rules
+
+
+def customer_attributes(customers) -> pd.DataFrame:
+    """
+    Age, income ceiling and audience predicates per customer (input order).
+
+    Args:
+        customers: Customer table with any of ``ELIGIBILITY_COLUMNS`` (pandas
+            or Spark DataFrame, or collected Rows / dicts)
+
+    Returns:
+        DataFrame with age and income_max (nan = unknown) and one bool column
+        per predicate (True where the column needed is missing)
+    """
+    customers = _frame(customers)
+    n = len(customers)
+    attributes = pd.DataFrame(index=customers.index)
+    attributes['age'] = (pd.to_numeric(customers['Age'], errors='coerce').to_numpy(dtype=np.float64)
+                         if 'Age' in customers else np.full(n, np.nan))
+    attributes['income_max'] = ([parse_income_bracket(v)[1] for v in customers['Income_Bracket']]
+                                if 'Income_Bracket' in customers else np.full(n, np.nan))
+    # Customers absent from the customer table (all columns null) satisfy every predicate
+    present = [c for c in ELIGIBILITY_COLUMNS if c in customers]
+    unknown = customers[present].isna().all(axis=1).to_numpy() if present else np.ones(n, dtype=bool)
+    for name, _ in AUDIENCE_RULES:
+        values = CUSTOMER_PREDICATES[name](customers)
+        attributes[name] = True if values is None else np.asarray(values, dtype=bool) | unknown
+    return attributes
+
+
+def eligibility_mask(customers, rules: pd.DataFrame) -> np.ndarray:
+    """
+    Boolean (n_customers, n_products) mask: True where the product's rules admit the customer.
+
+    Args:
+        customers: Customer rows (see ``customer_attributes``), or the
+            attributes frame it returns
+        rules: ``product_rules`` frame, optionally reindexed to another
+            product order (rows of unknown products are all-NaN and admit
+            everyone)
+
+    Returns:
+        Mask with rows in customer order and columns in ``rules`` order
+    """
+    attributes = customers if 'income_max' in getattr(customers, 'columns', ()) else customer_attributes(customers)
+    predicates = [name for name, _ in AUDIENCE_RULES]
+
+    age = attributes['age'].to_numpy(dtype=np.float64)[:, None]
+    min_age = rules['min_age'].fillna(-np.inf).to_numpy(dtype=np.float64)[None, :]
+    max_age = rules['max_age'].fillna(np.inf).to_numpy(dtype=np.float64)[None, :]
+    mask = np.isnan(age) | ((age >= min_age) & (age <= max_age))
+
+    income = attributes['income_max'].to_numpy(dtype=np.float64)[:, None]
+    with np.errstate(invalid='ignore'):
+        required = np.fmax(rules['min_balance'].to_numpy(dtype=np.float64),
+                           rules['min_income'].to_numpy(dtype=np.float64))
+    mask &= np.isnan(income) | (income >= np.nan_to_num(required, nan=0.0)[None, :])
+
+    # Unmet requirements per pair: (customers x predicates) @ (predicates x products)
+    missing = (~attributes[predicates].to_numpy(dtype=bool)).astype(np.int32)
+    requires = rules[[f"requires_{name}" for name in predicates]].fillna(False).to_numpy(dtype=bool)
+    mask &= (missing @ requires.T.astype(np.int32)) == 0
+
+    mask &= rules['active'].fillna(True).to_numpy(dtype=bool)[None, :]
+    return mask
+
+
+def aligned_mask(customers: pd.DataFrame, customer_lookup: pd.DataFrame, user_ids: np.ndarray,
+                 rules: pd.DataFrame, product_lookup: pd.DataFrame, item_ids: np.ndarray) -> np.ndarray:
+    """
+    Eligibility mask in ALS factor order, for filtering top-N scoring.
+
+    Args:
+        customers: Customer table with Customer_ID and ``ELIGIBILITY_COLUMNS``
+        customer_lookup: Customer_ID, user_int
+        user_ids: user_int per user factor row
+        rules: ``product_rules`` frame
+        product_lookup: Product_Name, item_int
+        item_ids: item_int per item factor row
+
+    Returns:
+        (len(user_ids), len(item_ids)) bool mask; users or items missing
+        from the lookups or the customer table are unconstrained
+    """
+    customers = _frame(customers)
+    customer_lookup, product_lookup = _frame(customer_lookup), _frame(product_lookup)
+    columns = ['Customer_ID', *(c for c in ELIGIBILITY_COLUMNS if c in customers)]
+    users = (customer_lookup[['Customer_ID', 'user_int']]
+             .merge(customers[columns].drop_duplicates('Customer_ID'), on='Customer_ID', how='left')
+             .set_index('user_int').reindex(np.asarray(user_ids, dtype=np.int64)).reset_index(drop=True))
+    names = product_lookup.set_index('item_int')['Product_Name'].reindex(np.asarray(item_ids, dtype=np.int64))
+    return eligibility_mask(users, rules.reindex(names.to_numpy()))
+
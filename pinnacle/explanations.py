@@ -0,0 +1,183 @@
+"""
+Deduplicated, batched LLM explanation generation.
+
+Recommendations whose explanation inputs normalize to the same key (product,
+rank, occupation, income bracket, age band) share one explanation. Distinct
+keys are packed several to one JSON-mode request and dispatched through
+``pinnacle.llm_dispatch`` so the number of LLM calls grows with the number of
+distinct profiles, not with the number of customers.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pinnacle.llm_dispatch import RateLimiter, dispatch_batches
+from pinnacle.metrics import RunMetrics
+
+
+AGE_BANDS = [(0, 17, 'under 18'), (18, 24, '18-24'), (25, 34, '25-34'), (35, 44, '35-44'),
+             (45, 54, '45-54'), (55, 64, '55-64'), (65, 200, '65+')]
+
+RANK_CONTEXT = {
+    1: "This is the TOP recommendation for this customer.",
+    2: "This is the SECOND-BEST option for this customer.",
+    3: "This is the THIRD-BEST option for this customer.",
+}
+
+SYSTEM_PROMPT = ("You are a professional banking analytics assistant providing product recommendation "
+                 "rationale to account managers. Always use third-person language. Return only valid JSON.")
+
+
+def age_band(age: Any) -> str:
+    """Bucket an age into the bands used for explanation grouping."""
+    try:
+        age = int(float(age))
+    except (TypeError, ValueError):
+        return 'Unknown'
+    for low, high, label in AGE_BANDS:
+        if low <= age <= high:
+            return label
+    return 'Unknown'
+
+
+def _normalize(value: Any) -> str:
+    if value is None:
+        return 'Unknown'
+    text = ' '.join(str(value).split())
+    return text if text else 'Unknown'
+
+
+def explanation_key(product_name: str, rank: int, cust_dict: Dict[str, Any]) -> Tuple[str, int, str, str, str]:
+    """Normalized grouping key: (product, rank, occupation, income bracket, age band)."""
+    return (
+        _normalize(product_name),
+        int(rank),
+        _normalize(cust_dict.get('Occupation')).title(),
+        _normalize(cust_dict.get('Income_Bracket')),
+        age_band(cust_dict.get('Age')),
+    )
+
+
+def fallback_explanation(product_name: str, confidence_pct: float) -> str:
+    """Professional fallback used when the LLM gives no usable explanation."""
+    return (f"This customer's profile and banking behavior patterns indicate strong alignment with "
+            f"{product_name}. Recommendation confidence: {confidence_pct:.1f}%.")
+
+
+def build_group_prompt(keyed_profiles: Sequence[Tuple[str, Tuple[str, int, str, str, str]]]) -> str:
+    """Prompt asking for one explanation per profile, answered as a JSON object."""
+    blocks = []
+    for profile_id, (product, rank, occupation, income, band) in keyed_profiles:
+        blocks.append(
+            f"[{profile_id}]\n"
+            f"- Recommended product: {product}\n"
+            f"- Recommendation rank: #{rank} (out of top 3). "
+            f"{RANK_CONTEXT.get(rank, f'This ranks #{rank} for this customer.')}\n"
+            f"- Occupation: {occupation}\n"
+            f"- Income bracket: {income}\n"
+            f"- Age band: {band}"
+        )
+
+    return f"""You are an AI assistant helping bank account managers make product recommendations. For each customer profile below, provide a brief explanation (2-3 sentences) for why the recommended product suits that profile.
+
+# PROFILES
+{chr(10).join(blocks)}
+
+Each explanation must:
+1. Use third-person language (e.g., "This customer...", "The client's...", "Their profile indicates...")
+2. Reference the profile attributes that justify the recommendation
+3. Explain the product fit based on demographics and financial profile
+4. Be concise and actionable (2-3 sentences max)
+5. Consider the ranking - top recommendations should emphasize strongest fit factors
+6. NOT mention customer IDs or exact ages, and NOT use "you" or "your"
+
+Return ONLY valid JSON with this exact structure:
+{{
+  "explanations": [
+    {{"id": "E1", "text": "This customer's profile as a ..."}}
+  ]
+}}"""
+
+
+def generate_grouped_explanations(client: Any,
+                                  recommendations: Sequence[Dict[str, Any]],
+                                  customer_dict: Dict[str, Dict[str, Any]],
+                                  model: str,
+                                  group_batch_size: int = 10,
+                                  temperature: float = 0.7,
+                                  max_in_flight: int = 4,
+                                  limiter: Optional[RateLimiter] = None,
+                                  metrics: Optional[RunMetrics] = None) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Generate explanations for many recommendations with few LLM calls.
+
+    Args:
+        client: OpenAI client
+        recommendations: Rows/dicts with Customer_ID, Product_Name,
+            confidence_score_pct and rank
+        customer_dict: Customer features by Customer_ID
+        model: Chat model name
+        group_batch_size: Distinct explanation keys packed per request
+        temperature: LLM temperature
+        max_in_flight: Concurrent requests
+        limiter: Optional RPM/TPM limiter
+        metrics: Optional run metrics recording request latency and token usage
+
+    Returns:
+        (explanations, stats): one explanation per recommendation, in order,
+        and a dict with recommendations, unique_keys, llm_calls, failed_calls
+        and calls_per_recommendation
+    """
+    rec_keys = [
+        explanation_key(rec['Product_Name'], rec['rank'], customer_dict.get(rec['Customer_ID'], {}))
+        for rec in recommendations
+    ]
+    unique_keys = list(dict.fromkeys(rec_keys))
+    profile_ids = {key: f"E{i + 1}" for i, key in enumerate(unique_keys)}
+
+    batches = [unique_keys[i:i + group_batch_size] for i in range(0, len(unique_keys), group_batch_size)]
+    prompts = [build_group_prompt([(profile_ids[key], key) for key in batch]) for batch in batches]
+
+    def explain_batch(prompt):
+        request = dict(
+            model=model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            max_tokens=150 * group_batch_size,
+            response_format={"type": "json_object"}
+        )
+        response = (metrics.timed_completion(client, 'explanation', **request) if metrics
+                    else client.chat.completions.create(**request))
+        result = json.loads(response.choices[0].message.content)
+        return {item['id']: item['text'].strip()
+                for item in result.get('explanations', [])
+                if isinstance(item, dict) and item.get('id') and item.get('text')}
+
+    results = dispatch_batches(explain_batch, prompts, max_in_flight=max_in_flight, limiter=limiter)
+
+    texts_by_id = {}
+    failed_calls = 0
+    for result in results:
+        if isinstance(result, Exception):
+            failed_calls += 1
+            print(f"    ✗ Explanation batch failed: {str(result)[:100]}")
+            continue
+        texts_by_id.update(result)
+
+    explanations = []
+    for rec, key in zip(recommendations, rec_keys):
+        text = texts_by_id.get(profile_ids[key])
+        explanations.append(text if text else fallback_explanation(rec['Product_Name'],
+                                                                   float(rec['confidence_score_pct'])))
+
+    stats = {
+        'recommendations': len(recommendations),
+        'unique_keys': len(unique_keys),
+        'llm_calls': len(prompts),
+        'failed_calls': failed_calls,
+        'calls_per_recommendation': len(prompts) / len(recommendations) if recommendations else 0.0
+    }
+    return explanations, stats
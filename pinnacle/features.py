@@ -0,0 +1,146 @@
+"""
+Transaction feature aggregation for ``engineer_customer_features`` (Spark).
+
+Sections 1-3 of the feature builder (date range, aggregates, category
+preferences) as a single grouped pass: transactions are hash-partitioned by
+``Customer_ID`` once, and every aggregate below reuses that partitioning, so
+the plan has one shuffle of the transactions instead of one per ``groupBy``,
+window and join. All aggregates keep bounded state per customer (no
+per-customer lists of amounts).
+"""
+
+from datetime import timedelta
+
+
+TRANSACTION_FEATURE_COLUMNS = [
+    'Customer_ID', 'total_debit', 'total_credit', 'avg_transaction', 'std_transaction',
+    'median_transaction', 'transaction_count', 'debit_count', 'credit_count',
+    'unique_categories', 'unique_destinations', 'recent_transaction_count', 'recent_debit',
+    'current_account', 'date_span_days', 'top_category', 'top_category_amount',
+    'category_concentration'
+]
+
+
+def prepare_transactions(df_trans, recency_days=90):
+    """Date cast, debit/credit flags and recency flags used by the aggregates."""
+    from pyspark.sql import functions as F
+
+    df_trans = df_trans.withColumn('Date', F.to_date(F.col('Date')))
+    df_trans = df_trans.withColumn('is_debit', F.when(F.col('Deb_or_credit') == 'D', 1).otherwise(0))
+    df_trans = df_trans.withColumn('is_credit', F.when(F.col('Deb_or_credit') == 'C', 1).otherwise(0))
+    df_trans = df_trans.withColumn('debit_amount', F.col('Trans_Amount') * F.col('is_debit'))
+    df_trans = df_trans.withColumn('credit_amount', F.col('Trans_Amount') * F.col('is_credit'))
+
+    max_date = df_trans.agg(F.max('Date')).collect()[0][0]
+    recent_threshold = max_date - timedelta(days=recency_days)
+
+    df_trans = df_trans.withColumn('is_recent', F.when(F.col('Date') >= F.lit(recent_threshold), 1).otherwise(0))
+    return df_trans.withColumn('recent_debit', F.col('debit_amount') * F.col('is_recent'))
+
+
+def aggregate_transaction_features(df_trans, recency_days=90):
+    """
+    Per-customer transaction features from one shuffle of the transactions.
+
+    Args:
+        df_trans: Transaction DataFrame (Customer_ID, Date, Trans_Amount,
+            Deb_or_credit, Category, Destination, Account_Type)
+        recency_days: Window for recent_transaction_count / recent_debit
+
+    Returns:
+        DataFrame with ``TRANSACTION_FEATURE_COLUMNS`` (nulls not yet filled)
+    """
+    from pyspark.sql import Window, functions as F
+
+    # The only exchange: (Customer_ID, Category) and Customer_ID groupings below
+    # are both satisfied by hash partitioning on Customer_ID
+    df_trans = prepare_transactions(df_trans, recency_days).repartition('Customer_ID')
+
+    # Amount distribution per customer as whole-partition window aggregates over
+    # the same partitioning (a sort, no exchange): percentile_approx and
+    # stddev_samp keep a bounded sketch / running moments per customer, and the
+    # window buffer spills, unlike collecting every amount into one row
+    customer = Window.partitionBy('Customer_ID')
+    df_trans = (df_trans
+        .withColumn('avg_transaction', F.avg('Trans_Amount').over(customer))
+        .withColumn('std_transaction', F.stddev_samp('Trans_Amount').over(customer))
+        .withColumn('median_transaction', F.percentile_approx('Trans_Amount', 0.5).over(customer)))
+
+    # (Customer_ID, Category) pre-aggregate carrying mergeable partials for
+    # the other features, so top category, top amount and concentration come
+    # out of the same pass as the customer totals
+    category_agg = df_trans.groupBy('Customer_ID', 'Category').agg(
+        F.count('Trans_Amount').alias('amount_count'),
+        F.first('avg_transaction').alias('avg_transaction'),
+        F.first('std_transaction').alias('std_transaction'),
+        F.first('median_transaction').alias('median_transaction'),
+        F.sum('debit_amount').alias('debit_amount'),
+        F.sum('credit_amount').alias('credit_amount'),
+        F.sum('is_debit').alias('debit_count'),
+        F.sum('is_credit').alias('credit_count'),
+        F.sum('is_recent').alias('recent_count'),
+        F.sum('recent_debit').alias('recent_debit'),
+        F.collect_set('Destination').alias('destinations'),
+        F.first('Account_Type').alias('account_type'),
+        F.min('Date').alias('min_date'),
+        F.max('Date').alias('max_date')
+    )
+
+    customer_agg = category_agg.groupBy('Customer_ID').agg(
+        # Financial metrics
+        F.sum('debit_amount').alias('total_debit'),
+        F.sum('credit_amount').alias('total_credit'),
+        F.sum('amount_count').alias('transaction_count'),
+        F.first('avg_transaction').alias('avg_transaction'),
+        F.first('std_transaction').alias('std_transaction'),
+        F.first('median_transaction').alias('median_transaction'),
+
+        # Debit/Credit counts
+        F.sum('debit_count').alias('debit_count'),
+        F.sum('credit_count').alias('credit_count'),
+
+        # Diversity metrics (one pre-aggregate row per distinct category)
+        F.count('Category').alias('unique_categories'),
+        F.size(F.array_distinct(F.flatten(F.collect_list('destinations')))).alias('unique_destinations'),
+
+        # Recency
+        F.sum('recent_count').alias('recent_transaction_count'),
+        F.sum('recent_debit').alias('recent_debit'),
+
+        # Account type (most common using first)
+        F.first('account_type').alias('current_account'),
+
+        # Date range
+        F.min('min_date').alias('min_date'),
+        F.max('max_date').alias('max_date'),
+
+        # Category preferences over debit transactions
+        F.max_by(F.when(F.col('debit_count') > 0, F.col('Category')), F.col('debit_count')).alias('top_category'),
+        F.max(F.when(F.col('debit_count') > 0, F.col('debit_amount'))).alias('top_category_amount'),
+        F.max('debit_count').alias('max_category_count'),
+        F.sum('debit_count').alias('total_debit_count')
+    )
+
+    span = F.datediff(F.col('max_date'), F.col('min_date'))
+
+    return customer_agg.select(
+        'Customer_ID',
+        'total_debit',
+        'total_credit',
+        'avg_transaction',
+        'std_transaction',
+        'median_transaction',
+        'transaction_count',
+        'debit_count',
+        'credit_count',
+        'unique_categories',
+        'unique_destinations',
+        'recent_transaction_count',
+        'recent_debit',
+        'current_account',
+        F.when(span == 0, 1).otherwise(span).alias('date_span_days'),
+        'top_category',
+        'top_category_amount',
+        F.when(F.col('total_debit_count') > 0,
+               F.col('max_category_count') / F.col('total_debit_count')).alias('category_concentration')
+    )
@@ -0,0 +1,159 @@
+"""
+Real-time ALS fold-in for new or changed customers.
+
+Solves the same regularized least-squares problem Spark's ALS solves for a
+user in its last half-iteration, against the frozen item factors:
+
+    (Y_I^T Y_I + regParam * |I| * I) x = Y_I^T r_I
+
+where ``I`` are the items the customer has scores for (Spark scales
+``regParam`` by the number of ratings). With ``nonnegative=True`` (as the
+notebook trains) the system is solved as a non-negative least-squares
+problem. The item Gram matrix ``Y^T Y`` is computed once; customers with
+scores for most of the catalogue reuse it instead of rebuilding ``Y_I^T Y_I``.
+
+Factors from the implicit backend (``pinnacle.implicit_als``) are folded in
+with ``implicit_alpha`` set, solving that model's user step instead:
+
+    (Y^T Y + Y_I^T (C_I - I) Y_I + lambda * I) x = Y_I^T C_I 1
+
+with confidences ``C = 1 + alpha * score`` on the observed items, preference
+1 on them and 0 elsewhere, and an unscaled ``lambda`` (``regularization``).
+"""
+
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from pinnacle.scoring import factors_to_array
+
+
+class FoldInRecommender:
+    """
+    Top-N recommendations for customers outside the trained ALS model.
+
+    Args:
+        item_ids: ALS item ids (``item_int``), one per row of ``item_factors``
+        item_factors: (n_items, rank) frozen item factor matrix
+        reg_param: ALS ``regParam`` the item factors were trained with (the
+            implicit backend's ``regularization`` with ``implicit_alpha``)
+        nonnegative: Solve with non-negativity constraints (ALS ``nonnegative``)
+        implicit_alpha: Confidence scaling of implicit-feedback factors; when
+            set, scores are folded in as confidences ``1 + alpha * score``
+            (``nonnegative`` does not apply)
+    """
+
+    def __init__(self, item_ids: np.ndarray, item_factors: np.ndarray,
+                 reg_param: float, nonnegative: bool = True, implicit_alpha: Optional[float] = None):
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)
+        self.item_factors = np.ascontiguousarray(item_factors, dtype=np.float64)
+        self.reg_param = reg_param
+        self.implicit_alpha = implicit_alpha
+        self.nonnegative = nonnegative and implicit_alpha is None
+        self.rank = self.item_factors.shape[1]
+        self.gram = self.item_factors.T @ self.item_factors
+        self._row_of = {int(item): row for row, item in enumerate(self.item_ids)}
+
+    @classmethod
+    def from_model(cls, als_model, reg_param: float, nonnegative: bool = True) -> 'FoldInRecommender':
+        """Build from a fitted Spark ``ALSModel`` (collects its item factors)."""
+        item_ids, item_factors = factors_to_array(als_model.itemFactors.collect())
+        return cls(item_ids, item_factors, reg_param, nonnegative=nonnegative)
+
+    def _normal_equations(self, rows: np.ndarray, ratings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        observed = self.item_factors[rows]
+        if self.implicit_alpha is not None:
+            confidence = 1.0 + self.implicit_alpha * ratings
+            ata = self.gram + (observed * (confidence - 1.0)[:, None]).T @ observed
+            return ata + self.reg_param * np.eye(self.rank), observed.T @ confidence
+        if 2 * len(rows) > len(self.item_ids):
+            # Dense vectors: subtract the unobserved items from the cached Gram
+            unobserved = np.ones(len(self.item_ids), dtype=bool)
+            unobserved[rows] = False
+            rest = self.item_factors[unobserved]
+            ata = self.gram - rest.T @ rest
+        else:
+            ata = observed.T @ observed
+        ata = ata + self.reg_param * len(rows) * np.eye(self.rank)
+        return ata, observed.T @ ratings
+
+    def fold_in(self, interactions: Mapping[int, float]) -> np.ndarray:
+        """
+        Customer factor vector for ``{item_int: interaction_score}``.
+
+        Items unknown to the model are ignored; an empty vector folds in to
+        the zero vector.
+        """
+        pairs = [(self._row_of[int(item)], float(score)) for item, score in interactions.items()
+                 if int(item) in self._row_of and score is not None]
+        if not pairs:
+            return np.zeros(self.rank, dtype=np.float32)
+
+        rows = np.array([row for row, _ in pairs], dtype=np.int64)
+        ratings = np.array([score for _, score in pairs], dtype=np.float64)
+        ata, atb = self._normal_equations(rows, ratings)
+
+        if not self.nonnegative:
+            return np.linalg.solve(ata, atb).astype(np.float32)
+
+        from scipy.optimize import nnls
+
+        # min x'Ax - 2b'x over x >= 0, as a least-squares problem on the Cholesky factor
+        factor = np.linalg.cholesky(ata)
+        x, _ = nnls(factor.T, np.linalg.solve(factor, atb))
+        return x.astype(np.float32)
+
+    def recommend(self, interactions: Mapping[int, float], top_n: int = 5,
+                  exclude_seen: bool = False) -> List[Dict[str, Any]]:
+        """
+        Fold a customer in and return their top-N items.
+
+        Args:
+            interactions: ``{item_int: interaction_score}`` (RFM or LLM scores)
+            top_n: Number of recommendations
+            exclude_seen: Drop items present in ``interactions``
+
+        Returns:
+            Rows in the ``item_int, als_score, rank`` layout of Step 4
+        """
+        scores = self.item_factors @ self.fold_in(interactions).astype(np.float64)
+        if exclude_seen:
+            for item in interactions:
+                row = self._row_of.get(int(item))
+                if row is not None:
+                    scores[row] = -np.inf
+
+        k = min(top_n, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        candidates.sort()
+        order = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [
+            {'item_int': int(self.item_ids[row]), 'als_score': float(scores[row]), 'rank': rank}
+            for rank, row in enumerate(order, start=1)
+        ]
+
+
+def recommend_by_name(recommender: FoldInRecommender, product_scores: Mapping[str, float],
+                      product_index: Mapping[str, int], top_n: int = 5,
+                      exclude_seen: bool = False) -> List[Dict[str, Any]]:
+    """
+    ``FoldInRecommender.recommend`` keyed by ``Product_Name``.
+
+    Args:
+        recommender: Fold-in recommender over the trained item factors
+        product_scores: ``{Product_Name: interaction_score}``
+        product_index: ``{Product_Name: item_int}`` from ``product_lookup``
+        top_n: Number of recommendations
+        exclude_seen: Drop products present in ``product_scores``
+
+    Returns:
+        Rows with Product_Name, als_score and rank
+    """
+    product_names: Dict[int, Optional[str]] = {item: name for name, item in product_index.items()}
+    interactions = {product_index[name]: score for name, score in product_scores.items() if name in product_index}
+    return [
+        {'Product_Name': product_names.get(row['item_int']), 'als_score': row['als_score'], 'rank': row['rank']}
+        for row in recommender.recommend(interactions, top_n=top_n, exclude_seen=exclude_seen)
+    ]
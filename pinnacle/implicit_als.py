@@ -0,0 +1,112 @@
+"""
+Implicit-feedback ALS backend on the ``implicit`` library.
+
+Treats each customer-product interaction score as evidence of preference
+rather than a rating to reproduce: the CSR user x item matrix holds the
+confidence ``1 + alpha * interaction_score`` of every observed pair, and
+``implicit``'s multi-threaded conjugate-gradient ALS fits
+``x_u . y_i ~ 1`` on observed pairs and ``~ 0`` elsewhere, weighted by that
+confidence. Factors come back in the ``(ids, factors)`` form of
+``factors_to_array``, so top-N scoring, the audience index and the factor
+export take them unchanged.
+
+Predicted scores are preferences (roughly 0-1), not 1-5 ratings, so RMSE
+against ``interaction_score`` does not apply; evaluate with ranking
+metrics instead.
+"""
+
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+
+def confidence_matrix(user_int: np.ndarray, item_int: np.ndarray, scores: np.ndarray, alpha: float,
+                      shape: Optional[Tuple[int, int]] = None):
+    """
+    CSR user x item confidence matrix ``1 + alpha * score`` (duplicates summed).
+
+    Args:
+        user_int: Dense user ids (rows)
+        item_int: Dense item ids (columns)
+        scores: Interaction scores
+        alpha: Confidence scaling
+        shape: (n_users, n_items) (default: max id + 1 on each axis)
+
+    Returns:
+        float32 ``scipy.sparse.csr_matrix``
+    """
+    from scipy.sparse import csr_matrix
+
+    user_int = np.asarray(user_int, dtype=np.int64)
+    item_int = np.asarray(item_int, dtype=np.int64)
+    confidence = 1.0 + alpha * np.asarray(scores, dtype=np.float32)
+    if shape is None:
+        shape = (int(user_int.max(initial=-1)) + 1, int(item_int.max(initial=-1)) + 1)
+    matrix = csr_matrix((confidence, (user_int, item_int)), shape=shape, dtype=np.float32)
+    matrix.sum_duplicates()
+    return matrix
+
+
+def train_implicit_als(user_int: np.ndarray, item_int: np.ndarray, scores: np.ndarray,
+                       factors: int = 50, regularization: float = 0.01, iterations: int = 15,
+                       alpha: float = 40.0, num_threads: int = 0, random_state: Optional[int] = 42,
+                       init_factors: Optional[Tuple[np.ndarray, np.ndarray]] = None
+                       ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Fit implicit-feedback ALS on indexed interactions.
+
+    Args:
+        user_int, item_int, scores: Indexed interactions (the notebook's idx_df columns)
+        factors, regularization, iterations, alpha: ``CONFIG['als']`` hyperparameters
+        num_threads: Worker threads (0 = all cores)
+        random_state: Factor initialization seed
+        init_factors: Optional (user_factors, item_factors) of an earlier fit
+            on the same interactions, to warm-start from
+
+    Returns:
+        (user_ids, user_factors, item_ids, item_factors), ids int64 and
+        factors C-contiguous float32, covering the users and items that
+        occur in the training interactions
+    """
+    from implicit.cpu.als import AlternatingLeastSquares
+
+    user_items = confidence_matrix(user_int, item_int, scores, alpha)
+    model = AlternatingLeastSquares(factors=factors, regularization=regularization, alpha=1.0,
+                                    iterations=iterations, num_threads=num_threads,
+                                    random_state=random_state, calculate_training_loss=False)
+    # alpha=1.0: the matrix already holds 1 + alpha * score, which implicit uses as-is
+    user_ids = np.unique(np.asarray(user_int, dtype=np.int64))
+    item_ids = np.unique(np.asarray(item_int, dtype=np.int64))
+    if init_factors is not None:
+        model.user_factors = np.zeros((user_items.shape[0], factors), dtype=np.float32)
+        model.item_factors = np.zeros((user_items.shape[1], factors), dtype=np.float32)
+        model.user_factors[user_ids], model.item_factors[item_ids] = init_factors
+    model.fit(user_items, show_progress=False)
+
+    return (user_ids, np.ascontiguousarray(model.user_factors[user_ids], dtype=np.float32),
+            item_ids, np.ascontiguousarray(model.item_factors[item_ids], dtype=np.float32))
+
+
+def train_from_config(idx_df, als_config: Dict[str, Any], num_threads: int = 0,
+                      random_state: Optional[int] = 42) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    ``train_implicit_als`` on a pandas or Spark idx_df, driven by ``CONFIG['als']``.
+
+    Args:
+        idx_df: Frame with user_int, item_int and interaction_score (a Spark
+            DataFrame is collected to the driver)
+        als_config: Dict with factors, regularization, iterations and alpha
+        num_threads: Worker threads (0 = all cores)
+        random_state: Factor initialization seed
+
+    Returns:
+        (user_ids, user_factors, item_ids, item_factors) as ``train_implicit_als``
+    """
+    columns = ['user_int', 'item_int', 'interaction_score']
+    if not hasattr(idx_df, 'to_numpy'):
+        idx_df = idx_df.select(*columns).toPandas()
+    return train_implicit_als(idx_df['user_int'].to_numpy(), idx_df['item_int'].to_numpy(),
+                              idx_df['interaction_score'].to_numpy(),
+                              factors=als_config['factors'], regularization=als_config['regularization'],
+                              iterations=als_config['iterations'], alpha=als_config['alpha'],
+                              num_threads=num_threads, random_state=random_state)
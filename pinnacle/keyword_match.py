@@ -0,0 +1,313 @@
+"""
+Single-pass multi-keyword matching of transactions to products.
+
+The keyword dictionary is generated from the catalogue: every product has a
+name unit (the distinctive tokens of ``Product_Name``) and one unit per
+``Key_Features`` item ("Small business loans", "Education loan", ...).
+A text's weight for a product is the best unit coverage, the IDF-weighted
+share of the unit's tokens present in the text, times the unit weight
+(``NAME_WEIGHT`` / ``FEATURE_WEIGHT``). "Gold Premium Current Account" thus
+covers the Gold Premium account fully and the Platinum Premium account only
+in part. IDF discounts tokens shared by many products, instead of the old
+keyword join fanning one keyword out to every product carrying it.
+
+Two corrections keep generic and near-miss texts in their product family:
+
+- each product also has a fallback unit from its ``Product_Category``
+  ("Savings Account" -> saving), weighted ``CATEGORY_WEIGHT`` and used only
+  for texts that match no product through names or features, so a generic
+  "Savings Account" still reaches every savings product;
+- ``CONFLICTING_TOKENS`` are groups of mutually exclusive family tokens
+  (current / savings / card / loan, classic / gold / platinum, ...). A product whose name
+  or category carries a token of a group is weighted ``CONFLICT_PENALTY``
+  times less for texts naming another token of that group, so "Individual
+  Current Account" does not reach the Individual Savings account.
+
+Matching is a token index: texts are tokenized once per distinct value, the
+(texts x tokens) indicator is multiplied with the (tokens x units) IDF
+matrix, and units are reduced to products with ``np.maximum.reduceat``.
+Transactions map onto the distinct (Account_Type, Description, ...)
+combinations, so each transaction costs one array lookup. Every product at
+or above ``min_weight`` is emitted, across all text columns, in one pass.
+
+Usage:
+    matcher = KeywordMatcher.from_products(products)
+    matches = matcher.match(transactions)                    # pandas
+    matches = match_transactions_spark(df_trans, matcher)    # Spark (mapInPandas)
+"""
+
+import re
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+TEXT_COLUMNS = ('Account_Type', 'Description', 'Narration')
+MATCH_COLUMNS = ('Customer_ID', 'Trans_Amount', 'Date')
+NAME_WEIGHT = 1.0
+FEATURE_WEIGHT = 0.5
+CATEGORY_WEIGHT = 0.6
+MIN_MATCH_WEIGHT = 0.5
+CONFLICT_PENALTY = 0.5
+
+# Mutually exclusive family tokens (stemmed): a text naming one excludes products carrying another
+CONFLICTING_TOKENS = (
+    ('current', 'saving', 'card', 'loan'),
+    ('classic', 'gold', 'platinum'),
+    ('debit', 'credit', 'prepaid'),
+)
+
+# Tokens that say nothing about which product a text refers to (stemmed)
+STOPWORDS = frozenset("""
+    a access account all an and any at available balance bank by customer day fast for free from highest
+    higher hour in is limit max maximum min minimum more no of on opening or over per seamless simple single
+    the to up upon via with within zenith zero
+""".split())
+
+_TOKEN = r'[a-z0-9]*[a-z][a-z0-9]*'
+_PLURAL = r'(?<=[a-z]{2}[^su])s$'
+# Commas inside parentheses belong to the same feature item
+_FEATURE_SPLIT = re.compile(r',\s*(?![^()]*\))')
+
+
+def tokens(text) -> List[str]:
+    """Distinct stemmed lowercase word tokens of ``text``, without stopwords and bare numbers."""
+    if text is None or (isinstance(text, float) and np.isnan(text)):
+        return []
+    found = (re.sub(_PLURAL, '', token) for token in re.findall(_TOKEN, str(text).lower()))
+    return list(dict.fromkeys(t for t in found if len(t) > 1 and t not in STOPWORDS))
+
+
+class KeywordMatcher:
+    """
+    Compiled keyword dictionary: (tokens x units) IDF matrix plus unit -> product map.
+
+    Args:
+        product_names: Product per output column
+        units: (product position, unit weight, tokens) per keyword unit
+        min_weight: Smallest product weight emitted by ``match``
+        fallback_units: Units in the same form (e.g. product categories)
+            used only for texts no product in ``units`` reaches ``min_weight`` for
+        product_tokens: Optional tokens naming each product (name and
+            category), checked against ``conflicts``
+        conflicts: Groups of mutually exclusive tokens; a text with a token
+            of a group scores products carrying only other tokens of that
+            group ``conflict_penalty`` times their weight
+        conflict_penalty: Weight factor for conflicting products
+    """
+
+    def __init__(self, product_names: Sequence[str], units: Sequence[Tuple[int, float, Sequence[str]]],
+                 min_weight: float = MIN_MATCH_WEIGHT,
+                 fallback_units: Sequence[Tuple[int, float, Sequence[str]]] = (),
+                 product_tokens: Optional[Sequence[Sequence[str]]] = None,
+                 conflicts: Sequence[Sequence[str]] = CONFLICTING_TOKENS,
+                 conflict_penalty: float = CONFLICT_PENALTY):
+        from scipy.sparse import csr_matrix
+
+        units = sorted((u for u in units if u[2]), key=lambda u: u[0])
+        fallback_units = sorted((u for u in fallback_units if u[2]), key=lambda u: u[0])
+        self.product_names = np.asarray(product_names, dtype=object)
+        self.min_weight = min_weight
+        self.conflict_penalty = conflict_penalty
+        self.vocabulary = {token: i for i, token in
+                           enumerate(sorted({t for _, _, ts in [*units, *fallback_units] for t in ts}))}
+
+        # Document frequency over products (a token shared by a product's units counts once)
+        tokens_of_product = {}
+        for product, _, unit_tokens in [*units, *fallback_units]:
+            tokens_of_product.setdefault(product, set()).update(unit_tokens)
+        df = np.zeros(len(self.vocabulary))
+        for unit_tokens in tokens_of_product.values():
+            df[[self.vocabulary[t] for t in unit_tokens]] += 1
+        self._idf = np.log1p(len(self.product_names) / np.maximum(df, 1))
+
+        self.unit_products, self.unit_weights, self.coverage, self._starts, self._group_products = \
+            self._compile(units)
+        self.units = [tuple(u[2]) for u in units]
+        self.fallback_units = [tuple(u[2]) for u in fallback_units]
+        self._fallback = self._compile(fallback_units)
+
+        # (tokens x products) 1 where a text token conflicts with the product's family tokens
+        rows, cols = [], []
+        for product, own in enumerate(product_tokens or []):
+            own = set(own)
+            for group in conflicts:
+                if own & set(group):
+                    others = [self.vocabulary[t] for t in group if t not in own and t in self.vocabulary]
+                    rows += others
+                    cols += [product] * len(others)
+        self.conflicts = csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                                    shape=(len(self.vocabulary), len(self.product_names)))
+
+    def _compile(self, units):
+        """(unit products, unit weights, tokens x units coverage matrix, reduceat starts, group products)."""
+        from scipy.sparse import csr_matrix
+
+        rows, cols, values = [], [], []
+        for unit, (_, _, unit_tokens) in enumerate(units):
+            ids = [self.vocabulary[t] for t in unit_tokens]
+            share = self._idf[ids] / self._idf[ids].sum()
+            rows += ids
+            cols += [unit] * len(ids)
+            values += share.tolist()
+        unit_products = np.array([u[0] for u in units], dtype=np.int64)
+        unit_weights = np.array([u[1] for u in units], dtype=np.float32)
+        coverage = csr_matrix((np.asarray(values, dtype=np.float32), (rows, cols)),
+                              shape=(len(self.vocabulary), len(units)))
+        # Units are grouped by product: reduceat starts and the product of each group
+        starts = np.flatnonzero(np.r_[True, unit_products[1:] != unit_products[:-1]]) \
+            if len(units) else np.zeros(0, dtype=np.int64)
+        return unit_products, unit_weights, coverage, starts, unit_products[starts]
+
+    def _product_weights(self, indicator, compiled) -> np.ndarray:
+        _, unit_weights, coverage, starts, group_products = compiled
+        result = np.zeros((indicator.shape[0], len(self.product_names)), dtype=np.float32)
+        if len(starts):
+            unit_scores = (indicator @ coverage).toarray() * unit_weights
+            result[:, group_products] = np.maximum.reduceat(unit_scores, starts, axis=1)
+        return result
+
+    @classmethod
+    def from_products(cls, products, name_weight: float = NAME_WEIGHT, feature_weight: float = FEATURE_WEIGHT,
+                      category_weight: float = CATEGORY_WEIGHT,
+                      min_weight: float = MIN_MATCH_WEIGHT) -> 'KeywordMatcher':
+        """
+        Build the dictionary from the catalogue's Product_Name, Key_Features and Product_Category.
+
+        Args:
+            products: Catalogue (pandas or Spark DataFrame)
+            name_weight: Weight of a fully covered product name
+            feature_weight: Weight of a fully covered ``Key_Features`` item
+            category_weight: Weight of a fully covered ``Product_Category``
+                (fallback for texts matching no name or feature)
+            min_weight: Smallest product weight emitted by ``match``
+        """
+        columns = ('Product_Name', 'Key_Features', 'Product_Category')
+        if hasattr(products, 'toPandas'):
+            products = products.select(*[c for c in columns if c in products.columns]).toPandas()
+        names = products['Product_Name'].tolist()
+        features, categories = (products[c] if c in products else pd.Series(None, index=products.index)
+                                for c in columns[1:])
+        units, fallback_units, product_tokens = [], [], []
+        for position, (name, feature_text, category) in enumerate(zip(names, features, categories)):
+            name_tokens = tokens(name)
+            units.append((position, name_weight, name_tokens))
+            if isinstance(feature_text, str):
+                for item in _FEATURE_SPLIT.split(feature_text):
+                    item_tokens = [t for t in tokens(item) if t not in name_tokens]
+                    units.append((position, feature_weight, item_tokens))
+            category_tokens = tokens(category)
+            fallback_units.append((position, category_weight, category_tokens))
+            product_tokens.append([*name_tokens, *category_tokens])
+        return cls(names, units, min_weight=min_weight, fallback_units=fallback_units,
+                   product_tokens=product_tokens)
+
+    def keywords(self) -> pd.DataFrame:
+        """The generated dictionary: one row per unit with its product, weight, tokens and fallback flag."""
+        unit_products, unit_weights = self._fallback[:2]
+        return pd.DataFrame({
+            'Product_Name': self.product_names[np.r_[self.unit_products, unit_products]],
+            'unit_weight': np.r_[self.unit_weights, unit_weights],
+            'keywords': [' '.join(unit) for unit in [*self.units, *self.fallback_units]],
+            'fallback': np.r_[np.zeros(len(self.units), dtype=bool), np.ones(len(self.fallback_units), dtype=bool)],
+        })
+
+    def weights(self, texts: Sequence[str]) -> np.ndarray:
+        """(len(texts), n_products) float32 product weights (before the ``min_weight`` cut)."""
+        from scipy.sparse import csr_matrix
+
+        texts = pd.Series(texts, dtype=object).fillna('').astype(str).reset_index(drop=True)
+        if len(texts) == 0 or not self.vocabulary:
+            return np.zeros((len(texts), len(self.product_names)), dtype=np.float32)
+        exploded = texts.str.lower().str.findall(_TOKEN).explode().dropna()
+        ids = exploded.str.replace(_PLURAL, '', regex=True).map(self.vocabulary).dropna()
+        indicator = csr_matrix((np.ones(len(ids), dtype=np.float32),
+                                (ids.index.to_numpy(), ids.to_numpy(dtype=np.int64))),
+                               shape=(len(texts), len(self.vocabulary)))
+        indicator.data[:] = 1.0   # repeated tokens count once
+        result = self._product_weights(indicator, (self.unit_products, self.unit_weights, self.coverage,
+                                                   self._starts, self._group_products))
+        weak = np.flatnonzero(result.max(axis=1, initial=0) < self.min_weight)
+        if len(weak) and len(self.fallback_units):
+            result[weak] = np.maximum(result[weak], self._product_weights(indicator[weak], self._fallback))
+        if self.conflicts.nnz:
+            result[(indicator @ self.conflicts).toarray() > 0] *= self.conflict_penalty
+        return result
+
+    def match(self, frame: pd.DataFrame, text_columns: Optional[Sequence[str]] = None,
+              keep: Sequence[str] = MATCH_COLUMNS) -> pd.DataFrame:
+        """
+        Every product matched by each row's texts, with its weight.
+
+        Args:
+            frame: Transactions
+            text_columns: Columns to match (default: the ``TEXT_COLUMNS`` present)
+            keep: Columns copied to the output
+
+        Returns:
+            ``keep`` columns + Product_Name + match_weight, one row per
+            (transaction, product) with weight >= ``min_weight`` (the best
+            weight over the text columns)
+        """
+        if text_columns is None:
+            text_columns = [c for c in TEXT_COLUMNS if c in frame.columns]
+        keep = [c for c in keep if c in frame.columns]
+        empty = pd.DataFrame({**{c: frame[c].iloc[:0] for c in keep},
+                              'Product_Name': pd.Series([], dtype=object),
+                              'match_weight': pd.Series([], dtype=np.float64)})
+        if len(frame) == 0 or not text_columns:
+            return empty
+
+        # Rows -> distinct text combinations -> products
+        codes, uniques = [], []
+        for column in text_columns:
+            column_codes, column_uniques = pd.factorize(frame[column].fillna(''), sort=False)
+            codes.append(column_codes)
+            uniques.append(self.weights(column_uniques))
+        combo_codes, combos = pd.factorize(pd.MultiIndex.from_arrays(codes), sort=False) if len(codes) > 1 \
+            else (codes[0], None)
+        if combos is None:
+            combo_weights = uniques[0]
+        else:
+            combo_weights = np.maximum.reduce([w[np.asarray(combos.get_level_values(i))]
+                                               for i, w in enumerate(uniques)])
+
+        combo_ids, product_ids = np.nonzero(combo_weights >= self.min_weight)
+        if len(combo_ids) == 0:
+            return empty
+        counts = np.bincount(combo_ids, minlength=len(combo_weights))
+        starts = np.r_[0, np.cumsum(counts)[:-1]]
+        per_row = counts[combo_codes]
+        row_index = np.repeat(np.arange(len(frame)), per_row)
+        entry = np.repeat(starts[combo_codes] - np.r_[0, np.cumsum(per_row)[:-1]], per_row) + np.arange(len(row_index))
+
+        out = frame[keep].iloc[row_index].reset_index(drop=True)
+        out['Product_Name'] = self.product_names[product_ids[entry]]
+        out['match_weight'] = combo_weights[combo_ids[entry], product_ids[entry]].astype(np.float64)
+        return out
+
+
+def match_transactions_spark(df_trans, matcher: KeywordMatcher, keep: Sequence[str] = MATCH_COLUMNS):
+    """
+    ``KeywordMatcher.match`` over a Spark DataFrame with ``mapInPandas``.
+
+    Each Arrow batch is matched on its executor with the broadcast matcher,
+    so every transaction is read once and no keyword join is planned.
+
+    Returns:
+        Spark DataFrame with ``keep`` columns, Product_Name and match_weight
+    """
+    from pyspark.sql.types import DoubleType, StringType, StructField, StructType
+
+    text_columns = [c for c in TEXT_COLUMNS if c in df_trans.columns]
+    keep = [c for c in keep if c in df_trans.columns]
+    schema = StructType([*(df_trans.schema[c] for c in keep),
+                         StructField('Product_Name', StringType()),
+                         StructField('match_weight', DoubleType())])
+
+    def match_batches(batches: Iterable[pd.DataFrame]) -> Iterable[pd.DataFrame]:
+        for batch in batches:
+            yield matcher.match(batch, text_columns, keep)
+
+    return df_trans.select(*dict.fromkeys([*keep, *text_columns])).mapInPandas(match_batches, schema)
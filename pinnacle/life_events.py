@@ -0,0 +1,435 @@
+"""
+Online life-event detection over the transaction stream.
+
+The README promises life events (salary changes, relocations, business
+launches) but the customer features only summarize totals. Here every
+customer keeps a fixed-size state, updated once per transaction in date
+order, and three one-sided CUSUM change detectors raise events:
+
+- ``salary_jump``: credits (``Deb_or_credit == 'C'``). An exponentially
+  weighted mean / variance of ``log1p(Trans_Amount)`` is the baseline; the
+  standardized excess of each credit (clipped to ``SALARY_Z_CAP``, so one
+  large transfer alone is not a raise) accumulates in a CUSUM, and the
+  baseline itself takes clipped steps once armed. An event
+  fires after a sustained rise; its magnitude is the credit over the old
+  baseline (1.4 = 40% more), and the baseline restarts from the new level.
+- ``location_shift``: debits with a ``Destination``. A space-saving sketch
+  of the ``SKETCH_SLOTS`` most frequent (decayed) destinations says whether
+  a debit goes somewhere new; a CUSUM of the novelty indicator over the
+  customer's own novelty rate fires when spending moves to unfamiliar
+  merchants / places. Customers who spread spending widely have a high
+  novelty rate and need a longer run to fire.
+- ``business_start``: debits whose Category is in ``BUSINESS_CATEGORIES``
+  or whose Destination / Narration match ``BUSINESS_PATTERN``, as a CUSUM
+  over the customer's own business-spend rate: the first repeated business
+  spending of a customer with an established history fires, an existing
+  business account does not.
+
+Detectors only arm after ``MIN_CREDITS`` / ``MIN_DEBITS`` transactions of
+history. Location / business magnitudes are the CUSUM value when fired.
+
+State is about 170 bytes per customer whatever the history length (NumPy
+arrays indexed by customer code). ``update`` takes batches of any size in
+date order and stays vectorized: a batch is split into waves holding each
+customer's k-th transaction of the batch, so every wave updates distinct
+customers with array operations. One pass over the full history and
+streaming micro-batches use the same call.
+
+Usage:
+    detector = LifeEventDetector()
+    detector.update(transactions)               # history, then each micro-batch
+    detector.features(at='2024-12-31')          # per-customer event features
+    detector.drain_events()                     # events raised since the last drain
+    life_event_features_spark(df_transactions)  # Spark, one pass per partition
+"""
+
+import json
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from pinnacle.decayed_rfm import _day, day_numbers
+
+
+EVENT_TYPES = ('salary_jump', 'location_shift', 'business_start')
+INPUT_COLUMNS = ('Customer_ID', 'Date', 'Trans_Amount', 'Deb_or_credit', 'Destination', 'Category', 'Narration')
+FEATURE_COLUMNS = ('Customer_ID', *(f'{event}_count' for event in EVENT_TYPES),
+                   *(f'days_since_{event}' for event in EVENT_TYPES), 'salary_jump_ratio', 'life_events')
+EVENT_COLUMNS = ('Customer_ID', 'event', 'Date', 'magnitude')
+
+# Salary: CUSUM of standardized log credit amounts
+MIN_CREDITS = 3
+SALARY_WINDOW = 12          # Credits in the baseline's EW window
+SALARY_DRIFT = 0.5
+SALARY_THRESHOLD = 3.5      # Two credits at the z cap fire
+SALARY_Z_CAP = 2.5
+MIN_LOG_STD = 0.1
+# Location: CUSUM of destination novelty over the customer's novelty rate
+MIN_DEBITS = 5
+NOVELTY_WINDOW = 50
+LOCATION_DRIFT = 0.2
+LOCATION_THRESHOLD = 2.0
+SKETCH_SLOTS = 8
+SKETCH_DECAY = 0.95         # Per debit: a destination unused for ~14 debits has lost half its count
+# Business: CUSUM of business spending over the customer's business rate
+BUSINESS_DRIFT = 0.1
+BUSINESS_THRESHOLD = 1.5    # Two business debits close together fire
+BUSINESS_CATEGORIES = frozenset({'business', 'supplies', 'wholesale', 'inventory', 'equipment', 'payroll',
+                                 'office', 'logistics', 'merchant services'})
+BUSINESS_PATTERN = (r'\b(?:cac|corporate affairs|business name|company registration|wholesale|supplier|distributor'
+                    r'|(?:office|business|trade) supplies|inventory|stock purchase|payroll|staff salaries'
+                    r'|pos terminal|warehouse|office rent|shop rent)\b')
+RECENT_EVENT_DAYS = 180     # Events listed in ``life_events``
+
+_NO_DAY = np.iinfo(np.int32).min
+_STATE = {
+    'credit_count': np.int32, 'credit_mean': np.float32, 'credit_var': np.float32, 'salary_cusum': np.float32,
+    'debit_count': np.int32, 'destination_count': np.int32, 'novelty_rate': np.float32,
+    'location_cusum': np.float32, 'business_rate': np.float32, 'business_cusum': np.float32,
+    **{f'{event}_count': np.int32 for event in EVENT_TYPES},
+    **{f'{event}_day': np.int32 for event in EVENT_TYPES},
+    **{f'{event}_magnitude': np.float32 for event in EVENT_TYPES},
+}
+
+
+def business_spend(frame: pd.DataFrame, categories=BUSINESS_CATEGORIES, pattern: str = BUSINESS_PATTERN) -> np.ndarray:
+    """Rows whose Category is a business category or whose Destination / Narration match ``pattern``."""
+    flags = np.zeros(len(frame), dtype=bool)
+    if 'Category' in frame:
+        codes, uniques = pd.factorize(frame['Category'].fillna('').astype(str).str.strip().str.lower())
+        flags |= np.isin(uniques, list(categories))[codes]
+    for column in ('Destination', 'Narration'):
+        if column in frame:
+            codes, uniques = pd.factorize(frame[column].fillna('').astype(str))
+            flags |= pd.Series(uniques).str.lower().str.contains(pattern, regex=True).to_numpy()[codes]
+    return flags
+
+
+def _destination_keys(values: pd.Series) -> np.ndarray:
+    """Stable 64-bit hash per Destination (0 = none)."""
+    text = values.fillna('').astype(str).str.strip().str.lower()
+    keys = pd.util.hash_array(text.to_numpy(dtype=object)).view(np.int64)
+    return np.where(text.to_numpy() == '', 0, keys | 1)
+
+
+class LifeEventDetector:
+    """
+    Bounded per-customer state and the three CUSUM detectors.
+
+    Args:
+        salary_threshold: CUSUM level that raises ``salary_jump``
+        location_threshold: CUSUM level that raises ``location_shift``
+        business_threshold: CUSUM level that raises ``business_start``
+        min_credits: Credits seen before ``salary_jump`` is armed
+        min_debits: Debits seen before ``location_shift`` / ``business_start`` are armed
+        sketch_slots: Destinations tracked per customer
+    """
+
+    def __init__(self, salary_threshold: float = SALARY_THRESHOLD, location_threshold: float = LOCATION_THRESHOLD,
+                 business_threshold: float = BUSINESS_THRESHOLD, min_credits: int = MIN_CREDITS,
+                 min_debits: int = MIN_DEBITS, sketch_slots: int = SKETCH_SLOTS):
+        self.salary_threshold = float(salary_threshold)
+        self.location_threshold = float(location_threshold)
+        self.business_threshold = float(business_threshold)
+        self.min_credits = int(min_credits)
+        self.min_debits = int(min_debits)
+        self.sketch_slots = int(sketch_slots)
+        self.watermark: Optional[int] = None
+        self._customers: Dict[Any, int] = {}
+        self._state = {name: np.zeros(0, dtype=dtype) for name, dtype in _STATE.items()}
+        self._sketch_keys = np.zeros((0, self.sketch_slots), dtype=np.int64)
+        self._sketch_counts = np.zeros((0, self.sketch_slots), dtype=np.float32)
+        self._events: List[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self._customers)
+
+    @property
+    def customer_ids(self) -> np.ndarray:
+        return np.asarray(list(self._customers), dtype=object)
+
+    @property
+    def bytes_per_customer(self) -> float:
+        """State bytes per allocated customer slot."""
+        capacity = max(len(self._sketch_keys), 1)
+        total = sum(a.nbytes for a in self._state.values()) + self._sketch_keys.nbytes + self._sketch_counts.nbytes
+        return total / capacity
+
+    def _params(self) -> Dict[str, Any]:
+        return {'salary_threshold': self.salary_threshold, 'location_threshold': self.location_threshold,
+                'business_threshold': self.business_threshold, 'min_credits': self.min_credits,
+                'min_debits': self.min_debits, 'sketch_slots': self.sketch_slots}
+
+    def _grow(self, needed: int):
+        capacity = len(self._sketch_keys)
+        if needed <= capacity:
+            return
+        capacity = max(needed, 2 * capacity, 1024)
+        for name, old in self._state.items():
+            new = np.full(capacity, _NO_DAY if name.endswith('_day') else 0, dtype=old.dtype)
+            new[:len(old)] = old
+            self._state[name] = new
+        for name in ('_sketch_keys', '_sketch_counts'):
+            old = getattr(self, name)
+            new = np.zeros((capacity, self.sketch_slots), dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _codes(self, customer_ids: np.ndarray) -> np.ndarray:
+        codes, uniques = pd.factorize(customer_ids)
+        unique_codes = np.fromiter((self._customers.setdefault(c, len(self._customers)) for c in uniques),
+                                   dtype=np.int64, count=len(uniques))
+        self._grow(len(self._customers))
+        return unique_codes[codes]
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+
+    def update(self, transactions: pd.DataFrame):
+        """
+        Fold a batch of transactions in (date order; equal dates keep batch order).
+
+        Args:
+            transactions: Customer_ID, Date, Trans_Amount, Deb_or_credit and
+                optionally Destination, Category, Narration
+        """
+        frame = transactions[transactions['Customer_ID'].notna()]
+        if len(frame) == 0:
+            return
+        days = day_numbers(frame['Date'])
+        order = np.argsort(days, kind='stable')
+        frame = frame.iloc[order]
+        days = days[order].astype(np.int32)
+        codes = self._codes(frame['Customer_ID'].to_numpy(dtype=object))
+        amounts = frame['Trans_Amount'].to_numpy(dtype=np.float64)
+        credit = frame['Deb_or_credit'].astype(str).str.strip().str.upper().str.startswith('C').to_numpy()
+        destinations = _destination_keys(frame['Destination']) if 'Destination' in frame \
+            else np.zeros(len(frame), dtype=np.int64)
+        business = business_spend(frame)
+
+        # Wave k holds each customer's k-th row of the batch: distinct customers, in date order per customer
+        occurrence = pd.Series(codes).groupby(codes).cumcount().to_numpy()
+        waves = np.argsort(occurrence, kind='stable')
+        bounds = np.searchsorted(occurrence[waves], np.arange(occurrence.max() + 2))
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            rows = waves[start:stop]
+            self._step(codes[rows], days[rows], amounts[rows], credit[rows], destinations[rows], business[rows])
+        latest = int(days.max())
+        self.watermark = latest if self.watermark is None else max(self.watermark, latest)
+
+    def _step(self, codes, days, amounts, credit, destinations, business):
+        """One wave (each customer at most once)."""
+        s = self._state
+        is_credit = credit & (amounts > 0)
+        if is_credit.any():
+            self._credits(codes[is_credit], days[is_credit], np.log1p(amounts[is_credit]).astype(np.float32))
+        debit = ~credit
+        if debit.any():
+            c, d, b = codes[debit], days[debit], business[debit].astype(np.float32)
+            keys = destinations[debit]
+            located = keys != 0
+            if located.any():
+                self._destinations(c[located], d[located], keys[located])
+            n = s['debit_count'][c]
+            rate, cusum = s['business_rate'][c], s['business_cusum'][c]
+            cusum = np.where(n >= self.min_debits, np.maximum(0.0, cusum + b - rate - BUSINESS_DRIFT), 0.0)
+            fired = cusum > self.business_threshold
+            self._raise(2, c[fired], d[fired], cusum[fired])
+            s['business_cusum'][c] = np.where(fired, 0.0, cusum)
+            s['business_rate'][c] = rate + (b - rate) / np.minimum(n + 1, NOVELTY_WINDOW)
+            s['debit_count'][c] = n + 1
+
+    def _credits(self, c, days, x):
+        s = self._state
+        n, mean, var = s['credit_count'][c], s['credit_mean'][c], s['credit_var'][c]
+        std = np.sqrt(np.maximum(var, MIN_LOG_STD ** 2))
+        armed = n >= self.min_credits
+        z = np.clip(np.where(n > 0, (x - mean) / std, 0.0), -SALARY_Z_CAP, SALARY_Z_CAP)
+        cusum = np.where(armed, np.maximum(0.0, s['salary_cusum'][c] + z - SALARY_DRIFT), 0.0)
+        fired = cusum > self.salary_threshold
+        self._raise(0, c[fired], days[fired], np.exp(x - mean)[fired])
+        # Once armed the baseline takes winsorized steps, so occasional refunds / transfers barely move it
+        alpha = 1.0 / np.minimum(n + 1, SALARY_WINDOW)
+        delta = np.where(armed, z * std, x - mean)
+        # Fired: restart the baseline at the new level, keeping the learned spread
+        s['credit_mean'][c] = np.where(fired, x, mean + alpha * delta)
+        s['credit_var'][c] = np.where(fired, var, (1.0 - alpha) * (var + alpha * delta * delta))
+        s['credit_count'][c] = np.where(fired, 1, n + 1)
+        s['salary_cusum'][c] = np.where(fired, 0.0, cusum)
+
+    def _destinations(self, c, days, keys):
+        s = self._state
+        sketch_keys = self._sketch_keys[c]
+        counts = self._sketch_counts[c] * SKETCH_DECAY
+        hits = (sketch_keys == keys[:, None]) & (counts > 0)
+        known = hits.any(axis=1)
+        # Space-saving: a new destination takes the smallest slot and inherits its count
+        slot = np.where(known, hits.argmax(axis=1), counts.argmin(axis=1))
+        rows = np.arange(len(c))
+        counts[rows, slot] += 1.0
+        sketch_keys[rows, slot] = keys
+        self._sketch_keys[c] = sketch_keys
+        self._sketch_counts[c] = counts
+
+        novel = (~known).astype(np.float32)
+        n, rate = s['destination_count'][c], s['novelty_rate'][c]
+        cusum = np.where(n >= self.min_debits,
+                         np.maximum(0.0, s['location_cusum'][c] + novel - rate - LOCATION_DRIFT), 0.0)
+        fired = cusum > self.location_threshold
+        self._raise(1, c[fired], days[fired], cusum[fired])
+        s['location_cusum'][c] = np.where(fired, 0.0, cusum)
+        s['novelty_rate'][c] = rate + (novel - rate) / np.minimum(n + 1, NOVELTY_WINDOW)
+        s['destination_count'][c] = n + 1
+
+    def _raise(self, event: int, codes, days, magnitudes):
+        if len(codes) == 0:
+            return
+        name = EVENT_TYPES[event]
+        self._state[f'{name}_count'][codes] += 1
+        self._state[f'{name}_day'][codes] = days
+        self._state[f'{name}_magnitude'][codes] = magnitudes
+        self._events.append((np.asarray(codes), event, np.asarray(days), np.asarray(magnitudes, dtype=np.float64)))
+
+    # ------------------------------------------------------------------
+    # Outputs
+    # ------------------------------------------------------------------
+
+    def drain_events(self) -> pd.DataFrame:
+        """Events raised since the last drain: Customer_ID, event, Date, magnitude (date order per customer)."""
+        events, self._events = self._events, []
+        if not events:
+            return pd.DataFrame({'Customer_ID': pd.Series([], dtype=object), 'event': pd.Series([], dtype=object),
+                                 'Date': pd.Series([], dtype='datetime64[ns]'), 'magnitude': pd.Series([], dtype=float)})
+        codes = np.concatenate([e[0] for e in events])
+        return pd.DataFrame({
+            'Customer_ID': self.customer_ids[codes],
+            'event': np.asarray(EVENT_TYPES, dtype=object)[np.concatenate([np.full(len(e[0]), e[1]) for e in events])],
+            'Date': pd.to_datetime(np.concatenate([e[2] for e in events]).astype('datetime64[D]')),
+            'magnitude': np.concatenate([e[3] for e in events]),
+        })
+
+    def features(self, at=None, customer_ids: Optional[Sequence] = None,
+                 recent_days: int = RECENT_EVENT_DAYS) -> pd.DataFrame:
+        """
+        Per-customer event features at day ``at``.
+
+        Args:
+            at: Query date or day number (default: the latest folded day)
+            customer_ids: Optional customers to restrict to (unknown ones are skipped)
+            recent_days: Events at most this old are listed in ``life_events``
+
+        Returns:
+            DataFrame with ``FEATURE_COLUMNS``: ``<event>_count``,
+            ``days_since_<event>`` (nullable), ``salary_jump_ratio`` of the
+            latest jump (NaN if none) and ``life_events``, the recent event
+            names comma-separated ('' if none)
+        """
+        if customer_ids is None:
+            codes = np.arange(len(self._customers))
+        else:
+            codes = np.fromiter((self._customers[c] for c in customer_ids if c in self._customers), dtype=np.int64)
+        at = (self.watermark if at is None else _day(at)) or 0
+        s = self._state
+        out = {'Customer_ID': self.customer_ids[codes]}
+        recent = []
+        for event in EVENT_TYPES:
+            out[f'{event}_count'] = s[f'{event}_count'][codes]
+        for event in EVENT_TYPES:
+            day = s[f'{event}_day'][codes]
+            seen = day != _NO_DAY
+            since = at - day.astype(np.int64)
+            out[f'days_since_{event}'] = pd.arrays.IntegerArray(np.where(seen, since, 0), ~seen)
+            recent.append(np.where(seen & (since >= 0) & (since <= recent_days), event, ''))
+        out['salary_jump_ratio'] = np.where(s['salary_jump_count'][codes] > 0,
+                                            s['salary_jump_magnitude'][codes].astype(np.float64), np.nan)
+        out['life_events'] = [', '.join(name for name in names if name) for names in zip(*recent)] \
+            if len(codes) else []
+        return pd.DataFrame(out, columns=list(FEATURE_COLUMNS))
+
+    def save(self, path: str, **extra):
+        """
+        Write the state to an ``.npz`` file (undrained events are not saved).
+
+        The file is renamed into place once written; ``extra`` arrays are
+        stored in the same file (e.g. a stream's last batch id) and ignored
+        by ``load``.
+        """
+        size = len(self._customers)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.npz.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, customer_ids=self.customer_ids.astype(str),
+                         sketch_keys=self._sketch_keys[:size], sketch_counts=self._sketch_counts[:size],
+                         params=np.array(json.dumps({**self._params(), 'watermark': self.watermark})),
+                         **{name: values[:size] for name, values in self._state.items()}, **extra)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> 'LifeEventDetector':
+        with np.load(path) as data:
+            params = json.loads(str(data['params']))
+            watermark = params.pop('watermark')
+            detector = cls(**params)
+            detector.watermark = watermark
+            detector._customers = {c: i for i, c in enumerate(data['customer_ids'].tolist())}
+            detector._state = {name: data[name].astype(dtype) for name, dtype in _STATE.items()}
+            detector._sketch_keys = data['sketch_keys'].astype(np.int64)
+            detector._sketch_counts = data['sketch_counts'].astype(np.float32)
+        return detector
+
+
+# ---------------------------------------------------------------------------
+# Spark
+# ---------------------------------------------------------------------------
+
+def life_event_features_spark(df_trans, at_date=None, **params):
+    """
+    ``LifeEventDetector.features`` for every customer, in one pass over ``df_trans``.
+
+    Transactions are hash-partitioned by customer and sorted by date within
+    each partition, and a detector per partition folds its Arrow batches in
+    order (``mapInPandas``), so each executor holds only its customers'
+    bounded state.
+
+    Args:
+        df_trans: Transactions (``INPUT_COLUMNS``; Destination, Category and
+            Narration optional)
+        at_date: Query date (default: the latest transaction date)
+        **params: ``LifeEventDetector`` arguments
+
+    Returns:
+        Spark DataFrame with ``FEATURE_COLUMNS``
+    """
+    from pyspark.sql import functions as F
+    from pyspark.sql.types import DoubleType, IntegerType, LongType, StringType, StructField, StructType
+
+    if at_date is None:
+        at_date = df_trans.agg(F.max(F.to_date('Date'))).first()[0]
+    at = _day(at_date)
+    columns = [c for c in INPUT_COLUMNS if c in df_trans.columns]
+    schema = StructType([
+        StructField('Customer_ID', df_trans.schema['Customer_ID'].dataType),
+        *(StructField(f'{event}_count', IntegerType()) for event in EVENT_TYPES),
+        *(StructField(f'days_since_{event}', LongType()) for event in EVENT_TYPES),
+        StructField('salary_jump_ratio', DoubleType()),
+        StructField('life_events', StringType()),
+    ])
+
+    def detect(batches):
+        detector = LifeEventDetector(**params)
+        for batch in batches:
+            detector.update(batch)
+        yield detector.features(at=at)
+
+    return (df_trans.select(*columns)
+            .repartition('Customer_ID')
+            .sortWithinPartitions(F.to_timestamp('Date'))
+            .mapInPandas(detect, schema))
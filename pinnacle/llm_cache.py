@@ -0,0 +1,121 @@
+"""
+Persistent content-addressed cache for LLM customer-product fit scores.
+
+Entries are keyed by a SHA-256 of everything that determines the model's
+answer for one customer (customer summary, catalog/rules fingerprint, model
+name and temperature), so a customer is only re-scored when one of those
+inputs changes. Stored in a single SQLite file with least-recently-used
+eviction and an optional time-to-live.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable SHA-256 hex digest of the given parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+
+class ScoreCache:
+    """
+    SQLite-backed key/value cache of JSON-serializable LLM results.
+
+    Args:
+        path: SQLite file path (created if missing)
+        max_entries: Entries kept after ``evict``; least recently used go first
+        ttl_days: Entries older than this are treated as misses (None = keep)
+    """
+
+    def __init__(self, path: str, max_entries: int = 1_000_000, ttl_days: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_days * 86400 if ttl_days is not None else None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS llm_cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' accessed_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)')
+        self._conn.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Return cached values for the keys that are present and fresh."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time()
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT key, value, created_at FROM llm_cache WHERE key IN ({placeholders})', chunk
+                ).fetchall()
+                for key, value, created_at in rows:
+                    if self.ttl_seconds is None or now - created_at <= self.ttl_seconds:
+                        found[key] = json.loads(value)
+            if found:
+                self._conn.executemany('UPDATE llm_cache SET accessed_at = ? WHERE key = ?',
+                                       [(now, key) for key in found])
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, Any]) -> None:
+        """Insert or replace entries."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+                [(key, json.dumps(value), now, now) for key, value in items.items()]
+            )
+            self._conn.commit()
+
+    def evict(self) -> int:
+        """Drop expired entries and trim to ``max_entries``. Returns rows removed."""
+        removed = 0
+        with self._lock:
+            if self.ttl_seconds is not None:
+                removed += self._conn.execute('DELETE FROM llm_cache WHERE created_at < ?',
+                                              (time.time() - self.ttl_seconds,)).rowcount
+            count = self._conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+            if count > self.max_entries:
+                removed += self._conn.execute(
+                    'DELETE FROM llm_cache WHERE key IN '
+                    '(SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)',
+                    (count - self.max_entries,)
+                ).rowcount
+            self._conn.commit()
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this session."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
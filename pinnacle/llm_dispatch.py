@@ -0,0 +1,164 @@
+"""
+Concurrent, rate-limited dispatch of LLM batch requests.
+
+Keeps up to ``max_in_flight`` requests running on a thread pool, paces them
+with requests-per-minute and tokens-per-minute token buckets instead of a
+fixed sleep, retries 429/5xx responses with jittered exponential backoff and
+returns results in submission order.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence
+
+
+RETRYABLE_ERROR_NAMES = {'APIConnectionError', 'APITimeoutError', 'RateLimitError', 'InternalServerError'}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at ``rate_per_minute``.
+
+    ``acquire`` blocks until the requested amount is available. Requests
+    larger than the bucket capacity are clamped to the capacity so a single
+    oversized prompt cannot deadlock the dispatcher.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute must be > 0")
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """Take ``amount`` tokens, sleeping as needed. Returns seconds waited."""
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                wait = (amount - self._tokens) / self.rate_per_second
+            time.sleep(wait)
+            waited += wait
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits applied together."""
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, token_cost: float = 0.0) -> float:
+        """Reserve one request and ``token_cost`` tokens. Returns seconds waited."""
+        waited = 0.0
+        if self.requests is not None:
+            waited += self.requests.acquire(1)
+        if self.tokens is not None and token_cost > 0:
+            waited += self.tokens.acquire(token_cost)
+        return waited
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used for TPM budgeting."""
+    return len(text) // 4 + 1
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for rate-limit (429), server (5xx) and connection errors."""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _default_token_cost(payload: Any) -> float:
+    return estimate_tokens(payload) if isinstance(payload, str) else 0
+
+
+def dispatch_batches(request_fn: Callable[[Any], Any],
+                     payloads: Sequence[Any],
+                     max_in_flight: int = 4,
+                     limiter: Optional[RateLimiter] = None,
+                     token_cost: Optional[Callable[[Any], float]] = None,
+                     max_retries: int = 5,
+                     base_delay: float = 1.0,
+                     max_delay: float = 60.0,
+                     on_complete: Optional[Callable[[int, Any], None]] = None) -> List[Any]:
+    """
+    Run ``request_fn`` over ``payloads`` with bounded concurrency.
+
+    Args:
+        request_fn: Callable sending one request, e.g. a chat completion call
+        payloads: One entry per batch (prompt text or any request payload)
+        max_in_flight: Maximum concurrent requests
+        limiter: Optional RPM/TPM limiter, acquired before every attempt
+        token_cost: Estimated tokens for a payload (defaults to
+            ``estimate_tokens`` for strings, 0 otherwise)
+        max_retries: Retries per batch for retryable errors
+        base_delay: First backoff delay in seconds
+        max_delay: Backoff ceiling in seconds
+        on_complete: Called as ``on_complete(index, result)`` when a batch
+            finishes (successfully or not); calls are serialized
+
+    Returns:
+        One entry per payload in the original order: the value returned by
+        ``request_fn``, or the exception raised by its final attempt.
+    """
+    if token_cost is None:
+        token_cost = _default_token_cost
+    callback_lock = threading.Lock()
+
+    def run(index: int, payload: Any) -> Any:
+        attempt = 0
+        while True:
+            if limiter is not None:
+                limiter.acquire(token_cost(payload))
+            try:
+                result = request_fn(payload)
+            except Exception as e:
+                if attempt >= max_retries or not is_retryable(e):
+                    result = e
+                else:
+                    # Full jitter keeps concurrent workers from retrying in lockstep
+                    delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+                    delay = max(delay, _retry_after(e) or 0.0)
+                    attempt += 1
+                    time.sleep(delay)
+                    continue
+            if on_complete is not None:
+                with callback_lock:
+                    on_complete(index, result)
+            return result
+
+    if not payloads:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+        futures = [executor.submit(run, i, payload) for i, payload in enumerate(payloads)]
+        return [future.result() for future in futures]
@@ -0,0 +1,640 @@
+"""
+Single-node pandas/NumPy engine for the recommendation pipeline.
+
+Runs the Spark notebook's deterministic stages on one machine, for branch
+datasets small enough to fit in memory, without a cluster or a JVM:
+
+- customer sampling (same seeded xxhash64 order as ``pinnacle.sampling``)
+- transaction features (``pinnacle.features`` + ``engineer_customer_features``)
+- current products, decayed RFM transaction scores (``pinnacle.keyword_match``
+  + ``pinnacle.decayed_rfm``) and the LLM/transaction merge of
+  ``create_customer_product_interactions``
+- explicit ALS with Spark's regularization (``regParam`` scaled by each
+  row's rating count) and non-negativity
+- blocked top-N scoring (``pinnacle.scoring``)
+
+Inputs are pandas DataFrames with the Unity Catalog table columns. LLM
+scores are an input (``Customer_ID, Product_Name, interaction_score``) since
+the scoring requests are the same on either engine. Features and transaction
+interactions match the Spark output row for row; ALS is a different random
+initialization of the same objective, so factors differ while RMSE and top-N
+agree closely (see ``benchmarks/bench_local_engine.py``).
+"""
+
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pinnacle.decayed_rfm import (FREQUENCY_HALF_LIFE_DAYS, MONETARY_HALF_LIFE_DAYS, RECENCY_HALF_LIFE_DAYS,
+                                  DecayedRFM)
+from pinnacle.features import TRANSACTION_FEATURE_COLUMNS
+from pinnacle.scoring import DEFAULT_BLOCK_SIZE, top_n_recommendations
+
+
+ACCOUNT_KEYWORDS = r'(current|savings|sme|student|premium|platinum|children|aspire)'
+
+# Ratings per chunk when accumulating ALS normal equations (bounds the
+# chunk x rank x rank outer-product buffer)
+ALS_CHUNK_SIZE = 16384
+# Rows with at least this many ratings get their Gram matrix from one matmul
+HEAVY_ROW_RATINGS = 256
+NNLS_MAX_SWEEPS = 200
+NNLS_TOLERANCE = 1e-9
+
+# Same fixed ALS score range the notebook uses for confidence_score_pct
+SCORE_RANGE = (0.0, 5.0)
+
+
+# ============================================================================
+# SAMPLING
+# ============================================================================
+
+_P1, _P2, _P3, _P4, _P5 = (0x9E3779B185EBCA87, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+                           0x85EBCA77C2B2AE63, 0x27D4EB2F165667C5)
+_MASK = (1 << 64) - 1
+
+
+def _rotl(x: int, r: int) -> int:
+    return ((x << r) | (x >> (64 - r))) & _MASK
+
+
+def _round(acc: int, lane: int) -> int:
+    return (_rotl((acc + lane * _P2) & _MASK, 31) * _P1) & _MASK
+
+
+def _xxh64(data: bytes, seed: int) -> int:
+    n, i = len(data), 0
+    if n >= 32:
+        v1, v2, v3, v4 = (seed + _P1 + _P2) & _MASK, (seed + _P2) & _MASK, seed, (seed - _P1) & _MASK
+        while i + 32 <= n:
+            v1 = _round(v1, int.from_bytes(data[i:i + 8], 'little'))
+            v2 = _round(v2, int.from_bytes(data[i + 8:i + 16], 'little'))
+            v3 = _round(v3, int.from_bytes(data[i + 16:i + 24], 'little'))
+            v4 = _round(v4, int.from_bytes(data[i + 24:i + 32], 'little'))
+            i += 32
+        h = (_rotl(v1, 1) + _rotl(v2, 7) + _rotl(v3, 12) + _rotl(v4, 18)) & _MASK
+        for v in (v1, v2, v3, v4):
+            h = ((h ^ _round(0, v)) * _P1 + _P4) & _MASK
+    else:
+        h = (seed + _P5) & _MASK
+    h = (h + n) & _MASK
+    while i + 8 <= n:
+        h = (_rotl(h ^ _round(0, int.from_bytes(data[i:i + 8], 'little')), 27) * _P1 + _P4) & _MASK
+        i += 8
+    if i + 4 <= n:
+        h = (_rotl(h ^ (int.from_bytes(data[i:i + 4], 'little') * _P1 & _MASK), 23) * _P2 + _P3) & _MASK
+        i += 4
+    while i < n:
+        h = (_rotl(h ^ (data[i] * _P5 & _MASK), 11) * _P1) & _MASK
+        i += 1
+    h = ((h ^ (h >> 33)) * _P2) & _MASK
+    h = ((h ^ (h >> 29)) * _P3) & _MASK
+    return h ^ (h >> 32)
+
+
+def spark_xxhash64(value: Optional[str], seed: int) -> int:
+    """Spark's ``xxhash64(value, lit(seed))`` as a signed 64-bit integer."""
+    h = 42  # Spark's default xxhash64 seed
+    if value is not None:
+        h = _xxh64(str(value).encode('utf-8'), h)
+    h = _xxh64(int(seed).to_bytes(4, 'little', signed=True), h)
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def sample_customers(customers: pd.DataFrame, sample_size: Optional[int], seed: int = 42,
+                     id_col: str = 'Customer_ID') -> pd.DataFrame:
+    """The same customers ``pinnacle.sampling.sample_customers`` selects (all if None)."""
+    if sample_size is None:
+        return customers
+    keys = np.fromiter((spark_xxhash64(v, seed) for v in customers[id_col]), dtype=np.int64,
+                       count=len(customers))
+    order = np.argsort(keys, kind='stable')[:sample_size]
+    return customers.iloc[np.sort(order)].reset_index(drop=True)
+
+
+def restrict_to_customers(df: pd.DataFrame, customers: pd.DataFrame, id_col: str = 'Customer_ID') -> pd.DataFrame:
+    return df[df[id_col].isin(customers[id_col])].reset_index(drop=True)
+
+
+# ============================================================================
+# FEATURES
+# ============================================================================
+
+def prepare_transactions(trans: pd.DataFrame, recency_days: int = 90) -> pd.DataFrame:
+    """Date cast, debit/credit flags and recency flags (``pinnacle.features.prepare_transactions``)."""
+    t = trans.copy()
+    t['Date'] = pd.to_datetime(t['Date']).dt.normalize()
+    t['is_debit'] = (t['Deb_or_credit'] == 'D').astype(np.int64)
+    t['is_credit'] = (t['Deb_or_credit'] == 'C').astype(np.int64)
+    t['debit_amount'] = t['Trans_Amount'] * t['is_debit']
+    t['credit_amount'] = t['Trans_Amount'] * t['is_credit']
+    recent_threshold = t['Date'].max() - timedelta(days=recency_days)
+    t['is_recent'] = (t['Date'] >= recent_threshold).astype(np.int64)
+    t['recent_debit'] = t['debit_amount'] * t['is_recent']
+    return t
+
+
+def transaction_features(trans: pd.DataFrame, recency_days: int = 90) -> pd.DataFrame:
+    """
+    Per-customer transaction features (``aggregate_transaction_features``).
+
+    Returns:
+        DataFrame with ``TRANSACTION_FEATURE_COLUMNS`` (nulls not yet
+        filled), one row per customer, sorted by Customer_ID
+    """
+    t = prepare_transactions(trans, recency_days)
+    by_customer = t.groupby('Customer_ID', sort=True)
+
+    features = by_customer.agg(
+        total_debit=('debit_amount', 'sum'),
+        total_credit=('credit_amount', 'sum'),
+        avg_transaction=('Trans_Amount', 'mean'),
+        std_transaction=('Trans_Amount', 'std'),
+        transaction_count=('Trans_Amount', 'count'),
+        debit_count=('is_debit', 'sum'),
+        credit_count=('is_credit', 'sum'),
+        unique_categories=('Category', 'nunique'),
+        unique_destinations=('Destination', 'nunique'),
+        recent_transaction_count=('is_recent', 'sum'),
+        recent_debit=('recent_debit', 'sum'),
+        current_account=('Account_Type', 'first'),
+        min_date=('Date', 'min'),
+        max_date=('Date', 'max'),
+    )
+    # Lower median, the value percentile_approx(Trans_Amount, 0.5) returns
+    features['median_transaction'] = by_customer['Trans_Amount'].quantile(0.5, interpolation='lower')
+    span = (features['max_date'] - features['min_date']).dt.days
+    features['date_span_days'] = span.where(span != 0, 1)
+
+    # Category preferences over debit transactions
+    categories = t.groupby(['Customer_ID', 'Category'], sort=True).agg(
+        debit_count=('is_debit', 'sum'), debit_amount=('debit_amount', 'sum'))
+    debit_categories = categories[categories['debit_count'] > 0]
+    top = debit_categories['debit_count'].groupby(level='Customer_ID').idxmax()
+    features['top_category'] = top.map(lambda key: key[1])
+    features['top_category_amount'] = debit_categories['debit_amount'].groupby(level='Customer_ID').max()
+    max_category_count = categories['debit_count'].groupby(level='Customer_ID').max()
+    features['category_concentration'] = (max_category_count / features['debit_count']).where(
+        features['debit_count'] > 0)
+
+    return features.reset_index()[TRANSACTION_FEATURE_COLUMNS]
+
+
+def customer_features(trans: pd.DataFrame, convs: pd.DataFrame, custs: Optional[pd.DataFrame] = None,
+                      recency_days: int = 90, customer_sample_size: Optional[int] = 1000) -> pd.DataFrame:
+    """
+    Customer profiles for ALS context and prompts (``engineer_customer_features``).
+
+    Args:
+        trans: Transactions
+        convs: Conversations
+        custs: Customers (source table for the sample and demographics)
+        recency_days: Window for the recent_* features
+        customer_sample_size: Customers to sample (None = all)
+    """
+    if customer_sample_size and custs is not None:
+        custs = sample_customers(custs, customer_sample_size, seed=42)
+        trans = restrict_to_customers(trans, custs)
+        convs = restrict_to_customers(convs, custs)
+    return profile_features(transaction_features(trans, recency_days), convs, custs)
+
+
+def profile_features(transaction_feature_frame: pd.DataFrame, convs: pd.DataFrame,
+                     custs: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Customer profiles from per-customer transaction features (sections 5-8 of ``engineer_customer_features``).
+
+    Args:
+        transaction_feature_frame: ``TRANSACTION_FEATURE_COLUMNS`` per customer
+            (``transaction_features``, or ``transaction_features_from_state``
+            collected to pandas)
+        convs: Conversations of those customers
+        custs: Customers, for demographics
+    """
+    df = transaction_feature_frame.fillna({
+        'std_transaction': 0,
+        'top_category': 'Unknown',
+        'top_category_amount': 0,
+        'category_concentration': 0
+    })
+
+    df['net_balance'] = df['total_credit'] - df['total_debit']
+    df['debit_credit_ratio'] = np.where(df['total_credit'] > 0, df['total_debit'] / df['total_credit'], 0)
+    df['transaction_frequency_days'] = df['transaction_count'] / df['date_span_days']
+    df['days_since_last_transaction'] = df['date_span_days']
+
+    if len(convs):
+        conv_features = convs.groupby('Customer_ID').agg(
+            conversation_count=('Category', 'count'),
+            top_inquiry_category=('Category', 'first'),
+            message_count=('Customer_Message', 'count'),
+        ).reset_index()
+        df = df.merge(conv_features, on='Customer_ID', how='left').fillna({
+            'conversation_count': 0,
+            'message_count': 0,
+            'top_inquiry_category': 'None'
+        })
+    else:
+        df['conversation_count'] = 0
+        df['message_count'] = 0
+        df['top_inquiry_category'] = 'None'
+
+    if custs is not None:
+        demo_cols = ['Customer_ID'] + [c for c in ('Age', 'Occupation', 'Income_Bracket', 'State', 'Gender', 'Location')
+                                       if c in custs.columns]
+        df = df.merge(custs[demo_cols], on='Customer_ID', how='left')
+
+    df['financial_velocity'] = df['transaction_count'] / (df['days_since_last_transaction'] + 1)
+    df['spending_consistency'] = df['std_transaction'] / (df['avg_transaction'] + 1)
+    df['engagement_score'] = (df['transaction_count'] * 0.4 +
+                              df['unique_categories'] * 10 * 0.3 +
+                              df['conversation_count'] * 5 * 0.3)
+    return df
+
+
+# ============================================================================
+# INTERACTIONS
+# ============================================================================
+
+def _extract(values: pd.Series, pattern: str) -> pd.Series:
+    """``regexp_extract(lower(values), pattern, 1)``: '' when no match, null stays null."""
+    extracted = values.str.lower().str.extract(pattern, expand=False)
+    return extracted.where(values.isna(), extracted.fillna(''))
+
+
+def keyword_map(products: pd.DataFrame) -> pd.DataFrame:
+    """(keyword, Product_Name) pairs for products whose name carries an account keyword."""
+    keywords = _extract(products['Product_Name'], ACCOUNT_KEYWORDS)
+    pairs = pd.DataFrame({'keyword': keywords, 'Product_Name': products['Product_Name']})
+    return pairs[pairs['keyword'].notna() & (pairs['keyword'] != '')].drop_duplicates().reset_index(drop=True)
+
+
+def current_products(custs: pd.DataFrame, products: pd.DataFrame) -> Dict[str, set]:
+    """Products each customer already holds, matched from Account_Type keywords."""
+    keys = pd.DataFrame({'Customer_ID': custs['Customer_ID'], 'keyword': _extract(custs['Account_Type'], ACCOUNT_KEYWORDS)})
+    matched = keys.merge(keyword_map(products), on='keyword', how='inner')
+    return {customer: set(names) for customer, names in matched.groupby('Customer_ID')['Product_Name']}
+
+
+def transaction_interactions(trans: pd.DataFrame, products: pd.DataFrame,
+                             frequency_half_life: float = FREQUENCY_HALF_LIFE_DAYS,
+                             monetary_half_life: float = MONETARY_HALF_LIFE_DAYS,
+                             recency_half_life: float = RECENCY_HALF_LIFE_DAYS) -> pd.DataFrame:
+    """
+    Decayed RFM transaction scores per (customer, product) from multi-keyword matches.
+
+    Every product a transaction's Account_Type / Description matches
+    (``pinnacle.keyword_match``) counts with its match weight: frequency is
+    the decayed summed weight and monetary the decayed weight-scaled amount
+    (``pinnacle.decayed_rfm``), scored at the latest transaction date.
+
+    Args:
+        trans: Transactions
+        products: Product catalog
+        frequency_half_life: Days for a transaction's count to halve
+        monetary_half_life: Days for a transaction's amount to halve
+        recency_half_life: Days for the recency score to halve
+
+    Returns:
+        DataFrame with Customer_ID, Product_Name, trans_score,
+        transaction_count, total_amount, days_since_last
+    """
+    from pinnacle.keyword_match import KeywordMatcher
+
+    dates = pd.to_datetime(trans['Date'])
+    matches = KeywordMatcher.from_products(products).match(trans.assign(Date=dates))
+    state = DecayedRFM(frequency_half_life, monetary_half_life, recency_half_life)
+    state.update_frame(matches)
+    scores = state.scores(at=dates.max()) if len(dates) else state.scores()
+    return scores.sort_values(['Customer_ID', 'Product_Name']).reset_index(drop=True)
+
+
+def build_interactions(custs: pd.DataFrame, products: pd.DataFrame, trans: Optional[pd.DataFrame],
+                       llm_interactions: Optional[pd.DataFrame] = None,
+                       customer_sample_size: Optional[int] = None,
+                       use_transaction_data: bool = True,
+                       transaction_weight: float = 0.7) -> Tuple[pd.DataFrame, Dict[str, set]]:
+    """
+    Interaction matrix of ``create_customer_product_interactions`` (sections 1, 3 and 7-10).
+
+    Args:
+        custs: Customers
+        products: Product catalog
+        trans: Transactions (with optional Description)
+        llm_interactions: LLM scores as Customer_ID, Product_Name,
+            interaction_score (None or empty = transaction scores only)
+        customer_sample_size: Customers to sample (None = all)
+        use_transaction_data: Blend in RFM transaction scores
+        transaction_weight: Weight of the transaction score (0-1)
+
+    Returns:
+        (interaction_matrix, customer_current_products)
+    """
+    customer_current_products = current_products(custs, products)
+    sample = sample_customers(custs, customer_sample_size, seed=42)
+    llm = llm_interactions if llm_interactions is not None and len(llm_interactions) else None
+
+    if use_transaction_data and trans is not None:
+        trans_scores = transaction_interactions(restrict_to_customers(trans, sample), products)
+        matrix = blend_scores(trans_scores, llm, transaction_weight)
+    elif llm is not None:
+        matrix = llm
+    else:
+        fallback = list(products['Product_Name'][:3])
+        matrix = pd.DataFrame([(c, p, 5.0) for c in sample['Customer_ID'] for p in fallback],
+                              columns=['Customer_ID', 'Product_Name', 'interaction_score'])
+
+    matrix = (matrix.groupby(['Customer_ID', 'Product_Name'], sort=True)['interaction_score']
+              .max().reset_index())
+    return drop_current_products(matrix, customer_current_products), customer_current_products
+
+
+def blend_scores(trans_scores: pd.DataFrame, llm: Optional[pd.DataFrame],
+                 transaction_weight: float = 0.7) -> pd.DataFrame:
+    """
+    Section 8 merge: transaction and LLM scores full-outer joined and weighted (missing = 0).
+
+    Returns:
+        Customer_ID, Product_Name, interaction_score (plus trans_score when
+        there are LLM scores)
+    """
+    if llm is None:
+        return trans_scores.rename(columns={'trans_score': 'interaction_score'})
+    combined = llm[['Customer_ID', 'Product_Name', 'interaction_score']].merge(
+        trans_scores[['Customer_ID', 'Product_Name', 'trans_score']],
+        on=['Customer_ID', 'Product_Name'], how='outer')
+    combined['interaction_score'] = (combined['trans_score'].fillna(0.0) * transaction_weight +
+                                     combined['interaction_score'].fillna(0.0) * (1.0 - transaction_weight))
+    return combined
+
+
+def drop_current_products(matrix: pd.DataFrame, customer_current_products: Dict[str, set]) -> pd.DataFrame:
+    """Section 10: remove pairs for products the customer already holds."""
+    current_pairs = pd.DataFrame([(c, p) for c, held in customer_current_products.items() for p in held],
+                                 columns=['Customer_ID', 'Product_Name'])
+    if len(current_pairs):
+        matrix = matrix.merge(current_pairs, on=['Customer_ID', 'Product_Name'], how='left', indicator=True)
+        matrix = matrix[matrix['_merge'] == 'left_only'].drop(columns='_merge')
+    return matrix.reset_index(drop=True)
+
+
+# ============================================================================
+# ALS
+# ============================================================================
+
+def index_interactions(interactions: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Dense user/item ids in sorted ID order (the notebook's Step 2 lookups).
+
+    Returns:
+        (idx_df with user_int/item_int, customer_lookup, product_lookup)
+    """
+    customer_lookup = pd.DataFrame({'Customer_ID': np.sort(interactions['Customer_ID'].unique())})
+    customer_lookup['user_int'] = np.arange(len(customer_lookup), dtype=np.int32)
+    product_lookup = pd.DataFrame({'Product_Name': np.sort(interactions['Product_Name'].unique())})
+    product_lookup['item_int'] = np.arange(len(product_lookup), dtype=np.int32)
+    idx_df = (interactions.merge(customer_lookup, on='Customer_ID')
+              .merge(product_lookup, on='Product_Name'))
+    return idx_df, customer_lookup, product_lookup
+
+
+def _nonnegative_solve(ata: np.ndarray, atb: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """
+    Batched ``min x'Ax - 2b'x, x >= 0`` by projected coordinate descent.
+
+    Every system is strictly convex (regParam > 0), so the sweeps converge to
+    the unique optimum; ``x`` (clipped) is the warm start.
+    """
+    x = np.maximum(x, 0.0)
+    diag = np.einsum('nii->ni', ata)
+    for _ in range(NNLS_MAX_SWEEPS):
+        largest_step = 0.0
+        for j in range(x.shape[1]):
+            updated = np.maximum(0.0, x[:, j] + (atb[:, j] - np.einsum('nk,nk->n', ata[:, j, :], x)) / diag[:, j])
+            largest_step = max(largest_step, float(np.max(np.abs(updated - x[:, j]), initial=0.0)))
+            x[:, j] = updated
+        if largest_step < NNLS_TOLERANCE:
+            break
+    return x
+
+
+def _regularized_solve(ata: np.ndarray, atb: np.ndarray, counts: np.ndarray, reg_param: float,
+                      nonnegative: bool) -> np.ndarray:
+    """Solve a batch of ALS normal equations with Spark's ``regParam * n_ratings`` ridge."""
+    diagonal = np.arange(ata.shape[1])
+    ata[:, diagonal, diagonal] += (reg_param * counts)[:, None]
+    x = np.linalg.solve(ata, atb[:, :, None])[:, :, 0]
+    if nonnegative:
+        negative = np.flatnonzero((x < 0).any(axis=1))
+        if len(negative):
+            x[negative] = _nonnegative_solve(ata[negative], atb[negative], x[negative])
+    return x
+
+
+def _solve_factors(src_factors: np.ndarray, dst: np.ndarray, src: np.ndarray, ratings: np.ndarray,
+                   n_dst: int, reg_param: float, nonnegative: bool, chunk_size: int = ALS_CHUNK_SIZE) -> np.ndarray:
+    """One ALS half-iteration: least-squares factors for every ``dst`` row given ``src_factors``."""
+    rank = src_factors.shape[1]
+    order = np.argsort(dst, kind='stable')
+    src, ratings = src[order], ratings[order]
+    counts = np.bincount(dst, minlength=n_dst)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    x = np.zeros((n_dst, rank))
+
+    # Rows with many ratings (products, mostly): one Y^T Y matrix multiply each
+    heavy = np.flatnonzero(counts >= HEAVY_ROW_RATINGS)
+    if len(heavy):
+        ata = np.empty((len(heavy), rank, rank))
+        atb = np.empty((len(heavy), rank))
+        for i, row in enumerate(heavy):
+            y = src_factors[src[offsets[row]:offsets[row + 1]]]
+            ata[i] = y.T @ y
+            atb[i] = y.T @ ratings[offsets[row]:offsets[row + 1]]
+        x[heavy] = _regularized_solve(ata, atb, counts[heavy], reg_param, nonnegative)
+
+    # Rows with few ratings (customers): outer products summed per row by a
+    # sparse 0/1 matrix, in chunks of whole rows so memory stays at
+    # chunk_size x rank x rank
+    light = np.flatnonzero((counts > 0) & (counts < HEAVY_ROW_RATINGS))
+    if len(light):
+        from scipy.sparse import csr_matrix
+
+        in_light = np.repeat((counts > 0) & (counts < HEAVY_ROW_RATINGS), counts)
+        src, ratings = src[in_light], ratings[in_light]
+        light_counts = counts[light]
+        light_offsets = np.concatenate([[0], np.cumsum(light_counts)])
+        start = 0
+        while start < len(light):
+            stop = int(np.searchsorted(light_offsets, light_offsets[start] + chunk_size, side='right')) - 1
+            stop = min(max(stop, start + 1), len(light))
+            lo, hi = light_offsets[start], light_offsets[stop]
+            y = src_factors[src[lo:hi]]
+            summer = csr_matrix((np.ones(hi - lo), (np.repeat(np.arange(stop - start), light_counts[start:stop]),
+                                                    np.arange(hi - lo))), shape=(stop - start, hi - lo))
+            ata = (summer @ (y[:, :, None] * y[:, None, :]).reshape(hi - lo, -1)).reshape(-1, rank, rank)
+            atb = summer @ (y * ratings[lo:hi, None])
+            x[light[start:stop]] = _regularized_solve(ata, atb, light_counts[start:stop], reg_param, nonnegative)
+            start = stop
+    return x
+
+
+def train_als(idx_df: pd.DataFrame, rank: int = 20, reg_param: float = 0.1, max_iter: int = 20,
+              nonnegative: bool = True, seed: int = 42, rating_col: str = 'interaction_score',
+              init_user_factors: Optional[np.ndarray] = None
+              ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Explicit-feedback ALS on ``user_int, item_int, <rating_col>`` rows.
+
+    Mirrors Spark ML's ALS: unit-norm Gaussian initial user factors, items
+    solved first each iteration, ``regParam * n_ratings`` ridge per row, and
+    non-negative least squares with ``nonnegative=True``. Passing
+    ``init_user_factors`` (one row per sorted user id, e.g. the user factors
+    of an earlier fit on the same rows) warm-starts from them instead.
+
+    Returns:
+        (user_ids, user_factors, item_ids, item_factors) in the layout of
+        ``factors_to_array``: only ids with ratings, float32 factors
+    """
+    users = idx_df['user_int'].to_numpy(dtype=np.int64)
+    items = idx_df['item_int'].to_numpy(dtype=np.int64)
+    ratings = idx_df[rating_col].to_numpy(dtype=np.float64)
+    user_ids, user_rows = np.unique(users, return_inverse=True)
+    item_ids, item_rows = np.unique(items, return_inverse=True)
+
+    if init_user_factors is not None:
+        user_factors = np.array(init_user_factors, dtype=np.float64)
+        if user_factors.shape != (len(user_ids), rank):
+            raise ValueError(f"init_user_factors has shape {user_factors.shape}, "
+                             f"expected ({len(user_ids)}, {rank})")
+    else:
+        rng = np.random.default_rng(seed)
+        user_factors = rng.standard_normal((len(user_ids), rank))
+        user_factors /= np.linalg.norm(user_factors, axis=1, keepdims=True)
+    item_factors = np.zeros((len(item_ids), rank))
+
+    for _ in range(max_iter):
+        item_factors = _solve_factors(user_factors, item_rows, user_rows, ratings, len(item_ids),
+                                      reg_param, nonnegative)
+        user_factors = _solve_factors(item_factors, user_rows, item_rows, ratings, len(user_ids),
+                                      reg_param, nonnegative)
+
+    return (user_ids, np.ascontiguousarray(user_factors, dtype=np.float32),
+            item_ids, np.ascontiguousarray(item_factors, dtype=np.float32))
+
+
+def rmse(idx_df: pd.DataFrame, user_ids: np.ndarray, user_factors: np.ndarray, item_ids: np.ndarray,
+         item_factors: np.ndarray, rating_col: str = 'interaction_score') -> float:
+    """RMSE over rows whose user and item have factors (``coldStartStrategy='drop'``)."""
+    user_pos = pd.Series(np.arange(len(user_ids)), index=user_ids)
+    item_pos = pd.Series(np.arange(len(item_ids)), index=item_ids)
+    u = idx_df['user_int'].map(user_pos)
+    i = idx_df['item_int'].map(item_pos)
+    known = u.notna() & i.notna()
+    if not known.any():
+        return float('nan')
+    u, i = u[known].to_numpy(dtype=np.int64), i[known].to_numpy(dtype=np.int64)
+    predictions = np.einsum('nk,nk->n', user_factors[u].astype(np.float64), item_factors[i].astype(np.float64))
+    errors = predictions - idx_df.loc[known, rating_col].to_numpy(dtype=np.float64)
+    return float(np.sqrt(np.mean(errors ** 2)))
+
+
+def recommendations_frame(user_ids, user_factors, item_ids, item_factors,
+                          customer_lookup: pd.DataFrame, product_lookup: pd.DataFrame,
+                          top_n: int = 5, block_size: int = DEFAULT_BLOCK_SIZE,
+                          eligible: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """
+    Top-N rows in the ``als_recommendations_table`` layout, ordered by Customer_ID and rank.
+
+    ``eligible`` is an optional (n_users, n_items) mask in factor order
+    (``pinnacle.eligibility.aligned_mask``); ineligible products are skipped.
+    """
+    recs = pd.DataFrame(top_n_recommendations(user_ids, user_factors, item_ids, item_factors,
+                                              top_n=top_n, block_size=block_size, eligible=eligible))
+    if recs.empty:
+        return pd.DataFrame(columns=['Customer_ID', 'Product_Name', 'als_score', 'confidence_score_pct', 'rank'])
+    low, high = SCORE_RANGE
+    recs = recs.merge(customer_lookup, on='user_int').merge(product_lookup, on='item_int')
+    recs['confidence_score_pct'] = (recs['als_score'] - low) / (high - low) * 100
+    return (recs[['Customer_ID', 'Product_Name', 'als_score', 'confidence_score_pct', 'rank']]
+            .sort_values(['Customer_ID', 'rank']).reset_index(drop=True))
+
+
+# ============================================================================
+# PIPELINE
+# ============================================================================
+
+def run_pipeline(customers: pd.DataFrame, transactions: pd.DataFrame, conversations: pd.DataFrame,
+                 products: pd.DataFrame, llm_interactions: Optional[pd.DataFrame] = None,
+                 customer_sample_size: Optional[int] = 1000, recency_days: int = 90,
+                 transaction_weight: float = 0.7, rank: int = 20, reg_param: float = 0.1,
+                 max_iter: int = 20, top_n: int = 5, test_fraction: float = 0.2, seed: int = 42,
+                 eligibility: bool = True, metrics=None) -> Dict[str, Any]:
+    """
+    Features, interactions, ALS and top-N on one machine.
+
+    Args:
+        customers, transactions, conversations, products: Source tables
+        llm_interactions: Optional LLM scores (see ``build_interactions``)
+        customer_sample_size: Customers to sample (None = all)
+        recency_days: Feature recency window
+        transaction_weight: Weight of transaction scores against LLM scores
+        rank, reg_param, max_iter: ALS hyperparameters
+        top_n: Recommendations per customer
+        test_fraction: Interactions held out for RMSE (the model is fit on the rest)
+        seed: Split and initialization seed
+        eligibility: Drop products whose catalogue rules exclude the customer
+            from the top-N (``pinnacle.eligibility``)
+        metrics: Optional ``RunMetrics`` receiving one span per stage
+
+    Returns:
+        Dict with features, interactions, current_products, customer_lookup,
+        product_lookup, factors (user_ids, user_factors, item_ids,
+        item_factors), rmse and recommendations
+    """
+    from pinnacle.metrics import RunMetrics
+
+    metrics = metrics or RunMetrics()
+    with metrics.span('local_pipeline', customers=len(customers)):
+        with metrics.span('features') as span:
+            features = customer_features(transactions, conversations, customers, recency_days=recency_days,
+                                         customer_sample_size=customer_sample_size)
+            span.set_rows(len(features))
+
+        with metrics.span('interactions') as span:
+            interactions, held = build_interactions(customers, products, transactions, llm_interactions,
+                                                    customer_sample_size=customer_sample_size,
+                                                    transaction_weight=transaction_weight)
+            span.set_rows(len(interactions))
+
+        with metrics.span('train', rank=rank, reg_param=reg_param, max_iter=max_iter) as span:
+            idx_df, customer_lookup, product_lookup = index_interactions(interactions)
+            test_mask = np.random.default_rng(seed).random(len(idx_df)) < test_fraction
+            train_df, test_df = idx_df[~test_mask], idx_df[test_mask]
+            factors = train_als(train_df, rank=rank, reg_param=reg_param, max_iter=max_iter, seed=seed)
+            test_rmse = rmse(test_df, *factors)
+            span.set(rmse=test_rmse)
+            span.set_rows(len(train_df))
+
+        with metrics.span('score', eligibility=eligibility) as span:
+            eligible = None
+            if eligibility:
+                from pinnacle.eligibility import aligned_mask, product_rules
+
+                eligible = aligned_mask(customers, customer_lookup, factors[0],
+                                        product_rules(products), product_lookup, factors[2])
+            recommendations = recommendations_frame(*factors, customer_lookup, product_lookup, top_n=top_n,
+                                                    eligible=eligible)
+            span.set_rows(len(factors[0]))
+
+    return {
+        'features': features,
+        'interactions': interactions,
+        'current_products': held,
+        'customer_lookup': customer_lookup,
+        'product_lookup': product_lookup,
+        'factors': factors,
+        'rmse': test_rmse,
+        'recommendations': recommendations,
+    }
@@ -0,0 +1,469 @@
+"""
+Run instrumentation: stage spans, row throughput, driver memory and LLM usage.
+
+A ``RunMetrics`` collects nested timing spans (pipeline stage -> sub-step)
+with row counts, rows/sec and the driver's peak resident memory, plus a
+latency histogram and prompt/completion token counters for every LLM
+request. With ``track_spark_jobs`` each span also counts the Spark jobs it
+launched. At the end of a run it is exported as JSON lines (one record per
+span or metric, appended run after run) or as a Prometheus text-format file
+that a node-exporter textfile collector can scrape.
+
+Usage:
+    metrics = RunMetrics()
+    metrics.track_spark_jobs(spark)
+    with metrics.span('features') as span:
+        df = ...
+        span.set_rows(df.count())
+    response = metrics.timed_completion(client, 'scoring', model=..., messages=...)
+    metrics.export('run_metrics.jsonl')
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Request latency buckets in seconds (chat completions take ~0.5-60 s)
+LLM_LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+PROMETHEUS_PREFIX = 'pinnacle'
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this (driver) process, or None if unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return int(peak if sys.platform == 'darwin' else peak * 1024)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with Prometheus semantics (cumulative ``le`` buckets).
+
+    Args:
+        buckets: Increasing upper bounds; ``+Inf`` is implicit
+    """
+
+    def __init__(self, buckets: Sequence[float] = LLM_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """``(le, count)`` pairs including ``+Inf``."""
+        pairs, running = [], 0
+        for bound, count in zip(list(self.buckets) + [float('inf')], self.counts):
+            running += count
+            pairs.append(('+Inf' if bound == float('inf') else f"{bound:g}", running))
+        return pairs
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bucket bound holding the ``q`` quantile (None when empty)."""
+        if not self.count:
+            return None
+        target, running = q * self.count, 0
+        for bound, count in zip(list(self.buckets) + [float('inf')], self.counts):
+            running += count
+            if running >= target:
+                return bound
+        return float('inf')
+
+
+class Span:
+    """
+    One timed stage or sub-step. Created started by ``RunMetrics.span``.
+
+    Usable as a context manager, or ended explicitly with ``end()`` when the
+    stage spans a whole notebook cell.
+    """
+
+    def __init__(self, metrics: 'RunMetrics', name: str, parent: Optional['Span'], attrs: Dict[str, Any]):
+        self.metrics = metrics
+        self.name = name
+        self.parent = parent
+        self.path = f"{parent.path}/{name}" if parent else name
+        self.attrs = dict(attrs)
+        self.rows: Optional[int] = None
+        self.error: Optional[str] = None
+        self.started_at = datetime.now(timezone.utc)
+        self.seconds: Optional[float] = None
+        self.peak_rss_start = peak_rss_bytes()
+        self.peak_rss_end: Optional[int] = None
+        self.jobs_start = metrics.spark_jobs()
+        self.spark_jobs: Optional[int] = None
+        self._start = time.perf_counter()
+
+    def __enter__(self) -> 'Span':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end(error=f"{exc_type.__name__}: {exc}" if exc_type else None)
+        return False
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds so far (or the final duration once ended)."""
+        return self.seconds if self.seconds is not None else time.perf_counter() - self._start
+
+    @property
+    def rows_per_sec(self) -> Optional[float]:
+        if self.rows is None or not self.elapsed:
+            return None
+        return self.rows / self.elapsed
+
+    def set_rows(self, rows: int):
+        self.rows = int(rows)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self, rows: Optional[int] = None, error: Optional[str] = None) -> 'Span':
+        """Stop the clock (idempotent) and record rows and driver memory."""
+        if self.seconds is not None:
+            return self
+        self.seconds = time.perf_counter() - self._start
+        if rows is not None:
+            self.set_rows(rows)
+        self.error = error
+        self.peak_rss_end = peak_rss_bytes()
+        jobs_end = self.metrics.spark_jobs()
+        if jobs_end is not None and self.jobs_start is not None:
+            self.spark_jobs = jobs_end - self.jobs_start
+        self.metrics._close(self)
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        rate = self.rows_per_sec
+        growth = (self.peak_rss_end - self.peak_rss_start
+                  if self.peak_rss_end is not None and self.peak_rss_start is not None else None)
+        return {
+            'type': 'span',
+            'run_id': self.metrics.run_id,
+            'span': self.path,
+            'parent': self.parent.path if self.parent else None,
+            'started_at': self.started_at.isoformat(),
+            'seconds': round(self.elapsed, 6),
+            'rows': self.rows,
+            'rows_per_sec': round(rate, 3) if rate is not None else None,
+            'peak_rss_bytes': self.peak_rss_end,
+            'peak_rss_growth_bytes': growth,
+            'spark_jobs': self.spark_jobs,
+            'error': self.error,
+            'attrs': self.attrs,
+        }
+
+
+class RunMetrics:
+    """
+    Spans and LLM request metrics for one pipeline run.
+
+    Thread-safe: spans nest per thread, and LLM requests may be recorded from
+    the dispatcher's worker threads.
+
+    Args:
+        run_id: Identifier stamped on every exported record (random if None)
+        latency_buckets: Histogram bounds in seconds for LLM request latency
+    """
+
+    def __init__(self, run_id: Optional[str] = None, latency_buckets: Sequence[float] = LLM_LATENCY_BUCKETS):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.latency_buckets = tuple(latency_buckets)
+        self.spans: List[Span] = []
+        self.llm_latency: Dict[Tuple[str, str], Histogram] = {}
+        self.llm_requests: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self.llm_tokens: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._spark_context = None
+        self._job_groups = set()
+        self._job_ids = set()
+
+    # ------------------------------------------------------------------
+    # Spans
+    # ------------------------------------------------------------------
+
+    def _stack(self) -> List[Span]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def span(self, name: str, **attrs) -> Span:
+        """Start a span nested under this thread's innermost open span."""
+        stack = self._stack()
+        span = Span(self, name, stack[-1] if stack else None, attrs)
+        stack.append(span)
+        return span
+
+    def _close(self, span: Span):
+        stack = self._stack()
+        if span in stack:
+            # Closing a parent also drops children left open
+            del stack[stack.index(span):]
+        with self._lock:
+            self.spans.append(span)
+
+    # ------------------------------------------------------------------
+    # Spark jobs
+    # ------------------------------------------------------------------
+
+    def track_spark_jobs(self, spark) -> bool:
+        """
+        Count Spark jobs launched from this thread in spans and the run total.
+
+        Jobs are found through the status tracker by job group: the group in
+        effect when a span starts or ends (e.g. the per-cell group Databricks
+        sets), or the run id when none is set. Returns False when the session
+        has no SparkContext (Spark Connect), leaving job counts empty.
+        """
+        try:
+            self._spark_context = spark.sparkContext
+        except Exception:
+            self._spark_context = None
+        return self._spark_context is not None
+
+    def spark_jobs(self) -> Optional[int]:
+        """Spark jobs seen so far in this run (None when not tracking)."""
+        sc = self._spark_context
+        if sc is None:
+            return None
+        group = sc.getLocalProperty('spark.jobGroup.id')
+        if group is None:
+            sc.setJobGroup(self.run_id, f"pinnacle run {self.run_id}")
+            group = self.run_id
+        tracker = sc.statusTracker()
+        with self._lock:
+            self._job_groups.add(group)
+            # Union across polls: the tracker only retains recent jobs
+            for job_group in self._job_groups:
+                self._job_ids.update(tracker.getJobIdsForGroup(job_group))
+            return len(self._job_ids)
+
+    # ------------------------------------------------------------------
+    # LLM requests
+    # ------------------------------------------------------------------
+
+    def record_llm_request(self, purpose: str, model: str, seconds: float,
+                           prompt_tokens: int = 0, completion_tokens: int = 0, status: str = 'ok'):
+        """
+        Record one LLM request attempt.
+
+        Args:
+            purpose: What the request was for ('scoring', 'explanation', ...)
+            model: Model name
+            seconds: Wall time of the request
+            prompt_tokens, completion_tokens: Token usage reported by the API
+            status: 'ok' or the exception class name of a failed attempt
+        """
+        with self._lock:
+            key = (purpose, model)
+            if key not in self.llm_latency:
+                self.llm_latency[key] = Histogram(self.latency_buckets)
+            self.llm_latency[key].observe(seconds)
+            self.llm_requests[(purpose, model, status)] += 1
+            self.llm_tokens[(purpose, model, 'prompt')] += int(prompt_tokens or 0)
+            self.llm_tokens[(purpose, model, 'completion')] += int(completion_tokens or 0)
+
+    def timed_completion(self, client: Any, purpose: str, **request) -> Any:
+        """
+        ``client.chat.completions.create(**request)``, recording latency and usage.
+
+        Failed attempts are recorded with their exception class as status and
+        the exception is re-raised (retries stay with the caller).
+        """
+        model = request.get('model', 'unknown')
+        start = time.perf_counter()
+        try:
+            response = client.chat.completions.create(**request)
+        except Exception as exc:
+            self.record_llm_request(purpose, model, time.perf_counter() - start, status=type(exc).__name__)
+            raise
+        usage = getattr(response, 'usage', None)
+        self.record_llm_request(purpose, model, time.perf_counter() - start,
+                                prompt_tokens=getattr(usage, 'prompt_tokens', 0),
+                                completion_tokens=getattr(usage, 'completion_tokens', 0))
+        return response
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Spans (in completion order) followed by LLM metrics, as plain dicts."""
+        with self._lock:
+            spans = list(self.spans)
+            latency = dict(self.llm_latency)
+            requests = dict(self.llm_requests)
+            tokens = dict(self.llm_tokens)
+
+        records = [span.to_dict() for span in sorted(spans, key=lambda s: s.started_at)]
+        for (purpose, model), hist in sorted(latency.items()):
+            records.append({
+                'type': 'llm',
+                'run_id': self.run_id,
+                'purpose': purpose,
+                'model': model,
+                'requests': {status: n for (p, m, status), n in sorted(requests.items())
+                             if (p, m) == (purpose, model)},
+                'prompt_tokens': tokens.get((purpose, model, 'prompt'), 0),
+                'completion_tokens': tokens.get((purpose, model, 'completion'), 0),
+                'latency_seconds': {
+                    'count': hist.count,
+                    'sum': round(hist.sum, 6),
+                    'p50_le': _bound(hist.quantile(0.5)),
+                    'p95_le': _bound(hist.quantile(0.95)),
+                    'buckets': dict(hist.cumulative()),
+                },
+            })
+        records.append({
+            'type': 'run',
+            'run_id': self.run_id,
+            'exported_at': datetime.now(timezone.utc).isoformat(),
+            'peak_rss_bytes': peak_rss_bytes(),
+            'spark_jobs': self.spark_jobs(),
+        })
+        return records
+
+    def export_jsonl(self, path: str):
+        """Append this run's records to a JSON-lines file."""
+        with open(path, 'a') as f:
+            for record in self.records():
+                f.write(json.dumps(record, default=str) + '\n')
+
+    def export_prometheus(self, path: str):
+        """
+        Write this run as a Prometheus text-format file (replaced atomically).
+
+        Spans become gauges labelled by span path; LLM latency is a histogram
+        and token usage a counter, labelled by purpose and model.
+        """
+        p = PROMETHEUS_PREFIX
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+
+        def sample(name, labels, value):
+            label_text = ','.join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+            lines.append(f"{p}_{name}{{{label_text}}} {value}")
+
+        spans = [span.to_dict() for span in sorted(self.spans, key=lambda s: s.started_at)]
+        family('stage_seconds', 'gauge', 'Wall time of a pipeline stage or sub-step.')
+        for span in spans:
+            sample('stage_seconds', {'run_id': self.run_id, 'span': span['span']}, span['seconds'])
+        family('stage_rows', 'gauge', 'Rows produced by a pipeline stage or sub-step.')
+        for span in spans:
+            if span['rows'] is not None:
+                sample('stage_rows', {'run_id': self.run_id, 'span': span['span']}, span['rows'])
+        family('stage_rows_per_second', 'gauge', 'Row throughput of a pipeline stage or sub-step.')
+        for span in spans:
+            if span['rows_per_sec'] is not None:
+                sample('stage_rows_per_second', {'run_id': self.run_id, 'span': span['span']}, span['rows_per_sec'])
+        family('stage_peak_rss_bytes', 'gauge', 'Driver peak resident memory when the stage ended.')
+        for span in spans:
+            if span['peak_rss_bytes'] is not None:
+                sample('stage_peak_rss_bytes', {'run_id': self.run_id, 'span': span['span']}, span['peak_rss_bytes'])
+
+        with self._lock:
+            latency = sorted(self.llm_latency.items())
+            requests = sorted(self.llm_requests.items())
+            tokens = sorted(self.llm_tokens.items())
+
+        family('llm_request_seconds', 'histogram', 'LLM request latency.')
+        for (purpose, model), hist in latency:
+            labels = {'run_id': self.run_id, 'purpose': purpose, 'model': model}
+            for le, count in hist.cumulative():
+                sample('llm_request_seconds_bucket', {**labels, 'le': le}, count)
+            sample('llm_request_seconds_sum', labels, round(hist.sum, 6))
+            sample('llm_request_seconds_count', labels, hist.count)
+        family('llm_requests_total', 'counter', 'LLM request attempts by status.')
+        for (purpose, model, status), count in requests:
+            sample('llm_requests_total', {'run_id': self.run_id, 'purpose': purpose, 'model': model,
+                                          'status': status}, count)
+        family('llm_tokens_total', 'counter', 'LLM tokens by kind (prompt or completion).')
+        for (purpose, model, kind), count in tokens:
+            sample('llm_tokens_total', {'run_id': self.run_id, 'purpose': purpose, 'model': model,
+                                        'kind': kind}, count)
+
+        family('stage_spark_jobs', 'gauge', 'Spark jobs launched by a pipeline stage or sub-step.')
+        for span in spans:
+            if span['spark_jobs'] is not None:
+                sample('stage_spark_jobs', {'run_id': self.run_id, 'span': span['span']}, span['spark_jobs'])
+        jobs = self.spark_jobs()
+        if jobs is not None:
+            family('spark_jobs', 'gauge', 'Spark jobs launched by the run.')
+            sample('spark_jobs', {'run_id': self.run_id}, jobs)
+
+        peak = peak_rss_bytes()
+        if peak is not None:
+            family('driver_peak_rss_bytes', 'gauge', 'Driver process peak resident memory.')
+            sample('driver_peak_rss_bytes', {'run_id': self.run_id}, peak)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
+
+    def export(self, path: str):
+        """Export by extension: ``.prom`` -> Prometheus text, anything else -> JSON lines."""
+        if path.endswith('.prom'):
+            self.export_prometheus(path)
+        else:
+            self.export_jsonl(path)
+
+    def summary(self) -> str:
+        """Human-readable table of spans and LLM usage for the end of a run."""
+        lines = [f"Run {self.run_id}"]
+        for span in sorted(self.spans, key=lambda s: s.started_at):
+            depth = span.path.count('/')
+            rate = span.rows_per_sec
+            jobs = f"{span.spark_jobs:>5,} jobs " if span.spark_jobs is not None else ''
+            rows = f"{span.rows:>12,} rows {rate:>12,.0f} rows/s" if rate is not None else ''
+            lines.append(f"   {'  ' * depth}{span.name:<{28 - 2 * depth}} {span.elapsed:>9.2f}s {jobs}{rows}")
+        for (purpose, model), hist in sorted(self.llm_latency.items()):
+            prompt = self.llm_tokens.get((purpose, model, 'prompt'), 0)
+            completion = self.llm_tokens.get((purpose, model, 'completion'), 0)
+            lines.append(f"   LLM {purpose} ({model}): {hist.count:,} requests, "
+                         f"{hist.sum / hist.count:.2f}s avg, p95 ≤ {hist.quantile(0.95):g}s, "
+                         f"{prompt:,} prompt + {completion:,} completion tokens")
+        peak = peak_rss_bytes()
+        if peak is not None:
+            lines.append(f"   Driver peak RSS: {peak / 2**20:,.0f} MiB")
+        jobs = self.spark_jobs()
+        if jobs is not None:
+            lines.append(f"   Spark jobs launched: {jobs:,}")
+        return '\n'.join(lines)
+
+
+def _bound(value: Optional[float]) -> Any:
+    # JSON has no Infinity; use the Prometheus spelling for the overflow bucket
+    return '+Inf' if value == float('inf') else value
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
@@ -0,0 +1,272 @@
+"""
+Incremental writes of the recommendation output tables.
+
+``als_recommendations_table`` and ``final_recommendations_api_table`` were
+rewritten in full on every run, although most customers' top-N lists come
+out the same. ``upsert_recommendations`` instead:
+
+1. hashes each customer's list (``content_hashes``: the (rank,
+   Product_Name) pairs in rank order, as one ``xxhash64``). Scores and
+   free text are left out by default: a retrain moves every score and
+   the LLM rewrites every reason, so hashing them would mark every
+   customer as changed;
+2. diffs the hashes against the ones stored with the table in
+   ``<table>_hashes`` (one row per customer), giving the customers whose
+   list changed, appeared or disappeared. With ``tolerances``, rows of
+   unchanged lists whose scores moved further than the tolerance are
+   refreshed too (a read of the score columns, no rewrite of the rest);
+3. MERGEs only those customers' rows into the Delta table, matched on
+   (customer_bucket, Customer_ID, rank). The table is partitioned by
+   ``customer_bucket = pmod(xxhash64(Customer_ID), buckets)`` and the merge
+   condition lists the touched buckets, so only their files are read; with
+   deletion vectors enabled the rewritten data is the changed rows plus
+   small deletion files, proportional to churn rather than table size;
+4. records the new hashes with the table version.
+
+The version is the Delta version of the table after the merge and is only
+bumped when some row was written, so it works as a cache key / ETag for
+downstream readers (``output_version``); ``customer_versions`` gives the
+version at which each customer's list last changed.
+
+The first write, a missing hash table, or a change of columns falls back to
+a full write. Requires Delta Lake (Databricks, or ``delta-spark``).
+
+Usage:
+    result = upsert_recommendations(spark, als_output, "als_recommendations_table")
+    result.version, result.changed, result.rows_written
+"""
+
+from functools import reduce
+from typing import Mapping, NamedTuple, Optional, Sequence
+
+BUCKETS = 64
+BUCKET_COLUMN = 'customer_bucket'
+HASH_COLUMN = 'content_hash'
+VERSION_COLUMN = 'version'
+HASH_TABLE_SUFFIX = '_hashes'
+HASH_COLUMNS = ('Product_Name',)
+FLOAT_DIGITS = 4
+_NEW = '_new'
+
+
+class UpsertResult(NamedTuple):
+    """Outcome of ``upsert_recommendations``."""
+    version: int
+    changed: int          # Customers whose rows were replaced (new customers included)
+    removed: int          # Customers whose rows were deleted
+    unchanged: int        # Customers whose list is the same (refreshed ones included)
+    refreshed: int        # Unchanged customers whose scores moved past ``tolerances`` and were updated
+    rows_written: int     # Rows inserted or updated
+    full_write: bool
+
+
+def customer_bucket(column: str = 'Customer_ID', buckets: int = BUCKETS):
+    """``pmod(xxhash64(column), buckets)``: the table's partition column."""
+    from pyspark.sql import functions as F
+
+    return F.pmod(F.xxhash64(F.col(column)), F.lit(buckets)).cast('int')
+
+
+def content_hashes(df, key: str = 'Customer_ID', order: str = 'rank',
+                   hash_columns: Optional[Sequence[str]] = HASH_COLUMNS, float_digits: int = FLOAT_DIGITS):
+    """
+    One ``xxhash64`` per customer over their rows ordered by ``order``.
+
+    Args:
+        df: Recommendation rows
+        key: Customer column
+        order: Rank column (the list order; sorted on first)
+        hash_columns: Columns hashed with ``order`` (default: the product,
+            i.e. what defines the top-N list); None hashes every column
+        float_digits: Decimals floats are rounded to before hashing, so
+            score noise below that does not count as a change
+
+    Returns:
+        Spark DataFrame with ``key`` and ``content_hash``
+    """
+    from pyspark.sql import functions as F
+    from pyspark.sql.types import DoubleType, FloatType
+
+    fields = [f for f in df.schema if f.name not in (key, order)
+              and (hash_columns is None or f.name in hash_columns)]
+    values = [F.round(F.col(f.name), float_digits).alias(f.name) if isinstance(f.dataType, (DoubleType, FloatType))
+              else F.col(f.name) for f in fields]
+    rows = F.array_sort(F.collect_list(F.struct(F.col(order), *values)))
+    return df.groupBy(key).agg(F.xxhash64(F.to_json(rows)).alias(HASH_COLUMN))
+
+
+def hash_table_name(table: str) -> str:
+    return table + HASH_TABLE_SUFFIX
+
+
+def output_version(spark, table: str) -> Optional[int]:
+    """Current Delta version of ``table`` (None if it does not exist)."""
+    from delta.tables import DeltaTable
+
+    if not spark.catalog.tableExists(table):
+        return None
+    return int(DeltaTable.forName(spark, table).history(1).select('version').first()[0])
+
+
+def customer_versions(spark, table: str, customer_ids: Optional[Sequence[str]] = None, key: str = 'Customer_ID'):
+    """``key``, content_hash and the table version at which each customer's list last changed."""
+    from pyspark.sql import functions as F
+
+    hashes = spark.table(hash_table_name(table))
+    if customer_ids is not None:
+        ids = [str(c) for c in customer_ids]
+        # The customers' buckets first, so only their partitions are read
+        touched = [row[0] for row in spark.createDataFrame([(c,) for c in ids], f"{key} string")
+                   .select(customer_bucket(key, bucket_count(spark, table))).distinct().collect()]
+        hashes = hashes.filter(F.col(BUCKET_COLUMN).isin(touched) & F.col(key).isin(ids))
+    return hashes.select(key, HASH_COLUMN, VERSION_COLUMN)
+
+
+def bucket_count(spark, table: str) -> int:
+    """Number of customer buckets ``table`` was written with."""
+    properties = {row['key']: row['value'] for row in spark.sql(f"SHOW TBLPROPERTIES {table}").collect()}
+    return int(properties.get('pinnacle.buckets', BUCKETS))
+
+
+def _full_write(spark, df, table: str, hashes, key: str, buckets: int) -> UpsertResult:
+    from pyspark.sql import functions as F
+
+    rows = df.withColumn(BUCKET_COLUMN, customer_bucket(key, buckets))
+    (rows.write.format('delta').mode('overwrite').option('overwriteSchema', 'true')
+     .partitionBy(BUCKET_COLUMN).saveAsTable(table))
+    spark.sql(f"ALTER TABLE {table} SET TBLPROPERTIES ("
+              f"'delta.enableDeletionVectors' = 'true', 'pinnacle.buckets' = '{buckets}')")
+    version = output_version(spark, table)
+    (hashes.withColumn(VERSION_COLUMN, F.lit(version))
+     .write.format('delta').mode('overwrite').option('overwriteSchema', 'true')
+     .partitionBy(BUCKET_COLUMN).saveAsTable(hash_table_name(table)))
+    customers = hashes.count()
+    return UpsertResult(version, customers, 0, 0, 0, df.count(), True)
+
+
+def _moved(tolerances: Mapping[str, float]):
+    """Rows where any ``tolerances`` column differs from its ``_stored_`` copy by more than its tolerance."""
+    from pyspark.sql import functions as F
+
+    def moved(column, tolerance):
+        new, old = F.col(column), F.col(f"_stored_{column}")
+        return (F.when(new.isNull() | old.isNull(), ~new.eqNullSafe(old))
+                .otherwise(F.abs(new - old) > F.lit(tolerance)))
+
+    return reduce(lambda a, b: a | b, [moved(c, t) for c, t in tolerances.items()])
+
+
+def upsert_recommendations(spark, df, table: str, key: str = 'Customer_ID', order: str = 'rank',
+                           buckets: int = BUCKETS, hash_columns: Optional[Sequence[str]] = HASH_COLUMNS,
+                           tolerances: Optional[Mapping[str, float]] = None, float_digits: int = FLOAT_DIGITS,
+                           delete_missing: bool = True) -> UpsertResult:
+    """
+    Write ``df`` to ``table``, touching only the customers whose list changed.
+
+    Args:
+        spark: Active SparkSession
+        df: The full new output (every customer's top-N rows)
+        table: Delta table name
+        key: Customer column
+        order: Rank column; rows are matched on (key, order)
+        buckets: Partitions of the customer hash (fixed at the first write)
+        hash_columns: Columns whose change (with ``order``) makes a
+            customer's list changed; see ``content_hashes``
+        tolerances: Score columns -> largest change left unwritten. Rows of
+            unchanged lists where any of them moved further get all their
+            columns updated, without touching the stored hash; None keeps
+            the stored values until the list itself changes
+        float_digits: Float rounding for the content hash
+        delete_missing: Delete customers absent from ``df`` (the old
+            overwrite semantics); False keeps them
+
+    Returns:
+        UpsertResult with the table version after the write
+    """
+    from delta.tables import DeltaTable
+    from pyspark.sql import functions as F
+
+    hash_table = hash_table_name(table)
+    expected = {*df.columns, BUCKET_COLUMN}
+    if not (spark.catalog.tableExists(table) and spark.catalog.tableExists(hash_table)):
+        hashes = (content_hashes(df, key, order, hash_columns, float_digits)
+                  .withColumn(BUCKET_COLUMN, customer_bucket(key, buckets)))
+        return _full_write(spark, df, table, hashes, key, buckets)
+    buckets = bucket_count(spark, table)
+    hashes = (content_hashes(df, key, order, hash_columns, float_digits)
+              .withColumn(BUCKET_COLUMN, customer_bucket(key, buckets)))
+    if set(spark.table(table).columns) != expected:
+        return _full_write(spark, df, table, hashes, key, buckets)
+
+    # Diff against the stored hashes (one row per customer on each side)
+    stored = spark.table(hash_table).select(key, BUCKET_COLUMN, F.col(HASH_COLUMN).alias('_stored_hash'))
+    diff = hashes.join(stored, [key, BUCKET_COLUMN], 'full_outer')
+    new_hash, old_hash = F.col(HASH_COLUMN), F.col('_stored_hash')
+    status = (F.when(old_hash.isNull(), 'changed')
+              .when(new_hash.isNull(), 'removed' if delete_missing else 'kept')
+              .when(new_hash != old_hash, 'changed')
+              .otherwise('unchanged'))
+    diff = diff.withColumn('_status', status).localCheckpoint()
+    counts = {row['_status']: row['count'] for row in diff.groupBy('_status').count().collect()}
+    changed, removed = counts.get('changed', 0), counts.get('removed', 0)
+    unchanged = counts.get('unchanged', 0) + counts.get('kept', 0)
+    bucketed = df.withColumn(BUCKET_COLUMN, customer_bucket(key, buckets))
+
+    # Unchanged lists whose scores drifted past the tolerances: their new rows, updated in place
+    refreshed_rows, refreshed = None, 0
+    if tolerances and unchanged:
+        unchanged_ids = diff.filter(F.col('_status') == 'unchanged').select(key, BUCKET_COLUMN)
+        stored_scores = spark.table(table).select(
+            key, order, BUCKET_COLUMN, *[F.col(c).alias(f"_stored_{c}") for c in tolerances])
+        refreshed_rows = (bucketed.join(unchanged_ids, [key, BUCKET_COLUMN], 'left_semi')
+                          .join(stored_scores, [key, order, BUCKET_COLUMN])
+                          .filter(_moved(tolerances))
+                          .select(*df.columns, BUCKET_COLUMN).withColumn(_NEW, F.lit(True))
+                          .localCheckpoint())
+        refreshed = refreshed_rows.select(key).distinct().count()
+    if changed + removed + refreshed == 0:
+        return UpsertResult(output_version(spark, table), 0, 0, unchanged, 0, 0, False)
+
+    touched = diff.filter(F.col('_status').isin('changed', 'removed'))
+    touched_buckets = {row[0] for row in touched.select(BUCKET_COLUMN).distinct().collect()}
+    if refreshed:
+        touched_buckets |= {row[0] for row in refreshed_rows.select(BUCKET_COLUMN).distinct().collect()}
+    touched_buckets = sorted(touched_buckets)
+    in_buckets = f"t.{BUCKET_COLUMN} IN ({', '.join(str(b) for b in touched_buckets)})"
+
+    # Source rows: the changed customers' new rows, plus their stored (key, rank)
+    # rows without a new counterpart (shorter lists, removed customers) to delete
+    changed_ids = touched.filter(F.col('_status') == 'changed').select(key, BUCKET_COLUMN)
+    new_rows = (bucketed.join(changed_ids, [key, BUCKET_COLUMN], 'left_semi')
+                .withColumn(_NEW, F.lit(True)))
+    rows_written = new_rows.count()
+    if refreshed:
+        new_rows = new_rows.unionByName(refreshed_rows)
+        rows_written += refreshed_rows.count()
+    stored_rows = (spark.table(table).filter(F.col(BUCKET_COLUMN).isin(touched_buckets))
+                   .join(touched.select(key, BUCKET_COLUMN), [key, BUCKET_COLUMN], 'left_semi')
+                   .select(key, order, BUCKET_COLUMN))
+    source = new_rows.join(stored_rows, [key, order, BUCKET_COLUMN], 'full_outer').localCheckpoint()
+
+    columns = [*df.columns, BUCKET_COLUMN]
+    (DeltaTable.forName(spark, table).alias('t')
+     .merge(source.alias('s'), f"{in_buckets} AND t.{BUCKET_COLUMN} = s.{BUCKET_COLUMN} "
+                               f"AND t.{key} = s.{key} AND t.{order} = s.{order}")
+     .whenMatchedDelete(condition=f"s.{_NEW} IS NULL")
+     .whenMatchedUpdate(set={c: f"s.{c}" for c in df.columns if c not in (key, order)})
+     .whenNotMatchedInsert(condition=f"s.{_NEW} IS NOT NULL", values={c: f"s.{c}" for c in columns})
+     .execute())
+    version = output_version(spark, table)
+    if changed + removed == 0:
+        return UpsertResult(version, 0, 0, unchanged, refreshed, rows_written, False)
+
+    # Hashes of the touched customers, stamped with the version they changed in
+    hash_rows = touched.select(key, BUCKET_COLUMN, HASH_COLUMN).withColumn(VERSION_COLUMN, F.lit(version))
+    (DeltaTable.forName(spark, hash_table).alias('t')
+     .merge(hash_rows.alias('s'), f"{in_buckets} AND t.{BUCKET_COLUMN} = s.{BUCKET_COLUMN} AND t.{key} = s.{key}")
+     .whenMatchedDelete(condition=f"s.{HASH_COLUMN} IS NULL")
+     .whenMatchedUpdate(set={HASH_COLUMN: f"s.{HASH_COLUMN}", VERSION_COLUMN: f"s.{VERSION_COLUMN}"})
+     .whenNotMatchedInsert(condition=f"s.{HASH_COLUMN} IS NOT NULL",
+                           values={c: f"s.{c}" for c in (key, BUCKET_COLUMN, HASH_COLUMN, VERSION_COLUMN)})
+     .execute())
+    return UpsertResult(version, changed, removed, unchanged, refreshed, rows_written, False)
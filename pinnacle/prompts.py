@@ -0,0 +1,200 @@
+"""
+Compact, token-budgeted prompts for LLM customer-product scoring.
+
+The verbose scoring prompt re-sent the whole catalogue (every column,
+title-cased), one rule line per product restating the catalogue's age range,
+audience and minimum balance, and a free-text block per customer built from
+every customer column, and asked for product names back. Here:
+
+- products are a numbered pipe table with only the fields the rules use
+  (category, age range, target audience, minimum balance), which also
+  replaces the per-product rule lines;
+- customers are a pipe table over a pruned set of columns, numbered within
+  the batch;
+- the model answers ``{"m": [[customer_no, product_no, score], ...]}`` and
+  the numbers are mapped back to Customer_ID / Product_Name;
+- ``plan_batches`` packs as many customers into each request as fit a
+  per-request token budget (prompt plus expected completion) instead of a
+  fixed ``batch_size``.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from pinnacle.llm_dispatch import estimate_tokens
+
+
+PRODUCT_FIELDS = (
+    ('Product_Category', 'category'),
+    ('Age_Range', 'age'),
+    ('Target_Audience', 'target'),
+    ('Minimum_Balance', 'min_bal'),
+)
+CUSTOMER_FIELDS = (
+    ('Age', 'age'),
+    ('Gender', 'sex'),
+    ('Marital_Status', 'marital'),
+    ('Occupation', 'occupation'),
+    ('Employment_Status', 'employment'),
+    ('Income_Bracket', 'income'),
+    ('Account_Type', 'account'),
+    ('life_events', 'events'),
+)
+GENERAL_RULES = (
+    "Match products to customer demographics (age, income, occupation)",
+    "Do NOT recommend products similar to the customer's current account",
+    "Consider the customer's financial capacity",
+    "Product age, target and min_bal columns are strict eligibility rules",
+)
+DEFAULT_TOKEN_BUDGET = 8000
+MATCH_TOKENS = 6      # One "[12,31,8]," entry of the compact response
+RESPONSE_OVERHEAD_TOKENS = 10
+
+_NAIRA_AMOUNT = re.compile(r'₦\s?(\d{1,3}(?:,\d{3})+|\d+)')
+
+
+def _short_amount(match) -> str:
+    number = int(match.group(1).replace(',', ''))
+    for unit, size in (('M', 1_000_000), ('k', 1_000)):
+        if number >= size and number % (size // 10) == 0:
+            return f"{number / size:g}{unit}"
+    return str(number)
+
+
+def compact_value(value: Any) -> str:
+    """Short single-line cell text: naira amounts as 250k / 1.5M, pipes and newlines removed."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = _NAIRA_AMOUNT.sub(_short_amount, str(value))
+    return ' '.join(text.replace('|', '/').split())
+
+
+def _table(header: Sequence[str], rows: Sequence[Sequence[str]]) -> str:
+    return '\n'.join('|'.join(cells) for cells in [header, *rows])
+
+
+def product_table(products: Sequence[Mapping[str, Any]],
+                  include: Optional[Sequence[int]] = None) -> Tuple[str, List[str]]:
+    """
+    Numbered product table with the rule fields present in the catalogue.
+
+    Args:
+        products: Catalogue rows (dicts or Rows with Product_Name)
+        include: Optional catalogue positions to list (e.g. the products a
+            batch's customers are eligible for); products keep their
+            catalogue numbers so answers map back the same way
+
+    Returns:
+        (table_text, product_names): product number ``n`` is ``product_names[n - 1]``,
+        over the whole catalogue
+    """
+    rows = [row.asDict() if hasattr(row, 'asDict') else dict(row) for row in products]
+    fields = [(column, label) for column, label in PRODUCT_FIELDS if any(column in row for row in rows)]
+    names = [row['Product_Name'] for row in rows]
+    positions = range(len(rows)) if include is None else sorted(int(i) for i in include)
+    table = _table(['p', 'name', *(label for _, label in fields)],
+                   [[str(i + 1), compact_value(rows[i]['Product_Name']),
+                     *(compact_value(rows[i].get(column)) for column, _ in fields)]
+                    for i in positions])
+    return table, names
+
+
+def customer_fields(columns: Sequence[str]) -> List[Tuple[str, str]]:
+    """The prompt's customer (column, label) pairs available in ``columns``."""
+    return [(column, label) for column, label in CUSTOMER_FIELDS if column in columns]
+
+
+def customer_row(customer: Mapping[str, Any], fields: Sequence[Tuple[str, str]]) -> str:
+    """One customer's table cells (without the batch-local number), e.g. ``20|Male|Single|Student|...``."""
+    get = customer.get if hasattr(customer, 'get') else lambda column: getattr(customer, column, None)
+    return '|'.join(compact_value(get(column)) for column, _ in fields)
+
+
+def rules_text(additional_rules: Optional[Sequence[str]] = None) -> str:
+    """General matching rules plus any custom ones, one ``- rule`` line each."""
+    return '\n'.join(f"- {rule}" for rule in [*GENERAL_RULES, *(additional_rules or [])])
+
+
+def prompt_header(product_text: str, rules: str, top_n: int) -> str:
+    """The per-request constant part of the prompt: catalogue, rules and answer format."""
+    return f"""Score how well products fit banking customers, 0-10.
+
+# PRODUCTS
+{product_text}
+
+# RULES
+{rules}
+
+# TASK
+For each customer score only their top {top_n} products.
+Return only JSON: {{"m": [[c, p, score], ...]}} with c the customer number and p the product number."""
+
+
+def build_prompt(header: str, fields: Sequence[Tuple[str, str]], rows: Sequence[str]) -> str:
+    """Full prompt for one batch of encoded customer rows (numbered 1..n in order)."""
+    table = _table(['c', *(label for _, label in fields)], [[str(i + 1), row] for i, row in enumerate(rows)])
+    return f"{header}\n\n# CUSTOMERS\n{table}"
+
+
+def completion_tokens(customers: int, top_n: int) -> int:
+    """Expected completion tokens for a batch in the compact answer format."""
+    return RESPONSE_OVERHEAD_TOKENS + customers * top_n * MATCH_TOKENS
+
+
+def plan_batches(rows: Mapping[str, str], header: str, top_n: int, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 max_batch_size: Optional[int] = None) -> List[List[str]]:
+    """
+    Greedily pack customers into requests of at most ``token_budget`` tokens.
+
+    The budget covers the header, each customer's table line and the
+    expected completion (``top_n`` matches per customer). A customer that
+    alone exceeds the budget still gets a request of its own.
+
+    Args:
+        rows: Encoded customer row per Customer_ID, in dispatch order
+        header: ``prompt_header`` text
+        top_n: Products scored per customer
+        token_budget: Maximum prompt + completion tokens per request
+        max_batch_size: Optional cap on customers per request
+
+    Returns:
+        Lists of Customer_IDs, one per request
+    """
+    fixed = estimate_tokens(header) + estimate_tokens('# CUSTOMERS\n') + RESPONSE_OVERHEAD_TOKENS
+    batches, batch, used = [], [], fixed
+    for customer_id, row in rows.items():
+        cost = estimate_tokens(row) + 2 + top_n * MATCH_TOKENS
+        if batch and (used + cost > token_budget or (max_batch_size and len(batch) >= max_batch_size)):
+            batches.append(batch)
+            batch, used = [], fixed
+        batch.append(customer_id)
+        used += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def parse_matches(response_text: str, batch: Sequence[str], product_names: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Map a compact answer back to ``{'customer_id', 'product', 'score'}`` dicts.
+
+    Entries with out-of-range numbers or non-numeric scores are dropped.
+    """
+    text = response_text.strip()
+    if text.startswith('```'):
+        text = text.split('```')[1]
+        if text.startswith('json'):
+            text = text[4:]
+    matches = []
+    for entry in json.loads(text).get('m', []):
+        try:
+            customer_no, product_no, score = int(entry[0]), int(entry[1]), float(entry[2])
+        except (TypeError, ValueError, IndexError):
+            continue
+        if 1 <= customer_no <= len(batch) and 1 <= product_no <= len(product_names):
+            matches.append({'customer_id': batch[customer_no - 1], 'product': product_names[product_no - 1],
+                            'score': score})
+    return matches
@@ -0,0 +1,34 @@
+"""
+Customer sampling kept as a DataFrame (Spark).
+
+The sample is drawn in one pass, without a ``count()`` to size a fraction,
+by keeping the ``sample_size`` customers with the smallest seeded hash of
+their ID. That is a deterministic, uniform sample that Spark evaluates as a
+per-partition top-K. Other tables are restricted to it with a broadcast
+left-semi join instead of an ``isin`` literal list, so the query plan stays
+the same size however large the sample gets.
+"""
+
+
+def sample_customers(df_custs, sample_size, seed=42, id_col='Customer_ID'):
+    """
+    Deterministic sample of ``sample_size`` customers (all rows if None).
+
+    Args:
+        df_custs: Customer DataFrame
+        sample_size: Number of customers to keep (None = no sampling)
+        seed: Hash seed; the same seed always selects the same customers
+        id_col: Customer ID column
+    """
+    from pyspark.sql import functions as F
+
+    if sample_size is None:
+        return df_custs
+    return df_custs.orderBy(F.xxhash64(F.col(id_col), F.lit(seed))).limit(sample_size)
+
+
+def restrict_to_customers(df, customers, id_col='Customer_ID'):
+    """Keep rows of ``df`` whose ``id_col`` appears in ``customers`` (broadcast left-semi join)."""
+    from pyspark.sql import functions as F
+
+    return df.join(F.broadcast(customers.select(id_col)), id_col, 'left_semi')
@@ -0,0 +1,136 @@
+"""
+Blocked top-N scoring for ALS factor matrices.
+
+Replaces the per-user / per-item ``np.dot`` loop of the recommendation step
+with one matrix multiply per block of users and an ``argpartition`` top-N
+selection, so memory stays bounded at ``block_size x n_items`` scores.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+DEFAULT_BLOCK_SIZE = 4096
+
+
+def factors_to_array(factor_rows: Iterable[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convert collected ALS factor rows into an id array and a factor matrix.
+
+    Args:
+        factor_rows: Rows with ``id`` and ``features`` fields, e.g. the result
+            of ``als_model.userFactors.collect()``
+
+    Returns:
+        (ids, factors): int64 ids and a C-contiguous float32 matrix whose
+        row ``i`` holds the factors of ``ids[i]``
+    """
+    rows = list(factor_rows)
+    ids = np.fromiter((row['id'] for row in rows), dtype=np.int64, count=len(rows))
+    if not rows:
+        return ids, np.zeros((0, 0), dtype=np.float32)
+    factors = np.asarray([row['features'] for row in rows], dtype=np.float32)
+    return ids, np.ascontiguousarray(factors)
+
+
+def top_n_scores(user_factors: np.ndarray,
+                 item_factors: np.ndarray,
+                 top_n: int = 5,
+                 block_size: int = DEFAULT_BLOCK_SIZE,
+                 eligible: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score every user against every item and keep the top N items per user.
+
+    Args:
+        user_factors: (n_users, rank) float32 user factor matrix
+        item_factors: (n_items, rank) float32 item factor matrix
+        top_n: Number of items to keep per user
+        block_size: Users scored per matrix multiply (bounds peak memory)
+        eligible: Optional (n_users, n_items) bool mask; ineligible items
+            score ``-inf`` and are never ranked above an eligible one
+
+    Returns:
+        (item_rows, scores): two (n_users, min(top_n, n_items)) arrays with
+        item row positions and their scores, best first. Ties keep the
+        lower item row first, matching a stable descending sort. Users with
+        fewer than N eligible items have ``-inf`` scores in the trailing slots.
+    """
+    if block_size < 1:
+        raise ValueError("block_size must be >= 1")
+
+    user_factors = np.ascontiguousarray(user_factors, dtype=np.float32)
+    item_factors = np.ascontiguousarray(item_factors, dtype=np.float32)
+    n_users, n_items = user_factors.shape[0], item_factors.shape[0]
+    k = max(0, min(top_n, n_items))
+
+    item_rows = np.empty((n_users, k), dtype=np.int64)
+    scores = np.empty((n_users, k), dtype=np.float32)
+    if n_users == 0 or k == 0:
+        return item_rows, scores
+    if eligible is not None and eligible.shape != (n_users, n_items):
+        raise ValueError(f"eligible mask shape {eligible.shape} != ({n_users}, {n_items})")
+
+    item_factors_t = np.ascontiguousarray(item_factors.T)
+
+    for start in range(0, n_users, block_size):
+        stop = min(start + block_size, n_users)
+        block_scores = user_factors[start:stop] @ item_factors_t
+        if eligible is not None:
+            block_scores[~eligible[start:stop]] = -np.inf
+
+        if k < n_items:
+            candidates = np.argpartition(-block_scores, k - 1, axis=1)[:, :k]
+            # argpartition does not order ties; sort the candidates by item row
+            # first so the stable sort below breaks ties like the old loop
+            candidates.sort(axis=1)
+        else:
+            candidates = np.broadcast_to(np.arange(n_items), block_scores.shape)
+
+        candidate_scores = np.take_along_axis(block_scores, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind='stable')
+
+        item_rows[start:stop] = np.take_along_axis(candidates, order, axis=1)
+        scores[start:stop] = np.take_along_axis(candidate_scores, order, axis=1)
+
+    return item_rows, scores
+
+
+def top_n_recommendations(user_ids: np.ndarray,
+                          user_factors: np.ndarray,
+                          item_ids: np.ndarray,
+                          item_factors: np.ndarray,
+                          top_n: int = 5,
+                          block_size: int = DEFAULT_BLOCK_SIZE,
+                          eligible: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+    """
+    Top-N recommendation rows in the ``user_int, item_int, als_score, rank``
+    layout used by ``als_recommendations_table``.
+
+    Args:
+        user_ids: ALS user ids (``user_int``), one per row of ``user_factors``
+        user_factors: (n_users, rank) user factor matrix
+        item_ids: ALS item ids (``item_int``), one per row of ``item_factors``
+        item_factors: (n_items, rank) item factor matrix
+        top_n: Number of recommendations per user
+        block_size: Users scored per matrix multiply
+        eligible: Optional (n_users, n_items) bool mask (see
+            ``pinnacle.eligibility``); ineligible items are not recommended,
+            so a user may get fewer than ``top_n`` rows
+    """
+    item_rows, scores = top_n_scores(user_factors, item_factors, top_n=top_n, block_size=block_size,
+                                     eligible=eligible)
+    n_users, k = item_rows.shape
+
+    user_col = np.repeat(np.asarray(user_ids, dtype=np.int64), k)
+    item_col = np.asarray(item_ids, dtype=np.int64)[item_rows].ravel()
+    score_col = scores.ravel()
+    rank_col = np.tile(np.arange(1, k + 1), n_users)
+    if eligible is not None:
+        keep = np.isfinite(score_col)
+        user_col, item_col, score_col, rank_col = user_col[keep], item_col[keep], score_col[keep], rank_col[keep]
+
+    return [
+        {'user_int': u, 'item_int': i, 'als_score': s, 'rank': r}
+        for u, i, s, r in zip(user_col.tolist(), item_col.tolist(), score_col.tolist(), rank_col.tolist())
+    ]
@@ -0,0 +1,389 @@
+"""
+Indexed in-memory store behind ``/api/recommendations_table``.
+
+The final recommendations joined with customer attributes are held as
+columns (NumPy arrays, strings dictionary-encoded), with rows ordered by
+confidence descending so result order is simply row order. Per-field
+indexes answer a filtered page without scanning the table:
+
+- confidence: the rows themselves, sorted descending (``min_confidence`` is a prefix)
+- age: row ids ordered by (age, row), so an age range is a slice of sorted runs
+- state, product, account type, status, name, city, customer ID: inverted
+  lists (postings) of ascending row ids per distinct value
+- search: substring match over the distinct names, cities and IDs, then
+  their postings
+
+A query starts from the most selective index and checks the remaining
+predicates against the column arrays of those candidate rows only; broad
+queries evaluate the predicates over the confidence prefix instead.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+RECORD_FIELDS = [
+    'customer_id', 'customer_name', 'gender', 'age', 'city', 'state', 'occupation',
+    'income_bracket', 'recommended_product', 'confidence_score', 'reason'
+]
+
+# Ages are held as int16; unknown ages are stored as -1 and served as None
+UNKNOWN_AGE = -1
+MAX_AGE = int(np.iinfo(np.int16).max)
+
+# Query parameter -> column filtered through its postings
+INVERTED_FIELDS = {
+    'state': 'state',
+    'products': 'recommended_product',
+    'account_type': 'account_type',
+    'status': 'status',
+}
+
+SEARCH_FIELDS = ['customer_name', 'city', 'customer_id']
+
+# Candidate sets larger than 1/DENSE_FRACTION of the confidence prefix are
+# cheaper to evaluate as column masks over the prefix than through postings
+DENSE_FRACTION = 8
+
+_MASK_CHUNK = 1 << 16
+
+
+def _split(value) -> List[str]:
+    """Comma-separated query value (or list) as a list of non-empty strings."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return [v.strip() for v in value if v is not None and str(v).strip()]
+
+
+def _page_of_mask(mask: np.ndarray, start: int, limit: int) -> np.ndarray:
+    """Positions ``start:start + limit`` of the True entries of ``mask``, scanning chunk by chunk."""
+    page = []
+    seen = 0
+    for offset in range(0, len(mask), _MASK_CHUNK):
+        chunk = mask[offset:offset + _MASK_CHUNK]
+        count = int(np.count_nonzero(chunk))
+        if seen + count > start:
+            hits = np.flatnonzero(chunk) + offset
+            page.append(hits[max(start - seen, 0):start + limit - seen])
+            if seen + count >= start + limit:
+                break
+        seen += count
+    return np.concatenate(page).astype(np.int32) if page else np.zeros(0, dtype=np.int32)
+
+
+class RecommendationStore:
+    """
+    Columnar, indexed recommendation table for filtered, paginated queries.
+
+    Args:
+        frame: pandas DataFrame with ``RECORD_FIELDS`` plus optional
+            ``account_type`` and ``status`` columns; ``confidence_score``
+            is on a 0-1 scale, missing ``age`` means unknown
+        version: Version of the source table (e.g. ``UpsertResult.version``),
+            sent as the response ETag so clients and caches can revalidate
+    """
+
+    def __init__(self, frame, version: Optional[int] = None):
+        self.version = version
+        frame = frame.sort_values(['confidence_score', 'customer_id'], ascending=[False, True], kind='stable')
+        self.size = len(frame)
+
+        self.age = frame['age'].fillna(UNKNOWN_AGE).clip(UNKNOWN_AGE, MAX_AGE).to_numpy(dtype=np.int16)
+        self.confidence = frame['confidence_score'].fillna(0.0).to_numpy(dtype=np.float32)
+        self._negated_confidence = -self.confidence
+
+        # Dictionary-encode every string column: codes per row + the distinct values
+        self.codes: Dict[str, np.ndarray] = {}
+        self.values: Dict[str, np.ndarray] = {}
+        for column in RECORD_FIELDS + ['account_type', 'status']:
+            if column in ('age', 'confidence_score'):
+                continue
+            if column not in frame:
+                if column == 'reason':
+                    # Older frames without reasons still load; records carry ''
+                    frame = frame.assign(reason='')
+                else:
+                    continue
+            codes, uniques = frame[column].fillna('').astype(str).factorize()
+            self.codes[column] = codes.astype(np.int32)
+            self.values[column] = np.asarray(uniques, dtype=object)
+
+        # Age index: row ids ordered by (age, row)
+        self.age_order = np.argsort(self.age, kind='stable').astype(np.int32)
+        self.age_sorted = self.age[self.age_order]
+
+        # Postings: per column, rows grouped by code (ascending within a code) + offsets
+        self._postings: Dict[str, tuple] = {}
+        self._code_of: Dict[str, Dict[str, int]] = {}
+        for column in list(INVERTED_FIELDS.values()) + SEARCH_FIELDS:
+            if column not in self.codes or column in self._postings:
+                continue
+            codes = self.codes[column]
+            order = np.argsort(codes, kind='stable').astype(np.int32)
+            offsets = np.searchsorted(codes[order], np.arange(len(self.values[column]) + 1))
+            self._postings[column] = (order, offsets)
+            self._code_of[column] = {value: i for i, value in enumerate(self.values[column])}
+
+        # Search: one lowercase haystack of distinct values per searchable column
+        self._haystacks = {}
+        for column in SEARCH_FIELDS:
+            lowered = [str(v).lower().replace('\n', ' ') for v in self.values[column]]
+            starts = np.cumsum([0] + [len(v) + 1 for v in lowered[:-1]]) if lowered else np.zeros(0, dtype=np.int64)
+            self._haystacks[column] = ('\n'.join(lowered), starts)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> 'RecommendationStore':
+        import pandas as pd
+        return cls(pd.DataFrame(list(records)))
+
+    def __len__(self):
+        return self.size
+
+    # ------------------------------------------------------------------
+    # Index lookups
+    # ------------------------------------------------------------------
+
+    def _posting_size(self, column: str, codes) -> int:
+        offsets = self._postings[column][1]
+        return int(sum(offsets[c + 1] - offsets[c] for c in codes))
+
+    def _posting_rows(self, column: str, codes) -> np.ndarray:
+        """Ascending row ids having any of ``codes`` in ``column``."""
+        order, offsets = self._postings[column]
+        lists = [order[offsets[c]:offsets[c + 1]] for c in codes]
+        if not lists:
+            return np.zeros(0, dtype=np.int32)
+        if len(lists) == 1:
+            return lists[0]
+        # Stable sort is a run-merging sort, so merging k sorted lists is O(n log k)
+        return np.sort(np.concatenate(lists), kind='stable')
+
+    def _matching_codes(self, column: str, term: str) -> List[int]:
+        """Codes of the distinct ``column`` values containing ``term`` (lowercase)."""
+        haystack, starts = self._haystacks[column]
+        codes = []
+        pos = haystack.find(term)
+        while pos != -1:
+            code = int(np.searchsorted(starts, pos, side='right')) - 1
+            codes.append(code)
+            if code + 1 >= len(starts):
+                break
+            pos = haystack.find(term, int(starts[code + 1]))
+        return codes
+
+    def _search_rows(self, term: str) -> np.ndarray:
+        """Ascending row ids whose name, city or customer ID contains ``term``."""
+        term = term.lower().replace('\n', ' ')
+        lists = [self._posting_rows(column, self._matching_codes(column, term)) for column in SEARCH_FIELDS]
+        rows = np.sort(np.concatenate(lists), kind='stable')
+        return np.unique(rows) if len(rows) else rows.astype(np.int32)
+
+    # ------------------------------------------------------------------
+    # Query
+    # ------------------------------------------------------------------
+
+    def query(self, page: int = 1, limit: int = 10, min_age: Optional[int] = None,
+              max_age: Optional[int] = None, state=None, products=None, account_type=None,
+              status=None, min_confidence: Optional[float] = None,
+              search: Optional[str] = None, **_ignored) -> Dict[str, Any]:
+        """
+        One page of recommendations matching every given filter.
+
+        Multi-valued filters (``state``, ``products``, ``account_type``,
+        ``status``) accept a list or a comma-separated string and match any
+        of their values. Unknown parameters (e.g. ``product_category``) are
+        ignored. Results are ordered by confidence, highest first.
+
+        Returns:
+            Dict in the ``RecommendationResponse`` shape: ``data`` records and
+            ``pagination`` (current_page, total_pages, total_records,
+            page_size, has_next, has_previous)
+        """
+        page = max(1, int(page or 1))
+        limit = max(1, int(limit or 10))
+
+        # Confidence prefix bounds every candidate set: rows [0, stop)
+        stop = self.size
+        if min_confidence is not None:
+            stop = int(np.searchsorted(self._negated_confidence, -np.float32(min_confidence), side='right'))
+
+        # Per active filter: candidate size, ascending candidate rows, and a
+        # predicate over row ids (an index array or the prefix slice)
+        filters = []
+
+        if min_age is not None or max_age is not None:
+            # An age filter never matches unknown ages; bounds are clamped to the
+            # int16 range, so out-of-range parameters cannot overflow the keys
+            min_age = int(np.clip(0 if min_age is None else int(min_age), 0, MAX_AGE))
+            max_age = int(np.clip(MAX_AGE if max_age is None else int(max_age), UNKNOWN_AGE, MAX_AGE))
+            # Search with int16 keys: a Python int would upcast the whole index per query
+            lo = int(np.searchsorted(self.age_sorted, np.int16(min_age), side='left'))
+            hi = int(np.searchsorted(self.age_sorted, np.int16(max_age), side='right'))
+            filters.append((
+                max(hi - lo, 0),
+                lambda lo=lo, hi=hi: np.sort(self.age_order[lo:hi], kind='stable'),
+                lambda rows, min_age=min_age, max_age=max_age: self._age_mask(rows, min_age, max_age)
+            ))
+
+        for param, values in (('state', state), ('products', products),
+                              ('account_type', account_type), ('status', status)):
+            values = _split(values)
+            column = INVERTED_FIELDS[param]
+            if not values or column not in self._postings:
+                continue
+            codes = [self._code_of[column][v] for v in values if v in self._code_of[column]]
+            wanted = np.zeros(len(self.values[column]), dtype=bool)
+            wanted[codes] = True
+            filters.append((
+                self._posting_size(column, codes),
+                lambda column=column, codes=codes: self._posting_rows(column, codes),
+                lambda rows, column=column, wanted=wanted: wanted[self.codes[column][rows]]
+            ))
+
+        search = (search or '').strip()
+        if search:
+            matched = self._search_rows(search)
+            filters.append((len(matched), lambda matched=matched: matched,
+                            lambda rows, matched=matched: self._membership_mask(rows, matched)))
+
+        smallest = min(range(len(filters)), key=lambda i: filters[i][0]) if filters else None
+        if smallest is not None and filters[smallest][0] * DENSE_FRACTION < stop:
+            # Selective: start from the smallest index, check the rest on its rows
+            rows = filters[smallest][1]()
+            rows = rows[:np.searchsorted(rows, stop)]
+            for i, (_, _, check) in enumerate(filters):
+                if i != smallest and len(rows):
+                    rows = rows[check(rows)]
+            total = len(rows)
+            start = (min(page, max(1, -(-total // limit))) - 1) * limit
+            rows = rows[start:start + limit]
+        elif filters:
+            # Broad: evaluate every predicate as a mask over the confidence prefix
+            prefix = slice(0, stop)
+            mask = filters[0][2](prefix)
+            for _, _, check in filters[1:]:
+                mask &= check(prefix)
+            total = int(np.count_nonzero(mask))
+            start = (min(page, max(1, -(-total // limit))) - 1) * limit
+            rows = _page_of_mask(mask, start, limit)
+        else:
+            total = stop
+            start = (min(page, max(1, -(-total // limit))) - 1) * limit
+            rows = range(start, min(start + limit, total))
+
+        total_pages = max(1, -(-total // limit))
+        current_page = min(page, total_pages)
+        return {
+            'data': [self.record(int(r)) for r in rows],
+            'pagination': {
+                'current_page': current_page,
+                'total_pages': total_pages,
+                'total_records': int(total),
+                'page_size': limit,
+                'has_next': current_page < total_pages,
+                'has_previous': current_page > 1,
+            }
+        }
+
+    def _age_mask(self, rows, min_age: int, max_age: int):
+        ages = self.age[rows]
+        return (ages >= min_age) & (ages <= max_age)
+
+    def _membership_mask(self, rows, members: np.ndarray):
+        if isinstance(rows, slice):
+            mask = np.zeros(rows.stop, dtype=bool)
+            mask[members[members < rows.stop]] = True
+            return mask
+        return np.isin(rows, members)
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """Row as a ``RecommendationRecord`` dict."""
+        record = {}
+        for field in RECORD_FIELDS:
+            if field == 'age':
+                age = int(self.age[row])
+                record[field] = None if age == UNKNOWN_AGE else age
+            elif field == 'confidence_score':
+                record[field] = round(float(self.confidence[row]), 4)
+            else:
+                record[field] = self.values[field][self.codes[field][row]]
+        return record
+
+
+def load_serving_frame(recommendations, customer_features, customers=None):
+    """
+    Join the final recommendations with customer attributes (Spark -> pandas).
+
+    Args:
+        recommendations: ``final_recommendations_api_table`` DataFrame
+        customer_features: Output of ``engineer_customer_features``
+        customers: Customer source table, for name, city, account type and
+            status (optional)
+
+    ``Recommendation_Reason`` (the LLM explanation) is served as ``reason``.
+
+    Returns:
+        pandas DataFrame ready for ``RecommendationStore``
+    """
+    from pyspark.sql import functions as F
+
+    features = customer_features.select(
+        'Customer_ID',
+        *[F.col(c) for c in ('Age', 'State', 'Occupation', 'Income_Bracket', 'Gender')
+          if c in customer_features.columns],
+        F.col('current_account').alias('Feature_Account_Type')
+    )
+    df = recommendations.join(features, 'Customer_ID', 'left')
+
+    if customers is not None:
+        extra = [c for c in ('Full_Name', 'City', 'Account_Type', 'Status') if c in customers.columns]
+        df = df.join(customers.select('Customer_ID', *extra), 'Customer_ID', 'left')
+
+    def column(name, alias, default=None):
+        if name in df.columns:
+            return F.col(name).alias(alias)
+        return F.lit(default).alias(alias)
+
+    account_type = (F.coalesce(F.col('Account_Type'), F.col('Feature_Account_Type'))
+                    if 'Account_Type' in df.columns else F.col('Feature_Account_Type'))
+
+    return df.select(
+        F.col('Customer_ID').alias('customer_id'),
+        column('Full_Name', 'customer_name', ''),
+        column('Gender', 'gender', ''),
+        column('Age', 'age'),
+        column('City', 'city', ''),
+        column('State', 'state', ''),
+        column('Occupation', 'occupation', ''),
+        column('Income_Bracket', 'income_bracket', ''),
+        F.col('Product_Name').alias('recommended_product'),
+        (F.col('Confidence_Score_Percentage') / 100).alias('confidence_score'),
+        column('Recommendation_Reason', 'reason', ''),
+        account_type.alias('account_type'),
+        column('Status', 'status', '')
+    ).toPandas()
+
+
+def create_app(store: RecommendationStore):
+    """FastAPI app serving ``GET /api/recommendations_table`` from ``store``."""
+    from fastapi import FastAPI, Query, Response
+
+    app = FastAPI(title='Pinnacle recommendations')
+
+    @app.get('/api/recommendations_table')
+    def recommendations_table(response: Response, page: int = 1, limit: int = Query(10, le=500),
+                              min_age: Optional[int] = Query(None, ge=0, le=MAX_AGE),
+                              max_age: Optional[int] = Query(None, ge=0, le=MAX_AGE),
+                              state: Optional[str] = None, products: Optional[str] = None,
+                              account_type: Optional[str] = None, status: Optional[str] = None,
+                              min_confidence: Optional[float] = None, search: Optional[str] = None):
+        if store.version is not None:
+            response.headers['ETag'] = f'"{store.version}"'
+        return store.query(page=page, limit=limit, min_age=min_age, max_age=max_age, state=state,
+                           products=products, account_type=account_type, status=status,
+                           min_confidence=min_confidence, search=search)
+
+    return app
@@ -0,0 +1,346 @@
+"""
+Structured Streaming mode: re-rank only the customers in each micro-batch.
+
+The batch pipeline rebuilds interactions, features and every customer's
+top-N on each run. In streaming mode new transactions are read as they land
+(files dropped into a directory, or appends to the transactions table) and
+each micro-batch:
+
+1. matches its transactions to products (``pinnacle.keyword_match``) and
+   folds them into the decayed RFM counters (``pinnacle.decayed_rfm``);
+2. re-blends the interaction scores of the customers with matches
+   (transaction + LLM scores, held products removed, as in sections 8-10);
+3. folds those customers into the current item factors
+   (``pinnacle.fold_in``, the ALS least-squares step) and recomputes their
+   top-N with catalogue eligibility;
+4. upserts only those customers' rows into the recommendations sink, and
+   hands the batch's customers to an optional callback (feature refresh).
+
+``StreamingRanker`` holds the driver-side state (matcher, counters, item
+factors) and is usable without Spark; ``stream_transactions`` wires it into
+``foreachBatch``. After each batch the counters and the batch id are saved
+together in one atomically replaced file, so a restarted query skips
+batches already folded in.
+
+Sinks replace a set of customers' rows: ``TableSink`` with one Delta
+``replaceWhere`` overwrite per batch, ``ParquetSink`` by rewriting a local
+parquet file (for file-drop testing with ``pinnacle stream``).
+"""
+
+import os
+import tempfile
+from typing import Any, Callable, Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from pinnacle.decayed_rfm import DecayedRFM
+from pinnacle.fold_in import FoldInRecommender
+from pinnacle.keyword_match import MATCH_COLUMNS, TEXT_COLUMNS, KeywordMatcher
+from pinnacle.local import SCORE_RANGE, blend_scores, current_products, drop_current_products
+from pinnacle.output_tables import BUCKET_COLUMN, bucket_count, customer_bucket, hash_table_name
+from pinnacle.scoring import top_n_scores
+
+
+RECOMMENDATION_COLUMNS = ('Customer_ID', 'Product_Name', 'als_score', 'confidence_score_pct', 'rank')
+RFM_STATE_FILE = 'rfm.npz'
+DEFAULT_TRIGGER_SECONDS = 60
+
+
+class StreamingRanker:
+    """
+    Incremental interactions and top-N for the customers of a transaction batch.
+
+    Args:
+        matcher: Keyword matcher for the catalogue
+        rfm: Decayed RFM counters with the history folded in
+        product_names: Product per row of ``item_factors``
+        item_factors: (n_items, rank) trained item factors
+        reg_param: ALS ``regParam`` the factors were trained with
+        nonnegative: Fold in with non-negativity (explicit ALS)
+        implicit_alpha: Confidence scaling of implicit-backend factors (folds
+            in with the implicit user step; ``reg_param`` is then its
+            ``regularization``)
+        llm_scores: Optional LLM scores (Customer_ID, Product_Name, interaction_score)
+        customers: Optional customer table, for held products and eligibility
+        products: Catalogue, for held products and eligibility rules
+        transaction_weight: Weight of transaction scores against LLM scores
+        top_n: Recommendations per customer
+        eligibility: Skip products whose catalogue rules exclude the customer
+        score_range: (min, max) expected ALS score for confidence_score_pct
+    """
+
+    def __init__(self, matcher: KeywordMatcher, rfm: DecayedRFM, product_names: Sequence[str],
+                 item_factors: np.ndarray, reg_param: float, nonnegative: bool = True,
+                 implicit_alpha: Optional[float] = None, llm_scores: Optional[pd.DataFrame] = None, customers: Optional[pd.DataFrame] = None,
+                 products: Optional[pd.DataFrame] = None, transaction_weight: float = 0.7, top_n: int = 5,
+                 eligibility: bool = True, score_range=SCORE_RANGE):
+        self.matcher = matcher
+        self.rfm = rfm
+        self.product_names = np.asarray(product_names).astype(str).astype(object)
+        self.item_factors = np.asarray(item_factors, dtype=np.float32)
+        self.fold_in = FoldInRecommender(np.arange(len(self.product_names)), self.item_factors,
+                                         reg_param, nonnegative=nonnegative, implicit_alpha=implicit_alpha)
+        self.product_rows = {name: row for row, name in enumerate(self.product_names)}
+        self.llm_scores = None
+        if llm_scores is not None and len(llm_scores):
+            self.llm_scores = llm_scores.set_index('Customer_ID', drop=False).sort_index()
+        self.transaction_weight = transaction_weight
+        self.top_n = top_n
+        self.score_range = score_range
+        self.last_batch_id = -1
+
+        self.customers = None
+        self.rules = None
+        self.held: Dict[str, set] = {}
+        if customers is not None and products is not None:
+            if 'Account_Type' in customers:
+                self.held = current_products(customers, products)
+            if eligibility:
+                from pinnacle.eligibility import ELIGIBILITY_COLUMNS, product_rules
+
+                columns = ['Customer_ID', *(c for c in ELIGIBILITY_COLUMNS if c in customers)]
+                self.customers = customers[columns].drop_duplicates('Customer_ID').set_index('Customer_ID')
+                self.rules = product_rules(products).reindex(self.product_names)
+
+    @classmethod
+    def from_model(cls, model, matcher: KeywordMatcher, rfm: DecayedRFM, **kwargs) -> 'StreamingRanker':
+        """
+        Ranker over a saved model (``pinnacle.artifacts.open_model``).
+
+        The fold-in follows the model's backend: implicit models are folded in
+        with their ``alpha`` and ``reg_param`` (``regularization``), explicit
+        ones with non-negativity. ``score_range`` defaults to the model's.
+        """
+        metadata = model.metadata
+        implicit_alpha = None
+        if metadata.get('backend') == 'implicit':
+            if metadata.get('alpha') is None:
+                raise ValueError("Implicit model metadata has no 'alpha'; cannot fold customers in")
+            implicit_alpha = float(metadata['alpha'])
+        kwargs.setdefault('score_range', tuple(metadata.get('score_range', SCORE_RANGE)))
+        return cls(matcher, rfm, model.product_names, np.asarray(model.item_factors),
+                   reg_param=metadata.get('reg_param', 0.1), nonnegative=implicit_alpha is None,
+                   implicit_alpha=implicit_alpha, **kwargs)
+
+    def interactions(self, customer_ids: Sequence[str]) -> pd.DataFrame:
+        """Current interaction scores of ``customer_ids`` (sections 8-10 for those customers only)."""
+        trans_scores = self.rfm.scores(customer_ids=customer_ids)
+        llm = None
+        if self.llm_scores is not None:
+            llm = self.llm_scores.loc[self.llm_scores.index.intersection(pd.Index(customer_ids))]
+            llm = llm.reset_index(drop=True) if len(llm) else None
+        matrix = blend_scores(trans_scores, llm, self.transaction_weight)
+        matrix = matrix.groupby(['Customer_ID', 'Product_Name'], sort=True)['interaction_score'].max().reset_index()
+        return drop_current_products(matrix, {c: self.held[c] for c in customer_ids if c in self.held})
+
+    def recommend(self, interactions: pd.DataFrame) -> pd.DataFrame:
+        """Fold each customer's interaction vector into the item factors and take the eligible top-N."""
+        known = interactions[interactions['Product_Name'].isin(self.product_rows)]
+        if known.empty:
+            return pd.DataFrame({column: [] for column in RECOMMENDATION_COLUMNS})
+        customer_ids, user_factors = [], []
+        for customer_id, rows in known.groupby('Customer_ID', sort=True):
+            vector = dict(zip(rows['Product_Name'].map(self.product_rows), rows['interaction_score']))
+            customer_ids.append(customer_id)
+            user_factors.append(self.fold_in.fold_in(vector))
+
+        eligible = None
+        if self.rules is not None:
+            from pinnacle.eligibility import eligibility_mask
+
+            eligible = eligibility_mask(self.customers.reindex(customer_ids).reset_index(), self.rules)
+        item_rows, scores = top_n_scores(np.vstack(user_factors), self.item_factors, top_n=self.top_n,
+                                         eligible=eligible)
+        low, high = self.score_range
+        recs = pd.DataFrame({
+            'Customer_ID': np.repeat(np.asarray(customer_ids, dtype=object), item_rows.shape[1]),
+            'Product_Name': self.product_names[item_rows.ravel()],
+            'als_score': scores.ravel(),
+            'rank': np.tile(np.arange(1, item_rows.shape[1] + 1), len(customer_ids)),
+        })
+        recs = recs[np.isfinite(recs['als_score'])]
+        recs['confidence_score_pct'] = (recs['als_score'] - low) / (high - low) * 100
+        return recs[list(RECOMMENDATION_COLUMNS)].reset_index(drop=True)
+
+    def rank(self, transactions: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Fold a batch of transactions in and re-rank its customers.
+
+        Args:
+            transactions: New transactions (``MATCH_COLUMNS`` plus the text columns)
+
+        Returns:
+            Dict with customers (every Customer_ID in the batch), ranked
+            (customers whose interactions changed), interactions and
+            recommendations of the ranked customers
+        """
+        customers = pd.unique(transactions['Customer_ID'].dropna())
+        matches = self.matcher.match(transactions.assign(Date=pd.to_datetime(transactions['Date'])))
+        self.rfm.update_frame(matches)
+        ranked = pd.unique(matches['Customer_ID'])
+        interactions = self.interactions(ranked) if len(ranked) else pd.DataFrame(
+            columns=['Customer_ID', 'Product_Name', 'interaction_score'])
+        return {
+            'customers': customers,
+            'ranked': ranked,
+            'interactions': interactions,
+            'recommendations': self.recommend(interactions),
+        }
+
+    def save_state(self, directory: str):
+        """Write the counters and the last batch id to one file, replaced atomically."""
+        os.makedirs(directory, exist_ok=True)
+        self.rfm.save(os.path.join(directory, RFM_STATE_FILE), last_batch_id=np.int64(self.last_batch_id))
+
+
+def load_stream_state(directory: str):
+    """(DecayedRFM, last_batch_id) saved by ``StreamingRanker.save_state``, or (None, -1)."""
+    path = os.path.join(directory, RFM_STATE_FILE)
+    if not os.path.exists(path):
+        return None, -1
+    with np.load(path) as data:
+        last_batch_id = int(data['last_batch_id']) if 'last_batch_id' in data.files else -1
+    return DecayedRFM.load(path), last_batch_id
+
+
+# ---------------------------------------------------------------------------
+# Sinks
+# ---------------------------------------------------------------------------
+
+class ParquetSink:
+    """
+    Local parquet file whose rows for a batch's customers are replaced.
+
+    Rewrites the file on every batch (atomically), so it is meant for
+    file-drop testing and the ``pinnacle stream`` command line.
+    """
+
+    def __init__(self, path: str, sort_columns: Sequence[str] = ('Customer_ID',)):
+        self.path = path
+        self.sort_columns = list(sort_columns)
+
+    def upsert(self, frame: pd.DataFrame, customer_ids: Sequence[str]):
+        if os.path.exists(self.path):
+            existing = pd.read_parquet(self.path)
+            existing = existing[~existing['Customer_ID'].isin(pd.Index(customer_ids))]
+            frame = pd.concat([existing, frame], ignore_index=True) if len(frame) else existing
+        frame = frame.sort_values(self.sort_columns).reset_index(drop=True)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.parquet.tmp')
+        os.close(fd)
+        frame.to_parquet(tmp, index=False)
+        os.replace(tmp, self.path)
+
+
+def _sql_string(value: str) -> str:
+    return "'" + str(value).replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+class TableSink:
+    """
+    Delta table whose rows for a batch's customers are swapped in one commit.
+
+    Each upsert is a ``replaceWhere`` overwrite restricted to
+    ``Customer_ID IN (<batch customers>)``: the customers' old rows are
+    removed and the new ones written atomically; other rows are untouched.
+    Tables kept by ``pinnacle.output_tables`` get their bucket column, and
+    the customers' stored content hashes are dropped so the next batch
+    ``upsert_recommendations`` diff rewrites them.
+    """
+
+    def __init__(self, spark, table: str):
+        self.spark = spark
+        self.table = table
+
+    def upsert(self, frame: pd.DataFrame, customer_ids: Sequence[str]):
+        if len(customer_ids) == 0:
+            return
+        from pyspark.sql import functions as F
+
+        if not self.spark.catalog.tableExists(self.table):
+            if len(frame) == 0:
+                return   # Nothing to write and no schema to create the table with
+            self.spark.createDataFrame(frame).write.format('delta').saveAsTable(self.table)
+            return
+        schema = self.spark.table(self.table).schema
+        df = (self.spark.createDataFrame(frame) if len(frame) else self.spark.createDataFrame([], schema))
+        condition = f"Customer_ID IN ({', '.join(_sql_string(c) for c in customer_ids)})"
+        bucketed = BUCKET_COLUMN in schema.names
+        if bucketed:
+            # Table written by ``upsert_recommendations``: keep its bucket column
+            df = df.withColumn(BUCKET_COLUMN, customer_bucket('Customer_ID', bucket_count(self.spark, self.table)))
+        df = df.select(*[F.col(field.name).cast(field.dataType) for field in schema])
+        df.write.format('delta').mode('overwrite').option('replaceWhere', condition).saveAsTable(self.table)
+        if bucketed and self.spark.catalog.tableExists(hash_table_name(self.table)):
+            # Forget these customers' content hashes: the next batch upsert rewrites them
+            self.spark.sql(f"DELETE FROM {hash_table_name(self.table)} WHERE {condition}")
+
+
+# ---------------------------------------------------------------------------
+# Stream
+# ---------------------------------------------------------------------------
+
+def stream_transactions(spark, source: str, ranker: StreamingRanker, sink, checkpoint_location: str,
+                        state_directory: Optional[str] = None,
+                        on_batch: Optional[Callable[[Any, Sequence[str], int], None]] = None,
+                        source_format: str = 'parquet', schema=None,
+                        trigger_seconds: Optional[int] = DEFAULT_TRIGGER_SECONDS,
+                        max_files_per_trigger: Optional[int] = None):
+    """
+    Start a Structured Streaming query that re-ranks each micro-batch's customers.
+
+    Args:
+        spark: Active SparkSession
+        source: Directory new transaction files are dropped into, or a table
+            name with ``source_format='table'`` (streaming read of its appends)
+        ranker: Ranker with the history folded in (or restored state)
+        sink: ``TableSink`` / ``ParquetSink`` for the recommendation rows
+        checkpoint_location: Streaming checkpoint directory
+        state_directory: Where the ranker state is saved after each batch
+            (None = not saved; a restart then refolds from the given ranker)
+        on_batch: Optional ``f(batch_df, customer_ids, batch_id)`` called
+            after the upsert with every customer in the batch (e.g. feature
+            refresh); it runs before the batch id is saved, so a batch it
+            saw may be replayed after a crash
+        source_format: File format of ``source``, or 'table'
+        schema: Transaction schema for file sources (default: inferred
+            from the files already in ``source``)
+        trigger_seconds: Micro-batch interval (None = process what is
+            available, then stop)
+        max_files_per_trigger: Cap on new files per micro-batch
+
+    Returns:
+        The started StreamingQuery
+    """
+    if source_format == 'table':
+        reader = spark.readStream.option('startingVersion', 'latest')
+        stream = reader.table(source)
+    else:
+        reader = spark.readStream.schema(schema or spark.read.format(source_format).load(source).schema)
+        if max_files_per_trigger:
+            reader = reader.option('maxFilesPerTrigger', max_files_per_trigger)
+        stream = reader.format(source_format).load(source)
+    columns = [c for c in (*MATCH_COLUMNS, *TEXT_COLUMNS) if c in stream.columns]
+
+    def process(batch_df, batch_id):
+        # Batches already folded before a restart are replayed by the checkpoint; skip them
+        if batch_id <= ranker.last_batch_id:
+            return
+        result = ranker.rank(batch_df.select(*columns).toPandas())
+        sink.upsert(result['recommendations'], result['ranked'])
+        if on_batch is not None and len(result['customers']):
+            on_batch(batch_df, result['customers'], batch_id)
+        ranker.last_batch_id = batch_id
+        if state_directory:
+            ranker.save_state(state_directory)
+        print(f"   batch {batch_id}: {len(result['customers']):,} customers, "
+              f"{len(result['ranked']):,} re-ranked, {len(result['recommendations']):,} rows upserted")
+
+    writer = stream.writeStream.foreachBatch(process).option('checkpointLocation', checkpoint_location)
+    if trigger_seconds is None:
+        writer = writer.trigger(availableNow=True)
+    else:
+        writer = writer.trigger(processingTime=f"{trigger_seconds} seconds")
+    return writer.start()
@@ -0,0 +1,463 @@
+"""
+Scalable synthetic data generator (customers, transactions, conversations, products).
+
+Produces the same columns and value vocabularies as
+``notebooks/dataset_generation.ipynb`` (and therefore the columns
+``recommendation_system.py`` reads), but vectorized with NumPy and written
+in customer chunks, so 10k, 1M and 10M customer datasets can be generated
+locally. Every chunk draws from its own seeded generator, so a dataset is
+reproducible for a given seed and chunk size.
+"""
+
+import os
+from datetime import date
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+SCALES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+
+DEFAULT_CHUNK_SIZE = 100_000
+TRANSACTIONS_PER_CUSTOMER = 12
+CONVERSATIONS_PER_CUSTOMER = 0.5
+
+TRANSACTION_START = date(2023, 1, 1)
+TRANSACTION_END = date(2024, 12, 31)
+AS_OF = date(2025, 1, 1)
+
+PRODUCTS_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataset', 'product.csv')
+
+# ============================================================================
+# VOCABULARIES (from dataset_generation.ipynb)
+# ============================================================================
+
+MALE_TITLES = ['Mr.', 'Dr.', 'Engr.', 'Chief', 'Prof.']
+FEMALE_TITLES = ['Mrs.', 'Miss', 'Dr.', 'Prof.']
+FIRST_NAMES_MALE = ['Chukwuemeka', 'Oluwaseun', 'Ibrahim', 'Tunde', 'Emeka', 'Abubakar', 'Chinedu', 'Yusuf',
+                    'Adeola', 'Musa', 'Obinna', 'Hassan', 'Ikechukwu', 'Usman', 'Chigozie', 'Adebayo',
+                    'Nnamdi', 'Ahmed', 'Kelechi', 'Abdullahi', 'Michael', 'David', 'John', 'Joseph']
+FIRST_NAMES_FEMALE = ['Chioma', 'Aisha', 'Ngozi', 'Fatima', 'Amaka', 'Zainab', 'Blessing', 'Hauwa',
+                      'Ifeoma', 'Maryam', 'Chinyere', 'Khadija', 'Chiamaka', 'Zainab', 'Obiageli',
+                      'Mary', 'Elizabeth', 'Grace', 'Sarah', 'Esther', 'Ruth', 'Rebecca']
+LAST_NAMES = ['Okonkwo', 'Mohammed', 'Adeyemi', 'Bello', 'Eze', 'Yusuf', 'Okafor', 'Abubakar',
+              'Nwachukwu', 'Ibrahim', 'Okoro', 'Hassan', 'Chukwu', 'Usman', 'Ojo', 'Aliyu',
+              'Nnadi', 'Musa', 'Uzor', 'Suleiman', 'Williams', 'Johnson', 'Brown', 'Davis']
+
+STATES = ['Lagos', 'Abuja', 'Rivers', 'Kano', 'Kaduna', 'Oyo', 'Edo', 'Delta', 'Anambra', 'Imo',
+          'Enugu', 'Ogun', 'Akwa Ibom', 'Osun', 'Borno', 'Bauchi', 'Plateau', 'Cross River',
+          'Kwara', 'Ondo', 'Abia', 'Ekiti', 'Nasarawa', 'Niger', 'Sokoto', 'Katsina']
+CITIES = {
+    'Lagos': ['Ikeja', 'Victoria Island', 'Lekki', 'Surulere', 'Yaba', 'Ikoyi', 'Ajah', 'Maryland'],
+    'Abuja': ['Garki', 'Wuse', 'Maitama', 'Asokoro', 'Gwarinpa', 'Kubwa', 'Lugbe', 'Nyanya'],
+    'Rivers': ['Port Harcourt', 'Obio-Akpor', 'Eleme', 'Ikwerre', 'Oyigbo'],
+    'Kano': ['Kano Municipal', 'Nassarawa', 'Fagge', 'Dala', 'Gwale'],
+    'Default': ['City Center', 'GRA', 'New Layout', 'Old Town', 'Industrial Area']
+}
+STREETS = ['Allen Avenue', 'Awolowo Road', 'Herbert Macaulay Way', 'Ahmadu Bello Way', 'Independence Avenue',
+           'Market Street', 'Main Road', 'Circular Road']
+EMAIL_DOMAINS = ['gmail.com', 'yahoo.com', 'outlook.com', 'hotmail.com']
+
+OCCUPATIONS = ['Civil Servant', 'Banker', 'Teacher', 'Engineer', 'Doctor', 'Nurse', 'Accountant',
+               'Lawyer', 'Business Owner', 'Trader', 'IT Professional', 'Entrepreneur',
+               'Consultant', 'Manager', 'Sales Executive', 'Pharmacist', 'Architect',
+               'Student', 'Self-Employed', 'Retired']
+EMPLOYMENT_STATUS = ['Employed', 'Employed', 'Employed', 'Self-Employed', 'Self-Employed',
+                     'Student', 'Retired', 'Unemployed']
+MARITAL_STATUS = ['Single', 'Married', 'Married', 'Married', 'Divorced', 'Widowed']
+EDUCATION_LEVELS = ['SSCE', 'OND', 'HND', 'B.Sc', 'B.Sc', 'M.Sc', 'M.Sc', 'PhD', 'Professional Certificate']
+INCOME_BRACKETS = ['< ₦100,000', '₦100,000 - ₦250,000', '₦250,000 - ₦500,000',
+                   '₦500,000 - ₦1,000,000', '₦1,000,000 - ₦2,500,000', '> ₦2,500,000']
+CUSTOMER_STATUS = ['Active', 'Active', 'Active', 'Active', 'Inactive', 'Dormant']
+
+TRANSACTION_TYPES = {
+    'Transport': {
+        'vendors': ['Mobil Filling Station', 'Total Energies', 'Conoil Filling Station', 'Oando Fuel Station',
+                    'Uber Trips', 'Bolt Ride Services', 'Lagos Bus Services', 'ABC Transport', 'Uber Eats Delivery'],
+        'narrations': ['fuel purchase', 'petrol refill', 'diesel purchase', 'transportation fare',
+                       'ride hailing service', 'bus fare payment', 'interstate travel', 'premium motor spirit'],
+        'amounts': (500, 25000), 'weight': 0.15
+    },
+    'Groceries': {
+        'vendors': ['Shoprite Victoria Island', 'Spar Supermarket', 'Park n Shop', 'Game Stores Lekki',
+                    'ShopRite Surulere', 'Ebeano Supermarket', 'Grand Square Mall', 'Prince Ebeano Supermarket'],
+        'narrations': ['grocery shopping', 'household items', 'monthly grocery shopping', 'fresh food items',
+                       'household supplies', 'weekly shopping', 'bulk food purchase', 'organic products'],
+        'amounts': (800, 50000), 'weight': 0.18
+    },
+    'Entertainment': {
+        'vendors': ['Quickteller Payment', 'DSTV Services', 'Gotv Payment', 'Netflix Subscription',
+                    'Showmax Payment', 'Startimes Subscription', 'Filmhouse Cinema', 'Genesis Deluxe Cinema'],
+        'narrations': ['DSTV subscription renewal', 'cable TV subscription', 'monthly streaming service',
+                       'cinema tickets', 'movie subscription', 'entertainment package', 'premium channel'],
+        'amounts': (1000, 15000), 'weight': 0.08
+    },
+    'Shopping': {
+        'vendors': ['Jumia Nigeria', 'Konga Online Store', 'Slot Limited', 'Computer Village Lagos',
+                    'Ikeja City Mall', 'Palms Shopping Mall', 'Jara Mall', 'Silverbird Galleria'],
+        'narrations': ['online electronics purchase', 'home appliances', 'smartphone purchase', 'laptop purchase',
+                       'clothing and accessories', 'fashion items', 'electronics shopping', 'online marketplace'],
+        'amounts': (2000, 500000), 'weight': 0.12
+    },
+    'Utilities': {
+        'vendors': ['MTN Recharge', 'Airtel Services', 'Glo Network', '9mobile Recharge',
+                    'Eko Electricity', 'Ikeja Electric', 'Abuja Electricity', 'LAWMA Waste Management'],
+        'narrations': ['airtime and data bundle', 'electricity bill payment', 'mobile data subscription',
+                       'utility bill payment', 'waste management fee', 'water bill payment', 'internet subscription'],
+        'amounts': (500, 35000), 'weight': 0.12
+    },
+    'Dining': {
+        'vendors': ['Chicken Republic', 'Dominos Pizza', 'Debonairs Pizza', 'KFC Nigeria',
+                    'Bukka Hut', 'Kilimanjaro Restaurant', 'The Place Restaurant', 'Sweet Sensation'],
+        'narrations': ['food and dining', 'weekend family meal', 'office lunch order', 'dinner reservation',
+                       'fast food purchase', 'restaurant bill', 'lunch delivery', 'catering service'],
+        'amounts': (1500, 75000), 'weight': 0.10
+    },
+    'Healthcare': {
+        'vendors': ['Pharmaplug', 'Medplus Pharmacy', 'HealthPlus Pharmacy', 'Reddington Hospital',
+                    'Lagos University Teaching Hospital', 'St Nicholas Hospital', 'Paelon Memorial Hospital'],
+        'narrations': ['medical supplies and drugs', 'prescription medications', 'hospital consultation',
+                       'medical tests', 'health insurance', 'pharmacy purchase', 'dental treatment'],
+        'amounts': (1000, 200000), 'weight': 0.07
+    },
+    'Education': {
+        'vendors': ['School Fees Payment', 'University of Lagos', 'Covenant University', 'JAMB Registration',
+                    'WAEC Examination', 'Private Lesson Services', 'Online Course Platform', 'Udemy Nigeria'],
+        'narrations': ['tuition fees for semester', 'school fees payment', 'examination fee', 'textbook purchase',
+                       'online course subscription', 'educational materials', 'exam registration', 'tutorial fees'],
+        'amounts': (5000, 750000), 'weight': 0.05
+    },
+    'Housing': {
+        'vendors': ['Rent Payment', 'Estate Management Services', 'Property Manager Lagos', 'Maintenance Services'],
+        'narrations': ['monthly apartment rent', 'annual rent payment', 'service charge', 'property maintenance',
+                       'house repairs', 'cleaning service', 'facility management', 'security deposit'],
+        'amounts': (50000, 2500000), 'weight': 0.04
+    },
+    'Insurance': {
+        'vendors': ['AIICO Insurance', 'Leadway Assurance', 'AXA Mansard', 'Custodian Insurance',
+                    'Cornerstone Insurance', 'NICON Insurance', 'Sovereign Trust Insurance'],
+        'narrations': ['annual car insurance', 'health insurance premium', 'life insurance payment',
+                       'property insurance', 'vehicle insurance renewal', 'insurance premium payment'],
+        'amounts': (15000, 500000), 'weight': 0.03
+    },
+    'Transfer': {
+        'vendors': ['Bank Transfer', 'Zenith Transfer', 'Interbank Transfer', 'Mobile Transfer'],
+        'narrations': ['funds transfer to family', 'business payment', 'personal transfer', 'salary payment',
+                       'money transfer', 'bill settlement', 'payment to vendor', 'remittance'],
+        'amounts': (5000, 5000000), 'weight': 0.06
+    },
+}
+
+CONVERSATION_MESSAGES = {
+    'Account Opening': [
+        'Good morning, I want to open a savings account. What are the requirements?',
+        "Hello, I'm a student. What account can I open?",
+        'I want to open an account but I have limited documentation',
+        "What's the difference between Aspire and Aspire Lite accounts?",
+        "I'm over 60 years old. Do you have special accounts for senior citizens?"],
+    'Card Services': [
+        'My debit card has been stolen. What should I do?',
+        'What types of debit cards do you offer?',
+        'How can I get a virtual card?',
+        'My card was declined at a POS terminal. Why?',
+        'What is the daily withdrawal limit on ATM?',
+        'Can I use my Zenith card abroad?'],
+    'Digital Banking': [
+        'How do I enroll for Internet banking?',
+        'What is ZIVA and how does it work?',
+        'I forgot my mobile app password. What should I do?',
+        'Can I transfer money without internet using my phone?',
+        'How do I download the Zenith mobile app?'],
+    'Transfers and Payments': [
+        'What are the charges for transferring money to other banks?',
+        'I sent money to a wrong account. Can it be reversed?',
+        'How do I pay my DSTV subscription?',
+        'My transfer is showing pending. How long will it take?',
+        'Can I transfer dollars from my domiciliary account?'],
+    'Loan Inquiries': [
+        'Do you offer personal loans? What are the requirements?',
+        'I need a quick loan. What options do I have?',
+        'Do you have loans for small businesses?',
+        'How long does loan approval take?',
+        "I'm a pensioner. Can I get a loan?"],
+    'Account Issues': [
+        "My account has been debited but I didn't make any transaction",
+        "I can't log into my account online",
+        "My account statement shows charges I don't understand",
+        "I want to close my account. What's the process?",
+        'Why is my account blocked?'],
+    'Cheque Services': [
+        'How do I request a chequebook?',
+        'Can I confirm if a cheque has been cleared?',
+        'I lost my chequebook. What should I do?'],
+    'Complaints': [
+        "I'm not satisfied with the service I received at your Victoria Island branch",
+        "The ATM swallowed my card but didn't dispense cash",
+        'Your customer service is excellent! I want to commend the staff'],
+    'General Inquiry': [
+        'What are your branch operating hours?',
+        'Do I need to visit the bank to open an account?',
+        'What is BVN and why do I need it?',
+        'Can I update my phone number on my account?',
+        'What services does Zenith Bank offer?'],
+}
+CONVERSATION_CHANNELS = ['Web Chat', 'Phone', 'Email', 'WhatsApp (ZIVA)', 'Branch Visit']
+CONVERSATION_STATUS = ['Resolved', 'Resolved', 'Resolved', 'Pending', 'Escalated']
+SATISFACTION_RATINGS = [4, 5, 5, 5, 4, 3, None]
+
+
+def _pick(rng, values, size):
+    return np.asarray(values, dtype=object)[rng.integers(0, len(values), size)]
+
+
+def _chunk_rng(seed: int, table: str, chunk: int) -> np.random.Generator:
+    return np.random.default_rng([seed, chunk, sum(map(ord, table))])
+
+
+def _format_ids(prefix: str, numbers: np.ndarray, width: int) -> np.ndarray:
+    return (prefix + pd.Series(numbers).astype(str).str.zfill(width)).to_numpy(dtype=object)
+
+
+def _dates(rng, start: date, end: date, size: int) -> np.ndarray:
+    days = rng.integers(0, (end - start).days + 1, size)
+    return (np.datetime64(start) + days.astype('timedelta64[D]')).astype(str).astype(object)
+
+
+# ============================================================================
+# TABLES
+# ============================================================================
+
+def generate_customers(n: int, first_id: int = 1, seed: int = 42, chunk: int = 0,
+                       as_of: date = AS_OF) -> pd.DataFrame:
+    """Customer demographics for IDs ``first_id .. first_id + n - 1`` (``ZB000001`` style)."""
+    rng = _chunk_rng(seed, 'customers', chunk)
+    ids = np.arange(first_id, first_id + n)
+
+    male = rng.random(n) < 0.5
+    first_name = np.where(male, _pick(rng, FIRST_NAMES_MALE, n), _pick(rng, FIRST_NAMES_FEMALE, n))
+    title = np.where(male, _pick(rng, MALE_TITLES, n), _pick(rng, FEMALE_TITLES, n))
+    last_name = _pick(rng, LAST_NAMES, n)
+
+    age = rng.integers(18, 76, n)
+    dob = np.datetime64(as_of) - (age * 365 + rng.integers(0, 365, n)).astype('timedelta64[D]')
+
+    state = _pick(rng, STATES, n)
+    city = np.empty(n, dtype=object)
+    for name in set(state):
+        mask = state == name
+        city[mask] = _pick(rng, CITIES.get(name, CITIES['Default']), int(mask.sum()))
+
+    occupation = _pick(rng, OCCUPATIONS, n)
+    employment = _pick(rng, EMPLOYMENT_STATUS, n)
+    young, old = age < 23, age > 65
+    occupation[young] = 'Student'
+    employment[young] = 'Student'
+    occupation[old] = _pick(rng, ['Retired', 'Business Owner', 'Consultant'], int(old.sum()))
+    employment[old & (occupation == 'Retired')] = 'Retired'
+
+    high_earner = np.isin(occupation, ['Doctor', 'Lawyer', 'Engineer', 'Manager', 'Consultant'])
+    low_earner = np.isin(occupation, ['Student', 'Unemployed'])
+    income = np.select(
+        [high_earner, low_earner],
+        [_pick(rng, INCOME_BRACKETS[3:], n), _pick(rng, INCOME_BRACKETS[:2], n)],
+        _pick(rng, INCOME_BRACKETS, n)
+    )
+
+    account_type = np.select(
+        [
+            (age >= 16) & (age <= 25) & (employment == 'Student'),
+            age >= 60,
+            income == '> ₦2,500,000',
+            np.isin(income, ['₦1,000,000 - ₦2,500,000', '₦500,000 - ₦1,000,000']),
+            (employment == 'Self-Employed') & (rng.random(n) > 0.7),
+        ],
+        [
+            _pick(rng, ['Aspire Account', 'Aspire Lite'], n),
+            _pick(rng, ['Timeless Account Current', 'Timeless Account Savings'], n),
+            _pick(rng, ['Platinum Premium Current Account', 'Gold Premium Current Account'], n),
+            _pick(rng, ['Gold Premium Current Account', 'Individual Current Account', 'Savings Account'], n),
+            np.full(n, 'SME Grow My Biz', dtype=object),
+        ],
+        _pick(rng, ['Individual Current Account', 'Savings Account', 'EazySave Classic Account'], n)
+    )
+
+    lower_first = pd.Series(first_name).str.lower()
+    lower_last = pd.Series(last_name).str.lower()
+    email = (lower_first + '.' + lower_last + pd.Series(rng.integers(1, 1000, n)).astype(str)
+             + '@' + pd.Series(_pick(rng, EMAIL_DOMAINS, n)))
+    address = (pd.Series(rng.integers(1, 151, n)).astype(str) + ' ' + pd.Series(_pick(rng, STREETS, n))
+               + ', ' + pd.Series(city))
+
+    return pd.DataFrame({
+        'Customer_ID': _format_ids('ZB', ids, 6),
+        'Full_Name': pd.Series(title) + ' ' + pd.Series(first_name) + ' ' + pd.Series(last_name),
+        'First_Name': first_name,
+        'Last_Name': last_name,
+        'Gender': np.where(male, 'Male', 'Female'),
+        'Date_of_Birth': dob.astype(str),
+        'Age': age,
+        'Phone_Number': '080' + pd.Series(rng.integers(10_000_000, 100_000_000, n)).astype(str),
+        'Email': email,
+        'Address': address,
+        'City': city,
+        'State': state,
+        'Occupation': occupation,
+        'Employment_Status': employment,
+        'Income_Bracket': income,
+        'Marital_Status': _pick(rng, MARITAL_STATUS, n),
+        'Education_Level': _pick(rng, EDUCATION_LEVELS, n),
+        'Account_Type': account_type,
+        'Account_Opening_Date': _dates(rng, date(as_of.year - 5, as_of.month, as_of.day), as_of, n),
+        'BVN': pd.Series(rng.integers(10_000_000_000, 100_000_000_000, n)).astype(str),
+        'Status': _pick(rng, CUSTOMER_STATUS, n),
+    })
+
+
+def generate_transactions(customers: pd.DataFrame, per_customer: float = TRANSACTIONS_PER_CUSTOMER,
+                          first_id: int = 1, seed: int = 42, chunk: int = 0) -> pd.DataFrame:
+    """Transactions for ``customers`` (Poisson ``per_customer`` each), IDs from ``first_id``."""
+    rng = _chunk_rng(seed, 'transactions', chunk)
+    counts = rng.poisson(per_customer, len(customers))
+    n = int(counts.sum())
+    owner = np.repeat(np.arange(len(customers)), counts)
+
+    names = list(TRANSACTION_TYPES)
+    weights = np.array([TRANSACTION_TYPES[c]['weight'] for c in names])
+    category = rng.choice(len(names), n, p=weights / weights.sum())
+
+    destination = np.empty(n, dtype=object)
+    narration = np.empty(n, dtype=object)
+    amount = np.empty(n, dtype=np.float64)
+    debit = np.empty(n, dtype=bool)
+    for code, name in enumerate(names):
+        mask = category == code
+        size = int(mask.sum())
+        spec = TRANSACTION_TYPES[name]
+        destination[mask] = _pick(rng, spec['vendors'], size)
+        narration[mask] = _pick(rng, spec['narrations'], size)
+        amount[mask] = rng.uniform(*spec['amounts'], size)
+        debit[mask] = rng.random(size) < (0.5 if name == 'Transfer' else 0.85)
+
+    return pd.DataFrame({
+        'Customer_ID': customers['Customer_ID'].to_numpy()[owner],
+        'Trans_Amount': np.round(amount, 2),
+        'Date': _dates(rng, TRANSACTION_START, TRANSACTION_END, n),
+        'Destination': destination,
+        'Deb_or_credit': np.where(debit, 'D', 'C'),
+        'Narration': narration,
+        'Tran_Id': _format_ids('TR', np.arange(first_id, first_id + n), 9),
+        'Category': np.asarray(names, dtype=object)[category],
+        'Account_Type': customers['Account_Type'].to_numpy()[owner],
+    })
+
+
+def generate_conversations(customers: pd.DataFrame, per_customer: float = CONVERSATIONS_PER_CUSTOMER,
+                           first_id: int = 1, seed: int = 42, chunk: int = 0) -> pd.DataFrame:
+    """Support conversations for ``customers`` (Poisson ``per_customer`` each), IDs from ``first_id``."""
+    rng = _chunk_rng(seed, 'conversations', chunk)
+    counts = rng.poisson(per_customer, len(customers))
+    n = int(counts.sum())
+    owner = np.repeat(np.arange(len(customers)), counts)
+
+    categories = list(CONVERSATION_MESSAGES)
+    category = rng.integers(0, len(categories), n)
+    message = np.empty(n, dtype=object)
+    for code, name in enumerate(categories):
+        mask = category == code
+        message[mask] = _pick(rng, CONVERSATION_MESSAGES[name], int(mask.sum()))
+    category_names = np.asarray(categories, dtype=object)[category]
+
+    customer_time = (np.datetime64(TRANSACTION_START, 's')
+                     + rng.integers(0, (TRANSACTION_END - TRANSACTION_START).days * 86400, n).astype('timedelta64[s]'))
+    agent_time = customer_time + (rng.integers(1, 6, n) * 60).astype('timedelta64[s]')
+
+    def timestamps(values):
+        return pd.Series(values).dt.strftime('%Y-%m-%d %H:%M:%S').to_numpy(dtype=object)
+
+    rating = np.asarray(SATISFACTION_RATINGS, dtype=object)[rng.integers(0, len(SATISFACTION_RATINGS), n)]
+
+    return pd.DataFrame({
+        'Conversation_ID': _format_ids('CONV', np.arange(first_id, first_id + n), 6),
+        'Customer_ID': customers['Customer_ID'].to_numpy()[owner],
+        'Agent_ID': _format_ids('AGT', rng.integers(100, 501, n), 3),
+        'Category': category_names,
+        'Customer_Message': message,
+        'Customer_Timestamp': timestamps(customer_time),
+        'Agent_Response': 'Thank you for contacting Zenith Bank about ' + pd.Series(category_names).str.lower() + '.',
+        'Agent_Timestamp': timestamps(agent_time),
+        'Channel': _pick(rng, CONVERSATION_CHANNELS, n),
+        'Status': _pick(rng, CONVERSATION_STATUS, n),
+        'Satisfaction_Rating': pd.array(rating, dtype='Int64'),
+    })
+
+
+def load_products(path: str = PRODUCTS_CSV) -> pd.DataFrame:
+    """The product catalogue (``dataset/product.csv``); its size does not scale with customers."""
+    return pd.read_csv(path)
+
+
+# ============================================================================
+# DATASET WRITER
+# ============================================================================
+
+def write_synthetic_dataset(output_dir: str, n_customers: int, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                            transactions_per_customer: float = TRANSACTIONS_PER_CUSTOMER,
+                            conversations_per_customer: float = CONVERSATIONS_PER_CUSTOMER,
+                            seed: int = 42, verbose: bool = True) -> Dict[str, int]:
+    """
+    Write a synthetic dataset as Parquet part files, one chunk of customers at a time.
+
+    Layout: ``<output_dir>/{customers,transactions,conversations,products}/part-NNNNN.parquet``,
+    readable with ``spark.read.parquet(<output_dir>/<table>)``.
+
+    Args:
+        output_dir: Target directory (created if missing)
+        n_customers: Number of customers (see ``SCALES``)
+        chunk_size: Customers generated and written per part file (bounds memory)
+        transactions_per_customer: Mean transactions per customer
+        conversations_per_customer: Mean support conversations per customer
+        seed: Base seed; the same seed and chunk size reproduce the same data
+        verbose: Print progress per chunk
+
+    Returns:
+        Row counts per table
+    """
+    tables = ('customers', 'transactions', 'conversations', 'products')
+    for table in tables:
+        os.makedirs(os.path.join(output_dir, table), exist_ok=True)
+
+    counts = dict.fromkeys(tables, 0)
+    next_transaction = next_conversation = 1
+    for chunk, first in enumerate(range(1, n_customers + 1, chunk_size)):
+        size = min(chunk_size, n_customers - first + 1)
+        customers = generate_customers(size, first_id=first, seed=seed, chunk=chunk)
+        transactions = generate_transactions(customers, transactions_per_customer,
+                                             first_id=next_transaction, seed=seed, chunk=chunk)
+        conversations = generate_conversations(customers, conversations_per_customer,
+                                               first_id=next_conversation, seed=seed, chunk=chunk)
+        next_transaction += len(transactions)
+        next_conversation += len(conversations)
+
+        part = f"part-{chunk:05d}.parquet"
+        for table, df in (('customers', customers), ('transactions', transactions),
+                          ('conversations', conversations)):
+            df.to_parquet(os.path.join(output_dir, table, part), index=False)
+            counts[table] += len(df)
+
+        if verbose:
+            print(f"   → chunk {chunk + 1}: {counts['customers']:,}/{n_customers:,} customers, "
+                  f"{counts['transactions']:,} transactions, {counts['conversations']:,} conversations")
+
+    products = load_products()
+    products.to_parquet(os.path.join(output_dir, 'products', 'part-00000.parquet'), index=False)
+    counts['products'] = len(products)
+    return counts
+
+
+def scale_to_customers(scale: Optional[str]) -> int:
+    """Customer count for a named scale (``10k``, ``1m``, ``10m``) or a plain integer string."""
+    if scale is None:
+        return SCALES['10k']
+    key = scale.lower()
+    return SCALES[key] if key in SCALES else int(key.replace('_', ''))
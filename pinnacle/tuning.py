@@ -0,0 +1,279 @@
+"""
+Parallel ALS hyperparameter sweeps with warm starts and a leaderboard.
+
+Every configuration is fit on the same training split and scored on the
+held-out interactions with ``pinnacle.evaluation.ranking_metrics``.
+Configurations that share a factor rank are ordered into chains of
+neighbours (adjacent values of the remaining parameters); each fit in a
+chain starts from the previous fit's factors and runs a fraction of the
+configured iterations, since it begins close to its optimum. Chains run in
+parallel worker processes, and the results are written as a leaderboard
+sorted by the chosen metric.
+
+Backends:
+    local:    ``pinnacle.local.train_als`` (explicit ALS, the notebook's
+              Spark model); params rank, reg_param, max_iter, nonnegative
+    implicit: ``pinnacle.implicit_als.train_implicit_als``; params factors,
+              regularization, iterations, alpha
+
+The explicit names rank, reg_param and max_iter are accepted for the
+implicit backend as factors, regularization and iterations; any other
+parameter a backend does not take is rejected.
+
+Usage:
+    configs = grid({'rank': [10, 20, 40], 'reg_param': [0.01, 0.03, 0.1, 0.3]})
+    board = sweep(idx_df, configs, backend='local', leaderboard_path='leaderboard.csv')
+"""
+
+import itertools
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pinnacle.evaluation import RANKING_METRICS, ranking_metrics
+
+
+BACKEND_DEFAULTS = {
+    'local': {'rank': 20, 'reg_param': 0.1, 'max_iter': 20, 'nonnegative': True},
+    'implicit': {'factors': 50, 'regularization': 0.01, 'iterations': 15, 'alpha': 40.0},
+}
+PARAM_ALIASES = {
+    'local': {},
+    'implicit': {'rank': 'factors', 'reg_param': 'regularization', 'max_iter': 'iterations'},
+}
+DEFAULT_GRIDS = {
+    'local': {'rank': [10, 20, 40], 'reg_param': [0.01, 0.03, 0.1, 0.3]},
+    'implicit': {'factors': [20, 50, 100], 'regularization': [0.01, 0.1, 1.0]},
+}
+RANK_PARAM = {'local': 'rank', 'implicit': 'factors'}
+ITERATIONS_PARAM = {'local': 'max_iter', 'implicit': 'iterations'}
+WARM_START_FRACTION = 0.5
+
+
+def grid(space: Mapping[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """Every combination of the listed parameter values."""
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[n] for n in names))]
+
+
+def random_configs(space: Mapping[str, Any], n: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    ``n`` distinct random configurations.
+
+    Args:
+        space: Per parameter either a list of values (sampled uniformly) or
+            a ``(low, high)`` tuple: log-uniform for floats, uniform for ints
+        n: Configurations to draw
+        seed: Sampling seed
+    """
+    rng = np.random.default_rng(seed)
+    configs, seen = [], set()
+    for _ in range(n * 20):
+        config = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    config[name] = int(rng.integers(low, high + 1))
+                else:
+                    config[name] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+            else:
+                config[name] = values[int(rng.integers(len(values)))]
+        key = tuple(sorted(config.items()))
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+        if len(configs) == n:
+            break
+    return configs
+
+
+def backend_configs(configs: Sequence[Mapping[str, Any]], backend: str) -> List[Dict[str, Any]]:
+    """
+    Configurations in the backend's parameter names.
+
+    Raises:
+        ValueError: On an unknown backend, no configurations, or a parameter
+            the backend does not take
+    """
+    if backend not in BACKEND_DEFAULTS:
+        raise ValueError(f"Unknown backend '{backend}' (expected one of {sorted(BACKEND_DEFAULTS)})")
+    if not configs:
+        raise ValueError("No configurations to sweep")
+    aliases = PARAM_ALIASES[backend]
+    renamed = []
+    for config in configs:
+        config = {aliases.get(name, name): value for name, value in config.items()}
+        unknown = sorted(set(config) - set(BACKEND_DEFAULTS[backend]))
+        if unknown:
+            raise ValueError(f"Parameters {unknown} do not apply to the '{backend}' backend "
+                             f"(expected {sorted(BACKEND_DEFAULTS[backend])})")
+        renamed.append(config)
+    return renamed
+
+
+def split_interactions(idx_df: pd.DataFrame, test_fraction: float = 0.2,
+                       seed: int = 42) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Random per-interaction train/test split (the notebook's ``randomSplit``)."""
+    test_mask = np.random.default_rng(seed).random(len(idx_df)) < test_fraction
+    return idx_df[~test_mask], idx_df[test_mask]
+
+
+def warm_start_chains(configs: Sequence[Mapping[str, Any]], backend: str,
+                      n_chains: int = 1) -> List[List[Dict[str, Any]]]:
+    """
+    Group configurations into warm-start chains.
+
+    Configurations with the same factor rank form one chain, sorted so that
+    neighbours differ in as few leading parameters as possible; the longest
+    chains are then halved until there are at least ``n_chains`` (one per
+    worker) or every chain has one configuration.
+    """
+    rank_param = RANK_PARAM[backend]
+    defaults = BACKEND_DEFAULTS[backend]
+    full = [{**defaults, **config} for config in configs]
+    by_rank: Dict[Any, List[Dict[str, Any]]] = {}
+    for config in full:
+        by_rank.setdefault(config[rank_param], []).append(config)
+    others = [name for name in defaults if name != rank_param]
+    chains = [sorted(group, key=lambda c: tuple(c[name] for name in others))
+              for _, group in sorted(by_rank.items())]
+
+    while len(chains) < n_chains:
+        longest = max(range(len(chains)), key=lambda i: len(chains[i]))
+        if len(chains[longest]) < 2:
+            break
+        chain = chains.pop(longest)
+        middle = len(chain) // 2
+        chains[longest:longest] = [chain[:middle], chain[middle:]]
+    return chains
+
+
+def _fit(backend: str, train: Mapping[str, np.ndarray], config: Mapping[str, Any], iterations: int, seed: int,
+         init: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]):
+    if backend == 'local':
+        from pinnacle.local import train_als
+
+        return train_als(pd.DataFrame(train), rank=config['rank'], reg_param=config['reg_param'],
+                         max_iter=iterations, nonnegative=config['nonnegative'], seed=seed,
+                         init_user_factors=init[1] if init else None)
+
+    from pinnacle.implicit_als import train_implicit_als
+
+    return train_implicit_als(train['user_int'], train['item_int'], train['interaction_score'],
+                              factors=config['factors'], regularization=config['regularization'],
+                              iterations=iterations, alpha=config['alpha'], num_threads=1,
+                              random_state=seed, init_factors=(init[1], init[3]) if init else None)
+
+
+def _run_chain(backend: str, chain: Sequence[Dict[str, Any]], train: Mapping[str, np.ndarray],
+               test: Mapping[str, np.ndarray], k: int, seed: int, warm_start: bool) -> List[Dict[str, Any]]:
+    """Fit and score one chain in order, each fit warm-started from the previous one."""
+    results = []
+    factors = None
+    for config in chain:
+        iterations = config[ITERATIONS_PARAM[backend]]
+        init = factors if warm_start else None
+        if init is not None:
+            iterations = max(1, math.ceil(iterations * WARM_START_FRACTION))
+        start = time.perf_counter()
+        factors = _fit(backend, train, config, iterations, seed, init)
+        fit_seconds = time.perf_counter() - start
+
+        scores = ranking_metrics(*factors, test['user_int'], test['item_int'],
+                                 train['user_int'], train['item_int'], k=k)
+        result = {**config, **{f"{name}@{k}": scores[name] for name in RANKING_METRICS},
+                  'users': scores['users'], 'iterations_run': iterations,
+                  'warm_start': init is not None, 'fit_seconds': round(fit_seconds, 3)}
+        if backend == 'local':
+            from pinnacle.local import rmse
+
+            result['rmse'] = rmse(pd.DataFrame(test), *factors)
+        results.append(result)
+    return results
+
+
+def sweep(idx_df: pd.DataFrame, configs: Sequence[Mapping[str, Any]], backend: str = 'local', k: int = 10,
+          metric: str = 'ndcg', test_fraction: float = 0.2, seed: int = 42, max_workers: Optional[int] = None,
+          warm_start: bool = True, leaderboard_path: Optional[str] = None, verbose: bool = True) -> pd.DataFrame:
+    """
+    Fit and score every configuration; return the leaderboard.
+
+    Args:
+        idx_df: Indexed interactions (user_int, item_int, interaction_score)
+        configs: Parameter dicts; missing parameters take the backend defaults
+            (explicit names are mapped for the implicit backend, see
+            ``backend_configs``)
+        backend: 'local' or 'implicit'
+        k: Ranking metric cutoff
+        metric: Leaderboard sort key: precision, recall, ndcg or map (@k)
+        test_fraction: Interactions held out for scoring
+        seed: Split and initialization seed
+        max_workers: Worker processes (default: CPU count, capped at the
+            number of configurations; 1 = run in this process)
+        warm_start: Start each fit from its chain neighbour's factors
+        leaderboard_path: Write the leaderboard here (.json or .csv)
+        verbose: Print one line per finished chain
+
+    Returns:
+        DataFrame sorted best-first on ``<metric>@k``, with a ``position`` column
+
+    Raises:
+        ValueError: On an unknown backend or metric, no configurations, or
+            parameters the backend does not take
+    """
+    configs = backend_configs(configs, backend)
+    if metric not in RANKING_METRICS:
+        raise ValueError(f"Unknown metric '{metric}' (expected one of {RANKING_METRICS})")
+
+    columns = ['user_int', 'item_int', 'interaction_score']
+    train_df, test_df = split_interactions(idx_df, test_fraction, seed)
+    train = {c: train_df[c].to_numpy() for c in columns}
+    test = {c: test_df[c].to_numpy() for c in columns}
+
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(configs)))
+    chains = warm_start_chains(configs, backend, n_chains=max_workers)
+    start = time.perf_counter()
+    results = []
+    if max_workers == 1:
+        for chain in chains:
+            results.extend(_run_chain(backend, chain, train, test, k, seed, warm_start))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(_run_chain, backend, chain, train, test, k, seed, warm_start)
+                       for chain in chains]
+            for future in futures:
+                chain_results = future.result()
+                results.extend(chain_results)
+                if verbose:
+                    best = max(r[f"{metric}@{k}"] for r in chain_results)
+                    print(f"   chain of {len(chain_results)} done, best {metric}@{k} {best:.4f}")
+
+    board = (pd.DataFrame(results)
+             .sort_values(f"{metric}@{k}", ascending=False, kind='stable')
+             .reset_index(drop=True))
+    board.insert(0, 'position', np.arange(1, len(board) + 1))
+    board.insert(1, 'backend', backend)
+    if verbose:
+        print(f"   {len(board)} configurations in {time.perf_counter() - start:.1f}s on {max_workers} workers")
+    if leaderboard_path:
+        write_leaderboard(board, leaderboard_path)
+    return board
+
+
+def write_leaderboard(board: pd.DataFrame, path: str):
+    """Write a sweep leaderboard: ``.json`` -> list of records, anything else -> CSV."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if path.endswith('.json'):
+        with open(path, 'w') as f:
+            json.dump(json.loads(board.to_json(orient='records')), f, indent=2)
+    else:
+        board.to_csv(path, index=False)
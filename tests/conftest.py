@@ -0,0 +1,13 @@
+import os
+
+import pandas as pd
+import pytest
+
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataset')
+
+
+@pytest.fixture(scope='session')
+def products():
+    """The product catalogue shipped in ``dataset/``."""
+    return pd.read_csv(os.path.join(DATASET_DIR, 'product.csv'))
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pinnacle.decayed_rfm import DecayedRFM
+
+
+def brute_force(frame, at, frequency_half_life, monetary_half_life, recency_half_life):
+    """Decayed count, amount and trans_score per pair, recomputed from every transaction."""
+    rows = []
+    for (customer, product), group in frame.groupby(['Customer_ID', 'Product_Name']):
+        age = at - group['day'].to_numpy()
+        count = (group['weight'] * 0.5 ** (age / frequency_half_life)).sum()
+        amount = (group['weight'] * group['Trans_Amount'] * 0.5 ** (age / monetary_half_life)).sum()
+        days_since_last = at - group['day'].max()
+        frequency = min(10.0, np.log1p(count) / np.log1p(100.0) * 10.0)
+        monetary = min(10.0, np.log1p(amount) / np.log1p(1000000.0) * 10.0)
+        recency = max(0.5, 10.0 * 0.5 ** (days_since_last / recency_half_life))
+        rows.append((customer, product, 0.35 * frequency + 0.35 * monetary + 0.30 * recency,
+                     count, amount, days_since_last))
+    return pd.DataFrame(rows, columns=['Customer_ID', 'Product_Name', 'trans_score', 'transaction_count',
+                                       'total_amount', 'days_since_last'])
+
+
+def transactions(n, days, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Customer_ID': rng.choice([f"ZB{i:03d}" for i in range(20)], n),
+        'Product_Name': rng.choice(['Aspire Account', 'Personal Loan', 'Zenith Virtual Card'], n),
+        'Trans_Amount': rng.uniform(100, 500000, n).round(2),
+        'day': rng.integers(19000, 19000 + days, n),
+        'weight': rng.choice([0.5, 0.6, 1.0], n),
+    })
+
+
+def batches(frame, n):
+    frame = frame.sort_values('day')
+    return [frame.iloc[rows] for rows in np.array_split(np.arange(len(frame)), n)]
+
+
+def assert_matches(state, frame, at, half_lives):
+    got = state.scores(at=at).sort_values(['Customer_ID', 'Product_Name']).reset_index(drop=True)
+    expected = brute_force(frame, at, *half_lives)
+    pd.testing.assert_frame_equal(got, expected, check_dtype=False, rtol=1e-9)
+
+
+@pytest.mark.parametrize('half_lives', [(180.0, 180.0, 120.0), (30.0, 90.0, 45.0)])
+def test_scores_match_brute_force(half_lives):
+    frame = transactions(2000, 720)
+    state = DecayedRFM(*half_lives)
+    state.update_many(frame['Customer_ID'], frame['Product_Name'], frame['Trans_Amount'], frame['day'],
+                      frame['weight'])
+    for at in (int(frame['day'].max()), int(frame['day'].max()) + 90):
+        assert_matches(state, frame, at, half_lives)
+
+
+def test_updates_in_any_order_and_batches_agree():
+    frame = transactions(1500, 720, seed=1)
+    half_lives = (180.0, 180.0, 120.0)
+    batched = DecayedRFM(*half_lives)
+    for batch in batches(frame, 5):
+        batched.update_many(batch['Customer_ID'], batch['Product_Name'], batch['Trans_Amount'], batch['day'],
+                            batch['weight'])
+    single = DecayedRFM(*half_lives)
+    for row in frame.sample(frac=1.0, random_state=2).itertuples():
+        single.update(row.Customer_ID, row.Product_Name, row.Trans_Amount, row.day, row.weight)
+    at = int(frame['day'].max())
+    assert_matches(batched, frame, at, half_lives)
+    assert_matches(single, frame, at, half_lives)
+
+
+def test_rebase_keeps_scores():
+    # Short half-lives over a long span force several rebases
+    frame = transactions(1000, 3000, seed=3)
+    half_lives = (5.0, 5.0, 30.0)
+    state = DecayedRFM(*half_lives)
+    for batch in batches(frame, 10):
+        state.update_many(batch['Customer_ID'], batch['Product_Name'], batch['Trans_Amount'], batch['day'],
+                          batch['weight'])
+    assert state.epoch > frame['day'].min()
+    assert_matches(state, frame, int(frame['day'].max()), half_lives)
+
+
+def test_save_and_load(tmp_path):
+    frame = transactions(500, 365, seed=4)
+    state = DecayedRFM()
+    state.update_many(frame['Customer_ID'], frame['Product_Name'], frame['Trans_Amount'], frame['day'],
+                      frame['weight'])
+    path = str(tmp_path / 'rfm.npz')
+    state.save(path)
+    loaded = DecayedRFM.load(path)
+    assert loaded.watermark == state.watermark
+    pd.testing.assert_frame_equal(loaded.scores(), state.scores())
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pinnacle.eligibility import eligibility_mask, parse_age_range, parse_amount, parse_income_bracket, product_rules
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('0-15 years', (0.0, 15.0)),
+    ('16 - 25 years', (16.0, 25.0)),
+    ('25 to 60 years', (25.0, 60.0)),
+    ('18+ years', (18.0, np.inf)),
+    ('60 and above', (60.0, np.inf)),
+])
+def test_parse_age_range(text, expected):
+    assert parse_age_range(text) == expected
+
+
+@pytest.mark.parametrize('text', ['All ages', '', None])
+def test_parse_age_range_unknown(text):
+    assert all(np.isnan(parse_age_range(text)))
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('₦1,000,000', 1e6),
+    ('0', 0.0),
+    ('Zero', 0.0),
+    ('₦5,000 (minimum)', 5000.0),
+    (2500, 2500.0),
+])
+def test_parse_amount(text, expected):
+    assert parse_amount(text) == expected
+
+
+@pytest.mark.parametrize('text', ['Standard', 'Variable', None, np.nan])
+def test_parse_amount_unknown(text):
+    assert np.isnan(parse_amount(text))
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('₦100,000 - ₦250,000', (1e5, 2.5e5)),
+    ('< ₦100,000', (0.0, 1e5)),
+    ('> ₦2,500,000', (2.5e6, np.inf)),
+])
+def test_parse_income_bracket(text, expected):
+    assert parse_income_bracket(text) == expected
+
+
+def test_product_rules_from_catalogue(products):
+    rules = product_rules(products)
+    assert list(rules.index) == products['Product_Name'].tolist()
+
+    pension = rules.loc['Timeless Pension Advance Plus']
+    assert (pension['min_age'], pension['max_age']) == (60.0, 70.0)
+    assert pension['min_income'] == 500000.0
+    assert pension['requires_retired'] and not pension['requires_employed']
+
+    assert rules.loc['Aspire Account', 'requires_student']
+    # "Students and parents" is a broader audience, open to everyone
+    assert not rules.loc['Education Loan', 'requires_student']
+    assert rules.loc['Zenith Debit Card - Gold', 'requires_gold_premium']
+    assert rules.loc['Z-Woman Loan', 'requires_female']
+    assert rules.loc['Zenith Gold Premium Current Account', 'min_balance'] == 1e6
+    assert np.isnan(rules.loc['Zenith Childrens Account (ZECA)', 'min_balance'])
+    assert rules['active'].all()
+
+
+def test_eligibility_mask():
+    products = pd.DataFrame({
+        'Product_Name': ['Kids', 'Pension', 'Premium', 'Open'],
+        'Age_Range': ['0-15 years', '60-70 years', '18+ years', 'All ages'],
+        'Minimum_Balance': ['0', '0', '₦1,000,000', 'Standard'],
+        'Target_Audience': ['Children', 'Pensioners receiving monthly pension ≥₦500,000', 'Individuals',
+                            'Customers and merchants'],
+    })
+    customers = pd.DataFrame({
+        'Age': [10, 65, 65, 40, None],
+        'Employment_Status': ['Student', 'Retired', 'Retired', 'Employed', None],
+        'Income_Bracket': ['< ₦100,000', '> ₦2,500,000', '₦100,000 - ₦250,000', '> ₦2,500,000', None],
+    })
+    expected = np.array([
+        [True, False, False, True],
+        [False, True, True, True],
+        [False, False, False, True],   # income ceiling below the pension and balance minimums
+        [False, False, True, True],
+        [True, True, True, True],      # unknown customers are never excluded
+    ])
+    np.testing.assert_array_equal(eligibility_mask(customers, product_rules(products)), expected)
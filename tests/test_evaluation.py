@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from pinnacle.evaluation import ranking_metrics
+
+
+def reference_metrics(user_ids, user_factors, item_ids, item_factors, test_pairs, train_pairs, k):
+    """Per-user loop: rank unseen items by score, then textbook precision/recall/NDCG/MAP@k."""
+    totals = {'precision': 0.0, 'recall': 0.0, 'ndcg': 0.0, 'map': 0.0}
+    users = 0
+    for row, user in enumerate(user_ids):
+        relevant = {item for u, item in test_pairs if u == user and item in item_ids}
+        if not relevant:
+            continue
+        seen = {item for u, item in train_pairs if u == user}
+        scores = {item: float(user_factors[row] @ item_factors[col]) for col, item in enumerate(item_ids)
+                  if item not in seen}
+        ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+        hits = [item in relevant for item in ranked]
+        ideal = min(len(relevant), k)
+        totals['precision'] += sum(hits) / k
+        totals['recall'] += sum(hits) / len(relevant)
+        totals['ndcg'] += (sum(1 / np.log2(i + 2) for i, hit in enumerate(hits) if hit)
+                           / sum(1 / np.log2(i + 2) for i in range(ideal)))
+        totals['map'] += sum(sum(hits[:i + 1]) / (i + 1) for i, hit in enumerate(hits) if hit) / ideal
+        users += 1
+    return {name: total / users for name, total in totals.items()}, users
+
+
+@pytest.mark.parametrize('k, block_size', [(5, 7), (10, 1000), (40, 16)])
+def test_ranking_metrics_match_reference(k, block_size):
+    rng = np.random.default_rng(k)
+    n_users, n_items, rank = 60, 30, 8
+    # Sparse, unordered ids as in the factors_to_array layout
+    user_ids = rng.permutation(np.arange(0, 3 * n_users, 3))
+    item_ids = rng.permutation(np.arange(100, 100 + 2 * n_items, 2))
+    user_factors = rng.standard_normal((n_users, rank))
+    item_factors = rng.standard_normal((n_items, rank))
+
+    pairs = {(int(u), int(i)) for u, i in zip(rng.choice(user_ids, 900), rng.choice(item_ids, 900))}
+    pairs = sorted(pairs)
+    train_pairs = set(pairs[::2])
+    test_pairs = set(pairs[1::2])
+    # Pairs of users / items without factors are ignored
+    test_pairs |= {(10 ** 6, int(item_ids[0])), (int(user_ids[0]), 10 ** 6)}
+    test_users, test_items = (np.array(column) for column in zip(*sorted(test_pairs)))
+    train_users, train_items = (np.array(column) for column in zip(*sorted(train_pairs)))
+
+    got = ranking_metrics(user_ids, user_factors, item_ids, item_factors, test_users, test_items,
+                          train_users, train_items, k=k, block_size=block_size)
+    expected, users = reference_metrics(user_ids, user_factors, item_ids, item_factors, test_pairs, train_pairs,
+                                        min(k, n_items))
+    assert got['users'] == users
+    assert got['k'] == min(k, n_items)
+    for name, value in expected.items():
+        assert got[name] == pytest.approx(value, rel=1e-12), name
+
+
+def test_ranking_metrics_without_test_users():
+    factors = np.ones((2, 3))
+    got = ranking_metrics(np.arange(2), factors, np.arange(2), factors, np.array([5]), np.array([0]))
+    assert got == {'precision': 0.0, 'recall': 0.0, 'ndcg': 0.0, 'map': 0.0, 'users': 0, 'k': 2}
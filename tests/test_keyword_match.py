@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pinnacle.keyword_match import KeywordMatcher
+
+
+ACCOUNT_KEYWORDS = r'(current|savings|sme|student|premium|platinum|children|aspire)'
+DESCRIPTION_KEYWORDS = (r'(current|savings|sme|student|premium|platinum|children|aspire'
+                        r'|loan|investment|card|transfer|deposit)')
+ACCOUNT_TYPES = [
+    'Savings Account', 'Individual Current Account', 'Gold Premium Current Account', 'Timeless Account Savings',
+    'Timeless Account Current', 'EazySave Classic Account', 'Platinum Premium Current Account', 'Aspire Lite',
+    'Aspire Account', 'SME Grow My Biz',
+]
+DESCRIPTIONS = [
+    'grocery shopping', 'money transfer', 'personal loan repayment', 'credit card payment', 'fixed deposit',
+    'school fees', 'investment top-up', '',
+]
+
+
+def legacy_matches(trans, products):
+    """The old path: first keyword of Account_Type, else Description, joined on the product keyword map."""
+    def extract(values, pattern):
+        return values.str.lower().str.extract(pattern, expand=False).fillna('')
+
+    keyword_map = pd.DataFrame({'keyword': extract(products['Product_Name'], ACCOUNT_KEYWORDS),
+                                'Product_Name': products['Product_Name']})
+    keyword_map = keyword_map[keyword_map['keyword'] != ''].drop_duplicates()
+    keyword = extract(trans['Account_Type'], ACCOUNT_KEYWORDS)
+    keyword = keyword.where(keyword != '', extract(trans['Description'], DESCRIPTION_KEYWORDS))
+    return trans[['row']].assign(keyword=keyword).merge(keyword_map, on='keyword')[['row', 'Product_Name']]
+
+
+@pytest.fixture(scope='module')
+def trans():
+    account, description = np.meshgrid(ACCOUNT_TYPES, DESCRIPTIONS, indexing='ij')
+    n = account.size
+    return pd.DataFrame({'Customer_ID': [f"ZB{i:03d}" for i in range(n)], 'Trans_Amount': 1000.0,
+                         'Date': '2024-01-01', 'Account_Type': account.ravel(),
+                         'Description': description.ravel(), 'row': np.arange(n)})
+
+
+@pytest.fixture(scope='module')
+def matcher(products):
+    return KeywordMatcher.from_products(products)
+
+
+def test_covers_every_transaction_the_old_path_matched(trans, products, matcher):
+    old = legacy_matches(trans, products)
+    new = matcher.match(trans, keep=('row',))
+    assert set(old['row']) <= set(new['row'])
+
+
+def test_account_types_match_their_own_product(trans, products, matcher):
+    new = matcher.match(trans, keep=('Account_Type',))
+    pairs = set(zip(new['Account_Type'], new['Product_Name']))
+    for account_type, product in [('Individual Current Account', 'Zenith Individual Current Account'),
+                                  ('Gold Premium Current Account', 'Zenith Gold Premium Current Account'),
+                                  ('Platinum Premium Current Account', 'Zenith Platinum Premium Current Account'),
+                                  ('Aspire Lite', 'Aspire Lite'),
+                                  ('SME Grow My Biz', 'SME Grow My Biz Account')]:
+        assert (account_type, product) in pairs
+
+
+def test_conflicting_tokens_do_not_cross_match(trans, matcher):
+    new = matcher.match(trans, keep=('Account_Type',))
+    pairs = set(zip(new['Account_Type'], new['Product_Name']))
+    assert ('Individual Current Account', 'Zenith Individual Savings Account') not in pairs
+    assert ('Gold Premium Current Account', 'Zenith Platinum Premium Current Account') not in pairs
+    assert ('Platinum Premium Current Account', 'Zenith Gold Premium Current Account') not in pairs
+
+
+def test_category_fallback(products, matcher):
+    matched = matcher.match(pd.DataFrame({'Account_Type': ['Savings Account'], 'row': [0]}), keep=('row',))
+    savings = set(products.loc[products['Product_Category'] == 'Savings Account', 'Product_Name'])
+    assert savings <= set(matched['Product_Name'])
+
+
+def test_weights_and_empty_input(trans, matcher):
+    new = matcher.match(trans, keep=('row',))
+    assert (new['match_weight'] >= matcher.min_weight).all()
+    assert not new.duplicated(['row', 'Product_Name']).any()
+    assert len(matcher.match(trans.iloc[:0], keep=('row',))) == 0
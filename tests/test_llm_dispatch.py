@@ -0,0 +1,102 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+
+from pinnacle.llm_dispatch import RateLimiter, TokenBucket, dispatch_batches
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from fake_openai_server import start_server  # noqa: E402
+
+OpenAI = pytest.importorskip('openai').OpenAI
+
+
+def prompts(n):
+    return [f"Customer ZB{i:03d}: age 30" for i in range(n)]
+
+
+@pytest.fixture
+def fake_server():
+    """``fake_server(**options)`` -> (stats, request_fn) against a fresh local server."""
+    servers = []
+
+    def start(**options):
+        server, base_url = start_server(**{'latency': 0.01, **options})
+        servers.append(server)
+        client = OpenAI(api_key='test', base_url=base_url, max_retries=0)
+
+        def request(prompt):
+            response = client.chat.completions.create(model='fake', messages=[{'role': 'user', 'content': prompt}])
+            return json.loads(response.choices[0].message.content)['matches']
+
+        return server.RequestHandlerClass.stats, request
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def customers(results):
+    return [[match['customer_id'] for match in result] for result in results]
+
+
+def test_results_in_submission_order(fake_server):
+    stats, request = fake_server(errors=[500])
+    payloads = prompts(12)
+    # The first batch fails once, so it completes after the later ones
+    results = dispatch_batches(request, payloads, max_in_flight=4, base_delay=0.2)
+    assert customers(results) == [[f"ZB{i:03d}"] for i in range(12)]
+    assert stats['requests'] == 13
+
+
+def test_failed_batches_are_retried(fake_server):
+    stats, request = fake_server(errors=[429, 500, 500, 429, 500])
+    completed = []
+    results = dispatch_batches(request, prompts(8), max_in_flight=4, base_delay=0.01,
+                               on_complete=lambda index, result: completed.append(index))
+    assert not any(isinstance(result, Exception) for result in results)
+    assert customers(results) == [[f"ZB{i:03d}"] for i in range(8)]
+    assert stats['requests'] == 8 + 5 and stats['errors'] == 5
+    assert sorted(completed) == list(range(8))
+
+
+def test_exhausted_retries_return_the_error(fake_server):
+    stats, request = fake_server(errors=[500] * 3)
+    results = dispatch_batches(request, prompts(1), max_retries=2, base_delay=0.01)
+    assert isinstance(results[0], Exception) and getattr(results[0], 'status_code', None) == 500
+    assert stats['requests'] == 3
+
+
+def test_retry_after_is_honoured(fake_server):
+    stats, request = fake_server(errors=[429], retry_after=0.5)
+    results = dispatch_batches(request, prompts(1), base_delay=0.001)
+    assert customers(results) == [['ZB000']]
+    (first, _), (retry, _) = stats['arrivals']
+    assert retry - first >= 0.5
+
+
+def test_requests_per_minute_pacing(fake_server):
+    stats, request = fake_server()
+    limiter = RateLimiter(requests_per_minute=1200)
+    limiter.requests = TokenBucket(1200, capacity=1)   # No burst: one request every 50ms
+    dispatch_batches(request, prompts(11), max_in_flight=8, limiter=limiter)
+    arrivals = sorted(t for t, _ in stats['arrivals'])
+    assert len(arrivals) == 11
+    for k, arrival in enumerate(arrivals):
+        assert arrival - arrivals[0] >= k * 0.05 - 0.01
+
+
+def test_tokens_per_minute_pacing(fake_server):
+    stats, request = fake_server()
+    limiter = RateLimiter(tokens_per_minute=60000)
+    limiter.tokens = TokenBucket(60000, capacity=100)  # 1000 tokens/s, 100 per request: every 100ms
+    start = time.monotonic()
+    dispatch_batches(request, prompts(6), max_in_flight=6, limiter=limiter, token_cost=lambda payload: 100)
+    arrivals = sorted(t for t, _ in stats['arrivals'])
+    assert arrivals[-1] - start >= 5 * 0.1 - 0.01
+    for k, arrival in enumerate(arrivals):
+        assert arrival - arrivals[0] >= k * 0.1 - 0.01
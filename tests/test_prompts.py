@@ -0,0 +1,41 @@
+import json
+
+from pinnacle.prompts import parse_matches
+
+
+BATCH = ['ZB001', 'ZB002', 'ZB003']
+PRODUCTS = ['Aspire Account', 'Personal Loan']
+
+
+def test_parse_matches_maps_numbers_back_to_ids():
+    text = json.dumps({'m': [[1, 2, 8], [3, 1, 6.5]]})
+    assert parse_matches(text, BATCH, PRODUCTS) == [
+        {'customer_id': 'ZB001', 'product': 'Personal Loan', 'score': 8.0},
+        {'customer_id': 'ZB003', 'product': 'Aspire Account', 'score': 6.5},
+    ]
+
+
+def test_parse_matches_strips_code_fences():
+    for text in ('```json\n{"m": [[2, 1, 7]]}\n```', '```\n{"m": [[2, 1, 7]]}\n```'):
+        assert parse_matches(text, BATCH, PRODUCTS) == [{'customer_id': 'ZB002', 'product': 'Aspire Account',
+                                                         'score': 7.0}]
+
+
+def test_parse_matches_drops_invalid_entries():
+    entries = [
+        [0, 1, 5],        # customer numbers start at 1
+        [4, 1, 5],        # past the end of the batch
+        [1, 3, 5],        # past the end of the catalogue
+        [1, 1, 'high'],   # non-numeric score
+        [1, 1],           # missing score
+        None,
+        [2, 2, '9'],      # numeric strings are accepted
+    ]
+    assert parse_matches(json.dumps({'m': entries}), BATCH, PRODUCTS) == [
+        {'customer_id': 'ZB002', 'product': 'Personal Loan', 'score': 9.0},
+    ]
+
+
+def test_parse_matches_without_matches():
+    assert parse_matches('{}', BATCH, PRODUCTS) == []
+    assert parse_matches('{"m": []}', BATCH, PRODUCTS) == []